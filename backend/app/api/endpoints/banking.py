@@ -0,0 +1,54 @@
+# agentos_core/app/api/endpoints/banking.py
+
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from loguru import logger
+
+from app.core.security import CurrentUser
+from app.core.logging_config import trace_id_var
+from app.modules.banking.models import TransactionPageAPI, TransactionSummaryAPI
+from app.modules.banking.repository import TransactionRepository, get_transaction_repository
+
+router = APIRouter()
+
+# Papéis que podem consultar o extrato de outro usuário
+STATEMENT_READER_ROLES = {"admin", "support", "manager"}
+
+@router.get(
+    "/transactions",
+    response_model=TransactionPageAPI,
+    tags=["Banking"],
+    summary="List transactions (newest first, cursor pagination)"
+)
+async def list_transactions_endpoint(
+    current_user: CurrentUser,
+    banking_repo: Annotated[TransactionRepository, Depends(get_transaction_repository)],
+    user_id: Optional[str] = Query(None, description="Other user's ID (admin/support/manager only); defaults to the caller"),
+    start_date: Optional[datetime] = Query(None, description="Filter by start date/time (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="Filter by end date/time (ISO format)"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned as next_cursor by the previous page")
+):
+    """Extrato paginado por keyset (created_at, _id): siga `next_cursor` até ele vir nulo."""
+    log = logger.bind(trace_id=trace_id_var.get(), user_id=str(current_user.id), api_endpoint="/banking/transactions GET")
+    target_id = current_user.id
+    if user_id is not None:
+        target_id = banking_repo._to_objectid(user_id)
+        if not target_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID")
+        if target_id != current_user.id and not STATEMENT_READER_ROLES & set(current_user.roles):
+            log.warning(f"Denied statement access to user {user_id}.")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to list this user's transactions")
+    try:
+        rows, next_cursor = await banking_repo.list_summaries_by_user(
+            target_id, start_date=start_date, end_date=end_date, limit=limit, cursor=cursor
+        )
+    except ValueError as e: # Cursor inválido/adulterado
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    items = [
+        TransactionSummaryAPI(**{**row, "id": str(row["_id"]), "amount": str(row["amount"])})
+        for row in rows
+    ]
+    return TransactionPageAPI(items=items, limit=limit, next_cursor=next_cursor)
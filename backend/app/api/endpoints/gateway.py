@@ -0,0 +1,65 @@
+# agentos_core/app/api/endpoints/gateway.py
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from loguru import logger
+import uuid
+
+from app.core.security import CurrentUser
+from app.core.logging_config import trace_id_var
+from app.models.gateway import GatewayStreamRequest
+from app.modules.gateway.streaming import stream_llm_completion, stream_as_sse, forward_stream_to_websocket
+
+router = APIRouter()
+
+@router.post(
+    "/stream",
+    tags=["Gateway"],
+    summary="Stream an LLM completion token by token (SSE or WebSocket)",
+    responses={200: {"content": {"text/event-stream": {}}}, 202: {"description": "Deltas sent via WebSocket /updates"}}
+)
+async def stream_completion(
+    request_in: GatewayStreamRequest,
+    background_tasks: BackgroundTasks,
+    current_user: CurrentUser
+):
+    """
+    Envia o prompt ao LLM com streaming e repassa os deltas assim que chegam.
+    - `channel="sse"`: resposta `text/event-stream` (eventos content / tool_call / done / error).
+    - `channel="websocket"`: retorna 202 com `stream_id`; os deltas vão como mensagens `llm_delta` para a conexão
+      WS identificada por `ws_connection_id` (o connection_id que ela recebeu em connection_status).
+    """
+    log = logger.bind(trace_id=trace_id_var.get(), user_id=str(current_user.id), api_endpoint="/gateway/stream POST")
+    messages = []
+    if request_in.system_prompt:
+        messages.append({"role": "system", "content": request_in.system_prompt})
+    messages.append({"role": "user", "content": request_in.text})
+
+    if request_in.channel == "websocket" and not request_in.ws_connection_id:
+        # Sem default: o id do usuário HTTP não corresponde a nenhum socket e não prova posse de uma conexão
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ws_connection_id (from the WebSocket connection_status frame) is required for channel='websocket'."
+        )
+
+    try:
+        chunks = stream_llm_completion(messages, model=request_in.model)
+    except ValueError as e: # Provider não configurado
+        log.error(f"LLM provider unavailable for streaming: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="LLM provider not available.")
+    except Exception as e:
+        log.exception(f"Failed to start LLM stream: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to start LLM stream.")
+
+    if request_in.channel == "websocket":
+        stream_id = uuid.uuid4().hex
+        background_tasks.add_task(forward_stream_to_websocket, chunks, request_in.ws_connection_id, stream_id)
+        log.info(f"LLM stream {stream_id} will be forwarded to the caller's WebSocket connection.")
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"stream_id": stream_id})
+
+    log.info("Streaming LLM response as SSE.")
+    return StreamingResponse(
+        stream_as_sse(chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Sem buffering em proxies (nginx)
+    )
@@ -6,24 +6,29 @@ from redis.asyncio import Redis
 import asyncio
 from datetime import datetime, timezone, date, time
 import time as process_time
-from typing import Dict, Optional, Literal
+from typing import Any, Dict, Optional, Literal
 from pydantic import BaseModel, Field
 from celery.exceptions import OperationalError as CeleryOperationalError
 
 # Core components
 from app.core.logging_config import trace_id_var
+from app.core.metrics import metrics as runtime_metrics
 from app.core.database import get_database, get_redis_client, AsyncIOMotorDatabase
 from app.worker.celery_app import celery_app
 
 # Repositories for metrics
+# (Exception e não só ImportError: um módulo quebrado não pode derrubar o /status)
 try:
     from app.modules.people.repository import UserRepository, get_user_repository
-    from app.modules.sales.repository import OrderRepository, get_order_repository
-except ImportError:
-    logger.error("Failed to import repositories for metrics endpoint. Metrics will be limited.")
+except Exception as e:
+    logger.error(f"Failed to import user repository for metrics endpoint ({e}). Metrics will be limited.")
     UserRepository = None
-    OrderRepository = None
     async def get_user_repository(): return None
+try:
+    from app.modules.sales.repository import OrderRepository, get_order_repository
+except Exception as e:
+    logger.error(f"Failed to import order repository for metrics endpoint ({e}). Metrics will be limited.")
+    OrderRepository = None
     async def get_order_repository(): return None
 
 class ComponentStatus(BaseModel):
@@ -40,6 +45,7 @@ class BasicMetricsResponse(BaseModel):
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     active_users: Optional[int] = None
     orders_today: Optional[int] = None
+    runtime: Dict[str, Any] = Field(default_factory=dict, description="In-process counters/gauges/summaries of this worker")
 
 PROCESS_START_TIME = process_time.monotonic()
 
@@ -142,7 +148,7 @@ async def get_basic_metrics(
     log = logger.bind(api_endpoint="/metrics GET")
     log.info("Calculating basic metrics...")
 
-    metrics = BasicMetricsResponse(active_users=None, orders_today=None)
+    metrics = BasicMetricsResponse(active_users=None, orders_today=None, runtime=runtime_metrics.snapshot())
 
     try:
         if user_repo:
@@ -2,12 +2,14 @@
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query, HTTPException, status as http_status  
 from loguru import logger  
+import json  
 import uuid  
-from typing import Annotated  
+from typing import Annotated, Any, Dict  
 import hmac # Para API Key
 
 # Manager, Security, Config  
 from app.websocket.connection_manager import manager as ws_manager  
+from app.websocket.topics import validate_topic  
 from app.core.security import settings, CredentialsException  
 from app.core.logging_config import trace_id_var  
 # Importar JWT decode se usar token (mas API Key é mais simples para WS)  
@@ -39,30 +41,63 @@ async def verify_ws_api_key(
     log.info(f"WebSocket authenticated via API Key. Assigned ID: {user_id}")  
     return user_id
 
+async def _handle_client_command(websocket: WebSocket, user_id: str, data: str) -> Dict[str, Any] | None:  
+    """Comandos JSON do cliente (subscribe/unsubscribe/list_subscriptions). Retorna a resposta ou None se ignorado."""  
+    try:  
+        command = json.loads(data)  
+    except ValueError:  
+        return {"type": "error", "error": "expected 'ping' or a JSON command"}  
+    if not isinstance(command, dict):  
+        return {"type": "error", "error": "command must be a JSON object"}  
+    action = command.get("action")  
+    requested = command.get("topics") or []  
+    if isinstance(requested, str):  
+        requested = [requested]  
+    if action == "subscribe":  
+        result = await ws_manager.subscribe(websocket, user_id, requested)  
+    elif action == "unsubscribe":  
+        result = await ws_manager.unsubscribe(websocket, user_id, requested)  
+    elif action == "list_subscriptions":  
+        result = {"topics": ws_manager.subscriptions(websocket), "rejected": {}}  
+    else:  
+        return {"type": "error", "error": f"unknown action '{action}'"}  
+    return {"type": "subscription", "action": action, **result}
+
 # --- Endpoint WebSocket ---  
 @router.websocket("/updates", name="websocket_updates")  
 async def websocket_endpoint(  
     websocket: WebSocket,  
     # Usar a dependência de autenticação API Key  
-    user_id: str = Depends(verify_ws_api_key)  
+    user_id: str = Depends(verify_ws_api_key),  
+    topics: str | None = Query(None, description="Tópicos iniciais separados por vírgula (padrão: WS_DEFAULT_TOPICS)")  
 ):  
     """  
     Endpoint WebSocket para atualizações em tempo real.  
-    Requer autenticação via `?apiKey=...` query parameter.  
+    Requer autenticação via `?apiKey=...` query parameter.
+
+    Protocolo de inscrição (app/websocket/topics.py), mensagens JSON do cliente:  
+        {"action": "subscribe", "topics": ["chat:5511999998888", "delivery:<id>"]}  
+        {"action": "unsubscribe", "topics": ["dashboard:whatsapp"]}  
+        {"action": "list_subscriptions"}  
+    Resposta: {"type": "subscription", "action": ..., "topics": [inscrições atuais], "rejected": {tópico: motivo}}  
     """  
     # Gerar/Obter Trace ID para logs desta conexão  
     trace_id = trace_id_var.get() or f"ws_{uuid.uuid4().hex[:8]}"  
     log = logger.bind(trace_id=trace_id, websocket_client=f"{websocket.client.host}:{websocket.client.port}", user=user_id)
 
     # Conectar ao manager após autenticação bem-sucedida  
-    await ws_manager.connect(websocket, user_id=user_id)  
+    initial_topics = None  
+    if topics is not None:  
+        initial_topics = [t.strip() for t in topics.split(",") if t.strip() and not validate_topic(t.strip(), user_id)]  
+    connection_id = await ws_manager.connect(websocket, user_id=user_id, topics=initial_topics)  
     connection_active = True
 
     try:  
-        # Enviar mensagem de boas-vindas/status  
-        await ws_manager.send_personal_message(  
-            {"type": "connection_status", "status": "connected", "user_id": user_id},  
-            user_id  
+        # Enviar mensagem de boas-vindas/status só para este socket: connection_id é a prova de posse da  
+        # conexão (ex.: ws_connection_id em POST /gateway/stream)  
+        await ws_manager.send_to_socket(  
+            websocket,  
+            {"type": "connection_status", "status": "connected", "user_id": user_id, "connection_id": connection_id}  
         )
 
         # Loop principal: manter conexão e ouvir mensagens do cliente (ex: ping)  
@@ -71,11 +106,14 @@ async def websocket_endpoint(
                 data = await websocket.receive_text()  
                 log.debug(f"Received message: {data}")  
                 # Responder a pings para keep-alive  
+                # Respostas passam pela fila de saída do socket (não concorrem com a task escritora)  
                 if data.strip().lower() == 'ping':  
-                    await websocket.send_text('pong')  
+                    await ws_manager.send_to_socket(websocket, 'pong')  
                     log.debug("Sent pong response.")  
-                # Processar outros comandos do cliente se necessário  
-                # else: ...
+                else:  
+                    reply = await _handle_client_command(websocket, user_id, data)  
+                    if reply is not None:  
+                        await ws_manager.send_to_socket(websocket, reply)
 
             except WebSocketDisconnect as e:  
                  log.info(f"WebSocket disconnected cleanly (code: {e.code}, reason: '{e.reason}').")  
@@ -0,0 +1,125 @@
+# agentos_core/app/api/endpoints/whatsapp_webhook.py
+
+"""
+Webhook da Meta (WhatsApp Cloud API): verificação da assinatura, handshake GET de verificação e recebimento
+de mensagens/statuses em lote (app/services/whatsapp_webhook.py). Router próprio, sem dependências de
+autenticação de usuário, incluído em app/api/v1.py com prefixo /whatsapp.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.database import get_database, get_redis_client_instance
+from app.core.logging_config import trace_id_var
+from app.core.metrics import metrics
+from app.services.autoresponder_timers import AutoResponderTimers
+from app.services.whatsapp_webhook import build_webhook_batch, process_webhook_batch
+from app.services.whatsapp_webhook_stream import WebhookStream
+from app.websocket.connection_manager import manager as ws_manager
+from app.worker.celery_app import celery_app
+
+router = APIRouter()
+
+# --- Dependência de Verificação de Assinatura Meta ---
+async def verify_meta_signature(request: Request, x_hub_signature_256: Annotated[str | None, Header(alias="X-Hub-Signature-256")] = None):
+    """Dependency to verify the X-Hub-Signature-256 header from Meta webhooks."""
+    log = logger.bind(trace_id=trace_id_var.get(), service="WebhookAuth")
+    if not settings.META_APP_SECRET: log.critical("FATAL: META_APP_SECRET missing."); raise HTTPException(500, "Webhook validation misconfigured")
+    if not x_hub_signature_256: log.warning("Webhook missing signature header."); raise HTTPException(400, "Missing signature header")
+    if not x_hub_signature_256.startswith("sha256="): log.warning(f"Invalid signature format."); raise HTTPException(400, "Invalid signature format")
+    expected_hash = x_hub_signature_256.split("=")[1]
+    if not hasattr(request.state, 'raw_body'): request.state.raw_body = await request.body()
+    body = request.state.raw_body
+    hashed = hmac.new(settings.META_APP_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(hashed, expected_hash): log.error("Webhook signature failed!"); raise HTTPException(403, "Invalid signature")
+    log.debug("Webhook signature verified.")
+    return True
+
+# --- Helpers de Processamento de Webhook (em lote: app/services/whatsapp_webhook.py) ---
+def _schedule_autoresponder_eta(chat_id: str, message_id_wami: str, eta: datetime) -> None:
+    """Fallback sem Redis: ETA task sem revoke (check_chat_timeout ignora mensagens que já não são a última)."""
+    celery_app.send_task(
+        "whatsapp.check_chat_timeout",
+        args=[chat_id, message_id_wami],
+        kwargs={"scheduled_time_iso": eta.isoformat(), "trace_id": trace_id_var.get()},
+        eta=eta
+    )
+
+def _get_autoresponder_timers(log: logger) -> Optional[AutoResponderTimers]:
+    """Timers do AutoResponder no Redis; None se o Redis não estiver conectado."""
+    try:
+        return AutoResponderTimers(get_redis_client_instance())
+    except RuntimeError as e:
+        log.warning(f"AutoResponder timers unavailable: {e}")
+        return None
+
+# --- API Endpoints ---
+
+@router.get("/webhook", response_class=PlainTextResponse, tags=["WhatsApp"])
+async def verify_whatsapp_webhook(
+    hub_mode: Annotated[str | None, Query(alias="hub.mode")] = None,
+    hub_verify_token: Annotated[str | None, Query(alias="hub.verify_token")] = None,
+    hub_challenge: Annotated[str | None, Query(alias="hub.challenge")] = None,
+):
+    """Handshake de verificação da Meta: devolve hub.challenge se o token confere com META_VERIFY_TOKEN."""
+    log = logger.bind(trace_id=trace_id_var.get(), service="WhatsAppWebhook")
+    if not settings.META_VERIFY_TOKEN:
+        log.critical("FATAL: META_VERIFY_TOKEN missing.")
+        raise HTTPException(500, "Webhook verification misconfigured")
+    if hub_mode != "subscribe" or hub_challenge is None or hub_verify_token is None \
+            or not hmac.compare_digest(hub_verify_token, settings.META_VERIFY_TOKEN):
+        log.warning(f"Webhook verification failed (mode={hub_mode}).")
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Verification failed")
+    log.info("Webhook verified by Meta.")
+    return hub_challenge
+
+@router.post("/webhook", status_code=status.HTTP_200_OK, tags=["WhatsApp"], dependencies=[Depends(verify_meta_signature)])
+async def handle_whatsapp_webhook_endpoint(request: Request, db: Annotated[AsyncIOMotorDatabase, Depends(get_database)]):
+    """
+    Recebe mensagens e statuses da Meta. Com WHATSAPP_WEBHOOK_STREAM_ENABLED só deduplica e enfileira no Redis Stream
+    (ack rápido); senão, ou com o stream cheio/indisponível, processa o payload inteiro inline como um lote.
+    """
+    log = logger.bind(trace_id=trace_id_var.get(), service="WhatsAppWebhook")
+    started = time.perf_counter()
+    try:
+        payload = json.loads(request.state.raw_body)
+    except ValueError:
+        log.warning("Webhook body is not valid JSON.")
+        raise HTTPException(400, "Invalid JSON payload")
+    if payload.get("object") != "whatsapp_business_account":
+        log.warning(f"Ignoring webhook for object '{payload.get('object')}'.")
+        return {"status": "ignored"}
+
+    if settings.WHATSAPP_WEBHOOK_STREAM_ENABLED:
+        try:
+            result = await WebhookStream(get_redis_client_instance()).enqueue(request.state.raw_body, payload)
+            if not result.backlog_full:
+                metrics.observe("whatsapp_webhook_ack_seconds", time.perf_counter() - started, mode="stream")
+                return {"status": "queued" if result.queued else "duplicate"}
+            log.warning("Webhook stream backlog full; processing payload inline.")
+        except Exception as e:
+            log.error(f"Webhook stream unavailable, processing payload inline: {e}")
+
+    batch = build_webhook_batch(payload)
+    if batch.messages or batch.statuses:
+        try:
+            await process_webhook_batch(
+                batch, db,
+                timers=_get_autoresponder_timers(log), publish=ws_manager.publish,
+                trace_id=trace_id_var.get(), schedule_fallback=_schedule_autoresponder_eta
+            )
+        except Exception as e:
+            # Sempre 200 para a Meta (evita tempestade de reentregas); o erro fica no log
+            log.exception(f"Core error processing webhook batch: {e}")
+    metrics.observe("whatsapp_webhook_ack_seconds", time.perf_counter() - started, mode="inline")
+    return {"status": "ok"}
@@ -1,7 +1,10 @@
 # app/api/v1.py
 from fastapi import APIRouter
-from app.api.endpoints import status
+from app.api.endpoints import status, gateway, whatsapp_webhook, banking
 
 api_v1_router = APIRouter()
 
-api_v1_router.include_router(status.router)
\ No newline at end of file
+api_v1_router.include_router(status.router)
+api_v1_router.include_router(gateway.router, prefix="/gateway")
+api_v1_router.include_router(whatsapp_webhook.router, prefix="/whatsapp")
+api_v1_router.include_router(banking.router, prefix="/banking")
@@ -31,6 +31,7 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "AgentOS Core"  
     API_V1_STR: str = "/api/v1"  
     LOG_LEVEL: str = "INFO"
+    FRONTEND_ORIGIN: str = Field(default="http://localhost:3000", env="FRONTEND_ORIGIN") # CORS (main.py)
 
     # Database & Cache  
     MONGODB_URI: str  
@@ -38,17 +39,82 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str  
     CELERY_RESULT_BACKEND: str
 
+    # Reference IDs (CounterService)
+    # "mongo" (coleção counters) ou "redis" (INCRBY); cada processo reserva blocos de COUNTER_BLOCK_SIZE valores
+    COUNTER_BACKEND: str = Field(default="mongo", env="COUNTER_BACKEND")
+    COUNTER_BLOCK_SIZE: int = Field(default=20, env="COUNTER_BLOCK_SIZE")
+    # Redis: o Mongo guarda uma marca d'água adiantada em passos deste tamanho (uma escrita a cada N valores, não por bloco)
+    COUNTER_REDIS_HWM_STEP: int = Field(default=1000, env="COUNTER_REDIS_HWM_STEP")
+
     # AI Services  
     OPENAI_API_KEY: str  
+    # Base da API OpenAI (chat + embeddings); aponte para o stub local (benchmarks/openai_stub.py) em testes de carga
+    OPENAI_API_BASE_URL: str = Field(default="https://api.openai.com/v1", env="OPENAI_API_BASE_URL")
     GEMINI_API_KEY: str | None = None
+    OPENAI_CHAT_MODEL: str = Field(default="gpt-4o-mini", env="OPENAI_CHAT_MODEL")
+    GEMINI_MODEL: str | None = None
+    # Cache de respostas do LLM (get_completion_with_fallback): exato por hash do request e, opcionalmente,
+    # semântico (similaridade do embedding da última mensagem do usuário >= LLM_CACHE_SEMANTIC_THRESHOLD; 0 desativa)
+    LLM_CACHE_ENABLED: bool = Field(default=True, env="LLM_CACHE_ENABLED")
+    LLM_CACHE_BACKEND: str = Field(default="memory", env="LLM_CACHE_BACKEND") # "memory" | "redis"
+    LLM_CACHE_SIZE: int = Field(default=2000, env="LLM_CACHE_SIZE")
+    LLM_CACHE_TTL_SECONDS: int = Field(default=3600, env="LLM_CACHE_TTL_SECONDS")
+    LLM_CACHE_MAX_TEMPERATURE: float = Field(default=0.0, env="LLM_CACHE_MAX_TEMPERATURE") # Acima disso: bypass
+    LLM_CACHE_SEMANTIC_THRESHOLD: float = Field(default=0.0, env="LLM_CACHE_SEMANTIC_THRESHOLD")
+    # Orçamento de tokens do prompt (app/services/token_budget.py)
+    LLM_DEFAULT_CONTEXT_TOKENS: int = Field(default=8192, env="LLM_DEFAULT_CONTEXT_TOKENS") # Modelos fora da tabela
+    LLM_MAX_PROMPT_TOKENS: int | None = Field(default=None, env="LLM_MAX_PROMPT_TOKENS") # Teto de custo abaixo da janela
+    LLM_PROMPT_SAFETY_MARGIN_TOKENS: int = Field(default=64, env="LLM_PROMPT_SAFETY_MARGIN_TOKENS")
+    LLM_SUMMARY_MAX_TOKENS: int = Field(default=300, env="LLM_SUMMARY_MAX_TOKENS")
+    LLM_SUMMARY_INPUT_MAX_TOKENS: int = Field(default=6000, env="LLM_SUMMARY_INPUT_MAX_TOKENS")
+    # AutoResponder: orçamento do histórico do chat no prompt (mensagens mais recentes primeiro)
+    AUTORESPONDER_HISTORY_MAX_TOKENS: int = Field(default=600, env="AUTORESPONDER_HISTORY_MAX_TOKENS")
+    AUTORESPONDER_MESSAGE_MAX_TOKENS: int = Field(default=120, env="AUTORESPONDER_MESSAGE_MAX_TOKENS")
+    # Resiliência por provider (app/services/llm_resilience.py)
+    LLM_CALL_TIMEOUT_SECONDS: float = Field(default=30.0, env="LLM_CALL_TIMEOUT_SECONDS")
+    LLM_LIMITER_INITIAL: int = Field(default=20, env="LLM_LIMITER_INITIAL")
+    LLM_LIMITER_MIN: int = Field(default=2, env="LLM_LIMITER_MIN")
+    LLM_LIMITER_MAX: int = Field(default=200, env="LLM_LIMITER_MAX")
+    LLM_LIMITER_LATENCY_TARGET_SECONDS: float = Field(default=20.0, env="LLM_LIMITER_LATENCY_TARGET_SECONDS")
+    LLM_LIMITER_QUEUE_TIMEOUT_SECONDS: float = Field(default=5.0, env="LLM_LIMITER_QUEUE_TIMEOUT_SECONDS")
+    LLM_BREAKER_FAILURE_THRESHOLD: int = Field(default=5, env="LLM_BREAKER_FAILURE_THRESHOLD")
+    LLM_BREAKER_RESET_SECONDS: float = Field(default=30.0, env="LLM_BREAKER_RESET_SECONDS")
+    # Hedged requests: se o primário não responder em p95 (ou o default até haver amostras), dispara o secundário
+    # e usa a primeira resposta válida. Só hedgeia contra um secundário distinto com interface OpenAI (o "gemini"
+    # padrão não serve); sem ele, LLM_HEDGE_SAME_PROVIDER=true permite uma cópia da chamada no próprio primário
+    LLM_HEDGE_ENABLED: bool = Field(default=False, env="LLM_HEDGE_ENABLED")
+    LLM_HEDGE_SAME_PROVIDER: bool = Field(default=False, env="LLM_HEDGE_SAME_PROVIDER")
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = Field(default=3.0, env="LLM_HEDGE_DEFAULT_DELAY_SECONDS")
+    LLM_HEDGE_PERCENTILE: float = Field(default=95.0, env="LLM_HEDGE_PERCENTILE")
 
     # Embedding  
     EMBEDDING_MODEL: str = Field(default="text-embedding-3-small", env="EMBEDDING_MODEL")  
     EMBEDDING_DIMENSIONS: int = Field(default=1536, env="EMBEDDING_DIMENSIONS")
+    EMBEDDING_MAX_INPUT_TOKENS: int = Field(default=8191, env="EMBEDDING_MAX_INPUT_TOKENS") # Textos maiores são truncados
+    # Micro-batching de embeddings (chamadas concorrentes viram uma requisição à API)
+    EMBEDDING_BATCH_MAX_ITEMS: int = Field(default=256, env="EMBEDDING_BATCH_MAX_ITEMS")
+    EMBEDDING_BATCH_MAX_TOKENS: int = Field(default=100000, env="EMBEDDING_BATCH_MAX_TOKENS")
+    EMBEDDING_BATCH_WINDOW_MS: float = Field(default=10.0, env="EMBEDDING_BATCH_WINDOW_MS")
+    # Cache por hash do conteúdo (modelo + dimensões + texto): LRU em memória e, opcionalmente, Redis
+    EMBEDDING_CACHE_SIZE: int = Field(default=10000, env="EMBEDDING_CACHE_SIZE")
+    EMBEDDING_CACHE_REDIS: bool = Field(default=False, env="EMBEDDING_CACHE_REDIS")
+    EMBEDDING_CACHE_TTL_SECONDS: int = Field(default=7 * 24 * 3600, env="EMBEDDING_CACHE_TTL_SECONDS")
 
     # MongoDB Atlas Search  
     MONGO_MEMORY_SEARCH_INDEX_NAME: str = Field(default="vector_index_memories", env="MONGO_MEMORY_SEARCH_INDEX_NAME")
 
+    # Memory vector search backend: "atlas" ($vectorSearch) ou índice local em processo ("bruteforce" | "ivf")
+    MEMORY_VECTOR_BACKEND: str = Field(default="atlas", env="MEMORY_VECTOR_BACKEND")
+    MEMORY_VECTOR_PARTITION_TTL_SECONDS: float = Field(default=300.0, env="MEMORY_VECTOR_PARTITION_TTL_SECONDS")
+    MEMORY_IVF_NPROBE: int = Field(default=16, env="MEMORY_IVF_NPROBE")
+    MEMORY_IVF_MIN_TRAIN_SIZE: int = Field(default=20000, env="MEMORY_IVF_MIN_TRAIN_SIZE")
+    # Formato do campo embedding em memories: "list" (legado), "float32" ou "int8" (BSON vector, subtipo 9)
+    MEMORY_EMBEDDING_STORAGE: str = Field(default="float32", env="MEMORY_EMBEDDING_STORAGE")
+
+    # Cache em processo de settings/feature flags (app/core/settings_cache.py); invalidação imediata via pub/sub Redis,
+    # o TTL limita a defasagem quando uma invalidação se perde
+    SETTINGS_CACHE_TTL_SECONDS: float = Field(default=60.0, env="SETTINGS_CACHE_TTL_SECONDS")
+
     # Security  
     SECRET_KEY: str # For JWT  
     ALGORITHM: str = "HS256"  
@@ -60,6 +126,52 @@ class Settings(BaseSettings):
     META_ACCESS_TOKEN: str | None = None  
     META_PHONE_NUMBER_ID: str | None = None  
     META_VERIFY_TOKEN: str | None = None
+    # Base da Graph API (apontar para benchmarks/graph_api_stub.py em testes de carga)
+    META_GRAPH_API_BASE_URL: str = Field(default="https://graph.facebook.com/v19.0", env="META_GRAPH_API_BASE_URL")
+    # Cliente HTTP compartilhado para a Graph API (pool por processo/event loop, HTTP/2 + keep-alive)
+    WHATSAPP_HTTP_TIMEOUT_SECONDS: float = Field(default=25.0, env="WHATSAPP_HTTP_TIMEOUT_SECONDS")
+    WHATSAPP_HTTP_CONNECT_TIMEOUT_SECONDS: float = Field(default=5.0, env="WHATSAPP_HTTP_CONNECT_TIMEOUT_SECONDS")
+    WHATSAPP_HTTP_MAX_CONNECTIONS: int = Field(default=50, env="WHATSAPP_HTTP_MAX_CONNECTIONS")
+    # Igual a MAX_CONNECTIONS: com menos, sob rajada o httpcore fecha conexões ociosas e abre novas para a fila
+    WHATSAPP_HTTP_MAX_KEEPALIVE: int = Field(default=50, env="WHATSAPP_HTTP_MAX_KEEPALIVE")
+    # httpx fecha conexões ociosas após 5s por padrão; rajadas espaçadas pagariam TCP+TLS de novo
+    WHATSAPP_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = Field(default=120.0, env="WHATSAPP_HTTP_KEEPALIVE_EXPIRY_SECONDS")
+    # Pipeline de envio em lote (pending_queue -> pending_send -> sent/failed_send), drenado pelo beat
+    WHATSAPP_SEND_PIPELINE_ENABLED: bool = Field(default=True, env="WHATSAPP_SEND_PIPELINE_ENABLED") # False = uma task whatsapp.send_message por mensagem
+    WHATSAPP_SEND_BATCH_SIZE: int = Field(default=50, env="WHATSAPP_SEND_BATCH_SIZE")
+    # Token bucket por META_PHONE_NUMBER_ID: em qualquer janela de 1s passam até RATE + BURST mensagens,
+    # então RATE + BURST <= limite da Meta (80 msg/s por número no tier padrão)
+    WHATSAPP_SEND_RATE_PER_SECOND: float = Field(default=70.0, env="WHATSAPP_SEND_RATE_PER_SECOND")
+    WHATSAPP_SEND_BURST: int = Field(default=10, env="WHATSAPP_SEND_BURST")
+    WHATSAPP_SEND_MAX_ATTEMPTS: int = Field(default=5, env="WHATSAPP_SEND_MAX_ATTEMPTS")
+    WHATSAPP_SEND_RETRY_BASE_SECONDS: float = Field(default=2.0, env="WHATSAPP_SEND_RETRY_BASE_SECONDS")
+    WHATSAPP_SEND_RETRY_MAX_SECONDS: float = Field(default=300.0, env="WHATSAPP_SEND_RETRY_MAX_SECONDS")
+    WHATSAPP_SEND_CLAIM_LEASE_SECONDS: float = Field(default=120.0, env="WHATSAPP_SEND_CLAIM_LEASE_SECONDS") # Claims mais antigos (worker morreu) voltam para a fila
+    WHATSAPP_SEND_DRAIN_SECONDS: float = Field(default=20.0, env="WHATSAPP_SEND_DRAIN_SECONDS") # Tempo máximo de uma execução do dreno
+    # Ingestão do webhook via Redis Stream: a request valida a assinatura, deduplica por WAMI e faz XADD (ack rápido para a Meta);
+    # a task whatsapp.consume_webhook_stream processa em lote. False = processa o payload inline na request
+    WHATSAPP_WEBHOOK_STREAM_ENABLED: bool = Field(default=False, env="WHATSAPP_WEBHOOK_STREAM_ENABLED")
+    WHATSAPP_WEBHOOK_DEDUP_TTL_SECONDS: int = Field(default=86400, env="WHATSAPP_WEBHOOK_DEDUP_TTL_SECONDS") # Janela de deduplicação por WAMI/status
+    WHATSAPP_WEBHOOK_STREAM_MAX_BACKLOG: int = Field(default=50000, env="WHATSAPP_WEBHOOK_STREAM_MAX_BACKLOG") # Acima disso a request processa inline (backpressure)
+    WHATSAPP_WEBHOOK_CONSUMER_BATCH: int = Field(default=100, env="WHATSAPP_WEBHOOK_CONSUMER_BATCH") # Entradas do stream por lote
+    WHATSAPP_WEBHOOK_CONSUMER_SECONDS: float = Field(default=10.0, env="WHATSAPP_WEBHOOK_CONSUMER_SECONDS") # Duração de uma execução do consumidor (= intervalo do beat)
+    WHATSAPP_WEBHOOK_CLAIM_IDLE_SECONDS: float = Field(default=60.0, env="WHATSAPP_WEBHOOK_CLAIM_IDLE_SECONDS") # Pendentes sem ack há mais tempo (consumidor morreu) são reivindicados
+    # Entregas (XPENDING) a partir das quais uma entrada reivindicada é processada sozinha; se falhar sozinha vai para o dead-letter
+    WHATSAPP_WEBHOOK_MAX_DELIVERIES: int = Field(default=3, env="WHATSAPP_WEBHOOK_MAX_DELIVERIES")
+
+    # WebSocket /updates: tópicos (app/websocket/topics.py). Clientes que não enviam subscribe recebem estes tópicos
+    # ao conectar (separados por vírgula); "" = só o tópico do próprio usuário
+    WS_DEFAULT_TOPICS: str = Field(default="dashboard:whatsapp", env="WS_DEFAULT_TOPICS")
+    WS_MAX_TOPICS_PER_CONNECTION: int = Field(default=200, env="WS_MAX_TOPICS_PER_CONNECTION")
+    # Backplane Redis pub/sub (canal ws:events): qualquer processo (API ou worker Celery) publica uma vez e cada nó da
+    # API entrega aos seus sockets. Desligado (ou sem Redis) = entrega só aos sockets do próprio processo
+    WS_BACKPLANE_ENABLED: bool = Field(default=True, env="WS_BACKPLANE_ENABLED")
+    # Fila de saída por socket (app/websocket/send_queue.py): acima do limite suave os tipos descartáveis são
+    # descartados; no limite máximo (ou com um envio parado pelo timeout) o cliente lento é desconectado
+    WS_SEND_QUEUE_MAX_FRAMES: int = Field(default=1000, env="WS_SEND_QUEUE_MAX_FRAMES")
+    WS_SEND_QUEUE_SOFT_LIMIT: int = Field(default=250, env="WS_SEND_QUEUE_SOFT_LIMIT")
+    WS_SEND_TIMEOUT_SECONDS: float = Field(default=10.0, env="WS_SEND_TIMEOUT_SECONDS")
+    WS_DROPPABLE_EVENT_TYPES: str = Field(default="whatsapp_message_status", env="WS_DROPPABLE_EVENT_TYPES")
 
     # Sentry (Optional)  
     SENTRY_DSN: str | None = None
@@ -1,34 +1,111 @@
 # agentos_core/app/core/counters.py
 
+import asyncio
+import weakref
 from datetime import datetime  
+from typing import Dict, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorCollection  
 from pymongo import ReturnDocument  
 from loguru import logger
+from fastapi import HTTPException, status
+import redis.asyncio as redis
 
 # Importar get_database diretamente para a função de dependência  
-from app.core.database import get_database
+from app.core.database import get_database, get_redis_client_instance
+from app.core.config import settings
 
 COUNTERS_COLLECTION = "counters"
+REDIS_COUNTER_KEY_PREFIX = "counters:"
+REDIS_COUNTER_HWM_SUFFIX = ":hwm"
+
+# KEYS: contador, marca d'água persistida no Mongo. ARGV: count[, semente].
+# Sem a chave e sem semente retorna nil (o chamador lê o Mongo e repete com a semente);
+# com semente, SET + INCRBY acontecem no mesmo script, então só um processo semeia.
+_RESERVE_BLOCK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    if ARGV[2] == nil then return nil end
+    redis.call('SET', KEYS[1], ARGV[2])
+    redis.call('SET', KEYS[2], ARGV[2])
+end
+local end_val = redis.call('INCRBY', KEYS[1], ARGV[1])
+return {end_val, tonumber(redis.call('GET', KEYS[2]) or '0')}
+"""
+
+# Só avança a marca d'água (vários processos podem persistir passos concorrentes)
+_ADVANCE_HWM_SCRIPT = """
+if tonumber(ARGV[1]) > tonumber(redis.call('GET', KEYS[1]) or '0') then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+class _SequenceBlock:
+    """Faixa [next_value, end_value] de uma sequência já reservada por este processo."""
+    __slots__ = ("next_value", "end_value")
+
+    def __init__(self, next_value: int, end_value: int):
+        self.next_value = next_value
+        self.end_value = end_value
+
+# Estado por processo, compartilhado por todas as instâncias de CounterService
+# (get_counter_service cria uma instância por request).
+_blocks: Dict[str, _SequenceBlock] = {}
+# Locks por event loop: workers Celery usam loops diferentes ao longo da vida do processo
+_block_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = weakref.WeakKeyDictionary()
+
+def _get_block_lock(name: str) -> asyncio.Lock:
+    locks = _block_locks.setdefault(asyncio.get_running_loop(), {})
+    lock = locks.get(name)
+    if lock is None:
+        lock = locks[name] = asyncio.Lock()
+    return lock
+
+def reset_sequence_blocks() -> None:
+    """Descarta os blocos reservados (os valores não usados viram lacunas). Útil em testes/benchmarks."""
+    _blocks.clear()
 
 class CounterService:  
-    """Gera IDs sequenciais amigáveis (ex: ORD-YYYY-XXXXX)."""
+    """
+    Gera IDs sequenciais amigáveis (ex: ORD-YYYY-XXXXX).
+
+    Cada processo reserva um bloco de `block_size` valores com um único $inc (Mongo) ou INCRBY (Redis)
+    e os entrega localmente. As referências continuam únicas, mas podem ter lacunas (blocos não
+    consumidos até o restart do processo) e não são estritamente crescentes entre processos.
+    block_size=1 sem Redis equivale ao comportamento antigo (um round trip por referência).
+    """
 
-    def __init__(self, db: AsyncIOMotorDatabase):  
+    def __init__(self, db: AsyncIOMotorDatabase, block_size: Optional[int] = None, redis_client: Optional[redis.Redis] = None):  
         if not isinstance(db, AsyncIOMotorDatabase):  
              # Adicionar verificação de tipo para segurança  
              raise TypeError("CounterService requires a valid AsyncIOMotorDatabase instance.")  
         self.collection: AsyncIOMotorCollection = db[COUNTERS_COLLECTION]  
-        logger.debug(f"CounterService initialized with collection '{COUNTERS_COLLECTION}'.")
+        self.block_size = max(1, block_size if block_size is not None else settings.COUNTER_BLOCK_SIZE)
+        self.redis = redis_client
+        logger.debug(f"CounterService initialized with collection '{COUNTERS_COLLECTION}' (block_size={self.block_size}, backend={'redis' if redis_client else 'mongo'}).")
 
     async def _get_next_sequence(self, name: str) -> int:  
-        """Obtém o próximo valor da sequência de forma atômica."""  
-        log = logger.bind(counter_name=name)  
-        log.debug("Getting next sequence value...")  
+        """Obtém o próximo valor da sequência, reservando um novo bloco quando o atual se esgota."""
+        async with _get_block_lock(name):
+            # O lock segura as demais corrotinas enquanto um bloco é reservado (uma reserva por bloco)
+            block = _blocks.get(name)
+            if block is None or block.next_value > block.end_value:
+                end_value = await self._reserve_block(name, self.block_size)
+                block = _blocks[name] = _SequenceBlock(end_value - self.block_size + 1, end_value)
+            next_val = block.next_value
+            block.next_value += 1
+            return next_val
+
+    async def _reserve_block(self, name: str, count: int) -> int:
+        """Reserva `count` valores de forma atômica; retorna o último valor da faixa reservada."""
+        if self.redis is not None:
+            return await self._reserve_block_redis(name, count)
+        log = logger.bind(counter_name=name, count=count)  
+        log.debug("Reserving sequence block...")
         try:  
             # find_one_and_update com upsert=True é atômico  
             counter = await self.collection.find_one_and_update(  
                 {"_id": name}, # Usar nome como _id  
-                {"$inc": {"sequence_value": 1}}, # Incrementar  
+                {"$inc": {"sequence_value": count}}, # Incrementar pelo tamanho do bloco
                 upsert=True, # Criar se não existir (começará em 1 após $inc)  
                 return_document=ReturnDocument.AFTER # Retornar o documento *depois* da atualização  
             )  
@@ -37,14 +114,44 @@ class CounterService:
                 log.critical(f"CRITICAL: Failed to get or create counter - find_one_and_update returned unexpected value: {counter}")  
                 raise RuntimeError(f"Failed to reliably get or create counter '{name}'")
 
-            next_val = counter["sequence_value"]  
-            log.debug(f"Next sequence value obtained: {next_val}")  
-            return next_val  
+            end_val = counter["sequence_value"]  
+            log.debug(f"Sequence block reserved: {end_val - count + 1}..{end_val}")
+            return end_val
         except Exception as e:  
             # Capturar erros de DB (ex: timeout, falha de conexão)  
             log.exception(f"Database error while getting next sequence for counter '{name}': {e}")  
             raise RuntimeError(f"Database error accessing counter '{name}'") from e
 
+    async def _reserve_block_redis(self, name: str, count: int) -> int:
+        """
+        Reserva via script Lua (INCRBY). O Mongo só é lido para semear a chave quando ela não existe, e só é
+        escrito quando o bloco ultrapassa a marca d'água persistida: aí avança ($max) COUNTER_REDIS_HWM_STEP
+        valores à frente antes de o bloco ser usado. Se o Redis perder a chave, a nova semente (a marca d'água)
+        é >= qualquer valor já entregue; o custo é uma lacuna de até um passo.
+        """
+        log = logger.bind(counter_name=name, count=count, backend="redis")
+        key = f"{REDIS_COUNTER_KEY_PREFIX}{name}"
+        hwm_key = f"{key}{REDIS_COUNTER_HWM_SUFFIX}"
+        try:
+            reserve = self.redis.register_script(_RESERVE_BLOCK_SCRIPT)
+            reserved = await reserve(keys=[key, hwm_key], args=[count])
+            if reserved is None:
+                current = await self.collection.find_one({"_id": name}, {"sequence_value": 1})
+                seed = (current or {}).get("sequence_value", 0)
+                log.info(f"Seeding Redis counter from Mongo high-water mark {seed}.")
+                reserved = await reserve(keys=[key, hwm_key], args=[count, seed])
+            end_val, hwm = int(reserved[0]), int(reserved[1])
+            if end_val > hwm:
+                new_hwm = end_val + max(0, settings.COUNTER_REDIS_HWM_STEP)
+                await self.collection.update_one({"_id": name}, {"$max": {"sequence_value": new_hwm}}, upsert=True)
+                await self.redis.register_script(_ADVANCE_HWM_SCRIPT)(keys=[hwm_key], args=[new_hwm])
+                log.debug(f"Mongo high-water mark advanced to {new_hwm}.")
+            log.debug(f"Sequence block reserved: {end_val - count + 1}..{end_val}")
+            return end_val
+        except Exception as e:
+            log.exception(f"Redis error while reserving sequence block for counter '{name}': {e}")
+            raise RuntimeError(f"Redis error accessing counter '{name}'") from e
+
     async def generate_reference(self, prefix: str) -> str:  
         """Gera a referência completa (ex: ORD-2025-00001)."""  
         if not prefix or not isinstance(prefix, str) or not prefix.isalnum():  
@@ -72,6 +179,14 @@ class CounterService:
 async def get_counter_service() -> CounterService:  
     """FastAPI dependency to get CounterService instance."""  
     # Sempre obtém a instância do DB atual  
-    db = get_database()  
-    # Retorna uma nova instância do serviço (sem estado)  
-    return CounterService(db)
+    db = await get_database()
+    redis_client = None
+    if settings.COUNTER_BACKEND == "redis":
+        try:
+            redis_client = get_redis_client_instance()
+        except RuntimeError as e:
+            # Sem fallback para o Mongo: o valor lá pode estar atrás do Redis e reemitiria referências
+            logger.error("COUNTER_BACKEND=redis but Redis is not available; refusing to generate references.")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Counter backend not available: {e}")
+    # Instância leve: os blocos reservados vivem no módulo (por processo)
+    return CounterService(db, redis_client=redis_client)
@@ -1,6 +1,7 @@
 # agentos_core/app/core/database.py
 
 import motor.motor_asyncio  
+from motor.motor_asyncio import AsyncIOMotorDatabase
 import redis.asyncio as redis  
 from contextlib import asynccontextmanager, AbstractAsyncContextManager # Importar AbstractAsyncContextManager  
 from loguru import logger  
@@ -0,0 +1,126 @@
+# agentos_core/app/core/dataloader.py
+
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from bson import ObjectId
+from loguru import logger
+
+from app.core.repository import BaseRepository
+
+# Loaders do request atual, indexados pela coleção do repositório.
+# O dict é criado pelo middleware/escopo e compartilhado por todas as tasks do request.
+_request_loaders_var: contextvars.ContextVar[Optional[Dict[str, "DataLoader"]]] = contextvars.ContextVar(
+    "request_loaders", default=None
+)
+
+class DataLoader:
+    """
+    Agrupa chamadas get_by_id feitas no mesmo tick do event loop em uma única query $in
+    (via BaseRepository.get_many) e mantém cache por _id durante o escopo do request.
+    """
+
+    def __init__(self, repository: BaseRepository):
+        self.repository = repository
+        self._cache: Dict[ObjectId, asyncio.Future] = {}
+        self._pending: List[ObjectId] = []
+        self._dispatch_scheduled = False
+        self._batch_tasks: Set[asyncio.Task] = set() # Referência forte até o lote terminar (o loop só guarda weakref)
+
+    def load(self, id: str | ObjectId) -> "asyncio.Future":
+        """Agenda a busca de um documento; retorna um awaitable com o modelo (ou None)."""
+        loop = asyncio.get_running_loop()
+        obj_id = self.repository._to_objectid(id)
+        if not obj_id:
+            future = loop.create_future()
+            future.set_result(None)
+            return future
+
+        cached = self._cache.get(obj_id)
+        if cached is not None:
+            return cached
+
+        future = loop.create_future()
+        self._cache[obj_id] = future
+        self._pending.append(obj_id)
+        if not self._dispatch_scheduled:
+            # Despachar apenas depois que as demais tasks prontas neste tick enfileirarem seus ids
+            self._dispatch_scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, ids: Iterable[str | ObjectId]) -> List[Optional[Any]]:
+        """Busca vários ids (mesma ordem da entrada, None para ausentes)."""
+        return list(await asyncio.gather(*(self.load(i) for i in ids)))
+
+    def prime(self, obj: Any) -> None:
+        """Insere no cache um documento já carregado (ex: recém-criado)."""
+        obj_id = self.repository._to_objectid(getattr(obj, "id", None))
+        if not obj_id or obj_id in self._cache:
+            return
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(obj)
+        self._cache[obj_id] = future
+
+    def clear(self, id: str | ObjectId) -> None:
+        """Remove um id do cache (usar após updates)."""
+        obj_id = self.repository._to_objectid(id)
+        if obj_id:
+            self._cache.pop(obj_id, None)
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, []
+        self._dispatch_scheduled = False
+        if batch:
+            task = asyncio.ensure_future(self._load_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _load_batch(self, batch: List[ObjectId]) -> None:
+        log = logger.bind(collection=self.repository.collection_name, batch_size=len(batch))
+        log.debug("DataLoader: executando busca em lote...")
+        try:
+            found = await self.repository.get_many(batch)
+        except Exception as e:
+            # Não cachear falhas: próximas chamadas tentam novamente
+            for obj_id in batch:
+                future = self._cache.pop(obj_id, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        for obj_id in batch:
+            future = self._cache.get(obj_id)
+            if future is not None and not future.done():
+                future.set_result(found.get(obj_id))
+
+@contextmanager
+def request_loaders_scope() -> Iterator[Dict[str, DataLoader]]:
+    """Abre um escopo de loaders (um request HTTP, uma task Celery, etc.)."""
+    token = _request_loaders_var.set({})
+    try:
+        yield _request_loaders_var.get()
+    finally:
+        _request_loaders_var.reset(token)
+
+def get_loader(repository: BaseRepository) -> DataLoader:
+    """
+    Retorna o DataLoader do request atual para a coleção do repositório.
+    Fora de um escopo (request_loaders_scope/middleware), cada chamada cria um loader novo: não há batching
+    entre chamadas nem cache; só os ids pedidos ao mesmo loader (ex.: load_many) vão juntos numa query.
+    """
+    loaders = _request_loaders_var.get()
+    if loaders is None:
+        return DataLoader(repository)
+    loader = loaders.get(repository.collection_name)
+    if loader is None:
+        loader = DataLoader(repository)
+        loaders[repository.collection_name] = loader
+    return loader
+
+# Middleware FastAPI: um conjunto de loaders por request
+async def dataloader_middleware(request, call_next):
+    """Cria os DataLoaders com escopo do request (cache descartado ao final)."""
+    with request_loaders_scope():
+        return await call_next(request)
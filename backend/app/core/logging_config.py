@@ -43,6 +43,8 @@ def setup_logging():
 
     # Remover handlers padrão do Loguru para evitar duplicação  
     logger.remove()
+    # Logs sem bind(trace_id=...) (import de módulos, startup) também precisam do campo usado no formato
+    logger.configure(extra={"trace_id": "unset"})
 
     log_level = settings.LOG_LEVEL.upper()  
     # Ativar diagnose (mais detalhes em erros) apenas se o nível for DEBUG  
@@ -0,0 +1,59 @@
+# agentos_core/app/core/metrics.py
+
+from collections import defaultdict
+from typing import Any, Dict
+
+class _Summary:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+class MetricsRegistry:
+    """
+    Métricas simples em processo (contadores, gauges e resumos count/sum/avg/max).
+    Expostas em GET /metrics (campo `runtime`). Labels viram parte do nome: `nome{label=valor}`.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, _Summary] = defaultdict(_Summary)
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        self._counters[self._key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        self._summaries[self._key(name, labels)].observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        summaries = {
+            key: {"count": s.count, "sum": s.total, "avg": s.total / s.count if s.count else 0.0, "max": s.max}
+            for key, s in self._summaries.items() if s.count
+        }
+        return {"counters": dict(self._counters), "gauges": dict(self._gauges), "summaries": summaries}
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._gauges.clear()
+        self._summaries.clear()
+
+# Instância global do processo
+metrics = MetricsRegistry()
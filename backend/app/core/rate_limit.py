@@ -0,0 +1,102 @@
+# agentos_core/app/core/rate_limit.py
+
+"""
+Token bucket compartilhado entre processos (Redis) para limitar a vazão de chamadas externas.
+
+O estado (tokens, timestamp) fica num hash Redis e é atualizado atomicamente por um script Lua que usa o
+relógio do próprio Redis (TIME) — workers com relógios diferentes enxergam o mesmo bucket. Sem Redis
+o bucket cai para um contador local (limite vale só para o processo; loga um aviso).
+
+    bucket = TokenBucket(f"wa:send:{phone_id}", rate_per_second=80, capacity=80, redis_client=client)
+    await bucket.acquire()          # espera 1 token
+    granted, wait = await bucket.take(10)  # pega até 10 sem esperar
+"""
+
+import asyncio
+import time
+from typing import Optional, Tuple
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.metrics import metrics
+
+# Retorna {tokens concedidos, segundos até o próximo token (string: números Lua viram inteiros na resposta)}
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+local wait = 0
+if granted < requested then
+    wait = (1 - tokens) / rate
+end
+return {granted, tostring(wait)}
+"""
+
+class TokenBucket:
+    """Bucket de `capacity` tokens reabastecido a `rate_per_second`. Uma instância por loop/processo."""
+
+    def __init__(self, key: str, rate_per_second: float, capacity: int, redis_client: Optional[redis.Redis] = None):
+        if rate_per_second <= 0 or capacity < 1:
+            raise ValueError("TokenBucket requires rate_per_second > 0 and capacity >= 1")
+        self.key = key
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._redis = redis_client
+        self._script = redis_client.register_script(TOKEN_BUCKET_LUA) if redis_client is not None else None
+        self._local_tokens = float(capacity)
+        self._local_ts = time.monotonic()
+        self._lock = asyncio.Lock() # Só um acquire consulta o bucket por vez (evita rajadas de polling no Redis)
+        self._warned = False
+
+    def _take_local(self, requested: int) -> Tuple[int, float]:
+        now = time.monotonic()
+        self._local_tokens = min(float(self.capacity), self._local_tokens + (now - self._local_ts) * self.rate)
+        self._local_ts = now
+        granted = min(requested, int(self._local_tokens))
+        self._local_tokens -= granted
+        return granted, (1 - self._local_tokens) / self.rate if granted < requested else 0.0
+
+    async def take(self, requested: int = 1) -> Tuple[int, float]:
+        """Pega até `requested` tokens sem esperar. Retorna (concedidos, segundos até o próximo token)."""
+        if self._script is not None:
+            try:
+                granted, wait = await self._script(keys=[self.key], args=[self.rate, self.capacity, requested])
+                return int(granted), float(wait)
+            except Exception as e:
+                if not self._warned:
+                    self._warned = True
+                    logger.bind(service="TokenBucket", key=self.key).warning(f"Redis token bucket unavailable, limiting per process: {e}")
+                metrics.incr("token_bucket_redis_errors", bucket=self.key)
+        return self._take_local(requested)
+
+    async def acquire(self, tokens: int = 1, timeout: Optional[float] = None) -> float:
+        """Espera até obter `tokens` tokens. Retorna o tempo esperado; TimeoutError se passar de `timeout`."""
+        started = time.monotonic()
+        async with self._lock:
+            remaining = tokens
+            while True:
+                granted, wait = await self.take(remaining)
+                remaining -= granted
+                if remaining <= 0:
+                    break
+                if timeout is not None and time.monotonic() - started + wait > timeout:
+                    raise TimeoutError(f"Token bucket '{self.key}' could not grant {tokens} token(s) within {timeout}s")
+                await asyncio.sleep(wait)
+        waited = time.monotonic() - started
+        metrics.observe("token_bucket_wait_seconds", waited, bucket=self.key)
+        return waited
@@ -1,26 +1,31 @@
 # agentos_core/app/core/repository.py
 
-from typing import TypeVar, Type, Optional, List, Any, Dict, Tuple, cast # Adicionar cast  
+from typing import TypeVar, Type, Optional, List, Any, Dict, Tuple, Iterable, Generic, cast # Adicionar cast  
 from abc import ABC, abstractmethod  
 from datetime import datetime  
 from decimal import Decimal # Adicionar Decimal
+import base64
+import hashlib
+import hmac
 
 from pydantic import BaseModel  
 from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorCollection  
-from bson import ObjectId  
+from bson import Decimal128, ObjectId, json_util
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from pymongo.results import InsertOneResult, UpdateResult, DeleteResult  
 from pymongo.errors import DuplicateKeyError  
 from loguru import logger
 
 # Importar get_database da implementação final  
 from app.core.database import get_database
+from app.core.config import settings
 
 # Tipos genéricos  
 ModelType = TypeVar("ModelType", bound=BaseModel) # Modelo Pydantic que representa o doc DB (ex: UserInDB)  
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel) # Schema para criar (ex: UserCreate)  
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel) # Schema para atualizar (ex: UserUpdate)
 
-class BaseRepository(ABC):  
+class BaseRepository(ABC, Generic[ModelType, CreateSchemaType, UpdateSchemaType]):  
     """Classe base abstrata para repositórios MongoDB com Motor e Pydantic."""
 
     model: Type[ModelType]  
@@ -95,6 +100,18 @@ class BaseRepository(ABC):
             self._handle_db_exception(e, "get_by_id", obj_id)  
             return None # Erro de DB, retornar None
 
+    async def get_many(self, ids: Iterable[str | ObjectId]) -> Dict[ObjectId, ModelType]:
+        """Busca vários documentos por _id em uma única query $in. Retorna {_id: modelo} (ausentes ficam de fora)."""
+        obj_ids = list({obj_id for obj_id in (self._to_objectid(i) for i in ids) if obj_id})
+        if not obj_ids: return {}
+        try:
+            cursor = self.collection.find({"_id": {"$in": obj_ids}})
+            documents = await cursor.to_list(length=len(obj_ids))
+            return {doc["_id"]: self.model.model_validate(doc) for doc in documents}
+        except Exception as e:
+            self._handle_db_exception(e, "get_many", query={"_id": {"$in": obj_ids}})
+            return {}
+
     async def get_by(self, query: Dict[str, Any]) -> Optional[ModelType]:  
         """Busca o PRIMEIRO documento que corresponde a um critério."""  
         try:  
@@ -104,30 +121,164 @@ class BaseRepository(ABC):
             self._handle_db_exception(e, "get_by", query=query)  
             return None
 
+    def _to_models(self, documents: List[Dict[str, Any]], raw: bool = False, validate: bool = True) -> List[Any]:
+        """Converte documentos do DB: dicts crus (raw), model_construct (validate=False) ou model_validate."""
+        if raw:
+            return documents
+        if not validate:
+            # Dados confiáveis (escritos por nós): pular validação por linha
+            return [self.model.model_construct(**doc) for doc in documents]
+        return [self.model.model_validate(doc) for doc in documents]
+
     async def list_by(  
         self,  
         query: Dict[str, Any] = {},  
         skip: int = 0,  
         limit: int = 100, # Default limit  
-        sort: Optional[List[Tuple[str, int]]] = None  
-    ) -> List[ModelType]:  
-        """Lista documentos com base em critérios, paginação e ordenação."""  
+        sort: Optional[List[Tuple[str, int]]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        raw: bool = False,
+        validate: bool = True
+    ) -> List[ModelType] | List[Dict[str, Any]]:
+        """
+        Lista documentos com base em critérios, paginação e ordenação.
+        `projection` é enviada ao Mongo; `raw=True` retorna dicts e `validate=False`
+        usa model_construct (sem validação por linha) para listagens grandes e confiáveis.
+        """
         try:  
-            cursor = self.collection.find(query)  
+            cursor = self.collection.find(query, projection)
             if sort:  
                 cursor = cursor.sort(sort)  
             # Aplicar skip e limit (garantir não negativos)  
             cursor = cursor.skip(max(0, skip)).limit(max(0, limit) if limit > 0 else 0) # limit=0 significa sem limite para pymongo  
             documents = await cursor.to_list(length=limit if limit > 0 else None) # length=None para buscar todos se limit=0  
-            # Validar cada documento (pode ser lento para listas grandes)  
-            # Considerar retornar dicts e validar no service/router se performance for crítica  
-            return [self.model.model_validate(doc) for doc in documents]  
+            return self._to_models(documents, raw=raw, validate=validate)
         except Exception as e:  
              self._handle_db_exception(e, "list_by", query=query)  
              return [] # Retornar lista vazia em caso de erro
 
-    async def create(self, data_in: CreateSchemaType | Dict) -> ModelType:  
-        """Cria um novo documento."""  
+    # --- Paginação por cursor (keyset) ---
+    # O cursor é opaco para o cliente: base64 dos valores das chaves de ordenação do último
+    # item da página (sempre terminando em _id como desempate), assinado com HMAC (SECRET_KEY).
+    # A próxima página filtra "depois desses valores" em vez de usar skip, então o custo não
+    # cresce com a profundidade. A assinatura impede que o cliente injete operadores ($gt, $where...)
+    # nos valores que vão para o filtro.
+
+    _CURSOR_SCALARS = (type(None), bool, int, float, str, datetime, ObjectId, Decimal128)
+
+    @staticmethod
+    def _get_field(doc: Dict[str, Any], path: str) -> Any:
+        """Lê um campo (suporta caminho com pontos, ex: 'profile.balance')."""
+        value: Any = doc
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    @staticmethod
+    def _normalize_cursor_sort(sort: Optional[List[Tuple[str, int]]]) -> List[Tuple[str, int]]:
+        """Garante _id como último critério de ordenação (desempate estável)."""
+        sort = list(sort or [("_id", DESCENDING)])
+        if not any(key == "_id" for key, _ in sort):
+            sort.append(("_id", sort[-1][1]))
+        return sort
+
+    @staticmethod
+    def _cursor_signature(body: str) -> str:
+        digest = hmac.new(settings.SECRET_KEY.encode("utf-8"), body.encode("ascii"), hashlib.sha256).digest()[:16]
+        return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+    @classmethod
+    def encode_cursor(cls, document: Dict[str, Any], sort: List[Tuple[str, int]]) -> str:
+        """Gera o token opaco (payload.assinatura) a partir do último documento da página."""
+        payload = {"k": [key for key, _ in sort], "v": [cls._get_field(document, key) for key, _ in sort]}
+        body = base64.urlsafe_b64encode(json_util.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+        return f"{body}.{cls._cursor_signature(body)}"
+
+    @classmethod
+    def decode_cursor(cls, token: str, sort: List[Tuple[str, int]]) -> List[Any]:
+        """Decodifica o token; levanta ValueError se adulterado, inválido ou de outra ordenação."""
+        body, _, signature = token.partition(".")
+        try:
+            if not hmac.compare_digest(signature.encode("ascii"), cls._cursor_signature(body).encode("ascii")):
+                raise ValueError("bad signature")
+            raw_payload = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+            payload = json_util.loads(raw_payload)
+        except Exception as e:
+            raise ValueError("Invalid pagination cursor.") from e
+        if not isinstance(payload, dict) or payload.get("k") != [key for key, _ in sort] or len(payload.get("v", [])) != len(sort):
+            raise ValueError("Pagination cursor does not match the requested sort order.")
+        if not all(isinstance(value, cls._CURSOR_SCALARS) for value in payload["v"]):
+            raise ValueError("Invalid pagination cursor.")
+        return payload["v"]
+
+    @staticmethod
+    def _keyset_filter(sort: List[Tuple[str, int]], values: List[Any]) -> List[Dict[str, Any]]:
+        """Monta os ramos $or de 'depois de (v1, v2, ...)' respeitando a ordem de nulls do Mongo."""
+        branches = []
+        for i, (key, direction) in enumerate(sort):
+            value = values[i]
+            equal_prefix = {prev_key: prev_value for (prev_key, _), prev_value in zip(sort[:i], values[:i])}
+            if value is None:
+                # null/ausente é o menor valor: em DESC nada vem depois dele
+                if direction == DESCENDING: continue
+                after = {key: {"$ne": None}}
+            elif direction == ASCENDING:
+                after = {key: {"$gt": value}}
+            else:
+                after = {"$or": [{key: {"$lt": value}}, {key: None}]}
+            branches.append({**equal_prefix, **after})
+        return branches
+
+    async def list_by_cursor(
+        self,
+        query: Dict[str, Any] = {},
+        sort: Optional[List[Tuple[str, int]]] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        raw: bool = False,
+        validate: bool = True
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        Lista documentos com paginação keyset. Retorna (itens, next_cursor);
+        next_cursor é None na última página. Levanta ValueError para cursor inválido.
+        """
+        sort = self._normalize_cursor_sort(sort)
+        limit = max(1, limit)
+
+        final_query = query
+        if cursor:
+            branches = self._keyset_filter(sort, self.decode_cursor(cursor, sort))
+            if not branches: return [], None
+            final_query = {"$and": [query, {"$or": branches}]} if query else {"$or": branches}
+
+        if projection:
+            # Chaves de ordenação (sempre inclui _id) precisam vir no documento para gerar o próximo cursor
+            projection = dict(projection)
+            projection.pop("_id", None)
+            if any(v for v in projection.values()):
+                projection.update({key: 1 for key, _ in sort})
+            else:
+                # Projeção de exclusão: não excluir chaves de ordenação; {} faria o pymongo devolver só o _id
+                for key, _ in sort: projection.pop(key, None)
+            projection = projection or None
+
+        try:
+            db_cursor = self.collection.find(final_query, projection).sort(sort).limit(limit + 1)
+            documents = await db_cursor.to_list(length=limit + 1)
+        except Exception as e:
+            self._handle_db_exception(e, "list_by_cursor", query=final_query)
+            return [], None
+
+        next_cursor = self.encode_cursor(documents[limit - 1], sort) if len(documents) > limit else None
+        return self._to_models(documents[:limit], raw=raw, validate=validate), next_cursor
+
+    async def create(self, data_in: CreateSchemaType | Dict, return_document: bool = True) -> ModelType | ObjectId:
+        """
+        Cria um novo documento.
+        O modelo retornado é montado a partir do documento inserido + inserted_id (sem reler do DB).
+        Com return_document=False retorna apenas o ObjectId inserido.
+        """
         if isinstance(data_in, BaseModel):  
             create_data_dict = data_in.model_dump(exclude_unset=False, by_alias=False)  
         else:  
@@ -138,6 +289,8 @@ class BaseRepository(ABC):
 
         # Adicionar timestamps  
         now = datetime.utcnow()  
+        # BSON guarda milissegundos: truncar para que o modelo retornado seja igual ao persistido
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
         create_data_prepared.setdefault("created_at", now)  
         create_data_prepared.setdefault("updated_at", now)
 
@@ -148,23 +301,24 @@ class BaseRepository(ABC):
         try:  
             result: InsertOneResult = await self.collection.insert_one(create_data_prepared)  
             inserted_id = result.inserted_id  
-            # Buscar o documento recém-criado para retornar o objeto Pydantic validado  
-            created_document = await self.get_by_id(inserted_id)  
-            if created_document is None:  
-                 # Log crítico  
-                 logger.critical(f"CRITICAL: Failed to retrieve document immediately after insertion! ID: {inserted_id}, Collection: {self.collection_name}")  
-                 raise RuntimeError("Failed to retrieve document after creation.")  
-            return created_document  
+            if not return_document:
+                return inserted_id
+            # insert_one não altera os valores: o documento salvo é exatamente o que enviamos + _id
+            create_data_prepared["_id"] = inserted_id
+            return self.model.model_validate(create_data_prepared)
         except Exception as e:  
              # _handle_db_exception já loga e levanta erro (ValueError para DupKey, RuntimeError para outros)  
              self._handle_db_exception(e, "create")  
              # Garantir que a função não retorne se _handle_db_exception levantar erro  
              raise # Re-raise a exceção que _handle_db_exception levantou
 
-    async def update(self, id: str | ObjectId, data_in: UpdateSchemaType | Dict) -> Optional[ModelType]:  
-        """Atualiza um documento existente usando $set."""  
+    async def update(self, id: str | ObjectId, data_in: UpdateSchemaType | Dict, return_document: bool = True) -> Optional[ModelType] | bool:
+        """
+        Atualiza um documento existente usando $set, em um único find_one_and_update (ReturnDocument.AFTER).
+        Com return_document=False usa update_one e retorna apenas True/False (documento encontrado).
+        """
         obj_id = self._to_objectid(id)  
-        if not obj_id: return None
+        if not obj_id: return None if return_document else False
 
         if isinstance(data_in, BaseModel):  
             update_data_dict = data_in.model_dump(exclude_unset=True, by_alias=False) # Apenas campos definidos  
@@ -181,27 +335,40 @@ class BaseRepository(ABC):
 
         if not update_data_prepared:  
             logger.debug(f"Update called for ID {id} with no updatable data.")  
+            if not return_document:
+                return await self.collection.count_documents({"_id": obj_id}, limit=1) > 0
             return await self.get_by_id(obj_id)
 
         # Adicionar timestamp de atualização  
         update_data_prepared["updated_at"] = datetime.utcnow()
 
         try:  
-            result: UpdateResult = await self.collection.update_one(  
-                {"_id": obj_id},  
-                {"$set": update_data_prepared}  
-            )  
-            if result.matched_count == 0:  
+            if not return_document:
+                result: UpdateResult = await self.collection.update_one(  
+                    {"_id": obj_id},  
+                    {"$set": update_data_prepared}  
+                )  
+                if result.matched_count == 0:  
+                    logger.warning(f"Document not found for update: ID {id}, Collection: {self.collection_name}")  
+                logger.debug(f"Document updated: ID {id}, Matched: {result.matched_count}, Modified: {result.modified_count}")  
+                return result.matched_count > 0
+
+            # Retorna o documento completo e atualizado (um round trip só)
+            document = await self.collection.find_one_and_update(
+                {"_id": obj_id},
+                {"$set": update_data_prepared},
+                return_document=ReturnDocument.AFTER
+            )
+            if document is None:
                 logger.warning(f"Document not found for update: ID {id}, Collection: {self.collection_name}")  
                 return None
 
-            logger.debug(f"Document updated: ID {id}, Matched: {result.matched_count}, Modified: {result.modified_count}")  
-            # Retorna o documento completo e atualizado  
-            return await self.get_by_id(obj_id)
+            logger.debug(f"Document updated: ID {id}, Collection: {self.collection_name}")
+            return self.model.model_validate(document)
 
         except Exception as e:  
              self._handle_db_exception(e, "update", obj_id)  
-             return None
+             return None if return_document else False
 
     async def delete(self, id: str | ObjectId) -> bool:  
         """Deleta um documento pelo ID."""  
@@ -116,14 +116,14 @@ async def get_current_user_from_token(token: Annotated[str, Depends(oauth2_schem
         raise HTTPException(  
             status_code=status.HTTP_401_UNAUTHORIZED,  
             detail="Token has expired",  
-            headers={"WWW-Authenticate": "Bearer error="invalid_token", error_description="The token has expired""}  
+            headers={"WWW-Authenticate": 'Bearer error="invalid_token", error_description="The token has expired"'}  
         )  
     except jwt.JWTClaimsError as e:  
         log.warning(f"Token validation failed: Invalid claims - {e}")  
         raise HTTPException(  
             status_code=status.HTTP_401_UNAUTHORIZED,  
             detail=f"Invalid token claims: {e}",  
-            headers={"WWW-Authenticate": "Bearer error="invalid_token", error_description="Invalid claims""}  
+            headers={"WWW-Authenticate": 'Bearer error="invalid_token", error_description="Invalid claims"'}  
         )  
     except JWTError as e: # Outros erros JWT (formato inválido, etc.)  
         log.warning(f"Invalid JWT token format or signature: {e}")  
@@ -0,0 +1,221 @@
+# agentos_core/app/core/settings_cache.py
+
+"""
+Cache em processo das settings (`settings`) e feature flags (`feature_flags`) do escritório.
+
+- Leitura: dicionário local com TTL por chave (SETTINGS_CACHE_TTL_SECONDS ou `ttl=` na chamada); chaves
+  inexistentes também ficam em cache (o default é aplicado na leitura). Um hit não faz I/O.
+- Stampede: para cada chave expirada só uma corrotina por event loop vai ao Mongo; as demais aguardam a
+  mesma task. get_settings busca todas as chaves que faltam num único find($in).
+- Invalidação entre processos: quem altera uma setting chama set_setting/set_feature_flag (ou
+  publish_invalidation), que publica no canal Redis SETTINGS_INVALIDATION_CHANNEL; cada processo com o
+  listener ativo (lifespan da API, runtime do worker) descarta a chave. Ao (re)conectar o listener limpa o
+  cache inteiro, já que invalidações podem ter sido perdidas. Sem Redis, vale só o TTL.
+"""
+
+import asyncio
+import json
+import time
+import weakref
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import redis.asyncio as redis
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+SETTINGS_COLLECTION = "settings"
+FEATURE_FLAGS_COLLECTION = "feature_flags"
+SETTINGS_INVALIDATION_CHANNEL = "settings:invalidate"
+
+KIND_SETTING = "setting"
+KIND_FLAG = "flag"
+_COLLECTIONS = {KIND_SETTING: SETTINGS_COLLECTION, KIND_FLAG: FEATURE_FLAGS_COLLECTION}
+_VALUE_FIELDS = {KIND_SETTING: "value", KIND_FLAG: "is_enabled"}
+
+_MISSING = object() # Chave inexistente no Mongo (cacheada como ausência)
+
+class _Entry:
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: Any, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+
+class SettingsCache:
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.SETTINGS_CACHE_TTL_SECONDS
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        # Cargas em andamento, por event loop (tasks não atravessam loops)
+        self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], asyncio.Task]]" = weakref.WeakKeyDictionary()
+        self._epoch = 0 # Incrementado a cada invalidação: carga iniciada antes não grava valor velho
+        self._listener: Optional[asyncio.Task] = None
+
+    # --- Leitura ---
+    async def get_setting(self, key: str, db: AsyncIOMotorDatabase, default: Any = None, ttl: Optional[float] = None) -> Any:
+        return (await self._get_many(KIND_SETTING, [key], db, ttl)).get(key, default)
+
+    async def get_settings(self, defaults: Dict[str, Any], db: AsyncIOMotorDatabase, ttl: Optional[float] = None) -> Dict[str, Any]:
+        """Várias settings de uma vez ({chave: default}); as que faltam no cache vêm num único find."""
+        found = await self._get_many(KIND_SETTING, list(defaults), db, ttl)
+        return {key: found.get(key, default) for key, default in defaults.items()}
+
+    async def is_feature_enabled(self, key: str, db: AsyncIOMotorDatabase, default: bool = False, ttl: Optional[float] = None) -> bool:
+        return bool((await self._get_many(KIND_FLAG, [key], db, ttl)).get(key, default))
+
+    async def _get_many(self, kind: str, keys: Iterable[str], db: AsyncIOMotorDatabase, ttl: Optional[float]) -> Dict[str, Any]:
+        now = time.monotonic()
+        values: Dict[str, Any] = {}
+        misses = []
+        for key in keys:
+            entry = self._entries.get((kind, key))
+            if entry is not None and entry.expires_at > now:
+                if entry.value is not _MISSING:
+                    values[key] = entry.value
+            else:
+                misses.append(key)
+        metrics.incr("settings_cache_hits", len(values), kind=kind)
+        if not misses:
+            return values
+
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        waiting = {key: inflight[(kind, key)] for key in misses if (kind, key) in inflight}
+        to_load = [key for key in misses if key not in waiting]
+        if to_load:
+            # Task compartilhada: se quem disparou a carga for cancelado, ela continua para os demais
+            loaded = asyncio.get_running_loop().create_task(self._load(kind, to_load, db, ttl))
+            for key in to_load:
+                inflight[(kind, key)] = loaded
+
+            def _done(task: asyncio.Task, keys=tuple(to_load)) -> None:
+                for key in keys:
+                    if inflight.get((kind, key)) is task:
+                        del inflight[(kind, key)]
+                if not task.cancelled():
+                    task.exception() # Marca como recuperada: quem aguardava recebe o erro, sem warning no GC
+            loaded.add_done_callback(_done)
+            waiting.update({key: loaded for key in to_load})
+
+        for key, future in waiting.items():
+            try:
+                value = (await asyncio.shield(future)).get(key, _MISSING)
+            except Exception as e: # Falha no Mongo: usa o default, sem cachear
+                logger.bind(service="SettingsCache").error(f"Failed to fetch {kind} '{key}': {e}")
+                continue
+            if value is not _MISSING:
+                values[key] = value
+        return values
+
+    async def _load(self, kind: str, keys: list, db: AsyncIOMotorDatabase, ttl: Optional[float]) -> Dict[str, Any]:
+        epoch = self._epoch
+        metrics.incr("settings_cache_misses", len(keys), kind=kind)
+        field = _VALUE_FIELDS[kind]
+        docs = await db[_COLLECTIONS[kind]].find({"_id": {"$in": keys}}, {field: 1}).to_list(length=len(keys))
+        found = {doc["_id"]: doc.get(field) for doc in docs}
+        if epoch == self._epoch:
+            expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl_seconds)
+            for key in keys:
+                self._entries[(kind, key)] = _Entry(found.get(key, _MISSING), expires_at)
+        return found
+
+    # --- Invalidação ---
+    def invalidate(self, kind: Optional[str] = None, key: Optional[str] = None) -> None:
+        """Descarta uma chave, um tipo inteiro (key=None) ou tudo (kind=None) neste processo."""
+        self._epoch += 1
+        if kind is None:
+            self._entries.clear()
+        elif key is None:
+            for cached_key in [k for k in self._entries if k[0] == kind]:
+                del self._entries[cached_key]
+        else:
+            self._entries.pop((kind, key), None)
+
+    async def publish_invalidation(self, kind: str, key: Optional[str] = None, redis_client: Optional[redis.Redis] = None) -> None:
+        """Invalida localmente e avisa os demais processos (se houver Redis)."""
+        self.invalidate(kind, key)
+        if redis_client is None:
+            return
+        try:
+            await redis_client.publish(SETTINGS_INVALIDATION_CHANNEL, json.dumps({"kind": kind, "key": key}))
+        except Exception as e: # Os outros processos ficam com o valor antigo até o TTL
+            logger.bind(service="SettingsCache").warning(f"Could not publish invalidation for {kind} '{key}': {e}")
+
+    def _apply_message(self, data: Any) -> None:
+        try:
+            message = json.loads(data)
+            self.invalidate(message.get("kind"), message.get("key"))
+        except (TypeError, ValueError, AttributeError):
+            logger.bind(service="SettingsCache").warning(f"Ignoring malformed invalidation message: {data!r}")
+
+    async def _listen(self, redis_client: redis.Redis) -> None:
+        log = logger.bind(service="SettingsCache")
+        backoff = 1.0
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(SETTINGS_INVALIDATION_CHANNEL)
+                self.invalidate() # Invalidações enquanto desconectado foram perdidas
+                backoff = 1.0
+                log.info(f"Listening for settings invalidations on '{SETTINGS_INVALIDATION_CHANNEL}'.")
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_message(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"Settings invalidation listener disconnected ({e}); retrying in {backoff:.0f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def start_listener(self, redis_client: Optional[redis.Redis]) -> None:
+        """Inicia o listener de invalidações no loop atual (idempotente). Sem Redis, o cache vale só pelo TTL."""
+        if self._listener is not None and not self._listener.done():
+            return
+        if redis_client is None:
+            logger.bind(service="SettingsCache").warning("Redis unavailable: settings cache relies on TTL only.")
+            return
+        self._listener = asyncio.get_running_loop().create_task(self._listen(redis_client))
+
+    async def stop_listener(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._listener = None
+
+    def reset(self) -> None:
+        """Esquece o listener herdado (após fork) e o conteúdo do cache."""
+        self._listener = None
+        self._inflight = weakref.WeakKeyDictionary()
+        self.invalidate()
+
+# Instância global do processo
+settings_cache = SettingsCache()
+
+# --- Escrita (grava no Mongo e invalida em todos os processos) ---
+async def set_setting(db: AsyncIOMotorDatabase, key: str, value: Any, redis_client: Optional[redis.Redis] = None,
+                      description: Optional[str] = None) -> None:
+    fields: Dict[str, Any] = {"value": value, "updated_at": datetime.now(timezone.utc)}
+    if description is not None:
+        fields["description"] = description
+    await db[SETTINGS_COLLECTION].update_one({"_id": key}, {"$set": fields}, upsert=True)
+    await settings_cache.publish_invalidation(KIND_SETTING, key, redis_client)
+
+async def set_feature_flag(db: AsyncIOMotorDatabase, key: str, is_enabled: bool, redis_client: Optional[redis.Redis] = None,
+                           description: Optional[str] = None) -> None:
+    fields: Dict[str, Any] = {"is_enabled": is_enabled, "updated_at": datetime.now(timezone.utc)}
+    if description is not None:
+        fields["description"] = description
+    await db[FEATURE_FLAGS_COLLECTION].update_one({"_id": key}, {"$set": fields}, upsert=True)
+    await settings_cache.publish_invalidation(KIND_FLAG, key, redis_client)
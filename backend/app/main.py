@@ -1,17 +1,46 @@
 # app/main.py
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
-from app.api.v1 import api_router # Corrigir import
+from app.api.v1 import api_v1_router
+from app.api.endpoints import websocket as websocket_endpoints
 from app.core.logging_config import setup_logging
+from app.core.dataloader import dataloader_middleware
+from app.core.database import mongo_manager, redis_manager
+from app.core.settings_cache import settings_cache
+from app.services.whatsapp_service import whatsapp_http_manager
+from app.websocket.connection_manager import manager as ws_manager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # MongoDB: get_database (Depends) e get_mongo_db_instance dependem desta conexão
+    await mongo_manager.connect()
+    # Clientes HTTP de longa duração (pools keep-alive reutilizados entre requests)
+    await whatsapp_http_manager.connect()
+    # Redis: invalidações do cache de settings (pub/sub); sem Redis o cache vale só pelo TTL
+    await redis_manager.connect()
+    settings_cache.start_listener(redis_manager.client)
+    # Backplane WebSocket: eventos publicados por outros nós/workers chegam aos sockets deste nó
+    ws_manager.start_backplane(redis_manager.client)
+    try:
+        yield
+    finally:
+        await ws_manager.stop_backplane()
+        await settings_cache.stop_listener()
+        await redis_manager.disconnect()
+        await whatsapp_http_manager.disconnect()
+        await mongo_manager.disconnect()
 
 def create_app() -> FastAPI:
     setup_logging()
     app = FastAPI(
         title=settings.PROJECT_NAME,
-        openapi_url=f"{settings.API_V1_STR}/openapi.json"
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
+        lifespan=lifespan
     )
 
     # CORS Middleware
@@ -23,7 +52,12 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
-    app.include_router(api_router, prefix=settings.API_V1_STR)
+    # DataLoaders com escopo de request (batching/cache de get_by_id)
+    app.middleware("http")(dataloader_middleware)
+
+    app.include_router(api_v1_router, prefix=settings.API_V1_STR)
+    # WebSocket /ws/updates (VITE_WS_BASE_URL do frontend); autenticação por ?apiKey=
+    app.include_router(websocket_endpoints.router, prefix="/ws")
     return app
 
 app = create_app()
@@ -1,10 +1,8 @@
 # agentos_core/app/models/gateway.py
 
-from pydantic import BaseModel, Field, ConfigDict  
+from pydantic import BaseModel, Field, ConfigDict, field_validator  
 from typing import List, Optional, Dict, Any, Literal, Union
 
-# Reutilizar PyObjectId  
-from app.modules.people.models import PyObjectId
 
 # --- Schemas de Request para /gateway/process ---  
 class NaturalLanguagePayload(BaseModel):  
@@ -55,6 +53,14 @@ class GatewayRequest(BaseModel):
         }  
     )
 
+# --- Schema de Request para /gateway/stream ---
+class GatewayStreamRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=10000)
+    system_prompt: Optional[str] = None
+    model: Optional[str] = Field(None, description="Override do modelo (default: OPENAI_CHAT_MODEL).")
+    channel: Literal["sse", "websocket"] = Field("sse", description="sse: resposta text/event-stream; websocket: deltas enviados via WS /updates.")
+    ws_connection_id: Optional[str] = Field(None, description="connection_id recebido no frame connection_status do WS /updates (obrigatório para channel=websocket).")
+
 # --- Schemas de Response de /gateway/process ---  
 class FollowUpActionPayload(BaseModel):  
     intent: str  
@@ -137,6 +143,7 @@ class LLMError(BaseModel):
     message: str  
     type: Optional[str] = None  
     param: Optional[str] = None
+    status_code: Optional[int] = None # Status HTTP do provider (429/5xx alimentam limiter e circuit breaker)
 
 class LLMResponseChoice(BaseModel):  
      index: int  
@@ -162,5 +169,24 @@ class LLMResponse(BaseModel):
     #         # Adicionar um choice dummy para evitar quebras? Ou deixar o Gateway lidar?  
     #     return v
 
+# Mensagem no formato da API Chat Completions ({"role": ..., "content": ..., "tool_calls": ...})
+OpenAIMessage = Dict[str, Any]
+
+class LLMStreamChunk(BaseModel):
+    """
+    Evento do streaming de completions (OpenAIClient.stream_completion).
+    - content:   `content` traz o próximo pedaço de texto
+    - tool_call: `tool_call` traz o estado acumulado da chamada `tool_call_index` (arguments parciais)
+    - done:      `response` traz a resposta completa montada (mesmo formato de get_completion)
+    - error:     `error` preenchido; o stream termina
+    """
+    type: Literal["content", "tool_call", "done", "error"]
+    content: Optional[str] = None
+    tool_call_index: Optional[int] = None
+    tool_call: Optional[LLMToolCall] = None
+    finish_reason: Optional[str] = None
+    response: Optional[LLMResponse] = None
+    error: Optional[LLMError] = None
+
 # Importar ObjectId para validação  
 from bson import ObjectId
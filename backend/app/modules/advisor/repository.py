@@ -31,6 +31,8 @@ class AdvisorConversationRepository(BaseRepository[AdvisorConversationInDB, Advi
             # Índice para ordenar/buscar por data de atualização (mais recentes)  
             await self.collection.create_index([("updated_at", DESCENDING)])  
             await self.collection.create_index([("created_at", DESCENDING)])  
+            # Índice da listagem por usuário (keyset pagination em updated_at, _id)
+            await self.collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)])
             # Opcional: Índice de texto no título para busca?  
             # await self.collection.create_index("title", collation={'locale': 'en', 'strength': 2})  
             logger.info(f"Índices criados/verificados para a coleção: {self.collection_name}")  
@@ -97,26 +99,23 @@ class AdvisorConversationRepository(BaseRepository[AdvisorConversationInDB, Advi
     async def list_conversations_by_user(  
         self,  
         user_id: ObjectId,  
-        skip: int = 0,  
-        limit: int = 50  
-        ) -> List[Dict[str, Any]]: # Retorna dicts para o ListItem validar  
-        """Lista conversas de um usuário (apenas metadados)."""  
+        limit: int = 50,
+        cursor: Optional[str] = None
+        ) -> Tuple[List[Dict[str, Any]], Optional[str]]: # Retorna dicts para o ListItem validar
+        """Lista conversas de um usuário (apenas metadados), mais recentes primeiro. Retorna (conversas, next_cursor)."""
         log = logger.bind(user_id=str(user_id))  
-        log.debug(f"Listando conversas (limit={limit}, skip={skip})...")  
-        try:  
-            # Usar list_by do Base? Não, precisamos de projeção específica.  
-            cursor = self.collection.find(  
-                {"user_id": user_id},  
-                # Projeção para otimizar: buscar apenas campos necessários  
-                {"_id": 1, "title": 1, "created_at": 1, "updated_at": 1}  
-            ).sort("updated_at", DESCENDING).skip(skip).limit(limit) # Mais recentes primeiro
-
-            conversations = await cursor.to_list(length=limit)  
-            log.info(f"Encontradas {len(conversations)} conversas para listagem.")  
-            return conversations  
-        except Exception as e:  
-             self._handle_db_exception(e, "list_conversations_by_user", query={"user_id": user_id})  
-             return []
+        log.debug(f"Listando conversas (limit={limit}, cursor={'sim' if cursor else 'não'})...")
+        # Projeção para otimizar: buscar apenas campos necessários (sem o array de mensagens)
+        conversations, next_cursor = await self.list_by_cursor(
+            query={"user_id": user_id},
+            sort=[("updated_at", DESCENDING), ("_id", DESCENDING)],
+            limit=limit,
+            cursor=cursor,
+            projection={"_id": 1, "title": 1, "created_at": 1, "updated_at": 1},
+            raw=True
+        )
+        log.info(f"Encontradas {len(conversations)} conversas para listagem.")
+        return conversations, next_cursor
 
     async def update_conversation_title(self, conversation_id: ObjectId, user_id: ObjectId, new_title: str) -> bool:  
          """Atualiza o título de uma conversa (verificando o dono)."""  
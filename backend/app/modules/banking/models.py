@@ -2,9 +2,7 @@ from pydantic import BaseModel, Field, ConfigDict, field_validator
 from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 from bson import ObjectId
-from decimal import Decimal
-
-from app.models.api_common import PyObjectId
+from decimal import Decimal, InvalidOperation
 
 # --- Constants ---
 TRANSACTION_TYPES = Literal[
@@ -41,6 +39,8 @@ class TransactionBase(BaseModel):
     associated_shift_id: Optional[ObjectId] = None
     metadata: Optional[Dict[str, Any]] = None
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     @field_validator('amount')
     @classmethod
     def amount_must_be_positive(cls, v: Decimal) -> Decimal:
@@ -60,7 +60,7 @@ class TransactionUpdateInternal(BaseModel):
     model_config = ConfigDict(extra='ignore')
 
 class TransactionInDB(TransactionBase):
-    id: PyObjectId = Field(..., alias="_id")
+    id: ObjectId = Field(..., alias="_id")
     rollback_reason: Optional[str] = None
     rolled_back_by_trx_ref: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -92,6 +92,21 @@ class TransactionAPI(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class TransactionSummaryAPI(BaseModel):
+    id: str
+    transaction_ref: str
+    type: TRANSACTION_TYPES
+    amount: str
+    currency: str
+    description: str
+    status: TRANSACTION_STATUSES
+    created_at: datetime
+
+class TransactionPageAPI(BaseModel):
+    items: List[TransactionSummaryAPI]
+    limit: int
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page; null on the last page.")
+
 class TransactionCreateAPI(BaseModel):
     type: TRANSACTION_TYPES
     amount_str: str = Field(..., alias="amount", description="Positive value of transaction. Type determines direction.")
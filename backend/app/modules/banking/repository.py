@@ -1,11 +1,25 @@
 from bson import ObjectId
-from typing import Optional, List, Dict, Any
-from pymongo import DESCENDING
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+from pymongo import ASCENDING, DESCENDING
 from loguru import logger
-from app.core.database import BaseRepository
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.database import get_database
+from app.core.repository import BaseRepository
 from .models import TransactionInDB, TransactionCreateInternal, TransactionUpdateInternal
 
+COLLECTION_NAME = "transactions"
+
+# Fields shown in transaction listings (no metadata/rollback details)
+TRANSACTION_LIST_PROJECTION = {
+    "transaction_ref": 1, "type": 1, "amount": 1, "currency": 1, "description": 1,
+    "status": 1, "created_at": 1
+}
+
 class TransactionRepository(BaseRepository[TransactionInDB, TransactionCreateInternal, TransactionUpdateInternal]):
+    model = TransactionInDB
+    collection_name = COLLECTION_NAME
+
     async def get_by_ref(self, transaction_ref: str) -> Optional[TransactionInDB]:
         """Finds a transaction by its unique reference."""
         return await self.get_by({"transaction_ref": transaction_ref})
@@ -15,10 +29,18 @@ class TransactionRepository(BaseRepository[TransactionInDB, TransactionCreateInt
         user_id: ObjectId,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-        skip: int = 0,
-        limit: int = 100
-    ) -> List[TransactionInDB]:
-        """Lists transactions for a specific user, optionally filtered by date."""
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        raw: bool = False,
+        validate: bool = True
+    ) -> Tuple[List[TransactionInDB] | List[Dict[str, Any]], Optional[str]]:
+        """
+        Lists transactions for a specific user (newest first), optionally filtered by date.
+        Uses keyset pagination on (created_at, _id): returns (items, next_cursor).
+        Rows are validated by default; callers that pass a `projection` should also pass
+        validate=False (model_construct) or raw=True (dicts), since partial rows fail validation.
+        """
         query: Dict[str, Any] = {"associated_user_id": user_id}
         if start_date or end_date:
             query["created_at"] = {}
@@ -27,8 +49,31 @@ class TransactionRepository(BaseRepository[TransactionInDB, TransactionCreateInt
             if end_date:
                 query["created_at"]["$lte"] = end_date
 
-        return await self.list_by(query=query, skip=skip, limit=limit, sort=[("created_at", DESCENDING)])
+        return await self.list_by_cursor(
+            query=query, sort=[("created_at", DESCENDING), ("_id", DESCENDING)], limit=limit, cursor=cursor,
+            projection=projection, raw=raw, validate=validate
+        )
+
+    async def list_summaries_by_user(
+        self,
+        user_id: ObjectId,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Listing rows for a user's statement: TRANSACTION_LIST_PROJECTION as raw dicts, no per-row validation."""
+        return await self.list_by_user(
+            user_id, start_date=start_date, end_date=end_date, limit=limit, cursor=cursor,
+            projection=TRANSACTION_LIST_PROJECTION, raw=True
+        )
+
+    async def create_indexes(self):
+        """Creates indexes backing transaction lookups and keyset pagination."""
+        await self.collection.create_index("transaction_ref", unique=True)
+        await self.collection.create_index([("associated_user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
 
 # Factory to get repository instance
 async def get_transaction_repository() -> TransactionRepository:
-    return TransactionRepository(collection_name="transactions")
\ No newline at end of file
+    db: AsyncIOMotorDatabase = await get_database()
+    return TransactionRepository(db)
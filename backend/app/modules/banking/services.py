@@ -131,7 +131,7 @@ class BankingService:
             rollback_reason=reason,
             rolled_back_by_trx_ref=correction_trx.transaction_ref
         )
-        await banking_repo.update(original_trx.id, update_data)
+        await banking_repo.update(original_trx.id, update_data, return_document=False)
 
         await audit_service.log_audit_event(
             action="transaction_rolled_back",
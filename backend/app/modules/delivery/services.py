@@ -19,10 +19,12 @@ from .models import (
 )
 from app.modules.sales.models import OrderInDB  # Need OrderInDB model
 from app.core.counters import CounterService
+from app.core.dataloader import get_loader
 from app.modules.people.repository import UserRepository
 from app.modules.people.models import UserInDB
 from app.modules.office.services_audit import AuditService
 from app.websocket.connection_manager import manager as ws_manager  # For WebSocket notifications
+from app.websocket.topics import delivery_topic, user_topic
 
 
 # --- Utility Function ---
@@ -126,7 +128,7 @@ class DeliveryService:
         # Enrich with sender name
         sender_name = sender_id
         if sender_role != "system":
-            user = await user_repo.get_by_id(sender_id)
+            user = await get_loader(user_repo).load(sender_id)
             if user and user.profile:
                 sender_name = f"{user.profile.first_name or ''} {user.profile.last_name or ''}".strip() or user.email
 
@@ -155,12 +157,13 @@ class DeliveryService:
             if delivery.assigned_driver_id:
                 recipients.add(str(delivery.assigned_driver_id))
 
-            for user_id_to_notify in recipients:
-                try:
-                    await ws_manager.send_personal_message(ws_payload, user_id_to_notify)
-                    log.debug(f"Sent WebSocket notification to user {user_id_to_notify}")
-                except Exception as ws_err:
-                    log.error(f"Failed to send WebSocket message to user {user_id_to_notify}: {ws_err}")
+            # One publish: delivery topic watchers + each participant's personal topic (one copy per socket)
+            topics = [delivery_topic(delivery_id_str)] + [user_topic(user_id) for user_id in recipients]
+            try:
+                delivered = await ws_manager.publish(topics, ws_payload)
+                log.debug(f"Sent WebSocket notification to {delivered} socket(s) for delivery {delivery_id_str}")
+            except Exception as ws_err:
+                log.error(f"Failed to publish WebSocket message for delivery {delivery_id_str}: {ws_err}")
 
         # Optionally log audit event
         if audit_service and current_user:
@@ -223,20 +226,16 @@ class DeliveryService:
         if not delivery:
             raise HTTPException(404, "Delivery not found")
 
-        enriched_chat = []
-        user_cache = {}
+        # Resolver todos os remetentes de uma vez (um único $in via DataLoader do request)
+        sender_ids = list({msg.sender_id for msg in delivery.chat_history if msg.sender_role != "system"})
+        senders = dict(zip(sender_ids, await get_loader(user_repo).load_many(sender_ids)))
 
+        enriched_chat = []
         for msg in delivery.chat_history:
             sender_name = msg.sender_id
-            if msg.sender_role != "system" and msg.sender_id not in user_cache:
-                user = await user_repo.get_by_id(msg.sender_id)
-                user_cache[msg.sender_id] = user
-                if user and user.profile:
-                    sender_name = f"{user.profile.first_name or ''} {user.profile.last_name or ''}".strip() or user.email
-            elif msg.sender_id in user_cache:
-                user = user_cache[msg.sender_id]
-                if user and user.profile:
-                    sender_name = f"{user.profile.first_name or ''} {user.profile.last_name or ''}".strip() or user.email
+            user = senders.get(msg.sender_id)
+            if user and user.profile:
+                sender_name = f"{user.profile.first_name or ''} {user.profile.last_name or ''}".strip() or user.email
 
             enriched_chat.append(
                 ChatMessageAPI(
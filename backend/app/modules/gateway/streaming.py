@@ -0,0 +1,80 @@
+# agentos_core/app/modules/gateway/streaming.py
+
+"""
+Encaminhamento de completions em streaming (LLMStreamChunk) para os clientes.
+
+- SSE: cada chunk vira um evento `event: <type>` / `data: <json>`; `done` leva a resposta montada.
+- WebSocket: cada chunk vira uma mensagem {"type": "llm_delta", "stream_id": ..., "event": <type>, ...}
+  publicada no tópico connection:<id> da conexão em /updates (o frontend agrupa pelos `stream_id`). O id
+  é o connection_id secreto que só aquela conexão recebeu, então os deltas não vão para outros sockets.
+  Via publish, o evento chega à conexão em qualquer nó da API (backplane).
+"""
+
+import json
+import uuid
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.models.gateway import LLMStreamChunk, OpenAIMessage
+from app.services.llm_client import get_llm_client_instance
+from app.services.token_budget import fit_messages
+from app.websocket.connection_manager import manager as ws_manager
+from app.websocket.topics import connection_topic
+
+def stream_llm_completion(
+    messages: List[OpenAIMessage],
+    model: Optional[str] = None,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    provider: str = "openai",
+    max_tokens: int = 1500,
+) -> AsyncGenerator[LLMStreamChunk, None]:
+    """
+    Stream do provider (sem fallback: depois do primeiro token não dá para trocar de provider).
+    O cliente é resolvido já na chamada, então ValueError (provider não configurado) sai aqui.
+    """
+    client = get_llm_client_instance(provider)
+    model = model or settings.OPENAI_CHAT_MODEL
+    return client.stream_completion(fit_messages(messages, model, max_tokens), model, tools=tools, max_tokens=max_tokens)
+
+def _chunk_payload(chunk: LLMStreamChunk) -> Dict[str, Any]:
+    return chunk.model_dump(mode="json", exclude_none=True)
+
+def _ws_message(stream_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    payload = dict(payload)
+    return {"type": "llm_delta", "stream_id": stream_id, "event": payload.pop("type"), **payload}
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+async def stream_as_sse(chunks: AsyncIterator[LLMStreamChunk]) -> AsyncGenerator[str, None]:
+    """Converte os chunks em eventos SSE (para StreamingResponse com media_type text/event-stream)."""
+    try:
+        async for chunk in chunks:
+            yield format_sse_event(chunk.type, _chunk_payload(chunk))
+    except Exception as e:
+        # A resposta HTTP já começou (200); só resta avisar o cliente pelo próprio stream
+        logger.bind(service="GatewayStreaming").exception(f"Error while streaming LLM response as SSE: {e}")
+        yield format_sse_event("error", {"type": "error", "error": {"message": "Streaming failed."}})
+
+async def forward_stream_to_websocket(
+    chunks: AsyncIterator[LLMStreamChunk],
+    ws_connection_id: str,
+    stream_id: Optional[str] = None,
+) -> Optional[LLMStreamChunk]:
+    """Envia cada chunk para a conexão WS `ws_connection_id`. Retorna o chunk final (done/error)."""
+    stream_id = stream_id or uuid.uuid4().hex
+    log = logger.bind(service="GatewayStreaming", stream_id=stream_id)
+    topics = [connection_topic(ws_connection_id)]
+    last_chunk: Optional[LLMStreamChunk] = None
+    try:
+        async for chunk in chunks:
+            last_chunk = chunk
+            await ws_manager.publish(topics, _ws_message(stream_id, _chunk_payload(chunk)))
+    except Exception as e:
+        log.exception(f"Error while forwarding LLM stream to WebSocket: {e}")
+        await ws_manager.publish(topics, _ws_message(stream_id, {"type": "error", "error": {"message": "Streaming failed."}}))
+        return None
+    log.debug(f"LLM stream forwarded to WebSocket (final chunk: {last_chunk.type if last_chunk else 'none'}).")
+    return last_chunk
@@ -0,0 +1,4 @@
+# app/modules/memory/constants.py
+
+# Coleção dos registros de memória (repository e ferramenta de migração de embeddings)
+COLLECTION_NAME = "memories"
@@ -0,0 +1,61 @@
+# agentos_core/app/modules/memory/embedding_codec.py
+
+"""
+Formato binário compacto para embeddings de memória.
+
+Usa o subtipo BSON 9 (vector): 1 byte de dtype + 1 byte de padding + dados little-endian, o mesmo
+formato de `bson.binary.Binary.from_vector`, indexável pelo Atlas Vector Search.
+
+- "list":    array BSON de doubles (legado, ~8 B/dim + overhead por elemento)
+- "float32": 4 B/dim, sem perda em relação aos vetores float32 da OpenAI
+- "int8":    1 B/dim, quantização escalar simétrica; a escala fica em `embedding_scale`
+             (cosine não depende da escala, então buscas continuam corretas sem ela)
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from bson.binary import Binary
+
+BSON_VECTOR_SUBTYPE = 9
+DTYPE_INT8 = 0x03
+DTYPE_FLOAT32 = 0x27
+
+EMBEDDING_STORAGE_FORMATS = ("list", "float32", "int8")
+
+def encode_embedding(embedding: Sequence[float], storage: str) -> Dict[str, Any]:
+    """Retorna os campos a gravar no documento: {"embedding": ...} (+ "embedding_scale" para int8)."""
+    if storage == "list":
+        return {"embedding": [float(v) for v in embedding]}
+    vector = np.asarray(embedding, dtype=np.float32)
+    if storage == "float32":
+        return {"embedding": Binary(bytes([DTYPE_FLOAT32, 0]) + vector.astype("<f4").tobytes(), BSON_VECTOR_SUBTYPE)}
+    if storage == "int8":
+        max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = max_abs / 127.0 if max_abs else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return {"embedding": Binary(bytes([DTYPE_INT8, 0]) + quantized.tobytes(), BSON_VECTOR_SUBTYPE), "embedding_scale": scale}
+    raise ValueError(f"Unknown embedding storage format '{storage}'. Use: {', '.join(EMBEDDING_STORAGE_FORMATS)}")
+
+def embedding_storage_format(value: Any) -> Optional[str]:
+    """Formato em que um embedding lido do DB está armazenado (None se ausente/inválido)."""
+    if isinstance(value, list):
+        return "list"
+    if isinstance(value, bytes) and len(value) >= 2:
+        return {DTYPE_FLOAT32: "float32", DTYPE_INT8: "int8"}.get(value[0])
+    return None
+
+def decode_embedding(value: Any, scale: Optional[float] = None) -> Optional[np.ndarray]:
+    """
+    Converte o valor armazenado em um vetor float32 NumPy.
+    float32 é zero-copy (view somente-leitura sobre os bytes do BSON); int8 aloca um único array.
+    """
+    storage = embedding_storage_format(value)
+    if storage == "float32":
+        return np.frombuffer(value, dtype="<f4", offset=2)
+    if storage == "int8":
+        quantized = np.frombuffer(value, dtype=np.int8, offset=2)
+        return quantized.astype(np.float32) * np.float32(scale if scale else 1.0)
+    if storage == "list":
+        return np.asarray(value, dtype=np.float32)
+    return None
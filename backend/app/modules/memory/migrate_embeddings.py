@@ -0,0 +1,94 @@
+# agentos_core/app/modules/memory/migrate_embeddings.py
+
+"""
+Migra os embeddings existentes da coleção `memories` para o formato de armazenamento configurado.
+
+    cd backend
+    python -m app.modules.memory.migrate_embeddings --storage float32 --dry-run
+    python -m app.modules.memory.migrate_embeddings --storage int8 --batch-size 1000
+
+Idempotente: documentos já no formato alvo são ignorados, então pode ser re-executado (ou
+interrompido) com segurança. int8 -> float32/list não recupera a precisão perdida na quantização.
+"""
+
+import argparse
+import asyncio
+from typing import Any, Dict, List
+
+import bson
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import mongo_manager
+from .embedding_codec import EMBEDDING_STORAGE_FORMATS, decode_embedding, embedding_storage_format, encode_embedding
+from .constants import COLLECTION_NAME
+
+def _bson_size(fields: Dict[str, Any]) -> int:
+    return len(bson.encode(fields))
+
+async def migrate_embeddings(
+    db: AsyncIOMotorDatabase,
+    storage: str,
+    batch_size: int = 500,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """Converte os embeddings para `storage` em lotes de bulk_write. Retorna estatísticas."""
+    if storage not in EMBEDDING_STORAGE_FORMATS:
+        raise ValueError(f"Unknown embedding storage format '{storage}'. Use: {', '.join(EMBEDDING_STORAGE_FORMATS)}")
+
+    collection = db[COLLECTION_NAME]
+    log = logger.bind(collection=COLLECTION_NAME, storage=storage, dry_run=dry_run)
+    stats = {"scanned": 0, "converted": 0, "already_target": 0, "invalid": 0, "bytes_before": 0, "bytes_after": 0}
+    operations: List[UpdateOne] = []
+
+    async def flush() -> None:
+        if operations and not dry_run:
+            await collection.bulk_write(operations, ordered=False)
+        operations.clear()
+
+    cursor = collection.find(
+        {"embedding": {"$exists": True}}, {"embedding": 1, "embedding_scale": 1}
+    ).batch_size(batch_size)
+    async for doc in cursor:
+        stats["scanned"] += 1
+        current_format = embedding_storage_format(doc["embedding"])
+        if current_format is None:
+            stats["invalid"] += 1
+            continue
+        if current_format == storage:
+            stats["already_target"] += 1
+            continue
+        if current_format == "int8" and storage != "int8":
+            log.warning(f"Memory {doc['_id']}: int8 -> {storage} keeps the quantized precision.")
+
+        vector = decode_embedding(doc["embedding"], doc.get("embedding_scale"))
+        encoded = encode_embedding(vector, storage)
+        stats["bytes_before"] += _bson_size({k: doc[k] for k in ("embedding", "embedding_scale") if k in doc})
+        stats["bytes_after"] += _bson_size(encoded)
+
+        update: Dict[str, Any] = {"$set": encoded}
+        if "embedding_scale" not in encoded:
+            update["$unset"] = {"embedding_scale": ""}
+        operations.append(UpdateOne({"_id": doc["_id"]}, update))
+        stats["converted"] += 1
+        if len(operations) >= batch_size:
+            await flush()
+            log.info(f"Progress: scanned={stats['scanned']} converted={stats['converted']}")
+    await flush()
+
+    ratio = stats["bytes_before"] / stats["bytes_after"] if stats["bytes_after"] else 0
+    log.success(f"Embedding migration finished: {stats} (embedding bytes {ratio:.1f}x smaller)")
+    return stats
+
+async def _main(args: argparse.Namespace) -> None:
+    async with mongo_manager:
+        await migrate_embeddings(mongo_manager.get_db(), args.storage, args.batch_size, args.dry_run)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", choices=EMBEDDING_STORAGE_FORMATS, default=settings.MEMORY_EMBEDDING_STORAGE)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be converted")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,7 +1,8 @@
 # app/modules/memory/models.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
+from datetime import datetime
 from bson import ObjectId
 
 class MemoryBase(BaseModel):
@@ -22,3 +23,23 @@ class MemoryInDB(MemoryBase):
 
     class Config:
         arbitrary_types_allowed = True
+
+# --- Modelos internos do MemoryRepository (coleção `memories`) ---
+
+class MemoryRecordCreateInternal(BaseModel):
+    """Registro de memória a ser gravado (embedding já calculado)."""
+    user_id: ObjectId
+    text: str
+    source: Optional[str] = None
+    tags: List[str] = []
+    embedding: List[float]
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+class MemoryRecordInDB(MemoryRecordCreateInternal):
+    """Registro como retornado pelo repositório (embedding sempre em lista, já decodificado)."""
+    id: ObjectId = Field(..., alias="_id")
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
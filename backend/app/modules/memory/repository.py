@@ -1,8 +1,11 @@
 # agentos_core/app/modules/memory/repository.py
 
+import asyncio
 from typing import Optional, List, Tuple, Dict, Any  
 from datetime import datetime
 
+import numpy as np
+
 from motor.motor_asyncio import AsyncIOMotorDatabase  
 from pymongo import ASCENDING, DESCENDING  
 from bson import ObjectId  
@@ -11,20 +14,29 @@ from pydantic import BaseModel
 
 # Importar Base e modelos internos/DB  
 from app.core.repository import BaseRepository  
+from .constants import COLLECTION_NAME
 from .models import MemoryRecordInDB, MemoryRecordCreateInternal # Usar nomes internos  
 from app.core.config import settings # Para config de embedding/index
+from .vector_index import VectorIndexBackend, get_vector_index
+from .embedding_codec import decode_embedding, encode_embedding
 
 # Importar get_database  
 from app.core.database import get_database
 
-COLLECTION_NAME = "memories"
+# Campos retornados pela busca vetorial (sem o embedding)
+VECTOR_SEARCH_PROJECTION = {"_id": 1, "user_id": 1, "text": 1, "source": 1, "tags": 1, "created_at": 1}
 
 class MemoryRepository(BaseRepository[MemoryRecordInDB, MemoryRecordCreateInternal, BaseModel]): # Sem Update Schema  
     model = MemoryRecordInDB  
     collection_name = COLLECTION_NAME
 
+    def __init__(self, db: AsyncIOMotorDatabase):
+        super().__init__(db)
+        # None => Atlas $vectorSearch; senão índice local do processo (MEMORY_VECTOR_BACKEND)
+        self.vector_index: Optional[VectorIndexBackend] = get_vector_index()
+
     async def create_indexes(self):  
-        """Cria índices B-Tree. Índice vetorial DEVE ser criado no Atlas."""  
+        """Cria índices B-Tree. Com MEMORY_VECTOR_BACKEND=atlas o índice vetorial DEVE ser criado no Atlas."""  
         try:  
             await self.collection.create_index("user_id")  
             await self.collection.create_index([("created_at", DESCENDING)])  
@@ -32,6 +44,9 @@ class MemoryRepository(BaseRepository[MemoryRecordInDB, MemoryRecordCreateIntern
             await self.collection.create_index("source", sparse=True)  
             logger.info(f"Índices B-Tree criados/verificados para: {self.collection_name}")
 
+            if self.vector_index is not None:
+                logger.info(f"Vector search usando índice local '{self.vector_index.name}' (sem Atlas Search).")
+                return
             logger.warning(f"IMPORTANTE: Crie manualmente o índice Atlas Search vetorial "  
                            f"nomeado '{settings.MONGO_MEMORY_SEARCH_INDEX_NAME}' na coleção "  
                            f"'{self.collection_name}' para o campo 'embedding' "  
@@ -61,8 +76,29 @@ class MemoryRepository(BaseRepository[MemoryRecordInDB, MemoryRecordCreateIntern
              if not obj_id: raise ValueError("Invalid user_id format for memory record.")  
              create_data["user_id"] = obj_id
 
+        # Gravar o embedding no formato compacto configurado (MEMORY_EMBEDDING_STORAGE);
+        # o modelo retornado mantém a lista original, sem reler o documento
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        create_data.setdefault("created_at", now)
+        create_data.setdefault("updated_at", now)
+        stored_data = {**create_data, **encode_embedding(embedding, settings.MEMORY_EMBEDDING_STORAGE)}
+
         # Chamar create do BaseRepository  
-        return await super().create(create_data)
+        inserted_id = await super().create(stored_data, return_document=False)
+        created = self.model.model_validate({**create_data, "_id": inserted_id})
+        if self.vector_index is not None and create_data.get("user_id"):
+            await asyncio.to_thread(
+                self.vector_index.add, create_data["user_id"], created.id, embedding, create_data.get("tags")
+            )
+        return created
+
+    async def delete(self, id: str | ObjectId) -> bool:
+        """Deleta a memória e a remove do índice vetorial local (se houver)."""
+        deleted = await super().delete(id)
+        if deleted and self.vector_index is not None:
+            self.vector_index.remove(self._to_objectid(id))
+        return deleted
 
     async def vector_search(  
         self,  
@@ -72,18 +108,25 @@ class MemoryRepository(BaseRepository[MemoryRecordInDB, MemoryRecordCreateIntern
         min_similarity: float = 0.75,  
         tags_filter: Optional[List[str]] = None  
     ) -> List[Dict[str, Any]]: # Retornar dicts com score para o service validar/modelar  
-        """Executa busca vetorial via Atlas Search $vectorSearch."""
+        """Executa busca vetorial via Atlas Search $vectorSearch ou pelo índice local configurado."""
 
         if len(query_embedding) != settings.EMBEDDING_DIMENSIONS:  
             raise ValueError(f"Query embedding dimension mismatch ({len(query_embedding)} vs {settings.EMBEDDING_DIMENSIONS})")
 
+        if self.vector_index is not None:
+            return await self._local_vector_search(query_embedding, user_id, limit, min_similarity, tags_filter)
+
         search_index_name = settings.MONGO_MEMORY_SEARCH_INDEX_NAME
 
         # Construir estágio $vectorSearch  
         vector_search_stage = {  
             "index": search_index_name,  
             "path": "embedding",  
-            "queryVector": query_embedding,  
+            # int8 armazenado exige consulta int8 (cosine ignora a escala); list/float32 aceitam array
+            "queryVector": (
+                encode_embedding(query_embedding, "int8")["embedding"]
+                if settings.MEMORY_EMBEDDING_STORAGE == "int8" else query_embedding
+            ),
             "numCandidates": max(limit * 15, 150), # Aumentar candidatos para melhor recall com filtros  
             "limit": limit,  
             # Filtro OBRIGATÓRIO por user_id!  
@@ -133,8 +176,53 @@ class MemoryRepository(BaseRepository[MemoryRecordInDB, MemoryRecordCreateIntern
                  raise RuntimeError(f"Required Atlas Search index '{search_index_name}' not found or not ready.") from e  
             raise RuntimeError(f"Vector search failed: {e}") from e
 
+    async def _load_vector_partition(self, user_id: ObjectId) -> None:
+        """Carrega (ou recarrega após o TTL) os embeddings do usuário no índice local."""
+        ids, vectors, tags = [], [], []
+        cursor = self.collection.find({"user_id": user_id}, {"embedding": 1, "embedding_scale": 1, "tags": 1})
+        async for doc in cursor:
+            # Aceita qualquer formato armazenado (lista legada, float32 ou int8)
+            embedding = decode_embedding(doc.get("embedding"), doc.get("embedding_scale"))
+            if embedding is None or len(embedding) != self.vector_index.dimensions:
+                continue
+            ids.append(doc["_id"])
+            vectors.append(embedding)
+            tags.append(doc.get("tags") or ())
+        matrix = np.stack(vectors) if vectors else np.empty((0, self.vector_index.dimensions), dtype=np.float32)
+        await asyncio.to_thread(self.vector_index.load_partition, user_id, ids, matrix, tags)
+
+    async def _local_vector_search(
+        self,
+        query_embedding: List[float],
+        user_id: ObjectId,
+        limit: int,
+        min_similarity: float,
+        tags_filter: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """Mesmo contrato do $vectorSearch: dicts com similarity_score, ordenados desc."""
+        log = logger.bind(user_id=str(user_id), limit=limit, min_score=min_similarity, index=self.vector_index.name)
+        try:
+            if not self.vector_index.has_partition(user_id):
+                await self._load_vector_partition(user_id)
+            hits = await asyncio.to_thread(
+                self.vector_index.search, user_id, query_embedding, limit, min_similarity, tags_filter
+            )
+            if not hits:
+                return []
+            scores = dict(hits)
+            cursor = self.collection.find({"_id": {"$in": list(scores)}}, VECTOR_SEARCH_PROJECTION)
+            results = await cursor.to_list(length=len(scores))
+            for doc in results:
+                doc["similarity_score"] = scores[doc["_id"]]
+            results.sort(key=lambda doc: doc["similarity_score"], reverse=True)
+            log.info(f"Vector search (local) encontrou {len(results)} memórias relevantes.")
+            return results
+        except Exception as e:
+            log.exception(f"Erro durante vector search local: {e}")
+            raise RuntimeError(f"Vector search failed: {e}") from e
+
 # Função de dependência FastAPI  
 async def get_memory_repository() -> MemoryRepository:  
     """FastAPI dependency to get MemoryRepository instance."""  
-    db = get_database()  
+    db = await get_database()
     return MemoryRepository(db)
@@ -0,0 +1,394 @@
+# agentos_core/app/modules/memory/vector_index.py
+
+"""
+Índices vetoriais locais (em processo) para MemoryRepository.vector_search, alternativa ao
+$vectorSearch do Atlas para testes e deploys on-prem.
+
+- BruteForceVectorIndex: busca exata (produto interno em NumPy sobre vetores normalizados).
+- IVFVectorIndex: busca aproximada (k-means + listas invertidas, sonda as `nprobe` listas mais
+  próximas). Partições pequenas continuam em busca exata.
+
+Os índices são particionados por user_id (o filtro por usuário é obrigatório) e mantêm um índice
+invertido de tags para pré-filtrar antes do cálculo de similaridade. O score retornado segue a
+escala do Atlas para cosine: (1 + cos) / 2, em [0, 1], para que `min_similarity` signifique o mesmo
+nos dois backends.
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from bson import ObjectId
+from loguru import logger
+
+from app.core.config import settings
+
+class _Partition:
+    """Vetores de um usuário: buffer float32 normalizado com crescimento amortizado + tags."""
+
+    def __init__(self, dimensions: int, capacity: int = 64):
+        self.dimensions = dimensions
+        self.vectors = np.empty((capacity, dimensions), dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.ids: List[ObjectId] = []
+        self.rows: Dict[ObjectId, int] = {}
+        self.tag_rows: Dict[str, List[int]] = {}
+        self.tag_arrays: Dict[str, np.ndarray] = {} # Cache ordenado de tag_rows (invalidado ao adicionar)
+        self.size = 0
+        self.live_count = 0
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= len(self.vectors):
+            return
+        capacity = max(needed, len(self.vectors) * 2)
+        vectors = np.empty((capacity, self.dimensions), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.vectors, self.alive = vectors, alive
+
+    def add_many(self, ids: Sequence[ObjectId], vectors: np.ndarray, tags: Sequence[Iterable[str]]) -> range:
+        """Adiciona linhas (ids já existentes são marcados como removidos e reinseridos)."""
+        for obj_id in ids:
+            self.remove(obj_id)
+        self._reserve(len(ids))
+        start = self.size
+        end = start + len(ids)
+        self.vectors[start:end] = _normalize(vectors)
+        self.alive[start:end] = True
+        for offset, (obj_id, row_tags) in enumerate(zip(ids, tags)):
+            row = start + offset
+            self.ids.append(obj_id)
+            self.rows[obj_id] = row
+            for tag in set(row_tags or ()):
+                self.tag_rows.setdefault(tag, []).append(row)
+                self.tag_arrays.pop(tag, None)
+        self.size = end
+        self.live_count += len(ids)
+        return range(start, end)
+
+    def remove(self, obj_id: ObjectId) -> bool:
+        row = self.rows.pop(obj_id, None)
+        if row is None:
+            return False
+        # Remoção lógica: a linha fica no buffer, mas nunca mais é retornada
+        self.alive[row] = False
+        self.live_count -= 1
+        return True
+
+    def rows_with_tags(self, tags_filter: Sequence[str]) -> np.ndarray:
+        """Linhas que têm QUALQUER uma das tags (mesma semântica do filtro $in)."""
+        arrays = [self._tag_array(tag) for tag in set(tags_filter) if tag in self.tag_rows]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        # Linhas crescem monotonicamente, então cada array já está ordenado
+        return arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays))
+
+    def _tag_array(self, tag: str) -> np.ndarray:
+        array = self.tag_arrays.get(tag)
+        if array is None:
+            array = self.tag_arrays[tag] = np.asarray(self.tag_rows[tag], dtype=np.int64)
+        return array
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _top_k(rows: Optional[np.ndarray], cosines: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Seleciona as `limit` maiores similaridades (argpartition + sort só do top-k)."""
+    if len(cosines) > limit:
+        best = np.argpartition(-cosines, limit - 1)[:limit]
+    else:
+        best = np.arange(len(cosines))
+    best = best[np.argsort(-cosines[best], kind="stable")]
+    return (best if rows is None else rows[best]), cosines[best]
+
+class VectorIndexBackend(ABC):
+    """Interface dos backends locais. Métodos síncronos (CPU-bound): chamar via asyncio.to_thread."""
+
+    name: str = "base"
+
+    def __init__(self, dimensions: Optional[int] = None, partition_ttl_seconds: Optional[float] = None):
+        self.dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+        self.partition_ttl_seconds = (
+            partition_ttl_seconds if partition_ttl_seconds is not None else settings.MEMORY_VECTOR_PARTITION_TTL_SECONDS
+        )
+        self._partitions: Dict[ObjectId, _Partition] = {}
+
+    def has_partition(self, user_id: ObjectId) -> bool:
+        """True se a partição do usuário está carregada e dentro do TTL (outros processos também escrevem)."""
+        partition = self._partitions.get(user_id)
+        if partition is None:
+            return False
+        if self.partition_ttl_seconds and time.monotonic() - partition.loaded_at > self.partition_ttl_seconds:
+            return False
+        return True
+
+    def load_partition(self, user_id: ObjectId, ids: Sequence[ObjectId], vectors: np.ndarray, tags: Sequence[Iterable[str]]) -> None:
+        """(Re)constrói a partição de um usuário a partir dos documentos do Mongo."""
+        partition = self._new_partition(max(len(ids), 64))
+        if len(ids):
+            partition.add_many(ids, vectors, tags)
+        self._after_add(partition, None)
+        self._partitions[user_id] = partition # Troca atômica: buscas em andamento usam a antiga
+        logger.debug(f"Vector index '{self.name}': partition loaded for user {user_id} ({len(ids)} vectors).")
+
+    def add(self, user_id: ObjectId, obj_id: ObjectId, vector: Sequence[float], tags: Optional[Iterable[str]] = None) -> None:
+        """Adiciona um vetor à partição (se carregada; senão ele vem no próximo load)."""
+        partition = self._partitions.get(user_id)
+        if partition is None:
+            return
+        with partition.lock:
+            added = partition.add_many([obj_id], np.asarray([vector], dtype=np.float32), [tags or ()])
+            self._after_add(partition, added)
+
+    def remove(self, obj_id: ObjectId, user_id: Optional[ObjectId] = None) -> bool:
+        partitions = [self._partitions.get(user_id)] if user_id is not None else list(self._partitions.values())
+        for partition in partitions:
+            if partition is None:
+                continue
+            with partition.lock:
+                if partition.remove(obj_id):
+                    return True
+        return False
+
+    def drop_partition(self, user_id: ObjectId) -> None:
+        self._partitions.pop(user_id, None)
+
+    def search(
+        self,
+        user_id: ObjectId,
+        query_embedding: Sequence[float],
+        limit: int = 5,
+        min_similarity: float = 0.0,
+        tags_filter: Optional[Sequence[str]] = None
+    ) -> List[Tuple[ObjectId, float]]:
+        """Retorna [(memory_id, score)] ordenado por score desc, apenas score >= min_similarity."""
+        partition = self._partitions.get(user_id)
+        if partition is None or partition.live_count == 0 or limit <= 0:
+            return []
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        with partition.lock:
+            rows, cosines = self._search_partition(partition, query, limit, tags_filter)
+            ids = [partition.ids[row] for row in rows.tolist()]
+        scores = (1.0 + cosines) / 2.0
+        return [(obj_id, float(score)) for obj_id, score in zip(ids, scores) if score >= min_similarity]
+
+    def _new_partition(self, capacity: int) -> _Partition:
+        return _Partition(self.dimensions, capacity)
+
+    def _after_add(self, partition: _Partition, added: Optional[range]) -> None:
+        """Hook para backends que mantêm estruturas auxiliares (ex: listas IVF)."""
+
+    def _exact(self, partition: _Partition, query: np.ndarray, limit: int, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        if rows is None:
+            # Sem cópia: produto direto sobre o buffer, linhas removidas recebem -inf
+            cosines = partition.vectors[:partition.size] @ query
+            cosines[~partition.alive[:partition.size]] = -np.inf
+            limit = min(limit, partition.live_count)
+            return _top_k(None, cosines, limit)
+        rows = rows[partition.alive[rows]]
+        if len(rows) == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        return _top_k(rows, partition.vectors[rows] @ query, limit)
+
+    @abstractmethod
+    def _search_partition(
+        self, partition: _Partition, query: np.ndarray, limit: int, tags_filter: Optional[Sequence[str]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Retorna (linhas, cossenos) do top-k, ordenados."""
+
+class BruteForceVectorIndex(VectorIndexBackend):
+    """Busca exata. Custo O(n·d) por consulta sobre a partição (ou só sobre as linhas das tags)."""
+
+    name = "bruteforce"
+
+    def _search_partition(self, partition, query, limit, tags_filter):
+        rows = partition.rows_with_tags(tags_filter) if tags_filter else None
+        return self._exact(partition, query, limit, rows)
+
+class _IVFPartition(_Partition):
+    def __init__(self, dimensions: int, capacity: int = 64):
+        super().__init__(dimensions, capacity)
+        self.centroids: Optional[np.ndarray] = None
+        # Linhas [offsets[i], offsets[i+1]) pertencem à lista i (buffer reordenado por lista)
+        self.offsets: Optional[np.ndarray] = None
+        self.packed_size = 0
+        # Linhas adicionadas depois do último repack, por lista
+        self.tail: List[List[int]] = []
+        self.tail_count = 0
+        self.trained_size = 0
+
+class IVFVectorIndex(VectorIndexBackend):
+    """
+    Busca aproximada IVF-Flat: k-means esférico (nlist ≈ √n) sobre os vetores normalizados, cada
+    vetor na lista do centróide mais próximo; a consulta calcula similaridade exata só nas `nprobe`
+    listas mais próximas. O buffer da partição é reordenado por lista ("repack"), então cada lista
+    sondada é uma fatia contígua (sem cópia). Partições abaixo de `min_train_size` usam busca exata.
+    Retreina quando a partição dobra desde o último treino; faz repack quando as inserções pendentes
+    passam de `repack_ratio` do tamanho empacotado.
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        dimensions: Optional[int] = None,
+        partition_ttl_seconds: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        min_train_size: Optional[int] = None,
+        kmeans_iterations: int = 10,
+        training_sample_per_list: int = 40,
+        repack_ratio: float = 0.1
+    ):
+        super().__init__(dimensions, partition_ttl_seconds)
+        self.nprobe = nprobe or settings.MEMORY_IVF_NPROBE
+        self.min_train_size = min_train_size or settings.MEMORY_IVF_MIN_TRAIN_SIZE
+        self.kmeans_iterations = kmeans_iterations
+        self.training_sample_per_list = training_sample_per_list
+        self.repack_ratio = repack_ratio
+
+    def _new_partition(self, capacity: int) -> _Partition:
+        return _IVFPartition(self.dimensions, capacity)
+
+    def _after_add(self, partition: _IVFPartition, added: Optional[range]) -> None:
+        if partition.centroids is None:
+            if partition.live_count >= self.min_train_size:
+                self._train(partition)
+            return
+        # Já treinada: mesmo abaixo de min_train_size (após remoções) as novas linhas vão para a tail,
+        # senão ficariam fora das listas e nunca seriam retornadas
+        if partition.live_count >= 2 * partition.trained_size:
+            self._train(partition)
+            return
+        if added:
+            nearest = self._nearest_lists(partition, partition.vectors[added.start:added.stop])
+            for row, list_id in zip(added, nearest.tolist()):
+                partition.tail[list_id].append(row)
+            partition.tail_count += len(added)
+        if partition.tail_count > self.repack_ratio * partition.packed_size:
+            self._repack(partition)
+
+    def _nearest_lists(self, partition: _IVFPartition, vectors: np.ndarray, chunk: int = 65_536) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk] @ partition.centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk)
+        ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+    def _train(self, partition: _IVFPartition) -> None:
+        started = time.perf_counter()
+        live_rows = np.flatnonzero(partition.alive[:partition.size])
+        n = len(live_rows)
+        nlist = max(1, min(int(np.sqrt(n)), n // 39 or 1))
+        rng = np.random.default_rng(0)
+        sample_size = min(n, nlist * self.training_sample_per_list)
+        sample = partition.vectors[np.sort(rng.choice(live_rows, sample_size, replace=False))]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            # k-means esférico: vetores e centróides normalizados, atribuição por produto interno
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+        partition.centroids = centroids
+        partition.trained_size = n
+        self._repack(partition, assignment=None)
+        logger.info(
+            f"Vector index 'ivf': trained partition with {n} vectors, nlist={nlist} "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
+
+    def _repack(self, partition: _IVFPartition, assignment: Optional[np.ndarray] = None) -> None:
+        """Reordena o buffer por lista (descartando linhas removidas) e recalcula os offsets."""
+        live_rows = np.flatnonzero(partition.alive[:partition.size])
+        lists = self._nearest_lists(partition, partition.vectors[live_rows]) if assignment is None else assignment
+        order = live_rows[np.argsort(lists, kind="stable")]
+        nlist = len(partition.centroids)
+        counts = np.bincount(lists, minlength=nlist)
+
+        new_row_of = np.full(partition.size, -1, dtype=np.int64)
+        new_row_of[order] = np.arange(len(order))
+        partition.vectors[:len(order)] = partition.vectors[order]
+        partition.alive[:] = False
+        partition.alive[:len(order)] = True
+        partition.ids = [partition.ids[row] for row in order.tolist()]
+        partition.rows = {obj_id: row for row, obj_id in enumerate(partition.ids)}
+        tag_rows = {}
+        for tag, rows in partition.tag_rows.items():
+            remapped = new_row_of[np.asarray(rows, dtype=np.int64)]
+            remapped = np.sort(remapped[remapped >= 0])
+            if len(remapped):
+                tag_rows[tag] = remapped.tolist()
+        partition.tag_rows = tag_rows
+        partition.tag_arrays = {}
+        partition.size = partition.live_count = len(order)
+        partition.offsets = np.concatenate([[0], np.cumsum(counts)])
+        partition.packed_size = len(order)
+        partition.tail = [[] for _ in range(nlist)]
+        partition.tail_count = 0
+
+    def _search_partition(self, partition: _IVFPartition, query, limit, tags_filter):
+        tag_rows = partition.rows_with_tags(tags_filter) if tags_filter else None
+        if partition.centroids is None:
+            return self._exact(partition, query, limit, tag_rows)
+
+        nprobe = min(self.nprobe, len(partition.centroids))
+        if tag_rows is not None and len(tag_rows) <= nprobe * partition.size / len(partition.centroids):
+            # Tags seletivas: o pré-filtro já é menor que as listas sondadas, busca exata nele
+            return self._exact(partition, query, limit, tag_rows)
+
+        closest = np.argpartition(-(partition.centroids @ query), nprobe - 1)[:nprobe]
+        row_chunks, cosine_chunks = [], []
+        for list_id in closest.tolist():
+            start, end = int(partition.offsets[list_id]), int(partition.offsets[list_id + 1])
+            if end > start:
+                row_chunks.append(np.arange(start, end))
+                cosine_chunks.append(partition.vectors[start:end] @ query) # Fatia contígua: sem cópia
+            if partition.tail[list_id]:
+                tail_rows = np.asarray(partition.tail[list_id], dtype=np.int64)
+                row_chunks.append(tail_rows)
+                cosine_chunks.append(partition.vectors[tail_rows] @ query)
+        if not row_chunks:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, cosines = np.concatenate(row_chunks), np.concatenate(cosine_chunks)
+
+        keep = partition.alive[rows]
+        if tag_rows is not None:
+            # tag_rows é ordenado: pertinência por busca binária
+            positions = np.minimum(np.searchsorted(tag_rows, rows), len(tag_rows) - 1)
+            keep &= tag_rows[positions] == rows
+        rows, cosines = rows[keep], cosines[keep]
+        return _top_k(rows, cosines, min(limit, len(rows)))
+
+_VECTOR_BACKENDS = {
+    BruteForceVectorIndex.name: BruteForceVectorIndex,
+    IVFVectorIndex.name: IVFVectorIndex,
+}
+
+_vector_index: Optional[VectorIndexBackend] = None
+
+def get_vector_index() -> Optional[VectorIndexBackend]:
+    """
+    Índice local do processo conforme MEMORY_VECTOR_BACKEND ("bruteforce" | "ivf").
+    Retorna None para "atlas" (padrão): o repositório usa $vectorSearch.
+    """
+    global _vector_index
+    backend = settings.MEMORY_VECTOR_BACKEND.lower()
+    if backend == "atlas":
+        return None
+    if _vector_index is None or _vector_index.name != backend:
+        backend_cls = _VECTOR_BACKENDS.get(backend)
+        if backend_cls is None:
+            raise ValueError(f"Unknown MEMORY_VECTOR_BACKEND '{settings.MEMORY_VECTOR_BACKEND}'. Use: atlas, {', '.join(_VECTOR_BACKENDS)}")
+        _vector_index = backend_cls()
+        logger.info(f"Local vector index backend initialized: {backend}")
+    return _vector_index
@@ -2,12 +2,23 @@
 from bson import ObjectId
 from datetime import datetime
 from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.results import UpdateResult
 from loguru import logger
-from app.core.database import BaseRepository
+from app.core.database import get_database
+from app.core.repository import BaseRepository
 from .models import UserInDB, UserCreateInternal, UserUpdateInternal
 
+COLLECTION_NAME = "users"
+
 class UserRepository(BaseRepository[UserInDB, UserCreateInternal, UserUpdateInternal]):
+    model = UserInDB
+    collection_name = COLLECTION_NAME
+
+    async def get_by_email(self, email: str) -> Optional[UserInDB]:
+        """Busca um usuário pelo email (claim 'sub' do JWT)."""
+        return await self.get_by({"email": email})
+
     async def update_balance(self, user_id: ObjectId, amount: float) -> bool:
         """Updates the balance for a specific user."""
         log = logger.bind(user_id=str(user_id))
@@ -32,4 +43,5 @@ class UserRepository(BaseRepository[UserInDB, UserCreateInternal, UserUpdateInte
 
 # Factory to get repository instance
 async def get_user_repository() -> UserRepository:
-    return UserRepository(collection_name="users")
\ No newline at end of file
+    db: AsyncIOMotorDatabase = await get_database()
+    return UserRepository(db)
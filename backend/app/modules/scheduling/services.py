@@ -1,4 +1,5 @@
 # app/modules/scheduling/services.py
+import asyncio
 from datetime import datetime, date, time
 from typing import List, Optional, Dict, Any, Tuple
 from bson import ObjectId
@@ -16,6 +17,7 @@ from app.modules.people.repository import UserRepository
 from app.modules.banking.services import BankingService
 from app.modules.banking.repository import TransactionRepository
 from app.core.counters import CounterService
+from app.core.dataloader import get_loader
 
 class SchedulingService:
     async def _enrich_shift(self, shift_db: ShiftInDB, user_repo: UserRepository) -> ShiftAPI:
@@ -37,11 +39,10 @@ class SchedulingService:
 
         assigned_user_ids = [ua.user_id for ua in shift_db.assigned_users]
         if assigned_user_ids:
-            users = await user_repo.list_by({"_id": {"$in": assigned_user_ids}}, limit=0)
-            user_map = {str(u.id): u for u in users}
+            # DataLoader do request: shifts enriquecidos em paralelo compartilham um único $in
+            users = await get_loader(user_repo).load_many(assigned_user_ids)
             enriched_assignments = []
-            for ua in shift_db.assigned_users:
-                user = user_map.get(str(ua.user_id))
+            for ua, user in zip(shift_db.assigned_users, users):
                 enriched_assignments.append(
                     AssignedUserAPI(
                         user_id=str(ua.user_id),
@@ -69,7 +70,7 @@ class SchedulingService:
         shifts_db = await shift_repo.list_shifts_by_user_and_date(
             user_id, start_date, end_date, skip, limit
         )
-        enriched_shifts = [await self._enrich_shift(s, user_repo) for s in shifts_db]
+        enriched_shifts = list(await asyncio.gather(*(self._enrich_shift(s, user_repo) for s in shifts_db)))
         log.info(f"Found {len(enriched_shifts)} assigned shifts for user.")
         return enriched_shifts
 
@@ -35,6 +35,8 @@ class TaskRepository(BaseRepository[TaskInDB, TaskCreateInternal, TaskUpdateInte
             await self.collection.create_index("tags", sparse=True)  
             await self.collection.create_index([("created_at", DESCENDING)])  
             await self.collection.create_index([("updated_at", DESCENDING)])  
+            # Índice da ordenação padrão da listagem (keyset pagination)
+            await self.collection.create_index([("due_date", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
             logger.info(f"Índices criados/verificados para a coleção: {self.collection_name}")  
         except Exception as e:  
             logger.exception(f"Erro ao criar índices para {self.collection_name}: {e}")
@@ -105,10 +107,10 @@ class TaskRepository(BaseRepository[TaskInDB, TaskCreateInternal, TaskUpdateInte
         due_before: Optional[date] = None, # Receber date  
         due_after: Optional[date] = None,  # Receber date  
         tags: Optional[List[str]] = None,  
-        skip: int = 0,  
-        limit: int = 100  
-        ) -> List[TaskInDB]:  
-        """Lista tarefas com filtros variados."""  
+        limit: int = 100,
+        cursor: Optional[str] = None
+        ) -> Tuple[List[TaskInDB], Optional[str]]:
+        """Lista tarefas com filtros variados (paginação por cursor). Retorna (tarefas, next_cursor)."""
         query = {}  
         if status: query["status"] = status  
         if priority: query["priority"] = priority
@@ -137,9 +139,10 @@ class TaskRepository(BaseRepository[TaskInDB, TaskCreateInternal, TaskUpdateInte
              # 3. Usar agregação com $addFields e $cond (complexo).  
              # Por ora, ordenar por due_date e created_at.  
              ("due_date", ASCENDING), # Nulos primeiro ou último? MongoDB trata nulos como menores.  
-             ("created_at", DESCENDING)  
+             ("created_at", DESCENDING),
+             ("_id", DESCENDING) # Desempate para o cursor
         ]  
-        return await self.list_by(query=query, skip=skip, limit=limit, sort=sort_order)
+        return await self.list_by_cursor(query=query, sort=sort_order, limit=limit, cursor=cursor)
 
 # Função de dependência FastAPI  
 async def get_task_repository() -> TaskRepository:  
@@ -0,0 +1,102 @@
+# agentos_core/app/services/autoresponder_timers.py
+
+"""
+Timers do AutoResponder num ZSET Redis (chat_id -> deadline epoch) em vez de uma task Celery com ETA
+por mensagem + revoke da anterior.
+
+- schedule: cada mensagem do cliente faz ZADD (substitui o deadline do chat) + HSET do payload
+  (última mensagem do cliente, trace) numa única transação — O(1), sem broadcast de revoke
+- cancel: resposta humana / modo agente remove o timer (ZREM + HDEL)
+- requeue: devolve um timer reivindicado que não pôde ser disparado (ZADD NX + HSETNX: não sobrescreve um
+  agendamento mais novo feito entre o claim e a devolução)
+- claim_due: o poller (task whatsapp.poll_autoresponder_timers, beat) reivindica atomicamente os
+  vencidos via Lua — cada timer é entregue a um único poller — e só então dispara check_chat_timeout
+
+check_chat_timeout continua conferindo se a última mensagem ainda é a do cliente, então um timer
+atrasado ou duplicado (ex.: fallback para ETA sem Redis) apenas sai sem responder.
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+AUTORESPONDER_DEADLINES_KEY = "wa:autoresponder:deadlines"
+AUTORESPONDER_PAYLOADS_KEY = "wa:autoresponder:payloads"
+
+# Remove e retorna até ARGV[2] timers com deadline <= ARGV[1]: {chat_id, payload, chat_id, payload, ...}
+CLAIM_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local claimed = {}
+for _, chat_id in ipairs(due) do
+    redis.call('ZREM', KEYS[1], chat_id)
+    local payload = redis.call('HGET', KEYS[2], chat_id)
+    redis.call('HDEL', KEYS[2], chat_id)
+    table.insert(claimed, chat_id)
+    table.insert(claimed, payload or '{}')
+end
+return claimed
+"""
+
+class AutoResponderTimers:
+    def __init__(self, redis_client: redis.Redis):
+        self._redis = redis_client
+        self._claim_script = redis_client.register_script(CLAIM_DUE_LUA)
+
+    async def schedule(self, chat_id: str, last_customer_message_id: str, deadline: float, trace_id: Optional[str] = None) -> None:
+        """Cria ou adia o timer do chat para `deadline` (epoch em segundos)."""
+        payload = json.dumps({"last_customer_message_id": last_customer_message_id, "deadline": deadline, "trace_id": trace_id})
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(AUTORESPONDER_DEADLINES_KEY, {chat_id: deadline})
+            pipe.hset(AUTORESPONDER_PAYLOADS_KEY, chat_id, payload)
+            await pipe.execute()
+
+    async def cancel(self, chat_id: str) -> bool:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(AUTORESPONDER_DEADLINES_KEY, chat_id)
+            pipe.hdel(AUTORESPONDER_PAYLOADS_KEY, chat_id)
+            removed, _ = await pipe.execute()
+        return bool(removed)
+
+    async def apply(self, schedule: Iterable[Tuple[str, str, float]] = (), cancel: Iterable[str] = (), trace_id: Optional[str] = None) -> None:
+        """Agenda (chat_id, last_customer_message_id, deadline) e cancela chats numa única transação (webhook em lote)."""
+        schedule, cancel = list(schedule), list(cancel)
+        if not schedule and not cancel:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if schedule:
+                pipe.zadd(AUTORESPONDER_DEADLINES_KEY, {chat_id: deadline for chat_id, _, deadline in schedule})
+                pipe.hset(AUTORESPONDER_PAYLOADS_KEY, mapping={
+                    chat_id: json.dumps({"last_customer_message_id": wami, "deadline": deadline, "trace_id": trace_id})
+                    for chat_id, wami, deadline in schedule
+                })
+            if cancel:
+                pipe.zrem(AUTORESPONDER_DEADLINES_KEY, *cancel)
+                pipe.hdel(AUTORESPONDER_PAYLOADS_KEY, *cancel)
+            await pipe.execute()
+
+    async def requeue(self, timer: Dict[str, Any], deadline: Optional[float] = None) -> bool:
+        """
+        Devolve um timer de claim_due para disparar em `deadline` (padrão: agora). Se o chat já tem um timer
+        (nova mensagem do cliente depois do claim), o mais novo prevalece. Retorna True se foi devolvido.
+        """
+        chat_id = timer["chat_id"]
+        payload = json.dumps({key: timer.get(key) for key in ("last_customer_message_id", "deadline", "trace_id")})
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(AUTORESPONDER_DEADLINES_KEY, {chat_id: time.time() if deadline is None else deadline}, nx=True)
+            pipe.hsetnx(AUTORESPONDER_PAYLOADS_KEY, chat_id, payload)
+            added, _ = await pipe.execute()
+        return bool(added)
+
+    async def claim_due(self, limit: int = 100, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Reivindica (remove) até `limit` timers vencidos. Retorna [{chat_id, last_customer_message_id, deadline, trace_id}]."""
+        now = time.time() if now is None else now
+        flat = await self._claim_script(keys=[AUTORESPONDER_DEADLINES_KEY, AUTORESPONDER_PAYLOADS_KEY], args=[now, limit])
+        timers = []
+        for chat_id, payload in zip(flat[0::2], flat[1::2]):
+            timers.append({"chat_id": chat_id if isinstance(chat_id, str) else chat_id.decode(), **json.loads(payload)})
+        return timers
+
+    async def pending_count(self) -> int:
+        return await self._redis.zcard(AUTORESPONDER_DEADLINES_KEY)
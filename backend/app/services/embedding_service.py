@@ -1,13 +1,25 @@
 # agentos_core/app/services/embedding_service.py
 
+import asyncio
+import hashlib
+import json
+import weakref
+from collections import OrderedDict
+
+import redis.asyncio as redis
 from openai import AsyncOpenAI, OpenAIError  
 from app.core.config import settings  
+from app.core.database import get_redis_client_instance
+from app.core.metrics import metrics
+from app.services.token_budget import count_tokens, truncate_text
 from loguru import logger  
-from typing import List, Optional  
+from typing import Dict, List, Optional, Set, Tuple
 from app.core.logging_config import trace_id_var  
 from functools import lru_cache  
 from fastapi import HTTPException, status # Para erros críticos
 
+EMBEDDING_CACHE_KEY_PREFIX = "emb:"
+
 # Usar um cliente separado para embeddings pode ter timeouts/retries diferentes  
 @lru_cache()  
 def get_embedding_client() -> Optional[AsyncOpenAI]:  
@@ -17,7 +29,7 @@ def get_embedding_client() -> Optional[AsyncOpenAI]:
         return None  
     try:  
         # Timeout um pouco mais curto para embeddings  
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=3, timeout=30.0)  
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_API_BASE_URL, max_retries=3, timeout=30.0)  
         # Verificar a conexão aqui? Ping não existe em embeddings. Fazer chamada teste? Não.  
         logger.info(f'[Embedding Service] OpenAI client initialized for model {settings.EMBEDDING_MODEL}.')  
         return client  
@@ -25,44 +37,172 @@ def get_embedding_client() -> Optional[AsyncOpenAI]:
         logger.exception(f'[Embedding Service] Failed to initialize OpenAI client: {e}')  
         return None
 
-async def generate_embedding(text: str) -> Optional[List[float]]:  
-    """  
-    Gera um vetor de embedding para o texto usando o modelo configurado.  
-    Valida a dimensão do vetor retornado contra as settings.  
-    """  
-    log = logger.bind(trace_id=trace_id_var.get(), service="EmbeddingService")  
-    aclient_embedding = get_embedding_client()
+def _clean_text(text: Optional[str]) -> Optional[str]:
+    """
+    Limpa o texto como recomendado pela OpenAI (quebras de linha viram espaço) e trunca em
+    EMBEDDING_MAX_INPUT_TOKENS (a API rejeita o lote inteiro se um input passar do limite do modelo).
+    """
+    if not text or not isinstance(text, str):
+        return None
+    cleaned = text.strip().replace("\n", " ")
+    if not cleaned:
+        return None
+    truncated = truncate_text(cleaned, settings.EMBEDDING_MAX_INPUT_TOKENS, model=settings.EMBEDDING_MODEL, marker="")
+    if truncated is not cleaned:
+        metrics.incr("embedding_inputs_truncated")
+    return truncated
 
-    if not aclient_embedding:  
-        log.error("OpenAI client for embeddings is unavailable.")  
-        # Levantar erro aqui? Ou apenas retornar None? Levantar erro se for crítico.  
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Embedding service client not configured.")
+def _estimate_tokens(text: str) -> int:
+    # Tokens do texto (BPE cacheado) para limitar o tamanho do lote
+    return count_tokens(text, settings.EMBEDDING_MODEL)
 
-    if not text or not isinstance(text, str):  
-        log.warning("generate_embedding called with invalid or empty input text.")  
-        return None # Não gerar embedding para texto vazio
+def _cache_key(model: str, dimensions: int, text: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{EMBEDDING_CACHE_KEY_PREFIX}{model}:{dimensions}:{digest}"
 
-    # Limpar e preparar texto (recomendação da OpenAI)  
-    text_to_embed = text.strip().replace("n", " ")  
-    if not text_to_embed:  
-        log.warning("Text became empty after cleaning, cannot generate embedding.")  
-        return None
+class EmbeddingCache:
+    """Cache de embeddings por hash do conteúdo: LRU em memória + Redis opcional (EMBEDDING_CACHE_REDIS)."""
+
+    def __init__(self, max_size: int, use_redis: bool, ttl_seconds: int):
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def _redis(self) -> Optional[redis.Redis]:
+        if not self.use_redis:
+            return None
+        try:
+            return get_redis_client_instance()
+        except RuntimeError:
+            return None # Redis indisponível: cache só em memória
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        missing = []
+        for key in keys:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+                found[key] = embedding
+            else:
+                missing.append(key)
+        metrics.incr("embedding_cache_hits", len(found), layer="memory")
+
+        redis_client = self._redis()
+        if missing and redis_client is not None:
+            try:
+                values = await redis_client.mget(missing)
+                redis_hits = 0
+                for key, value in zip(missing, values):
+                    if value:
+                        embedding = json.loads(value)
+                        self._remember(key, embedding)
+                        found[key] = embedding
+                        redis_hits += 1
+                metrics.incr("embedding_cache_hits", redis_hits, layer="redis")
+            except Exception as e:
+                logger.warning(f"[Embedding Service] Redis cache read failed: {e}")
+        metrics.incr("embedding_cache_misses", len(keys) - len(found))
+        return found
+
+    async def set_many(self, items: Dict[str, List[float]]) -> None:
+        for key, embedding in items.items():
+            self._remember(key, embedding)
+        redis_client = self._redis()
+        if items and redis_client is not None:
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for key, embedding in items.items():
+                        pipe.set(key, json.dumps(embedding), ex=self.ttl_seconds)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"[Embedding Service] Redis cache write failed: {e}")
 
-    # TODO: Adicionar truncamento baseado em tokens se necessário para o modelo  
-    # Ex: max_tokens = 8191 para text-embedding-ada-002  
-    # Precisa de uma biblioteca de tokenização (como tiktoken) para fazer isso corretamente.  
-    # if len(text_to_embed) > 8000 * 4: # Estimativa grosseira  
-    #     log.warning(f"Input text truncated for embedding (length: {len(text_to_embed)})")  
-    #     text_to_embed = text_to_embed[:32000] # Limite arbitrário
+class _EmbeddingBatcher:
+    """
+    Agrupa pedidos de embedding feitos dentro de uma janela curta (EMBEDDING_BATCH_WINDOW_MS) em uma
+    única chamada à API, respeitando limites de itens e tokens estimados. Textos idênticos em voo
+    compartilham o mesmo future.
+    """
 
+    def __init__(self, max_items: int, max_tokens: int, window_seconds: float):
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.window_seconds = window_seconds
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {} # cache_key -> (texto, future) do próximo lote
+        self._inflight: Dict[str, asyncio.Future] = {} # cache_key -> future (pendente ou já enviado)
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks: Set[asyncio.Task] = set() # Referência forte até o lote terminar
+
+    def submit(self, key: str, text: str) -> asyncio.Future:
+        in_flight = self._inflight.get(key)
+        if in_flight is not None:
+            metrics.incr("embedding_inflight_dedup")
+            return in_flight
+        tokens = _estimate_tokens(text)
+        if self._pending and self._pending_tokens + tokens > self.max_tokens:
+            self._flush()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        self._inflight[key] = future
+        self._pending[key] = (text, future)
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_tokens = self._pending, {}, 0
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run(self, batch: Dict[str, Tuple[str, asyncio.Future]]) -> None:
+        keys = list(batch)
+        texts = [batch[key][0] for key in keys]
+        log = logger.bind(trace_id=trace_id_var.get(), service="EmbeddingService", batch_size=len(texts))
+        metrics.observe("embedding_batch_size", len(texts))
+        metrics.incr("embedding_api_requests")
+        try:
+            embeddings = await _request_embeddings(texts, log)
+        except Exception as e:
+            for key in keys:
+                future = batch[key][1]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if embeddings is not None:
+            await _embedding_cache.set_many({key: emb for key, emb in zip(keys, embeddings)})
+        for index, key in enumerate(keys):
+            future = batch[key][1]
+            if not future.done():
+                future.set_result(embeddings[index] if embeddings is not None else None)
+
+async def _request_embeddings(texts: List[str], log) -> Optional[List[List[float]]]:
+    """Uma chamada à API para o lote. None em erro da OpenAI; ValueError em dimensão inválida."""
+    aclient_embedding = get_embedding_client()
     model_to_use = settings.EMBEDDING_MODEL  
     expected_dimensions = settings.EMBEDDING_DIMENSIONS  
-    log.info(f"Generating embedding (model: {model_to_use}, expected_dims: {expected_dimensions}, text_len: {len(text_to_embed)})")  
-    log.trace(f"Text start: '{text_to_embed[:80]}...'")
+    log.info(f"Generating embeddings (model: {model_to_use}, expected_dims: {expected_dimensions}, batch: {len(texts)})")
 
     try:  
         # Construir argumentos da API  
-        embedding_args = {"input": [text_to_embed], "model": model_to_use}  
+        embedding_args = {"input": texts, "model": model_to_use}  
         # Adicionar 'dimensions' SOMENTE se for um modelo V3 e quiser reduzir  
         # if settings.REQUESTED_EMBEDDING_DIMENSIONS and model_to_use.startswith("text-embedding-3"):  
         #    embedding_args["dimensions"] = settings.REQUESTED_EMBEDDING_DIMENSIONS  
@@ -71,32 +211,91 @@ async def generate_embedding(text: str) -> Optional[List[float]]:
         # Chamar API  
         response = await aclient_embedding.embeddings.create(**embedding_args)
 
-        # Validar resposta  
-        if not response.data or not response.data[0].embedding:  
-            log.error("OpenAI embedding response missing data or embedding vector.")  
+        # Validar resposta (a API devolve um item por input, com o índice original)
+        if not response.data or len(response.data) != len(texts):
+            log.error("OpenAI embedding response missing data or embedding vectors.")
             return None
-
-        embedding = response.data[0].embedding  
-        actual_dimensions = len(embedding)
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
         # Validação CRÍTICA da Dimensão  
-        if actual_dimensions != expected_dimensions:  
-             log.critical(f"CRITICAL EMBEDDING DIMENSION MISMATCH! Model '{model_to_use}' returned {actual_dimensions} dimensions, but system/DB is configured for {expected_dimensions}. Cannot use embedding.")  
-             # Levantar erro aqui é importante para evitar salvar dados inválidos  
-             raise ValueError(f"Embedding dimension mismatch: Expected {expected_dimensions}, got {actual_dimensions}")
+        for embedding in embeddings:
+            actual_dimensions = len(embedding)
+            if actual_dimensions != expected_dimensions:  
+                log.critical(f"CRITICAL EMBEDDING DIMENSION MISMATCH! Model '{model_to_use}' returned {actual_dimensions} dimensions, but system/DB is configured for {expected_dimensions}. Cannot use embedding.")  
+                # Levantar erro aqui é importante para evitar salvar dados inválidos  
+                raise ValueError(f"Embedding dimension mismatch: Expected {expected_dimensions}, got {actual_dimensions}")
 
-        log.success(f"Embedding generated successfully. Dimension: {actual_dimensions}")  
-        return embedding
+        log.success(f"Embeddings generated successfully. Count: {len(embeddings)}")
+        return embeddings
 
     except OpenAIError as e:  
         # Logar detalhes do erro da API OpenAI  
-        log.error(f"OpenAI API error during embedding: Status={e.status_code} Msg='{getattr(e, 'message', str(e))}' Type={getattr(e, 'type', 'Unknown')}", exc_info=True)  
-        # Levantar erro para indicar falha na geração? Ou retornar None? Retornar None por enquanto.  
+        metrics.incr("embedding_api_errors")
+        log.error(f"OpenAI API error during embedding: Status={getattr(e, 'status_code', None)} Msg='{getattr(e, 'message', str(e))}' Type={getattr(e, 'type', 'Unknown')}", exc_info=True)
         return None  
-    except ValueError as ve: # Capturar erro de dimensão  
-        # Já logado, apenas re-propagar ou retornar None? Re-propagar é mais claro.  
-        raise ve  
+    except ValueError:
+        raise
     except Exception as e:  
-        log.exception(f"Unexpected error generating embedding: {e}")  
-        # Levantar erro genérico? Ou retornar None? Retornar None.  
+        metrics.incr("embedding_api_errors")
+        log.exception(f"Unexpected error generating embeddings: {e}")
         return None
+
+_embedding_cache = EmbeddingCache(
+    max_size=settings.EMBEDDING_CACHE_SIZE,
+    use_redis=settings.EMBEDDING_CACHE_REDIS,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS
+)
+# Um batcher por event loop (workers Celery criam loops diferentes)
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _EmbeddingBatcher]" = weakref.WeakKeyDictionary()
+
+def _get_batcher() -> _EmbeddingBatcher:
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = _EmbeddingBatcher(
+            max_items=settings.EMBEDDING_BATCH_MAX_ITEMS,
+            max_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+            window_seconds=settings.EMBEDDING_BATCH_WINDOW_MS / 1000
+        )
+    return batcher
+
+async def generate_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Gera embeddings para vários textos (mesma ordem da entrada; None para textos vazios/inválidos
+    ou falha da API). Consulta o cache por hash do conteúdo; os textos restantes entram no
+    micro-batcher, que junta chamadas concorrentes em uma única requisição à API.
+    """
+    log = logger.bind(trace_id=trace_id_var.get(), service="EmbeddingService")
+    if not get_embedding_client():
+        log.error("OpenAI client for embeddings is unavailable.")  
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Embedding service client not configured.")
+
+    model, dimensions = settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS
+    cleaned = [_clean_text(text) for text in texts]
+    keys = [_cache_key(model, dimensions, text) if text else None for text in cleaned]
+    text_by_key = {key: text for key, text in zip(keys, cleaned) if key}
+    if any(text is None for text in cleaned):
+        log.warning("generate_embeddings called with invalid or empty input text(s); returning None for them.")
+
+    unique_keys = list(dict.fromkeys(key for key in keys if key))
+    cached = await _embedding_cache.get_many(unique_keys)
+    batcher = _get_batcher()
+    futures = {
+        key: batcher.submit(key, text_by_key[key])
+        for key in unique_keys if key not in cached
+    }
+    if futures:
+        log.debug(f"Embeddings: {len(cached)} cached, {len(futures)} queued for the API.")
+        # Futures são compartilhados entre chamadas concorrentes (mesmo texto em voo): shield impede que
+        # o cancelamento deste chamador cancele o future dos demais
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        cached.update({key: emb for key, emb in zip(futures, results) if emb is not None})
+    return [cached.get(key) if key else None for key in keys]
+
+async def generate_embedding(text: str) -> Optional[List[float]]:  
+    """  
+    Gera um vetor de embedding para o texto usando o modelo configurado.  
+    Valida a dimensão do vetor retornado contra as settings.  
+    Usa o mesmo caminho em lote/cache de generate_embeddings.
+    """  
+    return (await generate_embeddings([text]))[0]
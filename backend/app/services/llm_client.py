@@ -2,24 +2,34 @@
 
 import httpx  
 import json  
-from typing import List, Dict, Any, Optional, Union, AsyncGenerator  
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Union, AsyncGenerator, Tuple, Callable, Awaitable
+import numpy as np
 from loguru import logger  
 from functools import lru_cache  
 import asyncio # Para sleep no fallback  
 import traceback # Para log detalhado
+from abc import ABC, abstractmethod
+from datetime import datetime
+from fastapi import HTTPException
 
 from app.core.config import settings  
+from app.core.metrics import metrics
+from app.services.llm_resilience import LimiterTimeout, Outcome, classify_status, get_provider_guard
+from app.services.token_budget import fit_messages, truncate_text
 # Importar modelos Pydantic para validação e tipagem  
-from app.modules.gateway.models import (  
+from app.models.gateway import (  
     LLMResponse, LLMError, LLMResponseMessage,  
-    LLMToolCall, LLMResponseChoice, OpenAIMessage  
+    LLMToolCall, LLMToolCallFunction, LLMResponseChoice, LLMStreamChunk, OpenAIMessage  
 )  
 # Importar tipos Gemini se o fallback for implementado  
 # from google.generativeai.types import Content, Part, GenerateContentResponse, GenerationConfig, SafetySetting  
 # from google.generativeai import GenerativeModel, configure as configure_google_ai, Types Pydantic
 
 # --- Constantes ---  
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"  
+OPENAI_API_URL = f"{settings.OPENAI_API_BASE_URL.rstrip('/')}/chat/completions"  
 # Adicionar URL do Gemini se/quando implementado  
 # GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.GEMINI_MODEL or 'gemini-pro'}:generateContent?key={settings.GEMINI_API_KEY}"
 
@@ -40,6 +50,84 @@ class BaseLLMClient(ABC):
     ) -> LLMResponse:  
         pass
 
+    async def stream_completion(  
+        self,  
+        messages: List[OpenAIMessage],  
+        model: str,  
+        tools: Optional[List[Dict[str, Any]]] = None,  
+        tool_choice: str | Dict = "auto",  
+        temperature: float = 0.7,  
+        max_tokens: int = 1500,  
+    ) -> AsyncGenerator[LLMStreamChunk, None]:  
+        """Fallback para providers sem streaming: emite a resposta completa como um único delta + done."""  
+        response = await self.get_completion(messages, model, tools, tool_choice, temperature, max_tokens)  
+        if response.error:  
+            yield LLMStreamChunk(type="error", error=response.error)  
+            return  
+        message = response.choices[0].message if response.choices else None  
+        if message and message.content:  
+            yield LLMStreamChunk(type="content", content=message.content)  
+        for index, tool_call in enumerate((message.tool_calls if message else None) or []):  
+            yield LLMStreamChunk(type="tool_call", tool_call_index=index, tool_call=tool_call)  
+        yield LLMStreamChunk(type="done", finish_reason=response.choices[0].finish_reason if response.choices else None, response=response)
+
+# --- Montagem incremental do stream SSE ---  
+class _StreamAssembler:  
+    """  
+    Acumula os `delta` de um stream Chat Completions (choice 0) numa LLMResponse.  
+    Tool calls chegam fragmentadas por `index`: o primeiro fragmento traz id/nome, os seguintes  
+    apenas pedaços de `arguments` (string JSON), concatenados aqui na ordem de chegada.  
+    """
+
+    def __init__(self, model: str):  
+        self.id = ""  
+        self.created = 0  
+        self.model = model  
+        self.content_parts: List[str] = []  
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}  
+        self.finish_reason: Optional[str] = None  
+        self.usage: Optional[Dict[str, int]] = None
+
+    def feed(self, event: Dict[str, Any]) -> List[LLMStreamChunk]:  
+        """Processa um evento `chat.completion.chunk` e retorna os deltas a repassar."""  
+        self.id = event.get("id") or self.id  
+        self.created = event.get("created") or self.created  
+        self.model = event.get("model") or self.model  
+        if event.get("usage"):  
+            self.usage = event["usage"] # Último evento com stream_options.include_usage (choices vazio)  
+        chunks: List[LLMStreamChunk] = []  
+        for choice in event.get("choices") or []:  
+            if choice.get("index", 0) != 0:  
+                continue # Só pedimos n=1  
+            delta = choice.get("delta") or {}  
+            if delta.get("content"):  
+                self.content_parts.append(delta["content"])  
+                chunks.append(LLMStreamChunk(type="content", content=delta["content"]))  
+            for fragment in delta.get("tool_calls") or []:  
+                index = fragment.get("index", 0)  
+                state = self.tool_calls.setdefault(index, {"id": "", "name": "", "arguments": []})  
+                function = fragment.get("function") or {}  
+                state["id"] = fragment.get("id") or state["id"]  
+                state["name"] = function.get("name") or state["name"]  
+                if function.get("arguments"):  
+                    state["arguments"].append(function["arguments"])  
+                chunks.append(LLMStreamChunk(type="tool_call", tool_call_index=index, tool_call=self._tool_call(state)))  
+            if choice.get("finish_reason"):  
+                self.finish_reason = choice["finish_reason"]  
+        return chunks
+
+    @staticmethod  
+    def _tool_call(state: Dict[str, Any]) -> LLMToolCall:  
+        return LLMToolCall(id=state["id"], function=LLMToolCallFunction(name=state["name"], arguments="".join(state["arguments"])))
+
+    def response(self) -> LLMResponse:  
+        tool_calls = [self._tool_call(self.tool_calls[i]) for i in sorted(self.tool_calls)] or None  
+        message = LLMResponseMessage(role="assistant", content="".join(self.content_parts) or None, tool_calls=tool_calls)  
+        return LLMResponse(  
+            id=self.id or "stream", object="chat.completion", created=self.created, model=self.model,  
+            choices=[LLMResponseChoice(index=0, message=message, finish_reason=self.finish_reason)], usage=self.usage  
+        )
+
 # --- Cliente OpenAI ---  
 class OpenAIClient(BaseLLMClient):  
     provider_name = "OpenAI"
@@ -74,9 +162,15 @@ class OpenAIClient(BaseLLMClient):
         tool_choice: str | Dict = "auto",  
         temperature: float = 0.7,  
         max_tokens: int = 1500,  
-        stream: bool = False # Não implementado ainda  
+        stream: bool = False # True: usa stream_completion e retorna a resposta montada  
     ) -> LLMResponse:  
         """Chama a API Chat Completion da OpenAI."""  
+        if stream and self.aclient:  
+            async for chunk in self.stream_completion(messages, model, tools, tool_choice, temperature, max_tokens):  
+                if chunk.type == "done":  
+                    return chunk.response  
+                if chunk.type == "error":  
+                    return LLMResponse(id="error-stream", object="error", created=0, model=model, choices=[], error=chunk.error)  
         if not self.aclient or not self.headers:  
              logger.error("OpenAI Client not initialized (missing API key).")  
              return LLMResponse(id="error-no-init", object="error", created=0, model=model, choices=[], error=LLMError(message="OpenAI client not initialized."))
@@ -90,12 +184,9 @@ class OpenAIClient(BaseLLMClient):
         if tools:  
             payload["tools"] = tools  
             payload["tool_choice"] = tool_choice  
-        if stream:  
-            payload["stream"] = True  
-            logger.warning("Streaming requested but not fully implemented in this client version.")
 
         log = logger.bind(service="LLMClient", provider=self.provider_name, model=model)  
-        log.info(f"Sending request to OpenAI Chat Completion (Stream={stream})...")  
+        log.info("Sending request to OpenAI Chat Completion...")  
         # Logar apenas início do prompt do usuário para evitar PII excessivo  
         if messages: log.debug(f"User Prompt Start: '{messages[-1].get('content', '')[:80]}...'")  
         # log.trace(f"Full Payload (excluding messages): { {k:v for k,v in payload.items() if k != 'messages'} }")
@@ -137,7 +228,7 @@ class OpenAIClient(BaseLLMClient):
         except httpx.HTTPStatusError as http_err:  
             error_body_text = http_err.response.text[:500]  
             log.error(f"HTTP Error {http_err.response.status_code} from OpenAI: {error_body_text}")  
-            error_details = {"message": f"HTTP error {http_err.response.status_code} from OpenAI"}  
+            error_details = {"message": f"HTTP error {http_err.response.status_code} from OpenAI", "status_code": http_err.response.status_code}  
             try: error_details.update(http_err.response.json().get("error", {}))  
             except Exception: pass # Ignorar se corpo do erro não for JSON  
             return LLMResponse(id="error-http", object="error", created=int(request_time.timestamp()), model=model, choices=[], error=LLMError.model_validate(error_details))  
@@ -151,14 +242,259 @@ class OpenAIClient(BaseLLMClient):
              log.exception(f"Unexpected error in OpenAI client during get_completion: {e}")  
              return LLMResponse(id="error-unexpected", object="error", created=int(request_time.timestamp()), model=model, choices=[], error=LLMError(message=f"Unexpected error in OpenAI client: {e}"))
 
+    async def stream_completion(  
+        self,  
+        messages: List[OpenAIMessage],  
+        model: str,  
+        tools: Optional[List[Dict[str, Any]]] = None,  
+        tool_choice: str | Dict = "auto",  
+        temperature: float = 0.7,  
+        max_tokens: int = 1500,  
+    ) -> AsyncGenerator[LLMStreamChunk, None]:  
+        """  
+        Chat Completion com `stream=True` (SSE) sobre o mesmo cliente HTTPX pooled.  
+        Gera deltas de texto e de tool calls conforme chegam e termina com um chunk `done`  
+        (resposta completa montada) ou `error`. Erros não são levantados, viram chunk `error`.  
+        """  
+        if not self.aclient or not self.headers:  
+            yield LLMStreamChunk(type="error", error=LLMError(message="OpenAI client not initialized."))  
+            return
+
+        payload = {  
+            "model": model,  
+            "messages": messages,  
+            "temperature": temperature,  
+            "max_tokens": max_tokens,  
+            "stream": True,  
+            "stream_options": {"include_usage": True},  
+        }  
+        if tools:  
+            payload["tools"] = tools  
+            payload["tool_choice"] = tool_choice
+
+        log = logger.bind(service="LLMClient", provider=self.provider_name, model=model)  
+        log.info("Sending streaming request to OpenAI Chat Completion...")  
+        assembler = _StreamAssembler(model)  
+        request_time = datetime.utcnow()  
+        first_token_at: Optional[datetime] = None  
+        try:  
+            async with self.aclient.stream("POST", OPENAI_API_URL, headers=self.headers, json=payload) as response:  
+                if response.status_code >= 400:  
+                    body = await response.aread()  
+                    log.error(f"HTTP Error {response.status_code} from OpenAI stream: {body[:500]!r}")  
+                    error_details = {"message": f"HTTP error {response.status_code} from OpenAI", "status_code": response.status_code}  
+                    try: error_details.update(json.loads(body).get("error") or {})  
+                    except Exception: pass  
+                    yield LLMStreamChunk(type="error", error=LLMError.model_validate(error_details))  
+                    return
+
+                async for line in response.aiter_lines():  
+                    if not line.startswith("data:"):  
+                        continue # Linhas vazias (separador de eventos), comentários ": ..." e campos não usados  
+                    data = line[5:].strip()  
+                    if data == "[DONE]":  
+                        break  
+                    event = json.loads(data)  
+                    if event.get("error"):  
+                        yield LLMStreamChunk(type="error", error=LLMError.model_validate(event["error"]))  
+                        return  
+                    for chunk in assembler.feed(event):  
+                        if first_token_at is None:  
+                            first_token_at = datetime.utcnow()  
+                            log.debug(f"OpenAI stream first delta after {(first_token_at - request_time).total_seconds():.3f}s")  
+                        yield chunk
+        except httpx.TimeoutException:  
+            log.error(f"Timeout error during OpenAI stream after {self.aclient.timeout.read}s.")  
+            yield LLMStreamChunk(type="error", error=LLMError(message="Request to OpenAI API timed out."))  
+            return  
+        except httpx.RequestError as req_err:  
+            log.error(f"Network/Request error during OpenAI stream: {req_err}")  
+            yield LLMStreamChunk(type="error", error=LLMError(message=f"Network/Request error calling OpenAI: {req_err}"))  
+            return  
+        except json.JSONDecodeError as parse_err:  
+            log.error(f"Invalid SSE data from OpenAI stream: {parse_err}")  
+            yield LLMStreamChunk(type="error", error=LLMError(message=f"Failed to parse OpenAI stream event: {parse_err}"))  
+            return
+        except Exception as e:  
+            # Qualquer outra falha (evento inesperado, erro de validação...) também vira chunk `error`
+            log.exception(f"Unexpected error during OpenAI stream: {e}")  
+            yield LLMStreamChunk(type="error", error=LLMError(message="Unexpected error while streaming from OpenAI."))  
+            return
+
+        llm_response = assembler.response()  
+        duration = (datetime.utcnow() - request_time).total_seconds()  
+        log.info(f"OpenAI stream finished in {duration:.3f}s. Finish Reason: {assembler.finish_reason or 'N/A'}")  
+        yield LLMStreamChunk(type="done", finish_reason=assembler.finish_reason, response=llm_response)
+
 # --- Cliente Gemini (Exemplo - Placeholder/Não Implementado) ---  
 class GeminiClient(BaseLLMClient):  
      provider_name = "Gemini"  
      # ... (Implementação similar usando google.generativeai ou httpx) ...  
-     async def get_completion(self, ...) -> LLMResponse:  
+     async def get_completion(self, messages: List[OpenAIMessage], model: str, *args: Any, **kwargs: Any) -> LLMResponse:  
          logger.error("GeminiClient get_completion not implemented yet.")  
          return LLMResponse(id="error-not-impl", object="error", created=0, model="gemini", choices=[], error=LLMError(message="Gemini client not implemented"))
 
+# --- Cache de Respostas (exato + semântico) ---  
+LLM_CACHE_KEY_PREFIX = "llmcache:"
+
+def _normalize_messages(messages: List[OpenAIMessage]) -> List[Dict[str, Any]]:  
+    """Normaliza mensagens para a chave exata: só campos relevantes e whitespace colapsado no texto."""  
+    normalized = []  
+    for message in messages:  
+        content = message.get("content")  
+        if isinstance(content, str):  
+            content = " ".join(content.split())  
+        item = {"role": message.get("role"), "content": content}  
+        for field in ("name", "tool_call_id", "tool_calls"):  
+            if message.get(field) is not None:  
+                item[field] = message[field]  
+        normalized.append(item)  
+    return normalized
+
+def _hash_request(payload: Dict[str, Any]) -> str:  
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+class LLMResponseCache:  
+    """  
+    Cache de LLMResponse para requests repetitivos (templates do AutoResponder, classificação de intenção).
+
+    - Exato: chave = hash(mensagens normalizadas, modelo, tools, tool_choice, temperature, max_tokens);  
+      backend "memory" (LRU + TTL por processo) ou "redis" (SET EX, compartilhado entre workers).  
+    - Semântico (opcional): dentro do mesmo "escopo" (request sem a última mensagem do usuário), reutiliza  
+      a resposta de um prompt cujo embedding tenha cosseno >= semantic_threshold. O índice de embeddings  
+      é local ao processo e aponta para as chaves exatas.  
+    Só respostas sem erro são gravadas; temperature > max_temperature ignora o cache (respostas variáveis).  
+    """
+
+    def __init__(self, backend: str, max_size: int, ttl_seconds: int, max_temperature: float, semantic_threshold: float):  
+        self.backend = backend  
+        self.max_size = max_size  
+        self.ttl_seconds = ttl_seconds  
+        self.max_temperature = max_temperature  
+        self.semantic_threshold = semantic_threshold  
+        self._lru: "OrderedDict[str, Tuple[float, str]]" = OrderedDict() # key -> (expira_em, LLMResponse JSON)  
+        self._semantic: "OrderedDict[str, Tuple[float, str, str, np.ndarray]]" = OrderedDict() # key -> (expira_em, escopo, key, vetor)
+
+    def is_cacheable(self, temperature: float) -> bool:  
+        return temperature <= self.max_temperature
+
+    @staticmethod  
+    def build_keys(messages: List[OpenAIMessage], model: str, tools: Optional[List[Dict[str, Any]]], tool_choice: str | Dict, temperature: float, max_tokens: int) -> Tuple[str, str, Optional[str]]:  
+        """Retorna (chave exata, escopo semântico, texto da última mensagem do usuário ou None)."""  
+        normalized = _normalize_messages(messages)  
+        params = {"model": model, "tools": tools, "tool_choice": tool_choice if tools else None, "temperature": temperature, "max_tokens": max_tokens}  
+        exact_key = LLM_CACHE_KEY_PREFIX + _hash_request({**params, "messages": normalized})  
+        last = normalized[-1] if normalized else None  
+        if last and last["role"] == "user" and isinstance(last["content"], str) and last["content"]:  
+            return exact_key, _hash_request({**params, "messages": normalized[:-1]}), last["content"]  
+        return exact_key, "", None
+
+    def _redis(self):  
+        if self.backend != "redis":  
+            return None  
+        try:  
+            from app.core.database import get_redis_client_instance  
+            return get_redis_client_instance()  
+        except RuntimeError:  
+            return None # Redis indisponível: só memória
+
+    async def _get_raw(self, key: str) -> Optional[str]:  
+        entry = self._lru.get(key)  
+        if entry is not None:  
+            if entry[0] > time.monotonic():  
+                self._lru.move_to_end(key)  
+                return entry[1]  
+            del self._lru[key]  
+        redis_client = self._redis()  
+        if redis_client is not None:  
+            try:  
+                value = await redis_client.get(key)  
+            except Exception as e:  
+                logger.warning(f"[LLM Cache] Redis read failed: {e}")  
+                return None  
+            if value:  
+                value = value.decode("utf-8") if isinstance(value, bytes) else value  
+                self._remember(key, value)  
+                return value  
+        return None
+
+    def _remember(self, key: str, raw: str) -> None:  
+        self._lru[key] = (time.monotonic() + self.ttl_seconds, raw)  
+        self._lru.move_to_end(key)  
+        while len(self._lru) > self.max_size:  
+            self._lru.popitem(last=False)
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:  
+        from app.services.embedding_service import generate_embedding # Lazy: batching + cache de embeddings  
+        embedding = await generate_embedding(text)  
+        if not embedding:  
+            return None  
+        vector = np.asarray(embedding, dtype=np.float32)  
+        norm = float(np.linalg.norm(vector))  
+        return vector / norm if norm else None
+
+    async def get(self, exact_key: str, scope: str, prompt: Optional[str]) -> Optional[LLMResponse]:  
+        raw = await self._get_raw(exact_key)  
+        if raw is not None:  
+            metrics.incr("llm_cache_hits", tier="exact")  
+            return LLMResponse.model_validate_json(raw)  
+        if self.semantic_threshold > 0 and prompt:  
+            match_key = await self._semantic_lookup(scope, prompt)  
+            raw = await self._get_raw(match_key) if match_key else None  
+            if raw is not None:  
+                metrics.incr("llm_cache_hits", tier="semantic")  
+                return LLMResponse.model_validate_json(raw)  
+        metrics.incr("llm_cache_misses")  
+        return None
+
+    async def _semantic_lookup(self, scope: str, prompt: str) -> Optional[str]:  
+        now = time.monotonic()  
+        candidates = [(key, vector) for key, (expires_at, entry_scope, _, vector) in self._semantic.items() if entry_scope == scope and expires_at > now]  
+        if not candidates:  
+            return None  
+        query = await self._embed(prompt)  
+        if query is None:  
+            return None  
+        similarities = np.stack([vector for _, vector in candidates]) @ query  
+        best = int(np.argmax(similarities))  
+        if similarities[best] < self.semantic_threshold:  
+            return None  
+        self._semantic.move_to_end(candidates[best][0])  
+        return candidates[best][0]
+
+    async def set(self, exact_key: str, scope: str, prompt: Optional[str], response: LLMResponse) -> None:  
+        raw = response.model_dump_json()  
+        self._remember(exact_key, raw)  
+        redis_client = self._redis()  
+        if redis_client is not None:  
+            try:  
+                await redis_client.set(exact_key, raw, ex=self.ttl_seconds)  
+            except Exception as e:  
+                logger.warning(f"[LLM Cache] Redis write failed: {e}")  
+        if self.semantic_threshold > 0 and prompt and exact_key not in self._semantic:  
+            vector = await self._embed(prompt)  
+            if vector is not None:  
+                self._semantic[exact_key] = (time.monotonic() + self.ttl_seconds, scope, exact_key, vector)  
+                while len(self._semantic) > self.max_size:  
+                    self._semantic.popitem(last=False)
+
+    def clear(self) -> None:  
+        self._lru.clear()  
+        self._semantic.clear()
+
+@lru_cache()  
+def get_llm_response_cache() -> Optional[LLMResponseCache]:  
+    """Instância do cache por processo (None se LLM_CACHE_ENABLED=False)."""  
+    if not settings.LLM_CACHE_ENABLED:  
+        return None  
+    return LLMResponseCache(  
+        backend=settings.LLM_CACHE_BACKEND,  
+        max_size=settings.LLM_CACHE_SIZE,  
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,  
+        max_temperature=settings.LLM_CACHE_MAX_TEMPERATURE,  
+        semantic_threshold=settings.LLM_CACHE_SEMANTIC_THRESHOLD  
+    )
+
 # --- Função Getter com Cache (Seleciona Cliente) ---  
 @lru_cache()  
 def get_llm_client_instance(provider: str = "openai") -> BaseLLMClient:  
@@ -186,17 +522,165 @@ def get_llm_client_instance(provider: str = "openai") -> BaseLLMClient:
         log.error(f"Provider LLM não suportado solicitado: '{provider}'")  
         raise ValueError(f"Unsupported LLM provider: {provider}")
 
+# --- Chamadas protegidas (limiter AIMD + circuit breaker + hedging) ---  
+def _error_response(response_id: str, model: str, message: str) -> LLMResponse:  
+    return LLMResponse(id=response_id, object="error", created=int(datetime.utcnow().timestamp()), model=model, choices=[], error=LLMError(message=message))
+
+def _is_usable(response: Optional[LLMResponse]) -> bool:  
+    return bool(response and not response.error and response.choices and (response.choices[0].message.content or response.choices[0].message.tool_calls))
+
+def _call_outcome(response: LLMResponse) -> Outcome:  
+    if not response.error:  
+        return "success"  
+    return classify_status(response.error.status_code, timed_out=response.id == "error-timeout")
+
+async def _guarded_completion(  
+     provider: str, client: BaseLLMClient, messages: List[OpenAIMessage], model: str,  
+     tools: Optional[List[Dict[str, Any]]], tool_choice: str | Dict, temperature: float, max_tokens: int  
+) -> LLMResponse:  
+     """get_completion com circuit breaker, vaga no limiter do provider e timeout total por chamada."""  
+     guard = get_provider_guard(provider)  
+     if not guard.breaker.allow():  
+          return _error_response("error-circuit-open", model, f"Provider '{provider}' is failing (circuit open); skipped.")  
+     outcome: Outcome = "ignored"  
+     try:  
+          async with guard.limiter.slot(settings.LLM_LIMITER_QUEUE_TIMEOUT_SECONDS) as slot:  
+               started = time.monotonic()  
+               try:  
+                    result = await asyncio.wait_for(  
+                         client.get_completion(messages=messages, model=model, tools=tools, tool_choice=tool_choice, temperature=temperature, max_tokens=max_tokens),  
+                         settings.LLM_CALL_TIMEOUT_SECONDS  
+                    )  
+               except asyncio.TimeoutError:  
+                    result = _error_response("error-timeout", model, f"{provider} did not answer within {settings.LLM_CALL_TIMEOUT_SECONDS}s.")  
+               elapsed = time.monotonic() - started  
+               outcome = slot.outcome = _call_outcome(result)  
+     except LimiterTimeout as e:  
+          return _error_response("error-overloaded", model, str(e))  
+     except asyncio.CancelledError: # Perdedor de um hedged request: não conta como falha do provider  
+          raise  
+     except Exception:  
+          outcome = "failure"  
+          raise  
+     finally:  
+          guard.breaker.record(outcome)  
+     if outcome == "success":  
+          guard.latency.observe(elapsed)  
+          metrics.observe("llm_latency_seconds", elapsed, provider=provider)  
+     else:  
+          metrics.incr("llm_call_errors", provider=provider, outcome=outcome)  
+     return result
+
+async def _hedged_completion(  
+     primary_call: Callable[[], Awaitable[LLMResponse]],  
+     hedge_call: Callable[[], Awaitable[Optional[LLMResponse]]],  
+     delay_seconds: float  
+) -> LLMResponse:  
+     """Dispara o hedge se o primário não terminar em `delay_seconds`; a primeira resposta utilizável vence."""  
+     primary = asyncio.ensure_future(primary_call())  
+     hedge: Optional[asyncio.Future] = None  
+     fallback_result: Optional[LLMResponse] = None  
+     try:  
+          done, _ = await asyncio.wait({primary}, timeout=delay_seconds)  
+          if done:  
+               return primary.result()  
+          hedge = asyncio.ensure_future(hedge_call())  
+          pending = {primary, hedge}  
+          while pending:  
+               done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)  
+               for task in done:  
+                    # cancelled() antes de exception(): exception() levanta CancelledError em task cancelada  
+                    candidate = None if task.cancelled() or task.exception() else task.result()  
+                    if _is_usable(candidate):  
+                         metrics.incr("llm_hedge_wins", winner="hedge" if task is hedge else "primary")  
+                         return candidate  
+                    if candidate is not None and (task is primary or fallback_result is None):
+                         fallback_result = candidate # Resposta com erro/vazia: a do primário tem preferência
+          if fallback_result is not None:
+               return fallback_result
+          # Nenhuma resposta: propaga o erro do primário (se houver) sem cair em CancelledError de task cancelada
+          if not primary.cancelled() and primary.exception() is not None:
+               raise primary.exception()
+          raise RuntimeError("Hedged LLM call produced no response.")
+     finally:  
+          for task in (primary, hedge):  
+               if task is not None and not task.done():  
+                    task.cancel()
+
+def _hedge_call_factory(  
+     primary_provider: str, primary_client: BaseLLMClient, primary_model: str,  
+     secondary_provider: Optional[str], use_fallback: bool,  
+     messages: List[OpenAIMessage], tools: Optional[List[Dict[str, Any]]], tool_choice: str | Dict, temperature: float, max_tokens: int  
+) -> Optional[Callable[[], Awaitable[Optional[LLMResponse]]]]:
+     """
+     Alvo do hedge: secundário distinto com interface OpenAI. Sem ele retorna None (sem hedge), a não ser que
+     LLM_HEDGE_SAME_PROVIDER permita uma segunda chamada ao primário (o "gemini" padrão nunca é alvo do hedge).
+     """
+     provider, client, model = primary_provider, primary_client, primary_model
+     if use_fallback and secondary_provider and secondary_provider not in ("gemini", primary_provider):
+          try:
+               provider, client, model = secondary_provider, get_llm_client_instance(secondary_provider), settings.GEMINI_MODEL or primary_model
+          except ValueError:
+               pass
+     if provider == primary_provider and not settings.LLM_HEDGE_SAME_PROVIDER:
+          logger.bind(service="LLMClientFallback").debug(f"No distinct hedge target for '{primary_provider}'; hedging disabled for this call.")
+          return None
+
+     async def hedge_call() -> Optional[LLMResponse]:  
+          guard = get_provider_guard(provider)  
+          # Nunca hedgear contra um provider degradado ou sem folga: só aumentaria a carga  
+          if guard.breaker.state != "closed" or not guard.limiter.has_capacity():  
+               metrics.incr("llm_hedge_skipped", provider=provider)  
+               return None  
+          metrics.incr("llm_hedged_requests", provider=provider)  
+          return await _guarded_completion(provider, client, messages, model, tools, tool_choice, temperature, max_tokens)  
+     return hedge_call
+
 # --- Função Principal com Fallback (Refinada) ---  
 async def get_completion_with_fallback(  
      messages: List[OpenAIMessage],  
      model: Optional[str] = None, # Modelo primário  
-     # ... outros parâmetros (tools, tool_choice, temp, max_tokens, stream) ...  
+     tools: Optional[List[Dict[str, Any]]] = None,  
+     tool_choice: str | Dict = "auto",  
+     temperature: float = 0.7,  
+     max_tokens: int = 1500,  
      primary_provider: str = "openai",  
      secondary_provider: Optional[str] = "gemini", # Definir fallback padrão ou None  
-     use_fallback: bool = True  
+     use_fallback: bool = True,  
+     use_cache: bool = True  
 ) -> LLMResponse:  
-     """Tenta o provedor primário, depois o secundário se configurado e habilitado."""  
+     """  
+     Tenta o provedor primário, depois o secundário se configurado e habilitado.  
+     Com `use_cache` (e LLM_CACHE_ENABLED), respostas bem-sucedidas são reutilizadas para requests  
+     iguais (ou semanticamente próximos) com temperature <= LLM_CACHE_MAX_TEMPERATURE.  
+     """  
      log = logger.bind(service="LLMClientFallback")  
+     # Cortar histórico antigo antes de tudo: evita erro de context length e a chave do cache reflete o prompt enviado  
+     messages = fit_messages(messages, model or settings.OPENAI_CHAT_MODEL, max_tokens)  
+     cache = get_llm_response_cache() if use_cache else None  
+     if cache is not None and not cache.is_cacheable(temperature):  
+          metrics.incr("llm_cache_bypass")  
+          cache = None  
+     if cache is not None:  
+          cache_keys = cache.build_keys(messages, model or settings.OPENAI_CHAT_MODEL, tools, tool_choice, temperature, max_tokens)  
+          try:  
+               cached = await cache.get(*cache_keys)  
+          except Exception as e: # Cache nunca deve derrubar a chamada  
+               log.warning(f"LLM cache lookup failed: {e}")  
+               cached = None  
+          if cached is not None:  
+               log.info("LLM response served from cache.")  
+               return cached  
+          result = await get_completion_with_fallback(  
+               messages, model, tools, tool_choice, temperature, max_tokens,  
+               primary_provider, secondary_provider, use_fallback, use_cache=False  
+          )  
+          if not result.error and result.choices and (result.choices[0].message.content or result.choices[0].message.tool_calls):  
+               try:  
+                    await cache.set(*cache_keys, result)  
+               except Exception as e:  
+                    log.warning(f"LLM cache store failed: {e}")  
+          return result  
      primary_client: Optional[BaseLLMClient] = None  
      result: Optional[LLMResponse] = None
 
@@ -210,7 +694,15 @@ async def get_completion_with_fallback(
      try:  
          primary_client = get_llm_client_instance(primary_provider)  
          log.info(f"Tentando LLM primário: {primary_provider} (Modelo: {primary_model})")  
-         result = await primary_client.get_completion(messages=messages, model=primary_model, ...) # Passar outros args  
+         primary_call = lambda: _guarded_completion(primary_provider, primary_client, messages, primary_model, tools, tool_choice, temperature, max_tokens)  
+         hedge_call = _hedge_call_factory(
+              primary_provider, primary_client, primary_model, secondary_provider, use_fallback, messages, tools, tool_choice, temperature, max_tokens
+         ) if settings.LLM_HEDGE_ENABLED else None
+         if hedge_call is not None:
+              hedge_delay = get_provider_guard(primary_provider).latency.percentile(settings.LLM_HEDGE_PERCENTILE)  
+              result = await _hedged_completion(primary_call, hedge_call, hedge_delay)  
+         else:  
+              result = await primary_call()  
          # Considerar erro se resposta for vazia ou bloqueada (sem choices/tools E sem erro explícito)  
          is_error_or_empty = result.error or not (result.choices and (result.choices[0].message.content or result.choices[0].message.tool_calls))  
          if is_error_or_empty:  
@@ -245,7 +737,7 @@ async def get_completion_with_fallback(
                  logger.error("Fallback para Gemini não implementado no llm_client.")  
                  raise NotImplementedError("Gemini fallback call not implemented")  
              else: # Assumindo interface OpenAI compatível  
-                 result_fallback = await secondary_client.get_completion(messages=messages, model=secondary_model, ...)
+                 result_fallback = await _guarded_completion(secondary_provider, secondary_client, messages, secondary_model, tools, tool_choice, temperature, max_tokens)
 
              is_fallback_error = result_fallback.error or not (result_fallback.choices and (result_fallback.choices[0].message.content or result_fallback.choices[0].message.tool_calls))  
              if is_fallback_error:  
@@ -269,7 +761,17 @@ async def get_completion_with_fallback(
      log.error(final_error_msg)  
      return LLMResponse(id="error-no-provider", object="error", created=int(datetime.utcnow().timestamp()), model="N/A", choices=[], error=LLMError(message=final_error_msg))
 
-# Importar ABC e abstractmethod se usar BaseLLMClient  
-from abc import ABC, abstractmethod  
-# Importar HTTPException se usado no getter  
-from fastapi import HTTPException
+# --- Resumo de histórico (para token_budget.fit_messages_with_summary) ---  
+async def summarize_history(messages: List[OpenAIMessage]) -> Optional[str]:  
+     """Resume mensagens antigas de uma conversa em poucas frases (temperature 0, cacheável)."""  
+     transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages if isinstance(m.get("content"), str) and m.get("content"))  
+     if not transcript:  
+          return None  
+     summary_messages = [  
+          {"role": "system", "content": "Resuma a conversa abaixo em poucas frases objetivas, mantendo fatos, pedidos, números e decisões. Responda apenas com o resumo."},  
+          {"role": "user", "content": truncate_text(transcript, settings.LLM_SUMMARY_INPUT_MAX_TOKENS)}  
+     ]  
+     result = await get_completion_with_fallback(summary_messages, temperature=0.0, max_tokens=settings.LLM_SUMMARY_MAX_TOKENS, use_fallback=False)  
+     if result.error or not result.choices or not result.choices[0].message.content:  
+          return None  
+     return result.choices[0].message.content.strip()
@@ -0,0 +1,215 @@
+# agentos_core/app/services/llm_resilience.py
+
+"""
+Proteções por provider LLM usadas por get_completion_with_fallback:
+
+- AdaptiveConcurrencyLimiter: limita chamadas em voo com AIMD (+1 por "janela" de sucessos,
+  corte multiplicativo em 429/5xx/timeout ou latência acima do alvo). Quem não consegue vaga em
+  LLM_LIMITER_QUEUE_TIMEOUT_SECONDS falha rápido (e cai no fallback) em vez de empilhar.
+- CircuitBreaker: após N falhas consecutivas o provider é pulado por LLM_BREAKER_RESET_SECONDS;
+  depois uma única chamada de teste (half-open) decide se fecha ou reabre.
+- LatencyTracker: janela das últimas latências bem-sucedidas; o p95 define o atraso dos hedged requests.
+"""
+
+import asyncio
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Literal, Optional
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+Outcome = Literal["success", "overload", "failure", "ignored"]
+
+class LimiterTimeout(Exception):
+    """Nenhuma vaga liberada no limiter dentro do tempo de espera."""
+
+class AdaptiveConcurrencyLimiter:
+    """Semáforo com limite AIMD. Não é thread-safe: uma instância por event loop."""
+
+    def __init__(self, name: str, initial_limit: int, min_limit: int, max_limit: int,
+                 latency_target_seconds: float, backoff_ratio: float = 0.5, decrease_cooldown_seconds: float = 1.0):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_seconds = latency_target_seconds
+        self.backoff_ratio = backoff_ratio
+        self.decrease_cooldown_seconds = decrease_cooldown_seconds
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self, timeout: float) -> None:
+        if self.has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout) # release() já contou a vaga para este waiter
+        except asyncio.TimeoutError:
+            metrics.incr("llm_limiter_rejected", provider=self.name)
+            raise LimiterTimeout(f"No concurrency slot for provider '{self.name}' within {timeout}s")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot() # Recebeu a vaga mas foi cancelado antes de usar
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def release(self, outcome: Outcome, latency_seconds: float) -> None:
+        if outcome == "overload" or (outcome == "success" and latency_seconds > self.latency_target_seconds):
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_cooldown_seconds: # Uma rajada de 429 conta como um corte
+                self._last_decrease = now
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                logger.bind(service="LLMLimiter", provider=self.name).warning(f"Concurrency limit decreased to {int(self.limit)} ({outcome}, {latency_seconds:.2f}s)")
+        elif outcome == "success":
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / max(self.limit, 1.0))
+        metrics.set_gauge("llm_concurrency_limit", int(self.limit), provider=self.name)
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self, timeout: float) -> AsyncIterator["_SlotResult"]:
+        await self.acquire(timeout)
+        result = _SlotResult()
+        started = time.monotonic()
+        try:
+            yield result
+        except BaseException:
+            self.release("failure" if result.outcome == "ignored" else result.outcome, time.monotonic() - started)
+            raise
+        self.release(result.outcome, time.monotonic() - started)
+
+@dataclass
+class _SlotResult:
+    outcome: Outcome = "ignored"
+
+class CircuitBreaker:
+    """closed -> (N falhas consecutivas) -> open -> (reset_seconds) -> half_open -> closed/open."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state: Literal["closed", "open", "half_open"] = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True # Só uma chamada de teste por vez
+            return True
+        metrics.incr("llm_breaker_short_circuits", provider=self.name)
+        return False
+
+    def record(self, outcome: Outcome) -> None:
+        if outcome == "ignored":
+            if self.state == "half_open":
+                self._probe_in_flight = False
+            return
+        if outcome == "success":
+            if self.state != "closed":
+                logger.bind(service="LLMBreaker", provider=self.name).info("Circuit closed (provider recovered).")
+            self.state = "closed"
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.bind(service="LLMBreaker", provider=self.name).warning(f"Circuit opened after {self.consecutive_failures} consecutive failures.")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        metrics.set_gauge("llm_breaker_open", 1 if self.state == "open" else 0, provider=self.name)
+
+class LatencyTracker:
+    def __init__(self, window: int, default_seconds: float, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.default_seconds = default_seconds
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        if len(self._samples) < self.min_samples:
+            return self.default_seconds
+        return float(np.percentile(np.fromiter(self._samples, dtype=np.float64), q))
+
+@dataclass
+class ProviderGuard:
+    name: str
+    breaker: CircuitBreaker
+    latency: LatencyTracker
+    _limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AdaptiveConcurrencyLimiter]" = field(default_factory=weakref.WeakKeyDictionary)
+
+    @property
+    def limiter(self) -> AdaptiveConcurrencyLimiter:
+        """Limiter do event loop atual (futures não podem atravessar loops, ex.: tasks Celery)."""
+        loop = asyncio.get_running_loop()
+        limiter = self._limiters.get(loop)
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(
+                self.name,
+                initial_limit=settings.LLM_LIMITER_INITIAL,
+                min_limit=settings.LLM_LIMITER_MIN,
+                max_limit=settings.LLM_LIMITER_MAX,
+                latency_target_seconds=settings.LLM_LIMITER_LATENCY_TARGET_SECONDS,
+            )
+            self._limiters[loop] = limiter
+        return limiter
+
+_guards: Dict[str, ProviderGuard] = {}
+
+def get_provider_guard(provider: str) -> ProviderGuard:
+    """Breaker e latências são do processo (valem entre loops); o limiter é por loop."""
+    provider = provider.lower()
+    guard = _guards.get(provider)
+    if guard is None:
+        guard = ProviderGuard(
+            name=provider,
+            breaker=CircuitBreaker(provider, settings.LLM_BREAKER_FAILURE_THRESHOLD, settings.LLM_BREAKER_RESET_SECONDS),
+            latency=LatencyTracker(window=500, default_seconds=settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS),
+        )
+        _guards[provider] = guard
+    return guard
+
+def reset_provider_guards() -> None:
+    _guards.clear()
+
+def classify_status(status_code: Optional[int], timed_out: bool = False) -> Outcome:
+    """429/5xx/timeout = sobrecarga do provider; outros 4xx são erro do request (não afetam a saúde)."""
+    if timed_out or status_code == 429 or (status_code is not None and status_code >= 500):
+        return "overload"
+    if status_code is not None and 400 <= status_code < 500:
+        return "ignored"
+    return "failure"
@@ -0,0 +1,207 @@
+# agentos_core/app/services/token_budget.py
+
+"""
+Contagem de tokens e orçamento de prompts.
+
+- count_tokens / count_message_tokens: BPE do tiktoken (encoding carregado uma vez por modelo,
+  contagens de textos repetidos — system prompts, templates, histórico — em LRU).
+  Sem tiktoken (ou sem o arquivo BPE) cai numa estimativa de ~4 caracteres/token.
+- truncate_text: corta um texto em N tokens (embeddings, mensagens de histórico).
+- fit_messages: descarta o histórico mais antigo (mantendo system e a última mensagem) até caber
+  em context_window(model) - max_completion_tokens; fit_messages_with_summary resume o que
+  foi descartado numa mensagem system curta em vez de só descartar.
+"""
+
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+try:
+    import tiktoken
+except ImportError: # Dependência declarada; fallback só para ambientes mínimos
+    tiktoken = None
+
+OpenAIMessage = Dict[str, Any]
+
+# Overhead por mensagem no formato chat (role/separadores) e priming da resposta, conforme o cookbook da OpenAI
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+REPLY_PRIMING_TOKENS = 3
+
+# Janela de contexto por prefixo de modelo (o prefixo mais longo que casar vence)
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "text-embedding": 8191,
+}
+
+@lru_cache(maxsize=32)
+def _get_encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base" if model.startswith(("gpt-4o", "gpt-4.1", "o1", "o3")) else "cl100k_base")
+    except Exception as e:
+        # O BPE é baixado no primeiro uso (pré-carregar em TIKTOKEN_CACHE_DIR na imagem para workers sem internet)
+        logger.bind(service="TokenBudget", model=model).warning(f"Tokenizer unavailable, using ~4 chars/token estimate: {e}")
+        return None
+
+@lru_cache(maxsize=8192)
+def _count_cached(model: str, text: str) -> int:
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens(text: Optional[str], model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    return _count_cached(model or settings.OPENAI_CHAT_MODEL, text)
+
+def context_window(model: str) -> int:
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return settings.LLM_DEFAULT_CONTEXT_TOKENS
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+def count_message_tokens(message: OpenAIMessage, model: Optional[str] = None) -> int:
+    tokens = TOKENS_PER_MESSAGE
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += count_tokens(content, model)
+    elif isinstance(content, list): # Conteúdo multipart: só as partes de texto contam aqui
+        tokens += sum(count_tokens(part.get("text"), model) for part in content if isinstance(part, dict))
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function") or {}
+        tokens += count_tokens(function.get("name"), model) + count_tokens(function.get("arguments"), model)
+    if message.get("name"):
+        tokens += TOKENS_PER_NAME
+    return tokens
+
+def count_messages_tokens(messages: List[OpenAIMessage], model: Optional[str] = None) -> int:
+    return sum(count_message_tokens(message, model) for message in messages) + REPLY_PRIMING_TOKENS
+
+def truncate_text(text: str, max_tokens: int, model: Optional[str] = None, marker: str = "…") -> str:
+    """Corta `text` para no máximo `max_tokens` tokens (incluindo o marcador)."""
+    model = model or settings.OPENAI_CHAT_MODEL
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max(0, (max_tokens - 1) * 4 - len(marker))] + marker # Inverso de len // 4 + 1
+    tokens = encoding.encode(text, disallowed_special=())
+    keep = max(0, max_tokens - len(encoding.encode(marker)))
+    return encoding.decode(tokens[:keep]) + marker
+
+def prompt_budget(model: str, max_completion_tokens: int) -> int:
+    """Tokens disponíveis para o prompt: janela do modelo - resposta - margem (limitado por LLM_MAX_PROMPT_TOKENS)."""
+    budget = context_window(model) - max_completion_tokens - settings.LLM_PROMPT_SAFETY_MARGIN_TOKENS
+    if settings.LLM_MAX_PROMPT_TOKENS:
+        budget = min(budget, settings.LLM_MAX_PROMPT_TOKENS)
+    return budget
+
+def _history_groups(messages: List[OpenAIMessage]) -> List[List[OpenAIMessage]]:
+    """Agrupa o assistant com tool_calls e as respostas `tool` seguintes (descartar só metade quebra a API)."""
+    groups: List[List[OpenAIMessage]] = []
+    for message in messages:
+        if message.get("role") == "tool" and groups and groups[-1][0].get("tool_calls"):
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+def _split_for_budget(messages: List[OpenAIMessage], model: str, budget: int):
+    """Retorna (system, histórico mantido, histórico descartado, última mensagem) para caber em `budget`."""
+    system = [m for m in messages[:-1] if m.get("role") == "system"]
+    history = [m for m in messages[:-1] if m.get("role") != "system"]
+    last = messages[-1]
+    used = count_messages_tokens(system + [last], model)
+    kept: List[List[OpenAIMessage]] = []
+    groups = _history_groups(history)
+    for index in range(len(groups) - 1, -1, -1): # Do mais recente para o mais antigo
+        group_tokens = sum(count_message_tokens(m, model) for m in groups[index])
+        if used + group_tokens > budget:
+            dropped = [m for group in groups[:index + 1] for m in group]
+            return system, [m for group in reversed(kept) for m in group], dropped, last
+        used += group_tokens
+        kept.append(groups[index])
+    return system, history, [], last
+
+def fit_messages(
+    messages: List[OpenAIMessage],
+    model: str,
+    max_completion_tokens: int,
+    budget: Optional[int] = None,
+) -> List[OpenAIMessage]:
+    """
+    Garante que o prompt caiba no orçamento: descarta histórico antigo e, em último caso, trunca a
+    última mensagem. Retorna a lista original quando já cabe (caminho comum, sem cópias).
+    """
+    if not messages:
+        return messages
+    budget = budget if budget is not None else prompt_budget(model, max_completion_tokens)
+    total = count_messages_tokens(messages, model)
+    metrics.observe("llm_prompt_tokens", total, model=model)
+    if total <= budget:
+        return messages
+
+    system, kept, dropped, last = _split_for_budget(messages, model, budget)
+    fitted = system + kept + [last]
+    overflow = count_messages_tokens(fitted, model) - budget
+    if overflow > 0 and isinstance(last.get("content"), str):
+        content_budget = count_tokens(last["content"], model) - overflow
+        fitted[-1] = {**last, "content": truncate_text(last["content"], content_budget, model)}
+    metrics.incr("llm_prompt_trimmed", model=model)
+    logger.bind(service="TokenBudget", model=model).warning(
+        f"Prompt over budget ({total} > {budget} tokens): dropped {len(dropped)} history message(s)"
+        f"{', truncated last message' if overflow > 0 else ''}."
+    )
+    return fitted
+
+Summarizer = Callable[[List[OpenAIMessage]], Awaitable[Optional[str]]]
+
+async def fit_messages_with_summary(
+    messages: List[OpenAIMessage],
+    model: str,
+    max_completion_tokens: int,
+    summarize: Summarizer,
+    budget: Optional[int] = None,
+) -> List[OpenAIMessage]:
+    """
+    Como fit_messages, mas o histórico descartado vira uma mensagem system com o resumo gerado por
+    `summarize` (limitado a LLM_SUMMARY_MAX_TOKENS). Se o resumo falhar, fica só o corte.
+    """
+    if not messages:
+        return messages
+    budget = budget if budget is not None else prompt_budget(model, max_completion_tokens)
+    if count_messages_tokens(messages, model) <= budget:
+        return messages
+    summary_budget = settings.LLM_SUMMARY_MAX_TOKENS + TOKENS_PER_MESSAGE
+    system, kept, dropped, last = _split_for_budget(messages, model, budget - summary_budget)
+    summary = None
+    if dropped:
+        try:
+            summary = await summarize(dropped)
+        except Exception as e:
+            logger.bind(service="TokenBudget", model=model).warning(f"History summarization failed, trimming only: {e}")
+    if not summary:
+        return fit_messages(messages, model, max_completion_tokens, budget)
+    summary_message = {"role": "system", "content": "Resumo da conversa anterior: " + truncate_text(summary, settings.LLM_SUMMARY_MAX_TOKENS, model)}
+    metrics.incr("llm_prompt_summarized", model=model)
+    return fit_messages(system + [summary_message] + kept + [last], model, max_completion_tokens, budget)
@@ -0,0 +1,208 @@
+# agentos_core/app/services/whatsapp_send_pipeline.py
+
+"""
+Pipeline de envio em lote do WhatsApp.
+
+Produtores só gravam a mensagem em `whatsapp_messages` com status `pending_queue`; o dreno
+(task whatsapp.drain_send_queue, disparada pelo beat) faz:
+
+1. devolve para a fila claims abandonados (`pending_send` há mais de WHATSAPP_SEND_CLAIM_LEASE_SECONDS)
+2. reivindica lotes (`pending_queue` -> `pending_send` com um claim id, sem corrida entre workers), até
+   MAX_BATCHES_IN_FLIGHT em paralelo; mensagens atrás de uma mensagem mais antiga do mesmo destinatário
+   que espera nova tentativa (next_attempt_at no futuro) ficam na fila, para não ultrapassá-la
+3. envia respeitando o token bucket Redis do META_PHONE_NUMBER_ID (limite de vazão da Meta por número);
+   destinatários diferentes em paralelo, mensagens do mesmo destinatário em ordem
+4. grava os resultados num único bulk_write: `sent`, nova tentativa com backoff exponencial + jitter
+   (`pending_queue` + next_attempt_at) ou `failed_send` após WHATSAPP_SEND_MAX_ATTEMPTS
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import redis.asyncio as redis
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, UpdateOne
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.rate_limit import TokenBucket
+from app.services.whatsapp_service import WhatsAppSendResult, send_whatsapp_text_message_result
+
+WHATSAPP_MESSAGES_COLLECTION = "whatsapp_messages"
+# Lotes em voo por dreno: o próximo lote é reivindicado enquanto o anterior termina (sem esperar o envio mais lento)
+MAX_BATCHES_IN_FLIGHT = 2
+
+Sender = Callable[[str, str], Awaitable[WhatsAppSendResult]]
+StatusCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+def send_bucket_for(phone_number_id: Optional[str], redis_client: Optional[redis.Redis]) -> TokenBucket:
+    return TokenBucket(
+        f"wa:send_bucket:{phone_number_id or 'default'}",
+        rate_per_second=settings.WHATSAPP_SEND_RATE_PER_SECOND,
+        capacity=settings.WHATSAPP_SEND_BURST,
+        redis_client=redis_client,
+    )
+
+def retry_delay_seconds(attempt: int) -> float:
+    """Backoff exponencial com full jitter: uniforme em [base, min(max, base * 2^attempt)]."""
+    ceiling = min(settings.WHATSAPP_SEND_RETRY_MAX_SECONDS, settings.WHATSAPP_SEND_RETRY_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(settings.WHATSAPP_SEND_RETRY_BASE_SECONDS, max(ceiling, settings.WHATSAPP_SEND_RETRY_BASE_SECONDS))
+
+async def ensure_send_pipeline_indexes(db: AsyncIOMotorDatabase) -> None:
+    collection = db[WHATSAPP_MESSAGES_COLLECTION]
+    await collection.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING), ("timestamp", ASCENDING)])
+    await collection.create_index("send_claim", sparse=True)
+
+async def release_stale_claims(db: AsyncIOMotorDatabase, now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    result = await db[WHATSAPP_MESSAGES_COLLECTION].update_many(
+        {"status": "pending_send", "send_claimed_at": {"$lt": now - timedelta(seconds=settings.WHATSAPP_SEND_CLAIM_LEASE_SECONDS)}},
+        {"$set": {"status": "pending_queue"}, "$unset": {"send_claim": "", "send_claimed_at": ""}},
+    )
+    return result.modified_count
+
+async def claim_batch(
+    db: AsyncIOMotorDatabase,
+    limit: int,
+    now: Optional[datetime] = None,
+    exclude_recipients: Optional[Set[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Reivindica até `limit` mensagens prontas (mais antigas primeiro). Só quem ganhou o update recebe cada uma.
+    `exclude_recipients`: destinatários com envio em andamento (mantém a ordem por destinatário entre lotes).
+    Mensagens posteriores a uma do mesmo destinatário em backoff também não são reivindicadas.
+    """
+    now = now or datetime.now(timezone.utc)
+    collection = db[WHATSAPP_MESSAGES_COLLECTION]
+    ready: Dict[str, Any] = {"status": "pending_queue", "next_attempt_at": {"$not": {"$gt": now}}} # Sem next_attempt_at = pronta
+    if exclude_recipients:
+        ready["recipient_id"] = {"$nin": list(exclude_recipients)}
+    waiting = await collection.aggregate([
+        {"$match": {"status": "pending_queue", "next_attempt_at": {"$gt": now}}},
+        {"$group": {"_id": "$recipient_id", "first": {"$min": "$timestamp"}}},
+    ]).to_list(length=None)
+    if waiting:
+        ready["$nor"] = [{"recipient_id": doc["_id"], "timestamp": {"$gt": doc["first"]}} for doc in waiting]
+    candidates = await collection.find(ready, {"_id": 1}).sort("timestamp", ASCENDING).limit(limit).to_list(length=limit)
+    if not candidates:
+        return []
+    claim = uuid.uuid4().hex
+    await collection.update_many(
+        {"_id": {"$in": [doc["_id"] for doc in candidates]}, "status": "pending_queue"},
+        {"$set": {"status": "pending_send", "send_claim": claim, "send_claimed_at": now}},
+    )
+    projection = {"chat_id": 1, "recipient_id": 1, "content": 1, "send_attempts": 1, "timestamp": 1, "send_claim": 1}
+    claimed = await collection.find({"send_claim": claim}, projection).to_list(length=limit)
+    claimed.sort(key=lambda doc: doc.get("timestamp") or now)
+    return claimed
+
+def _result_update(doc: Dict[str, Any], result: WhatsAppSendResult, now: datetime) -> Dict[str, Any]:
+    attempts = int(doc.get("send_attempts") or 0) + 1
+    unset_claim = {"send_claim": "", "send_claimed_at": ""}
+    if result.success:
+        fields = {"status": "sent", "status_timestamp": now, "send_attempts": attempts}
+        if result.wami:
+            fields["official_wami"] = result.wami
+        return {"$set": fields, "$unset": {**unset_claim, "next_attempt_at": "", "last_send_error": ""}}
+    error = {"status_code": result.status_code, "error_code": result.error_code, "message": result.error}
+    if result.retryable and attempts < settings.WHATSAPP_SEND_MAX_ATTEMPTS:
+        retry_at = now + timedelta(seconds=retry_delay_seconds(attempts))
+        return {"$set": {"status": "pending_queue", "send_attempts": attempts, "next_attempt_at": retry_at, "last_send_error": error},
+                "$unset": unset_claim}
+    return {"$set": {"status": "failed_send", "status_timestamp": now, "send_attempts": attempts, "last_send_error": error},
+            "$unset": unset_claim}
+
+async def send_batch(
+    batch: List[Dict[str, Any]],
+    bucket: TokenBucket,
+    sender: Sender = send_whatsapp_text_message_result,
+) -> List[WhatsAppSendResult]:
+    """Envia o lote (já ordenado) respeitando o bucket; mesma ordem de `batch` no retorno."""
+    results: List[Optional[WhatsAppSendResult]] = [None] * len(batch)
+    by_recipient: "OrderedDict[str, List[int]]" = OrderedDict()
+    for index, doc in enumerate(batch):
+        by_recipient.setdefault(str(doc.get("recipient_id") or doc.get("chat_id")), []).append(index)
+
+    async def send_in_order(recipient: str, indexes: List[int]) -> None:
+        for index in indexes:
+            await bucket.acquire()
+            try:
+                results[index] = await sender(recipient, batch[index].get("content") or "")
+            except Exception as e: # O sender não deveria levantar; não perder o lote por isso
+                results[index] = WhatsAppSendResult(False, retryable=True, error=str(e))
+
+    await asyncio.gather(*(send_in_order(recipient, indexes) for recipient, indexes in by_recipient.items()))
+    return [result for result in results if result is not None]
+
+async def drain_send_queue(
+    db: AsyncIOMotorDatabase,
+    bucket: TokenBucket,
+    batch_size: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    sender: Sender = send_whatsapp_text_message_result,
+    on_status: Optional[StatusCallback] = None,
+) -> Dict[str, int]:
+    """Drena a fila até esvaziar ou estourar `max_seconds`. Retorna contadores da execução."""
+    batch_size = batch_size or settings.WHATSAPP_SEND_BATCH_SIZE
+    deadline = time.monotonic() + (max_seconds if max_seconds is not None else settings.WHATSAPP_SEND_DRAIN_SECONDS)
+    log = logger.bind(service="WhatsAppSendPipeline", bucket=bucket.key)
+    collection = db[WHATSAPP_MESSAGES_COLLECTION]
+    stats = {"released": await release_stale_claims(db), "claimed": 0, "sent": 0, "retried": 0, "failed": 0, "rate_limited": 0}
+    in_flight: Dict[asyncio.Task, Set[str]] = {} # lote em envio -> destinatários dele
+
+    async def process(batch: List[Dict[str, Any]]) -> None:
+        results = await send_batch(batch, bucket, sender)
+        now = datetime.now(timezone.utc)
+        operations = []
+        for doc, result in zip(batch, results):
+            update = _result_update(doc, result, now)
+            # Só o claim deste lote: se ele expirou e outro dreno reivindicou a mensagem, o resultado não a sobrescreve
+            operations.append(UpdateOne({"_id": doc["_id"], "send_claim": doc["send_claim"]}, update))
+            status = update["$set"]["status"]
+            stats["sent" if status == "sent" else "retried" if status == "pending_queue" else "failed"] += 1
+            stats["rate_limited"] += int(result.rate_limited)
+            if on_status is not None and status != "pending_queue":
+                try:
+                    await on_status({"id": doc["_id"], "chat_id": doc.get("chat_id"), "status": status, "wami": result.wami, "timestamp": now.isoformat()})
+                except Exception as e:
+                    log.warning(f"Status callback failed for message {doc['_id']}: {e}")
+        await collection.bulk_write(operations, ordered=False)
+
+    async def reap() -> None:
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            in_flight.pop(task)
+            task.result() # Propaga erro de Mongo (os claims expiram e voltam para a fila)
+
+    try:
+        while time.monotonic() < deadline:
+            if len(in_flight) >= MAX_BATCHES_IN_FLIGHT:
+                await reap()
+            busy = set().union(*in_flight.values()) if in_flight else None
+            batch = await claim_batch(db, batch_size, exclude_recipients=busy)
+            if not batch:
+                if not in_flight:
+                    break
+                await reap() # Pode haver mensagens só de destinatários ocupados
+                continue
+            stats["claimed"] += len(batch)
+            in_flight[asyncio.create_task(process(batch))] = {str(doc.get("recipient_id") or doc.get("chat_id")) for doc in batch}
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        for task in in_flight:
+            if not task.done():
+                task.cancel()
+
+    for key in ("sent", "retried", "failed", "rate_limited"):
+        if stats[key]:
+            metrics.incr(f"whatsapp_pipeline_{key}", stats[key])
+    if stats["claimed"] or stats["released"]:
+        log.info(f"WhatsApp send queue drained: {stats}")
+    return stats
@@ -3,19 +3,114 @@
 from app.core.config import settings  
 from loguru import logger  
 import httpx  
+import asyncio
+import time
+import weakref
+from contextlib import AbstractAsyncContextManager
+from dataclasses import dataclass
 from typing import Optional, Tuple, Dict, Any # Adicionar Dict, Any  
 from app.core.logging_config import trace_id_var  
+from app.core.metrics import metrics
 import json # Para log de erro
 
 # --- Constantes ---  
 META_GRAPH_API_VERSION = "v19.0" # Usar versão atual da API Graph  
-META_GRAPH_API_BASE_URL = f"https://graph.facebook.com/{META_GRAPH_API_VERSION}"
+META_GRAPH_API_BASE_URL = settings.META_GRAPH_API_BASE_URL.rstrip("/") # Padrão: https://graph.facebook.com/{META_GRAPH_API_VERSION}
 
-# --- HTTP Client (Recomendado: Criar um cliente reutilizável) ---  
-# Pode ser instanciado globalmente ou via dependência FastAPI  
-# Por simplicidade, vamos instanciar em cada chamada por enquanto, mas NÃO é ideal para produção.  
-# def get_httpx_client() -> httpx.AsyncClient:  
-#     return httpx.AsyncClient(timeout=25.0, http2=True) # Timeout razoável
+# --- HTTP Client compartilhado ---  
+class WhatsAppHTTPContext(AbstractAsyncContextManager):  
+    """
+    Pool HTTP/2 + keep-alive para a Graph API, reutilizado por todos os envios do processo.
+    Aberto no lifespan do FastAPI e no init dos workers Celery. Um cliente por event loop: conexões
+    httpx não podem ser usadas fora do loop que as criou (tasks Celery que usam asyncio.run).
+    """
+    def __init__(self):  
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+    async def __aenter__(self):  
+        await self.connect()  
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):  
+        await self.disconnect()
+
+    @staticmethod  
+    def _build_client() -> httpx.AsyncClient:  
+        return httpx.AsyncClient(  
+            base_url=META_GRAPH_API_BASE_URL,  
+            timeout=httpx.Timeout(settings.WHATSAPP_HTTP_TIMEOUT_SECONDS, connect=settings.WHATSAPP_HTTP_CONNECT_TIMEOUT_SECONDS),  
+            limits=httpx.Limits(  
+                max_connections=settings.WHATSAPP_HTTP_MAX_CONNECTIONS,  
+                max_keepalive_connections=settings.WHATSAPP_HTTP_MAX_KEEPALIVE,  
+                keepalive_expiry=settings.WHATSAPP_HTTP_KEEPALIVE_EXPIRY_SECONDS  
+            ),  
+            http2=True  
+        )
+
+    async def connect(self):  
+        """Cria o cliente do loop atual (idempotente)."""  
+        self.get_client()  
+        logger.info("WhatsApp Graph API HTTP client pool ready.")
+
+    async def disconnect(self):  
+        """
+        Fecha só o cliente do loop atual. Clientes de outros loops continuam registrados: eles só podem ser
+        fechados no próprio loop (close_all_sync no shutdown do worker) e somem com o loop (WeakKeyDictionary).
+        """
+        loop = asyncio.get_running_loop()  
+        client = self._clients.pop(loop, None)  
+        if client is not None:  
+            try:  
+                await client.aclose()  
+                logger.info("WhatsApp Graph API HTTP client pool closed.")  
+            except Exception as e:  
+                logger.error(f"Error closing WhatsApp HTTP client: {e}")
+
+    def reset(self):  
+        """Esquece todos os clientes sem fechá-los (após fork: sockets do processo pai não são reutilizáveis)."""  
+        self._clients = weakref.WeakKeyDictionary()
+
+    def close_all_sync(self):  
+        """Fecha, fora de um loop em execução, os clientes cujos loops ainda estão abertos (shutdown do worker)."""  
+        for loop, client in list(self._clients.items()):  
+            if not loop.is_closed() and not loop.is_running():  
+                try:  
+                    loop.run_until_complete(client.aclose())  
+                except Exception as e:  
+                    logger.error(f"Error closing WhatsApp HTTP client on worker shutdown: {e}")  
+        self.reset()
+
+    def get_client(self) -> httpx.AsyncClient:  
+        loop = asyncio.get_running_loop()  
+        client = self._clients.get(loop)  
+        if client is None or client.is_closed:  
+            client = self._clients[loop] = self._build_client()  
+            metrics.incr("whatsapp_http_clients_created")  
+        return client
+
+# Instância global do pool  
+whatsapp_http_manager = WhatsAppHTTPContext()
+
+async def _trace_connection_reuse(event_name: str, info: Dict[str, Any]) -> None:  
+    """Hook de trace do httpcore: conta conexões TCP novas (o resto dos requests reutilizou o pool)."""  
+    if event_name == "connection.connect_tcp.complete":  
+        metrics.incr("whatsapp_http_new_connections")
+
+# Códigos de erro da Graph API que indicam limite/instabilidade temporária (vale tentar de novo)
+# 4/80007: limite de chamadas da app/WABA; 130429: throughput do número; 131056: limite por par remetente/destinatário;
+# 1/2/131000: erro desconhecido/serviço indisponível
+RETRYABLE_META_ERROR_CODES = {1, 2, 4, 80007, 130429, 131000, 131056}
+RATE_LIMIT_META_ERROR_CODES = {4, 80007, 130429, 131056}
+
+@dataclass
+class WhatsAppSendResult:
+    success: bool
+    wami: Optional[str] = None
+    status_code: Optional[int] = None # None = sem resposta HTTP (timeout/rede/config)
+    error_code: Optional[int] = None
+    retryable: bool = False
+    rate_limited: bool = False
+    error: Optional[str] = None
 
 async def send_whatsapp_text_message(  
     recipient_wa_id: str,  
@@ -26,18 +121,23 @@ async def send_whatsapp_text_message(
 
     Retorna (True, wami) em sucesso, (False, None) em falha.  
     """  
+    result = await send_whatsapp_text_message_result(recipient_wa_id, message_text)  
+    return result.success, result.wami
+
+async def send_whatsapp_text_message_result(recipient_wa_id: str, message_text: str) -> WhatsAppSendResult:  
+    """Como send_whatsapp_text_message, com status/código de erro e se a falha é temporária (pipeline de envio)."""  
     log = logger.bind(trace_id=trace_id_var.get(), service="WhatsAppService", recipient=recipient_wa_id)
 
     # 1. Validação de Configuração e Input  
     if not all([settings.META_ACCESS_TOKEN, settings.META_PHONE_NUMBER_ID]):  
         log.critical("WhatsApp API credentials (Token, Phone ID) missing. Cannot send message.")  
-        return False, None # Falha crítica  
+        return WhatsAppSendResult(False, error="credentials_missing") # Falha crítica  
     if not recipient_wa_id or not message_text:  
          log.error("Attempted to send WhatsApp message with missing recipient or text.")  
-         return False, None
+         return WhatsAppSendResult(False, error="invalid_message")
 
     # 2. Preparar Request  
-    api_url = f"{META_GRAPH_API_BASE_URL}/{settings.META_PHONE_NUMBER_ID}/messages"  
+    api_url = f"/{settings.META_PHONE_NUMBER_ID}/messages" # Relativo ao base_url do cliente compartilhado  
     headers = {  
         "Authorization": f"Bearer {settings.META_ACCESS_TOKEN}",  
         "Content-Type": "application/json"  
@@ -57,11 +157,14 @@ async def send_whatsapp_text_message(
 
     # 3. Executar Chamada API  
     try:  
-        # Usar cliente HTTPX gerenciado seria melhor  
-        async with httpx.AsyncClient(timeout=25.0, http2=True) as client:  
-            response = await client.post(api_url, headers=headers, json=payload)
+        client = whatsapp_http_manager.get_client()  
+        started = time.perf_counter()  
+        response = await client.post(api_url, headers=headers, json=payload, extensions={"trace": _trace_connection_reuse})  
+        send_seconds = time.perf_counter() - started  
+        metrics.incr("whatsapp_http_requests")  
+        metrics.observe("whatsapp_send_latency_seconds", send_seconds)
 
-        log.debug(f"Meta API Response Status Code: {response.status_code}")  
+        log.debug(f"Meta API Response Status Code: {response.status_code} ({send_seconds * 1000:.0f}ms, {response.http_version})")  
         # Tentar ler corpo da resposta, mesmo em erro, para log  
         response_data: Dict[str, Any] = {}  
         response_text_snippet: str = ""  
@@ -73,7 +176,8 @@ async def send_whatsapp_text_message(
             log.error(f"Meta API returned non-JSON response (Status: {response.status_code}): {response_text_snippet}")  
             # Se não for 2xx e não for JSON, considerar falha  
             if not (200 <= response.status_code < 300):  
-                 return False, None
+                 transient = response.status_code == 429 or response.status_code >= 500  
+                 return WhatsAppSendResult(False, status_code=response.status_code, retryable=transient, rate_limited=response.status_code == 429, error=response_text_snippet)
 
         # 4. Processar Resposta  
         if 200 <= response.status_code < 300:  
@@ -82,11 +186,11 @@ async def send_whatsapp_text_message(
             wami = response_data.get("messages", [{}])[0].get("id")  
             if wami:  
                  log.success(f"WhatsApp message accepted by Meta API. WAMI: {wami}")  
-                 return True, wami  
+                 return WhatsAppSendResult(True, wami, status_code=response.status_code)  
             else:  
                  # Código 2xx mas sem WAMI? Incomum. Logar e tratar como sucesso parcial.  
                  log.warning(f"WhatsApp message API call returned 2xx status but no WAMI found in response.")  
-                 return True, None  
+                 return WhatsAppSendResult(True, None, status_code=response.status_code)  
         else:  
             # Erro reportado pela API Meta  
             error_info = response_data.get("error", {})  
@@ -95,19 +199,22 @@ async def send_whatsapp_text_message(
             error_code = error_info.get("code", response.status_code) # Usar code do erro se disponível  
             fbtrace_id = error_info.get("fbtrace_id", "N/A")  
             log.error(f"Failed to send WhatsApp message. Status={response.status_code}, Code={error_code}, Type='{error_type}', Message='{error_message}', FBTrace={fbtrace_id}")  
-            return False, None
+            rate_limited = response.status_code == 429 or error_code in RATE_LIMIT_META_ERROR_CODES  
+            retryable = rate_limited or response.status_code >= 500 or error_code in RETRYABLE_META_ERROR_CODES  
+            return WhatsAppSendResult(False, status_code=response.status_code, error_code=error_code if isinstance(error_code, int) else None,  
+                                      retryable=retryable, rate_limited=rate_limited, error=error_message)
 
     # Capturar erros de HTTPX (rede, timeout, etc.)  
     except httpx.TimeoutException:  
         log.error("Timeout error sending WhatsApp message to Meta API.")  
-        return False, None  
+        return WhatsAppSendResult(False, retryable=True, error="timeout")  
     except httpx.RequestError as e:  
         log.error(f"HTTP request error sending WhatsApp message: {e}", exc_info=True)  
-        return False, None  
+        return WhatsAppSendResult(False, retryable=True, error=str(e))  
     # Capturar outros erros inesperados  
     except Exception as e:  
         log.exception(f"Unexpected error sending WhatsApp message: {e}")  
-        return False, None
+        return WhatsAppSendResult(False, error=str(e))
 
 # --- Placeholder para outras funções de serviço WhatsApp ---  
 # async def get_media_url(media_id: str) -> Optional[str]: ...  
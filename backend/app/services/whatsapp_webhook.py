@@ -0,0 +1,247 @@
+# agentos_core/app/services/whatsapp_webhook.py
+
+"""
+Processamento em lote dos payloads de webhook da Meta (WhatsApp Cloud API).
+
+Um POST da Meta pode trazer várias mensagens e statuses (vários entries/changes). Em vez de 3-5
+round trips por mensagem, o payload inteiro vira um `WebhookBatch`:
+
+- mensagens: um upsert por WAMI, num único bulk_write junto com os statuses (último status por WAMI)
+- chats: uma atualização mesclada por chat_id (unread somado, last_message_ts = mais recente)
+- modo dos chats: um find, só se houver mensagem de cliente; settings do AutoResponder do cache em processo
+- timers do AutoResponder: uma transação Redis para todos os chats
+- WebSocket: um frame por chat nos tópicos do chat (`whatsapp_batch` com a lista de eventos; um evento
+  sozinho sai no formato antigo)
+
+Round trips por webhook não dependem do número de mensagens nele.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from app.core.metrics import metrics
+from app.core.settings_cache import settings_cache
+from app.services.autoresponder_timers import AutoResponderTimers
+from app.websocket.topics import whatsapp_chat_topics
+
+WHATSAPP_CHATS_COLLECTION = "whatsapp_chats"
+WHATSAPP_MESSAGES_COLLECTION = "whatsapp_messages"
+MEDIA_MESSAGE_TYPES = ("image", "audio", "video", "document", "sticker")
+
+Publish = Callable[[List[str], Dict[str, Any]], Awaitable[Any]] # ConnectionManager.publish(topics, message)
+
+@dataclass
+class WebhookBatch:
+    messages: List[Dict[str, Any]] = field(default_factory=list) # Documentos prontos para upsert
+    chats: Dict[str, Dict[str, Any]] = field(default_factory=dict) # chat_id -> atualização mesclada
+    statuses: Dict[str, Dict[str, Any]] = field(default_factory=dict) # WAMI -> último status do payload
+    skipped: int = 0
+
+def _unix_to_datetime(value: Any) -> datetime:
+    timestamp_unix = int(value or 0)
+    return datetime.fromtimestamp(timestamp_unix, tz=timezone.utc) if timestamp_unix else datetime.now(timezone.utc)
+
+def _contact_name(value_data: Dict, wa_id: str) -> str:
+    contacts = value_data.get("contacts") or [{}]
+    for contact in contacts:
+        if contact.get("wa_id") == wa_id:
+            return contact.get("profile", {}).get("name", "Unknown Contact")
+    return contacts[0].get("profile", {}).get("name", "Unknown Contact")
+
+def parse_incoming_message(message_data: Dict, value_data: Dict, now: Optional[datetime] = None) -> Optional[Tuple[Dict[str, Any], bool]]:
+    """Monta o documento de `whatsapp_messages` de uma mensagem recebida. Retorna (doc, conta_como_não_lida) ou None sem IDs."""
+    now = now or datetime.now(timezone.utc)
+    message_type = message_data.get("type")
+    sender_id_wa = message_data.get("from") # WA ID do cliente = ID do chat (1-on-1)
+    message_id_wami = message_data.get("id")
+    if not sender_id_wa or not message_id_wami:
+        return None
+
+    content = f"[{(message_type or 'unknown').upper()} Received - Check Metadata]"
+    media_info = None
+    is_unsupported_type = False
+    if message_type == "text":
+        content = message_data.get("text", {}).get("body", "")
+    elif message_type in MEDIA_MESSAGE_TYPES:
+        media_info = message_data.get(message_type, {})
+        content = media_info.get("caption", f"[{message_type.upper()} Media]")
+    elif message_type == "location":
+        media_info = message_data.get("location", {})
+        content = f"Location: {media_info.get('latitude')}, {media_info.get('longitude')}"
+    elif message_type == "contacts":
+        media_info = message_data.get("contacts", [])
+        content = f"[Contact(s) Received: {len(media_info)}]"
+    elif message_type == "reaction":
+        media_info = message_data.get("reaction", {})
+        content = f"[Reacted {media_info.get('emoji', '?')} to msg {media_info.get('message_id')}]"
+    else:
+        is_unsupported_type = True
+
+    doc = {
+        "_id": message_id_wami, "chat_id": sender_id_wa, "sender_id": sender_id_wa,
+        "recipient_id": value_data.get("metadata", {}).get("phone_number_id"), "content": content or "",
+        "type": message_type or "unknown", "timestamp": _unix_to_datetime(message_data.get("timestamp")), "status": "received",
+        "metadata": {"contact_name": _contact_name(value_data, sender_id_wa), "media_info": media_info},
+        "createdAt": now, "status_timestamp": None,
+        "official_wami": message_id_wami, # WAMI é o ID oficial aqui
+        "processing_status": None, "internal_flags": [],
+    }
+    counts_as_unread = message_type not in ("reaction", "status") and not is_unsupported_type
+    return doc, counts_as_unread
+
+def build_webhook_batch(payload: Dict[str, Any], now: Optional[datetime] = None) -> WebhookBatch:
+    """Junta mensagens e statuses de todos os entries/changes do payload, mesclando por chat e por WAMI."""
+    now = now or datetime.now(timezone.utc)
+    batch = WebhookBatch()
+    seen_wamis = set()
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            if change.get("field") != "messages":
+                continue
+            value = change.get("value") or {}
+            for message_data in value.get("messages") or []:
+                parsed = parse_incoming_message(message_data, value, now)
+                if parsed is None:
+                    batch.skipped += 1
+                    continue
+                doc, counts_as_unread = parsed
+                if doc["_id"] in seen_wamis: # Reentrega dentro do mesmo payload
+                    batch.skipped += 1
+                    continue
+                seen_wamis.add(doc["_id"])
+                batch.messages.append(doc)
+                chat = batch.chats.get(doc["chat_id"])
+                if chat is None:
+                    chat = batch.chats[doc["chat_id"]] = {"unread": 0, "last_message_ts": doc["timestamp"],
+                                                          "contact_name": doc["metadata"]["contact_name"], "last_customer_message_id": doc["_id"]}
+                elif doc["timestamp"] >= chat["last_message_ts"]:
+                    chat.update(last_message_ts=doc["timestamp"], contact_name=doc["metadata"]["contact_name"], last_customer_message_id=doc["_id"])
+                chat["unread"] += int(counts_as_unread)
+            for status_update in value.get("statuses") or []:
+                message_id_wami, status_val, chat_id = status_update.get("id"), status_update.get("status"), status_update.get("recipient_id")
+                if not message_id_wami or not status_val or not chat_id:
+                    batch.skipped += 1
+                    continue
+                timestamp_dt = _unix_to_datetime(status_update.get("timestamp"))
+                current = batch.statuses.get(message_id_wami)
+                if current is None or timestamp_dt >= current["timestamp"]: # sent/delivered/read do mesmo WAMI: fica o mais recente
+                    batch.statuses[message_id_wami] = {"chat_id": chat_id, "status": status_val, "timestamp": timestamp_dt, "errors": status_update.get("errors")}
+    return batch
+
+async def _fetch_autoresponder_settings(db: AsyncIOMotorDatabase) -> Tuple[bool, Any]:
+    values = await settings_cache.get_settings({"autoresponder_enabled": False, "autoresponder_timeout_minutes": 5}, db)
+    return bool(values["autoresponder_enabled"]), values["autoresponder_timeout_minutes"]
+
+# Campos de WhatsAppMessageAPI (by_alias), sem `metadata` (excluído no schema)
+_MESSAGE_API_FIELDS = ("_id", "chat_id", "sender_id", "recipient_id", "content", "type", "timestamp", "status",
+                       "status_timestamp", "transcription", "official_wami")
+
+def message_event_payload(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload de `new_whatsapp_message` = WhatsAppMessageAPI.model_dump(by_alias=True, exclude_none=True), sem Pydantic.
+
+    Os documentos vêm de parse_incoming_message/_send_auto_response, então não há o que validar no caminho
+    quente; `createdAt` do documento vira `created_at` como no schema.
+    """
+    payload = {key: doc[key] for key in _MESSAGE_API_FIELDS if doc.get(key) is not None}
+    created_at = doc.get("created_at") or doc.get("createdAt")
+    if created_at is not None:
+        payload["created_at"] = created_at
+    return payload
+
+def _combined_frame(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return events[0] if len(events) == 1 else {"type": "whatsapp_batch", "payload": {"events": events}}
+
+async def process_webhook_batch(
+    batch: WebhookBatch,
+    db: AsyncIOMotorDatabase,
+    timers: Optional[AutoResponderTimers] = None,
+    publish: Optional[Publish] = None,
+    trace_id: Optional[str] = None,
+    schedule_fallback: Optional[Callable[[str, str, datetime], None]] = None,
+) -> Dict[str, int]:
+    """
+    Persiste o lote, atualiza os chats, agenda/cancela timers do AutoResponder e publica um frame WS por chat.
+    `schedule_fallback(chat_id, wami, eta)`: usado quando não há timers (Redis fora), ex.: task com ETA.
+    """
+    log = logger.bind(service="WhatsAppWebhook", trace_id=trace_id)
+    now = datetime.now(timezone.utc)
+    stats = {"messages": len(batch.messages), "statuses": len(batch.statuses), "chats": len(batch.chats), "skipped": batch.skipped}
+    messages_collection = db[WHATSAPP_MESSAGES_COLLECTION]
+
+    # --- Mensagens + statuses: um bulk_write ---
+    known_status_ids = set()
+    if batch.statuses:
+        status_ids = list(batch.statuses)
+        known_status_ids = {doc["_id"] async for doc in messages_collection.find({"_id": {"$in": status_ids}}, {"_id": 1})}
+    operations = [UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True) for doc in batch.messages]
+    operations += [UpdateOne({"_id": wami}, {"$set": {"status": s["status"], "status_timestamp": s["timestamp"]}})
+                   for wami, s in batch.statuses.items() if wami in known_status_ids]
+    if operations:
+        await messages_collection.bulk_write(operations, ordered=False)
+    for wami, s in batch.statuses.items():
+        if wami not in known_status_ids:
+            log.warning(f"Status update for unknown WAMI: {wami}")
+        if s["status"] == "failed":
+            log.error(f"Message {wami} failed: {s.get('errors')}")
+
+    # --- Chats: uma atualização por chat_id ---
+    if batch.chats:
+        await db[WHATSAPP_CHATS_COLLECTION].bulk_write([
+            UpdateOne(
+                {"_id": chat_id},
+                {"$set": {"contact_id": chat_id, "contact_name": chat["contact_name"], "status": "open", "last_interaction_at": now},
+                 "$max": {"last_message_ts": chat["last_message_ts"]},
+                 "$inc": {"unread_count": chat["unread"]},
+                 "$setOnInsert": {"mode": "human", "created_at": now}},
+                upsert=True,
+            )
+            for chat_id, chat in batch.chats.items()
+        ], ordered=False)
+
+    # --- AutoResponder: timers só para chats em modo 'human' com AutoResponder ativo ---
+    if batch.chats:
+        try:
+            modes = {doc["_id"]: doc.get("mode", "human")
+                     async for doc in db[WHATSAPP_CHATS_COLLECTION].find({"_id": {"$in": list(batch.chats)}}, {"mode": 1})}
+            human_chats = [chat_id for chat_id in batch.chats if modes.get(chat_id, "human") == "human"]
+            enabled, timeout_min = await _fetch_autoresponder_settings(db) if human_chats else (False, None)
+            eta = now
+            if enabled and isinstance(timeout_min, int) and timeout_min > 0:
+                eta = now + timedelta(minutes=timeout_min)
+                to_schedule = [(chat_id, batch.chats[chat_id]["last_customer_message_id"]) for chat_id in human_chats]
+                to_cancel = [chat_id for chat_id in batch.chats if chat_id not in human_chats]
+            else:
+                to_schedule, to_cancel = [], list(batch.chats)
+            if timers is not None:
+                await timers.apply(schedule=[(chat_id, wami, eta.timestamp()) for chat_id, wami in to_schedule], cancel=to_cancel, trace_id=trace_id)
+            elif schedule_fallback is not None:
+                for chat_id, wami in to_schedule:
+                    schedule_fallback(chat_id, wami, eta)
+            stats["timers_scheduled"] = len(to_schedule)
+        except Exception as e:
+            log.exception(f"Failed to update AutoResponder timers for {len(batch.chats)} chat(s): {e}")
+
+    # --- WebSocket: um frame por chat, para os tópicos do chat (chat:<id> + dashboard:whatsapp) ---
+    if publish is not None:
+        events_by_chat: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in batch.messages:
+            events_by_chat.setdefault(doc["chat_id"], []).append({"type": "new_whatsapp_message", "payload": message_event_payload(doc)})
+        for wami, s in batch.statuses.items():
+            if wami in known_status_ids:
+                events_by_chat.setdefault(s["chat_id"], []).append({"type": "whatsapp_message_status",
+                    "payload": {"id": wami, "chat_id": s["chat_id"], "status": s["status"], "timestamp": s["timestamp"].isoformat()}})
+        for chat_id, events in events_by_chat.items():
+            try:
+                await publish(whatsapp_chat_topics(chat_id), _combined_frame(events))
+            except Exception as e:
+                log.error(f"Failed to publish webhook events for chat {chat_id} via WS: {e}")
+
+    metrics.incr("whatsapp_webhook_messages", stats["messages"])
+    metrics.incr("whatsapp_webhook_statuses", stats["statuses"])
+    log.info(f"Webhook batch processed: {stats}")
+    return stats
@@ -0,0 +1,227 @@
+# agentos_core/app/services/whatsapp_webhook_stream.py
+
+"""
+Ingestão do webhook da Meta via Redis Stream (WHATSAPP_WEBHOOK_STREAM_ENABLED).
+
+Request (ack rápido): depois da assinatura, um único script Lua
+- recusa se o backlog do stream passou de WHATSAPP_WEBHOOK_STREAM_MAX_BACKLOG (a request processa inline)
+- grava as chaves de idempotência (`m:<wami>` por mensagem, `s:<wami>:<status>` por status) com SET NX EX
+- se sobrou algo novo, XADD do corpo bruto + lista dos IDs novos; reentregas completas nem entram no stream
+
+Consumidor (task whatsapp.consume_webhook_stream): XREADGROUP em lotes de WHATSAPP_WEBHOOK_CONSUMER_BATCH,
+junta todas as entradas num único WebhookBatch (process_webhook_batch), e só então XACK + XDEL. Entradas
+de consumidores mortos (ou de um lote que falhou) voltam via XAUTOCLAIM após WHATSAPP_WEBHOOK_CLAIM_IDLE_SECONDS.
+O consumidor só lê o próximo lote quando termina o anterior: o backlog cresce no Redis, não na memória do worker.
+
+Entradas envenenadas: uma entrada reivindicada com WHATSAPP_WEBHOOK_MAX_DELIVERIES entregas (XPENDING) é
+processada sozinha; se falhar de novo (ou não for JSON válido) vai para o stream wa:webhook:dead com o erro e
+recebe ack, sem travar as demais.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.autoresponder_timers import AutoResponderTimers
+from app.services.whatsapp_webhook import Publish, build_webhook_batch, process_webhook_batch
+
+WEBHOOK_STREAM_KEY = "wa:webhook:stream"
+WEBHOOK_STREAM_GROUP = "wa-webhook"
+WEBHOOK_DEDUP_KEY_PREFIX = "wa:webhook:seen:"
+WEBHOOK_DEAD_LETTER_KEY = "wa:webhook:dead"
+
+# KEYS[1] = stream, KEYS[2..n] = chaves de dedup; ARGV[1] = backlog máximo, ARGV[2] = TTL, ARGV[3] = corpo, ARGV[4..] = IDs
+# Retorna {-1, 0} backlog cheio, {0, 0} tudo duplicado, {1, novos} enfileirado
+ENQUEUE_WEBHOOK_LUA = """
+if redis.call('XLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    return {-1, 0}
+end
+local fresh = {}
+for i = 2, #KEYS do
+    if redis.call('SET', KEYS[i], '1', 'NX', 'EX', tonumber(ARGV[2])) then
+        table.insert(fresh, ARGV[i + 2])
+    end
+end
+if #fresh == 0 then
+    return {0, 0}
+end
+redis.call('XADD', KEYS[1], '*', 'body', ARGV[3], 'fresh', cjson.encode(fresh))
+return {1, #fresh}
+"""
+
+@dataclass
+class WebhookEnqueueResult:
+    queued: bool
+    backlog_full: bool = False
+    fresh: int = 0
+    duplicates: int = 0
+
+def webhook_idempotency_ids(payload: Dict[str, Any]) -> List[str]:
+    """IDs de idempotência do payload: `m:<wami>` por mensagem, `s:<wami>:<status>` por status (sent/delivered/read)."""
+    ids: List[str] = []
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            ids += [f"m:{m['id']}" for m in value.get("messages") or [] if m.get("id")]
+            ids += [f"s:{s['id']}:{s.get('status')}" for s in value.get("statuses") or [] if s.get("id")]
+    return list(dict.fromkeys(ids))
+
+def filter_webhook_payload(payload: Dict[str, Any], fresh_ids: Iterable[str]) -> Dict[str, Any]:
+    """Cópia rasa do payload só com as mensagens/statuses cujos IDs ainda não tinham sido vistos."""
+    fresh = set(fresh_ids)
+    entries = []
+    for entry in payload.get("entry") or []:
+        changes = []
+        for change in entry.get("changes") or []:
+            value = dict(change.get("value") or {})
+            value["messages"] = [m for m in value.get("messages") or [] if f"m:{m.get('id')}" in fresh]
+            value["statuses"] = [s for s in value.get("statuses") or [] if f"s:{s.get('id')}:{s.get('status')}" in fresh]
+            changes.append({**change, "value": value})
+        entries.append({**entry, "changes": changes})
+    return {**payload, "entry": entries}
+
+class WebhookStream:
+    def __init__(self, redis_client: redis.Redis):
+        self._redis = redis_client
+        self._enqueue_script = redis_client.register_script(ENQUEUE_WEBHOOK_LUA)
+
+    async def enqueue(self, raw_body: bytes, payload: Dict[str, Any]) -> WebhookEnqueueResult:
+        ids = webhook_idempotency_ids(payload)
+        if not ids:
+            return WebhookEnqueueResult(queued=False)
+        status, fresh = await self._enqueue_script(
+            keys=[WEBHOOK_STREAM_KEY] + [WEBHOOK_DEDUP_KEY_PREFIX + id_ for id_ in ids],
+            args=[settings.WHATSAPP_WEBHOOK_STREAM_MAX_BACKLOG, settings.WHATSAPP_WEBHOOK_DEDUP_TTL_SECONDS, raw_body] + ids,
+        )
+        if int(status) < 0:
+            return WebhookEnqueueResult(queued=False, backlog_full=True)
+        result = WebhookEnqueueResult(queued=int(status) == 1, fresh=int(fresh), duplicates=len(ids) - int(fresh))
+        metrics.incr("whatsapp_webhook_events", len(ids))
+        if result.duplicates:
+            metrics.incr("whatsapp_webhook_duplicates", result.duplicates)
+        return result
+
+    async def backlog(self) -> int:
+        return await self._redis.xlen(WEBHOOK_STREAM_KEY)
+
+    async def ensure_group(self) -> None:
+        try:
+            await self._redis.xgroup_create(WEBHOOK_STREAM_KEY, WEBHOOK_STREAM_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> List[Tuple[str, Dict[str, Any]]]:
+        response = await self._redis.xreadgroup(WEBHOOK_STREAM_GROUP, consumer, {WEBHOOK_STREAM_KEY: ">"}, count=count, block=block_ms)
+        return [entry for _, entries in response or [] for entry in entries]
+
+    async def claim_stale(self, consumer: str, count: int) -> List[Tuple[str, Dict[str, Any]]]:
+        min_idle_ms = int(settings.WHATSAPP_WEBHOOK_CLAIM_IDLE_SECONDS * 1000)
+        response = await self._redis.xautoclaim(WEBHOOK_STREAM_KEY, WEBHOOK_STREAM_GROUP, consumer, min_idle_ms, start_id="0-0", count=count)
+        return [entry for entry in response[1] if entry[1]] # Entradas já removidas voltam sem campos
+
+    async def delivery_counts(self, entry_ids: List[str]) -> Dict[str, int]:
+        """Quantas vezes cada entrada pendente já foi entregue (XREADGROUP + cada XAUTOCLAIM); um round-trip."""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for entry_id in entry_ids:
+                pipe.xpending_range(WEBHOOK_STREAM_KEY, WEBHOOK_STREAM_GROUP, min=entry_id, max=entry_id, count=1)
+            results = await pipe.execute()
+        return {entry_id: int(pending[0]["times_delivered"]) if pending else 0 for entry_id, pending in zip(entry_ids, results)}
+
+    async def ack(self, entry_ids: List[str]) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.xack(WEBHOOK_STREAM_KEY, WEBHOOK_STREAM_GROUP, *entry_ids)
+            pipe.xdel(WEBHOOK_STREAM_KEY, *entry_ids) # XLEN = backlog real
+            await pipe.execute()
+
+    async def dead_letter(self, entry_id: str, fields: Dict[Any, Any], error: str, deliveries: int = 0) -> None:
+        """Copia a entrada para o dead-letter (com o erro) e dá ack + XDEL, na mesma transação."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(WEBHOOK_DEAD_LETTER_KEY, {**fields, "source_id": entry_id, "error": error[:1000], "deliveries": deliveries},
+                      maxlen=settings.WHATSAPP_WEBHOOK_STREAM_MAX_BACKLOG, approximate=True)
+            pipe.xack(WEBHOOK_STREAM_KEY, WEBHOOK_STREAM_GROUP, entry_id)
+            pipe.xdel(WEBHOOK_STREAM_KEY, entry_id)
+            await pipe.execute()
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+async def consume_webhook_stream(
+    stream: WebhookStream,
+    db: AsyncIOMotorDatabase,
+    consumer: str,
+    timers: Optional[AutoResponderTimers] = None,
+    publish: Optional[Publish] = None,
+    batch_size: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    block_ms: int = 1000,
+) -> Dict[str, int]:
+    """Consome o stream por até `max_seconds`, um lote de entradas por vez. Retorna contadores da execução."""
+    batch_size = batch_size or settings.WHATSAPP_WEBHOOK_CONSUMER_BATCH
+    deadline = time.monotonic() + (max_seconds if max_seconds is not None else settings.WHATSAPP_WEBHOOK_CONSUMER_SECONDS)
+    log = logger.bind(service="WhatsAppWebhookStream", consumer=consumer)
+    stats = {"entries": 0, "batches": 0, "messages": 0, "statuses": 0, "reclaimed": 0, "dead_lettered": 0}
+    await stream.ensure_group()
+
+    async def process(entries: List[Tuple[str, Dict[Any, Any]]]) -> None:
+        """Um lote: malformadas vão para o dead-letter, o resto vira um WebhookBatch e recebe ack depois de gravado."""
+        combined_entries: List[Dict[str, Any]] = []
+        processed: List[str] = []
+        for entry_id, fields in entries:
+            decoded = {_decode(k): v for k, v in fields.items()}
+            try:
+                payload = filter_webhook_payload(json.loads(decoded["body"]), json.loads(_decode(decoded["fresh"])))
+                combined_entries += payload.get("entry") or []
+                processed.append(entry_id)
+            except (KeyError, ValueError) as e:
+                log.error(f"Dead-lettering malformed webhook stream entry {entry_id}: {e}")
+                await stream.dead_letter(entry_id, fields, f"malformed entry: {e}")
+                stats["dead_lettered"] += 1
+        batch = build_webhook_batch({"entry": combined_entries})
+        if batch.messages or batch.statuses:
+            # Se falhar, as entradas ficam pendentes (sem ack) e voltam via XAUTOCLAIM
+            await process_webhook_batch(batch, db, timers=timers, publish=publish)
+        if processed:
+            await stream.ack(processed)
+        stats["entries"] += len(entries); stats["batches"] += 1
+        stats["messages"] += len(batch.messages); stats["statuses"] += len(batch.statuses)
+
+    entries = [(_decode(entry_id), fields) for entry_id, fields in await stream.claim_stale(consumer, batch_size)]
+    stats["reclaimed"] = len(entries)
+    if entries:
+        # Já falharam em lote WHATSAPP_WEBHOOK_MAX_DELIVERIES - 1 vezes: uma por vez, para isolar a envenenada
+        deliveries = await stream.delivery_counts([entry_id for entry_id, _ in entries])
+        exhausted = [entry for entry in entries if deliveries[entry[0]] >= settings.WHATSAPP_WEBHOOK_MAX_DELIVERIES]
+        entries = [entry for entry in entries if deliveries[entry[0]] < settings.WHATSAPP_WEBHOOK_MAX_DELIVERIES]
+        for entry_id, fields in exhausted:
+            try:
+                await process([(entry_id, fields)])
+            except Exception as e:
+                log.exception(f"Webhook stream entry {entry_id} failed after {deliveries[entry_id]} deliveries; dead-lettering: {e}")
+                await stream.dead_letter(entry_id, fields, repr(e), deliveries[entry_id])
+                stats["dead_lettered"] += 1
+    while True:
+        if not entries:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            entries = [(_decode(entry_id), fields) for entry_id, fields in await stream.read(consumer, batch_size, min(block_ms, remaining_ms))]
+            if not entries:
+                continue
+        await process(entries)
+        entries = []
+
+    if stats["dead_lettered"]:
+        metrics.incr("whatsapp_webhook_stream_dead_lettered", stats["dead_lettered"])
+    if stats["entries"]:
+        metrics.incr("whatsapp_webhook_stream_entries", stats["entries"])
+        log.info(f"Webhook stream consumed: {stats}")
+    return stats
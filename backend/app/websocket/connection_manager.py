@@ -1 +1,345 @@
-# placeholder – conteúdo não presente no 16.md
+# agentos_core/app/websocket/connection_manager.py
+
+import asyncio
+import os
+import secrets
+import socket
+import time
+import uuid
+from typing import Any, Collection, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+import redis.asyncio as redis
+from fastapi import WebSocket, status as http_status
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.websocket.encoding import EncodedEvent, dumps, encode_event, loads
+from app.websocket.send_queue import COALESCED, DROPPED, OVERFLOW, SocketSendQueue
+from app.websocket.topics import connection_topic, user_topic, validate_topic
+
+WS_BACKPLANE_CHANNEL = "ws:events"
+
+def _new_node_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class ConnectionManager:
+    """
+    Conexões WebSocket ativas em /updates, indexadas por usuário e por tópico (app/websocket/topics.py).
+
+    - publish(topics, message): entrega só para os sockets inscritos em algum dos tópicos (uma cópia por socket)
+    - send_personal_message: tópico user:<id>, no qual todo socket é inscrito ao conectar
+    - connection:<id>: tópico de um único socket (id secreto retornado por connect), ex.: deltas do /gateway/stream
+    - broadcast: todos os sockets (eventos realmente globais)
+
+    Envio: cada socket tem uma fila limitada com task escritora (app/websocket/send_queue.py); publish só
+    enfileira, então a latência não depende do cliente mais lento. Clientes que passam do limite da fila são
+    desconectados (1013, "try again later").
+
+    Backplane (WS_BACKPLANE_ENABLED): publish/broadcast entregam aos sockets locais e publicam o evento uma vez
+    no canal Redis WS_BACKPLANE_CHANNEL. Cada nó da API (start_backplane no lifespan) escuta o canal e entrega
+    aos seus próprios inscritos, ignorando o que ele mesmo publicou; workers Celery só publicam
+    (attach_backplane no runtime). Pub/sub é at-most-once: eventos publicados enquanto um nó está
+    desconectado do Redis se perdem para os sockets daquele nó.
+
+    Cada evento é codificado uma vez (app/websocket/encoding.py): o mesmo texto vai para as filas locais e,
+    como frame pronto, no envelope do backplane (cabeçalho JSON, quebra de linha, frame); os outros nós não decodificam
+    nem recodificam a mensagem.
+    """
+
+    def __init__(self):
+        self.active_connections: Dict[str, Set[WebSocket]] = {} # user_id -> sockets
+        self.socket_users: Dict[WebSocket, str] = {} # socket -> user_id (disconnect O(1))
+        self.topic_subscribers: Dict[str, Set[WebSocket]] = {} # tópico -> sockets
+        self.socket_topics: Dict[WebSocket, Set[str]] = {} # socket -> tópicos (para limpar no disconnect)
+        self.socket_connection_ids: Dict[WebSocket, str] = {} # socket -> id secreto da conexão
+        self._snapshots: Dict[str, FrozenSet[WebSocket]] = {} # tópico -> cópia imutável para o fan-out
+        self._all_sockets: Optional[Tuple[WebSocket, ...]] = None # Cópia para broadcast (None = refazer)
+        self._send_queues: Dict[WebSocket, SocketSendQueue] = {}
+        self._closing: Set[asyncio.Task] = set() # Fechamentos de clientes lentos em andamento
+        self.node_id = _new_node_id()
+        self._backplane: Optional[redis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    # Registro: todas as mutações são síncronas (sem await no meio) e o processo tem um único event loop, então
+    # não há lock. O fan-out itera cópias imutáveis (frozenset por tópico, tupla para broadcast) refeitas só na
+    # primeira leitura depois de uma mudança: connect/disconnect não copiam nada e publish não copia sets.
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.socket_users)
+
+    async def connect(self, websocket: WebSocket, user_id: str, topics: Optional[Iterable[str]] = None) -> str:
+        """
+        Aceita o socket e inscreve em user:<user_id>, connection:<id> + `topics` (padrão: WS_DEFAULT_TOPICS).
+        Retorna o id secreto da conexão (enviar só a este socket).
+        """
+        await websocket.accept()
+        if topics is None:
+            topics = [t.strip() for t in settings.WS_DEFAULT_TOPICS.split(",") if t.strip()]
+        connection_id = secrets.token_urlsafe(18)
+        self.active_connections.setdefault(user_id, set()).add(websocket)
+        self.socket_users[websocket] = user_id
+        self.socket_connection_ids[websocket] = connection_id
+        self._all_sockets = None
+        self._send_queues[websocket] = SocketSendQueue(websocket, self._drop_slow_consumer)
+        self._subscribe_topics(websocket, [user_topic(user_id), connection_topic(connection_id), *topics])
+        logger.bind(service="WSManager", user=user_id).info(f"WebSocket connected. Total connections: {self.connection_count}")
+        return connection_id
+
+    async def disconnect(self, websocket: WebSocket, user_id: Optional[str] = None) -> None:
+        owner = self.socket_users.pop(websocket, None)
+        if owner is None:
+            return # Já desconectado (ex.: cliente lento removido antes do finally do endpoint)
+        sockets = self.active_connections.get(owner)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.active_connections[owner]
+        self._all_sockets = None
+        self.socket_connection_ids.pop(websocket, None)
+        self._unsubscribe_topics(websocket, list(self.socket_topics.get(websocket, ())))
+        self.socket_topics.pop(websocket, None)
+        send_queue = self._send_queues.pop(websocket, None)
+        if send_queue is not None:
+            send_queue.close()
+        logger.bind(service="WSManager", user=owner).info(f"WebSocket disconnected. Total connections: {self.connection_count}")
+
+    # --- Inscrições ---
+    def _subscribe_topics(self, websocket: WebSocket, topics: Iterable[str]) -> None:
+        current = self.socket_topics.setdefault(websocket, set())
+        for topic in topics:
+            if topic in current or len(current) >= settings.WS_MAX_TOPICS_PER_CONNECTION:
+                continue
+            current.add(topic)
+            self.topic_subscribers.setdefault(topic, set()).add(websocket)
+            self._snapshots.pop(topic, None)
+
+    def _unsubscribe_topics(self, websocket: WebSocket, topics: Iterable[str]) -> None:
+        current = self.socket_topics.get(websocket, set())
+        for topic in topics:
+            current.discard(topic)
+            subscribers = self.topic_subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                self._snapshots.pop(topic, None)
+                if not subscribers:
+                    del self.topic_subscribers[topic]
+
+    async def subscribe(self, websocket: WebSocket, user_id: str, topics: Iterable[str]) -> Dict[str, Any]:
+        """Inscreve o socket nos tópicos válidos; retorna {"topics": inscrições atuais, "rejected": {tópico: motivo}}."""
+        accepted: List[str] = []
+        rejected: Dict[str, str] = {}
+        for topic in topics:
+            reason = validate_topic(topic, user_id)
+            if reason:
+                rejected[str(topic)] = reason
+            else:
+                accepted.append(topic)
+        if websocket not in self.socket_users:
+            return {"topics": [], "rejected": {**rejected, **{t: "not connected" for t in accepted}}}
+        room = settings.WS_MAX_TOPICS_PER_CONNECTION - len(self.socket_topics.get(websocket, ()))
+        new_topics = [t for t in accepted if t not in self.socket_topics.get(websocket, ())]
+        for topic in new_topics[max(room, 0):]:
+            rejected[topic] = "too many subscriptions"
+        self._subscribe_topics(websocket, accepted)
+        return {"topics": self.subscriptions(websocket), "rejected": rejected}
+
+    async def unsubscribe(self, websocket: WebSocket, user_id: str, topics: Iterable[str]) -> Dict[str, Any]:
+        # Mensagens pessoais e da própria conexão não podem ser desligadas
+        own_topics = {user_topic(user_id), connection_topic(self.socket_connection_ids.get(websocket, ""))}
+        self._unsubscribe_topics(websocket, [t for t in topics if t not in own_topics])
+        return {"topics": self.subscriptions(websocket), "rejected": {}}
+
+    def _topic_snapshot(self, topic: str) -> FrozenSet[WebSocket]:
+        snapshot = self._snapshots.get(topic)
+        if snapshot is None:
+            subscribers = self.topic_subscribers.get(topic)
+            if not subscribers:
+                return frozenset()
+            snapshot = self._snapshots[topic] = frozenset(subscribers)
+        return snapshot
+
+    def _targets(self, topics: Optional[Iterable[str]]) -> Collection[WebSocket]:
+        """Sockets alvo sem duplicatas: a maior cópia é usada como está, das demais só o que falta."""
+        if topics is None:
+            if self._all_sockets is None:
+                self._all_sockets = tuple(self.socket_users)
+            return self._all_sockets
+        snapshots = sorted((self._topic_snapshot(t) for t in set(topics)), key=len, reverse=True)
+        if not snapshots:
+            return ()
+        largest, rest = snapshots[0], snapshots[1:]
+        if not rest or not any(rest):
+            return largest
+        extra: Set[WebSocket] = set()
+        for snapshot in rest:
+            extra.update(ws for ws in snapshot if ws not in largest)
+        return [*largest, *extra]
+
+    # --- Envio ---
+    def _send_to(self, sockets: Collection[WebSocket], event: EncodedEvent) -> int:
+        """Enfileira o frame já codificado na fila de cada socket. Retorna quantos aceitaram o frame."""
+        if not sockets:
+            return 0
+        text, coalesce_key, droppable = event.text, event.coalesce_key, event.droppable
+        accepted = coalesced = dropped = 0
+        for ws in sockets:
+            send_queue = self._send_queues.get(ws)
+            if send_queue is None: # Desconectou entre a escolha dos alvos e o envio
+                continue
+            result = send_queue.enqueue(text, coalesce_key, droppable)
+            if result == OVERFLOW:
+                self._close_later(ws, f"send queue full ({len(send_queue)} frames)")
+            elif result == DROPPED:
+                dropped += 1
+            else:
+                accepted += 1
+                coalesced += result == COALESCED
+        if coalesced:
+            metrics.incr("ws_frames_coalesced", coalesced)
+        if dropped:
+            metrics.incr("ws_frames_dropped", dropped)
+        return accepted
+
+    async def send_to_socket(self, websocket: WebSocket, message: Union[str, Dict[str, Any]]) -> bool:
+        """Resposta direta a um socket (pong, confirmações), pela mesma fila dos eventos para manter a ordem."""
+        send_queue = self._send_queues.get(websocket)
+        if send_queue is None:
+            return False
+        text = message if isinstance(message, str) else dumps(message)
+        if send_queue.enqueue(text) == OVERFLOW:
+            self._close_later(websocket, f"send queue full ({len(send_queue)} frames)")
+            return False
+        return True
+
+    # --- Clientes lentos ---
+    async def _drop_slow_consumer(self, websocket: WebSocket, reason: str) -> None:
+        metrics.incr("ws_slow_consumer_disconnects")
+        logger.bind(service="WSManager").warning(f"Dropping WebSocket {websocket.client}: {reason}")
+        await self.disconnect(websocket)
+        try:
+            await asyncio.wait_for(websocket.close(code=http_status.WS_1013_TRY_AGAIN_LATER), timeout=1.0)
+        except Exception:
+            pass # Já fechado ou travado: o receive loop do endpoint termina com o disconnect
+
+    def _close_later(self, websocket: WebSocket, reason: str) -> None:
+        # Chamado durante o fan-out: desconectar fora do caminho de quem publica
+        if websocket not in self._send_queues:
+            return
+        self._send_queues.pop(websocket).close() # Não aceita mais frames enquanto o fechamento não roda
+        task = asyncio.get_running_loop().create_task(self._drop_slow_consumer(websocket, reason))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _deliver_local(self, topics: Optional[Iterable[str]], event: EncodedEvent) -> int:
+        """Entrega aos sockets deste processo: inscritos em algum dos `topics` (None = todos)."""
+        return self._send_to(self._targets(topics), event)
+
+    async def _publish_backplane(self, topics: Optional[List[str]], event: EncodedEvent) -> None:
+        if self._backplane is None:
+            return
+        header = {"origin": self.node_id, "sent_at": time.time(), "topics": topics,
+                  "coalesce_key": event.coalesce_key, "droppable": event.droppable}
+        try:
+            await self._backplane.publish(WS_BACKPLANE_CHANNEL, f"{dumps(header)}\n{event.text}")
+        except Exception as e: # Os sockets locais já receberam; os outros nós perdem este evento
+            metrics.incr("ws_backplane_publish_errors")
+            logger.bind(service="WSManager").error(f"Failed to publish WebSocket event to backplane: {e}")
+
+    async def publish(self, topics: Iterable[str], message: Dict[str, Any]) -> int:
+        """Envia `message` para quem está inscrito em algum dos `topics`, em todos os nós. Retorna quantos sockets locais receberam."""
+        topics = list(topics)
+        event = encode_event(message)
+        delivered = await self._deliver_local(topics, event)
+        await self._publish_backplane(topics, event)
+        return delivered
+
+    async def send_personal_message(self, message: Dict[str, Any], user_id: str) -> int:
+        return await self.publish([user_topic(user_id)], message)
+
+    async def broadcast(self, message: Dict[str, Any]) -> int:
+        event = encode_event(message)
+        delivered = await self._deliver_local(None, event)
+        await self._publish_backplane(None, event)
+        return delivered
+
+    # --- Backplane Redis ---
+    async def _handle_backplane_message(self, data: Any) -> None:
+        try:
+            if isinstance(data, bytes):
+                data = data.decode()
+            raw_header, frame = data.split("\n", 1) # JSON compacto não tem quebra de linha literal
+            header = loads(raw_header)
+            if header.get("origin") == self.node_id:
+                return # Já entregue localmente em publish()
+            metrics.observe("ws_backplane_lag_seconds", max(time.time() - float(header.get("sent_at") or 0), 0.0))
+            event = EncodedEvent(frame, header.get("coalesce_key"), bool(header.get("droppable")))
+            await self._deliver_local(header.get("topics"), event)
+        except (TypeError, ValueError, AttributeError, UnicodeDecodeError):
+            logger.bind(service="WSManager").warning(f"Ignoring malformed backplane message: {data!r:.200}")
+
+    async def _listen(self, redis_client: redis.Redis) -> None:
+        log = logger.bind(service="WSManager", node=self.node_id)
+        backoff = 1.0
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(WS_BACKPLANE_CHANNEL)
+                backoff = 1.0
+                log.info(f"Listening for WebSocket events on '{WS_BACKPLANE_CHANNEL}'.")
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self._handle_backplane_message(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"WebSocket backplane listener disconnected ({e}); retrying in {backoff:.0f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def attach_backplane(self, redis_client: Optional[redis.Redis]) -> None:
+        """Só publicação (workers Celery): eventos deste processo chegam aos sockets de todos os nós da API."""
+        if not settings.WS_BACKPLANE_ENABLED:
+            return
+        if redis_client is None:
+            logger.bind(service="WSManager").warning("Redis unavailable: WebSocket events reach only local sockets.")
+        self._backplane = redis_client
+
+    def start_backplane(self, redis_client: Optional[redis.Redis]) -> None:
+        """Publicação + listener no loop atual (nós da API; idempotente)."""
+        self.attach_backplane(self._backplane or redis_client)
+        if self._backplane is None or (self._listener is not None and not self._listener.done()):
+            return
+        self._listener = asyncio.get_running_loop().create_task(self._listen(self._backplane))
+
+    async def stop_backplane(self) -> None:
+        self._backplane = None
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._listener = None
+
+    def reset(self) -> None:
+        """Esquece o cliente/listener herdados (após fork); o processo filho ganha um node_id próprio."""
+        self._backplane = None
+        self._listener = None
+        self.node_id = _new_node_id()
+
+    def subscriptions(self, websocket: WebSocket) -> List[str]:
+        return sorted(self.socket_topics.get(websocket, ()))
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self.topic_subscribers.get(topic, ()))
+
+# Instância global do processo
+manager = ConnectionManager()
@@ -0,0 +1,54 @@
+# agentos_core/app/websocket/encoding.py
+
+"""
+Codificação dos eventos WebSocket: um evento é serializado uma única vez (encode_event) e o mesmo texto vai
+para todas as filas de saída e para o backplane Redis.
+
+- orjson (dependência do projeto; bytes -> str uma vez por evento); sem ele, json da stdlib em modo compacto
+- datetime sai em ISO 8601 nos dois caminhos; tipos desconhecidos (ObjectId, Decimal...) viram str
+- frames continuam de texto (JSON.parse no cliente); a compressão é a permessage-deflate negociada pelo
+  uvicorn (WS_PER_MESSAGE_DEFLATE no start.sh)
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from app.websocket.send_queue import frame_policy
+
+try:
+    import orjson
+except ImportError: # Ambiente sem orjson (ex.: só a stdlib): mesmo formato via json
+    orjson = None
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS).decode()
+
+    def loads(data: Any) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps(value: Any) -> str:
+        return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+    def loads(data: Any) -> Any:
+        return json.loads(data)
+
+@dataclass(frozen=True)
+class EncodedEvent:
+    """Frame pronto para envio + política da fila de saída (send_queue.frame_policy)."""
+    text: str
+    coalesce_key: Optional[str] = None
+    droppable: bool = False
+
+def encode_event(message: Dict[str, Any]) -> EncodedEvent:
+    coalesce_key, droppable = frame_policy(message)
+    return EncodedEvent(dumps(message), coalesce_key, droppable)
@@ -0,0 +1,101 @@
+# agentos_core/app/websocket/send_queue.py
+
+"""
+Fila de saída por conexão WebSocket: quem publica só enfileira (O(1), sem await) e uma task escritora por
+socket faz os send_text em ordem. Um cliente lento atrasa apenas a própria fila.
+
+Políticas (por frame, definidas em frame_policy):
+- coalescência: eventos com a mesma chave (status de uma mensagem: `whatsapp_message_status` por id) ainda
+  pendentes são substituídos pelo mais novo, na mesma posição da fila
+- descarte: acima de WS_SEND_QUEUE_SOFT_LIMIT frames, tipos em WS_DROPPABLE_EVENT_TYPES são descartados
+- limite: com WS_SEND_QUEUE_MAX_FRAMES pendentes (ou um send_text parado por WS_SEND_TIMEOUT_SECONDS) o
+  cliente é considerado lento e o ConnectionManager desconecta o socket
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+
+QUEUED = "queued"
+COALESCED = "coalesced"
+DROPPED = "dropped"
+OVERFLOW = "overflow"
+
+# Tipo do evento -> chave de coalescência a partir do payload
+_COALESCE_KEYS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "whatsapp_message_status": lambda payload: f"status:{payload['id']}" if payload.get("id") else None,
+}
+
+def frame_policy(message: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+    """(chave de coalescência, descartável) de um evento."""
+    event_type = message.get("type")
+    payload = message.get("payload")
+    key_fn = _COALESCE_KEYS.get(event_type)
+    coalesce_key = key_fn(payload) if key_fn is not None and isinstance(payload, dict) else None
+    droppable = event_type in {t.strip() for t in settings.WS_DROPPABLE_EVENT_TYPES.split(",")}
+    return coalesce_key, droppable
+
+class SocketSendQueue:
+    """Fila limitada + task escritora de um socket. `on_failure(websocket, reason)` é chamado se o envio falhar."""
+
+    def __init__(self, websocket: WebSocket, on_failure: Callable[[WebSocket, str], Awaitable[None]]):
+        self.websocket = websocket
+        self._on_failure = on_failure
+        self._frames: Deque[List[Any]] = deque() # [chave de coalescência, texto]
+        self._pending: Dict[str, List[Any]] = {} # chave -> frame ainda na fila
+        self._ready = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def enqueue(self, text: str, coalesce_key: Optional[str] = None, droppable: bool = False) -> str:
+        """Enfileira sem bloquear. Retorna QUEUED, COALESCED, DROPPED ou OVERFLOW (cliente lento: desconectar)."""
+        if coalesce_key is not None:
+            frame = self._pending.get(coalesce_key)
+            if frame is not None:
+                frame[1] = text
+                return COALESCED
+        depth = len(self._frames)
+        if depth >= settings.WS_SEND_QUEUE_MAX_FRAMES:
+            return OVERFLOW
+        if droppable and depth >= settings.WS_SEND_QUEUE_SOFT_LIMIT:
+            return DROPPED
+        frame = [coalesce_key, text]
+        self._frames.append(frame)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = frame
+        self._ready.set()
+        return QUEUED
+
+    async def _run(self) -> None:
+        while True:
+            if not self._frames:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            frame = self._frames.popleft()
+            if frame[0] is not None and self._pending.get(frame[0]) is frame:
+                del self._pending[frame[0]]
+            try:
+                async with asyncio.timeout(settings.WS_SEND_TIMEOUT_SECONDS): # Sem task extra por frame (wait_for)
+                    await self.websocket.send_text(frame[1])
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                await self._on_failure(self.websocket, f"send stalled for {settings.WS_SEND_TIMEOUT_SECONDS}s")
+                return
+            except Exception as e:
+                await self._on_failure(self.websocket, f"send failed: {e}")
+                return
+
+    def close(self) -> None:
+        """Para a escritora e descarta o que estava pendente."""
+        self._frames.clear()
+        self._pending.clear()
+        if self._task is not asyncio.current_task(): # on_failure roda na própria escritora, que já vai terminar
+            self._task.cancel()
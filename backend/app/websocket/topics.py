@@ -0,0 +1,50 @@
+# agentos_core/app/websocket/topics.py
+
+"""
+Tópicos das conexões WebSocket (/updates). Publicadores escolhem os tópicos; cada socket recebe um
+evento uma única vez, mesmo inscrito em mais de um dos tópicos alvo.
+
+- chat:<chat_id>        mensagens e status de um chat WhatsApp
+- delivery:<id>         chat/eventos de uma entrega
+- user:<user_id>        mensagens pessoais (inscrição automática, só o próprio usuário)
+- dashboard:<view>      visões agregadas (ex.: dashboard:whatsapp recebe os eventos de todos os chats)
+- connection:<id>       uma conexão específica (inscrição automática). O id é aleatório e só vai para a
+                        própria conexão no frame connection_status: quem o apresenta (ex.: /gateway/stream)
+                        prova que é dono da conexão. Clientes não podem se inscrever nesse tipo de tópico.
+"""
+
+from typing import List, Optional
+
+TOPIC_PREFIXES = ("chat:", "delivery:", "user:", "dashboard:")
+MAX_TOPIC_LENGTH = 200
+
+def chat_topic(chat_id: str) -> str:
+    return f"chat:{chat_id}"
+
+def delivery_topic(delivery_id: str) -> str:
+    return f"delivery:{delivery_id}"
+
+def user_topic(user_id: str) -> str:
+    return f"user:{user_id}"
+
+def dashboard_topic(view: str) -> str:
+    return f"dashboard:{view}"
+
+def connection_topic(connection_id: str) -> str:
+    return f"connection:{connection_id}"
+
+WHATSAPP_DASHBOARD_TOPIC = dashboard_topic("whatsapp")
+
+def whatsapp_chat_topics(chat_id: str) -> List[str]:
+    """Eventos de um chat WhatsApp: quem acompanha o chat e quem acompanha a lista de chats."""
+    return [chat_topic(chat_id), WHATSAPP_DASHBOARD_TOPIC]
+
+def validate_topic(topic: str, user_id: str) -> Optional[str]:
+    """Retorna o motivo da recusa, ou None se o cliente `user_id` pode se inscrever em `topic`."""
+    if not isinstance(topic, str) or not topic or len(topic) > MAX_TOPIC_LENGTH:
+        return "invalid topic"
+    if not topic.startswith(TOPIC_PREFIXES) or topic.endswith(":"):
+        return "unknown topic type"
+    if topic.startswith("user:") and topic != user_topic(user_id):
+        return "cannot subscribe to another user's topic"
+    return None
@@ -2,10 +2,13 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
 from datetime import timedelta
 
 # Get Redis URL from environment variable, default to localhost if not set
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Mesmo valor de settings.WHATSAPP_WEBHOOK_CONSUMER_SECONDS (duração de cada execução do consumidor do stream)
+webhook_consumer_seconds = float(os.getenv("WHATSAPP_WEBHOOK_CONSUMER_SECONDS", "10"))
 
 # Example configuration
 celery_app = Celery(
@@ -15,6 +18,10 @@ celery_app = Celery(
     include=[
         "app.worker.tasks_delivery",
         "app.worker.tasks_scheduling",
+        "app.worker.tasks_whatsapp", # whatsapp.send_message / check_chat_timeout (timers do AutoResponder)
+        "app.worker.tasks_whatsapp_outbox",
+        "app.worker.tasks_whatsapp_timers",
+        "app.worker.tasks_whatsapp_webhook",
     ]
 )
 
@@ -32,5 +39,38 @@ celery_app.conf.update(
             "schedule": timedelta(minutes=5),
             "options": {"queue": "periodic"}
         },
+        "drain-whatsapp-send-queue": {
+            "task": "whatsapp.drain_send_queue",
+            "schedule": timedelta(seconds=2),
+            "options": {"expires": 2} # Disparos atrasados são descartados (o próximo dreno pega a fila)
+        },
+        "poll-autoresponder-timers": {
+            "task": "whatsapp.poll_autoresponder_timers",
+            "schedule": timedelta(seconds=5), # Precisão dos timers do AutoResponder (ZSET no Redis)
+            "options": {"expires": 5}
+        },
+        "consume-whatsapp-webhook-stream": {
+            "task": "whatsapp.consume_webhook_stream",
+            "schedule": timedelta(seconds=webhook_consumer_seconds), # Cada execução bloqueia no XREADGROUP pelo mesmo intervalo
+            "options": {"expires": webhook_consumer_seconds}
+        },
     }
-)
\ No newline at end of file
+)
+
+# Runtime async por processo de worker: um event loop persistente e os clientes Mongo/Redis/HTTP
+# conectados uma vez (ver app/worker/runtime.py)
+@worker_process_init.connect
+def _start_worker_runtime(**kwargs):
+    from app.worker.runtime import worker_runtime
+    worker_runtime.start()
+
+@worker_process_shutdown.connect
+def _stop_worker_runtime(**kwargs):
+    from app.worker.runtime import worker_runtime
+    worker_runtime.shutdown()
+
+@worker_shutdown.connect
+def _stop_solo_worker_runtime(**kwargs):
+    # Pool solo/threads não emite worker_process_*; no prefork o processo principal não tem runtime (no-op)
+    from app.worker.runtime import worker_runtime
+    worker_runtime.shutdown()
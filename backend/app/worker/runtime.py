@@ -0,0 +1,145 @@
+# agentos_core/app/worker/runtime.py
+
+"""
+Runtime async dos workers Celery.
+
+Cada processo de worker mantém UM event loop de longa duração (criado no worker_process_init) e os
+clientes ligados a ele — Motor (mongo_manager), Redis (redis_manager) e o pool HTTP da Graph API —
+são conectados uma única vez. Tasks `async def` declaradas com `base=AsyncTask` rodam nesse loop:
+
+    @celery_app.task(bind=True, base=AsyncTask, name="whatsapp.send_message")
+    async def send_whatsapp_message(self, ...):
+        db = get_mongo_db_instance()
+        ...
+
+Sem o sinal (pool solo, modo eager, scripts) o runtime sobe sob demanda na primeira task.
+O loop roda na thread da task (run_until_complete), então self.request/self.retry e o trace_id_var
+continuam funcionando como nas tasks síncronas.
+"""
+
+import asyncio
+import inspect
+import os
+import threading
+import time
+from typing import Any, Awaitable, Optional, TypeVar
+
+from celery import Task
+from loguru import logger
+
+from app.core.database import mongo_manager, redis_manager
+from app.core.settings_cache import settings_cache
+from app.websocket.connection_manager import manager as ws_manager
+from app.services.whatsapp_service import whatsapp_http_manager
+
+T = TypeVar("T")
+
+MONGO_RECONNECT_INTERVAL_SECONDS = 30.0 # Sem Mongo, no máximo uma tentativa (timeout de 5s) a cada intervalo
+
+class WorkerAsyncRuntime:
+    """Event loop persistente por processo + ciclo de vida dos clientes async compartilhados."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._thread_id: Optional[int] = None
+        self._mongo_retry_at = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None and not self._loop.is_closed() and self._pid == os.getpid()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Cria o loop do processo e conecta os clientes (idempotente)."""
+        if self.started:
+            return self._loop
+        self._forget_inherited_clients()
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._pid = os.getpid()
+        self._thread_id = threading.get_ident()
+        self._loop.run_until_complete(self._connect_clients())
+        logger.bind(service="WorkerRuntime", pid=self._pid).info("Worker async runtime started (persistent event loop).")
+        return self._loop
+
+    def _forget_inherited_clients(self) -> None:
+        # Após fork (prefork) os clientes do processo pai apontam para sockets/loops que não são deste processo:
+        # descartar sem fechar (fechar afetaria o pai)
+        mongo_manager.client = None
+        mongo_manager.db = None
+        redis_manager.client = None
+        whatsapp_http_manager.reset()
+        settings_cache.reset()
+        ws_manager.reset()
+
+    async def _connect_clients(self) -> None:
+        log = logger.bind(service="WorkerRuntime")
+        try:
+            await mongo_manager.connect()
+        except Exception as e: # Tasks que precisarem do Mongo falham (e fazem retry); o runtime tenta de novo
+            self._mongo_retry_at = time.monotonic() + MONGO_RECONNECT_INTERVAL_SECONDS
+            log.error(f"MongoDB unavailable at worker start: {e}")
+        await redis_manager.connect() # Já loga e segue sem Redis em caso de falha
+        await whatsapp_http_manager.connect()
+        # Roda no loop persistente: as invalidações são aplicadas enquanto o loop executa tasks (o TTL cobre o resto)
+        settings_cache.start_listener(redis_manager.client)
+        # Worker não tem sockets: ws_manager.publish só publica no backplane (os nós da API entregam)
+        ws_manager.attach_backplane(redis_manager.client)
+
+    async def _ensure_clients(self) -> None:
+        if mongo_manager.db is None and time.monotonic() >= self._mongo_retry_at:
+            try:
+                await mongo_manager.connect()
+            except Exception as e:
+                self._mongo_retry_at = time.monotonic() + MONGO_RECONNECT_INTERVAL_SECONDS
+                logger.bind(service="WorkerRuntime").error(f"MongoDB still unavailable: {e}")
+
+    def run(self, awaitable: Awaitable[T]) -> T:
+        """Executa `awaitable` no loop persistente do processo e retorna o resultado."""
+        if asyncio._get_running_loop() is not None or (self.started and threading.get_ident() != self._thread_id):
+            if inspect.iscoroutine(awaitable):
+                awaitable.close() # Evita o warning "coroutine was never awaited"
+            raise RuntimeError("Async Celery tasks must run in the worker thread that owns the runtime loop "
+                               "(prefork/solo pool), not from a running event loop; use .delay()/.apply_async().")
+        loop = self.start()
+
+        async def with_clients() -> T:
+            await self._ensure_clients()
+            return await awaitable
+        return loop.run_until_complete(with_clients())
+
+    def shutdown(self) -> None:
+        """Fecha os clientes e o loop (worker_process_shutdown / worker_shutdown)."""
+        if not self.started:
+            return
+        loop = self._loop
+        try:
+            loop.run_until_complete(self._disconnect_clients())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        except Exception as e:
+            logger.bind(service="WorkerRuntime").error(f"Error shutting down worker async runtime: {e}")
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+            self._loop = None
+            logger.bind(service="WorkerRuntime", pid=self._pid).info("Worker async runtime stopped.")
+
+    async def _disconnect_clients(self) -> None:
+        await ws_manager.stop_backplane()
+        await settings_cache.stop_listener()
+        await whatsapp_http_manager.disconnect()
+        await redis_manager.disconnect()
+        await mongo_manager.disconnect()
+
+# Instância global (uma por processo de worker)
+worker_runtime = WorkerAsyncRuntime()
+
+class AsyncTask(Task):
+    """Base para tasks `async def`: a coroutine roda no loop persistente do worker."""
+    abstract = True
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        result = super().__call__(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return worker_runtime.run(result)
+        return result
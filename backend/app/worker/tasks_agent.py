@@ -6,6 +6,8 @@ from app.core.logging_config import trace_id_var
 import uuid  
 import asyncio  
 from typing import Dict, Any, Optional
+from celery.exceptions import Retry  
+from app.worker.runtime import AsyncTask  
 
 # Tentar importar engine - pode causar erro circular se engine importar worker  
 ENGINE_AVAILABLE = False  
@@ -22,8 +24,8 @@ except ImportError as e:
          return {"status": "error", "message": "Agent engine (GatewayService) unavailable due to import error."}  
      agent_process_prompt = agent_process_prompt_dummy # Usar dummy
 
-@celery_app.task(bind=True, name="agent.process_command", max_retries=2, default_retry_delay=30, acks_late=True)  
-def process_agent_command_task(self, prompt: str, user_id: str | None = None, context: dict | None = None, trace_id: str | None = None):  
+@celery_app.task(bind=True, base=AsyncTask, name="agent.process_command", max_retries=2, default_retry_delay=30, acks_late=True)  
+async def process_agent_command_task(self, prompt: str, user_id: str | None = None, context: dict | None = None, trace_id: str | None = None):  
     """  
     Task Celery para processar comando genérico do agente (atualmente stub/placeholder).  
     Deveria chamar a lógica principal de processamento de prompt/intenção.  
@@ -48,13 +50,10 @@ def process_agent_command_task(self, prompt: str, user_id: str | None = None, co
 
         # Exemplo simulado:  
         log.warning("Agent command processing logic is currently a placeholder.")  
-        async def run_mock_processing():  
-             await asyncio.sleep(2) # Simular trabalho  
-             # Simular uma chamada ao Gateway ou engine interno  
-             # result = await agent_process_prompt(prompt, user_id=user_id, context=context)  
-             return {"success": True, "message": f"Command processed (Mock): {prompt[:50]}..."}
-
-        result = asyncio.run(run_mock_processing())  
+        await asyncio.sleep(2) # Simular trabalho (no loop persistente do worker)  
+        # Simular uma chamada ao Gateway ou engine interno  
+        # result = await agent_process_prompt(prompt, user_id=user_id, context=context)  
+        result = {"success": True, "message": f"Command processed (Mock): {prompt[:50]}..."}  
         # --- Fim Lógica Real ---
 
         log.info(f"Agent command processing completed. Result Success: {result.get('success', False)}")  
@@ -73,6 +72,7 @@ def process_agent_command_task(self, prompt: str, user_id: str | None = None, co
             log.error("Max retries exceeded for agent command task.")  
             return {"status": "failed", "message": "Task failed after max retries.", "error": str(e)}  
         except Exception as retry_err:  
+             if isinstance(retry_err, Retry): raise  
              log.exception(f"Failed to initiate retry: {retry_err}")  
              raise e  
     finally:  
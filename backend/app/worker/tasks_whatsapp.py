@@ -10,20 +10,20 @@ from typing import List, Optional, Dict, Any
 
 # Importar services e DB  
 from app.services import whatsapp_service # Serviço que CHAMA a API Meta  
-from app.db.mongo_client import get_database, AsyncIOMotorDatabase  
+from app.core.database import get_mongo_db_instance, get_redis_client_instance, AsyncIOMotorDatabase  
+from app.worker.runtime import AsyncTask  
+from celery.exceptions import Retry  
+from pymongo import DESCENDING  
 from app.websocket.connection_manager import manager as ws_manager  
-from app.models.whatsapp import WhatsAppMessageAPI # Para broadcast  
+from app.websocket.topics import whatsapp_chat_topics  
+from app.services.whatsapp_webhook import message_event_payload # Payload WS de mensagem (sem Pydantic)  
 # Importar dependências para AutoResponder  
 from app.core.config import settings  
-from app.modules.office.repository import SettingRepository, get_setting_repository # Settings  
+from app.core.settings_cache import settings_cache # Settings do AutoResponder  
 from app.modules.people.repository import UserRepository, get_user_repository # User repo  
-from app.modules.sales.repository import OrderRepository, get_order_repository # Order repo  
-from app.modules.delivery.repository import DeliveryRepository, get_delivery_repository # Delivery repo  
-from app.modules.people.models import UserInDB # Modelo User  
-from app.modules.sales.models import Order # Modelo Order  
-from app.modules.delivery.models import Delivery # Modelo Delivery  
-# Importar GatewayService para chamar LLM no AutoResponder  
-from app.modules.gateway.services import GatewayService, get_gateway_service
+# Cliente LLM (fallback/cache/limiter) para o AutoResponder  
+from app.services.llm_client import get_completion_with_fallback
+from app.services.token_budget import count_tokens, truncate_text
 
 # Coleções  
 WHATSAPP_CHATS_COLLECTION = "whatsapp_chats"  
@@ -50,22 +50,18 @@ def process_agent_whatsapp_message(self, chat_id: str, message_id: str, trace_id
     return {"status": "skipped_phase2", "response_message_id": None}
 
 # Task Envio de Mensagem (Implementada)  
-@celery_app.task(bind=True, name="whatsapp.send_message", max_retries=4, default_retry_delay=45, acks_late=True, reject_on_worker_lost=True)  
-def send_whatsapp_message(self, recipient_wa_id: str, message_text: str, internal_message_id: str, trace_id: str | None = None):  
-    """Task Celery: Chama Meta API via service, atualiza DB, broadcast WS."""  
+@celery_app.task(bind=True, base=AsyncTask, name="whatsapp.send_message", max_retries=4, default_retry_delay=45, acks_late=True, reject_on_worker_lost=True)  
+async def send_whatsapp_message(self, recipient_wa_id: str, message_text: str, internal_message_id: str, trace_id: str | None = None):  
+    """Task Celery: Chama Meta API via service, atualiza DB, broadcast WS (no loop persistente do worker)."""  
     current_trace_id = trace_id or f"task_{uuid.uuid4().hex[:12]}"; token = trace_id_var.set(current_trace_id)  
     log = logger.bind(trace_id=current_trace_id, task_name=self.name, job_id=self.request.id, recipient=recipient_wa_id, internal_msg_id=internal_message_id)  
     log.info("Executing task to send WhatsApp message via Meta API...")  
-    db: AsyncIOMotorDatabase = get_database()  
     new_status = "failed_send"; wami: Optional[str] = None; success = False
 
     try:  
-        # 1. Chamar o serviço de envio  
-        # Usar asyncio.run para chamar a função async do service dentro da task sync  
-        loop = asyncio.get_event_loop()  
-        success, wami = loop.run_until_complete(  
-            whatsapp_service.send_whatsapp_text_message(recipient_wa_id, message_text)  
-        )  
+        db: AsyncIOMotorDatabase = get_mongo_db_instance()  
+        # 1. Chamar o serviço de envio (pool HTTP do worker, conectado no worker_process_init)  
+        success, wami = await whatsapp_service.send_whatsapp_text_message(recipient_wa_id, message_text)  
         new_status = "sent" if success else "failed_send"  
         log.info(f"WhatsApp API send result: Success={success}, WAMI={wami}")
 
@@ -73,20 +69,16 @@ def send_whatsapp_message(self, recipient_wa_id: str, message_text: str, interna
         update_data = {"status": new_status, "status_timestamp": datetime.now(timezone.utc)}  
         if success and wami: update_data["official_wami"] = wami
 
-        update_result = loop.run_until_complete(  
-             db[WHATSAPP_MESSAGES_COLLECTION].update_one({"_id": internal_message_id}, {"$set": update_data})  
-        )  
+        update_result = await db[WHATSAPP_MESSAGES_COLLECTION].update_one({"_id": internal_message_id}, {"$set": update_data})  
         if update_result.matched_count > 0:  
              log.info(f"Updated message {internal_message_id} status to '{new_status}' in DB.")  
              # 3. Broadcast de Status via WebSocket  
-             async def broadcast_status():  
-                  chat_id_for_ws = recipient_wa_id # Chat ID é o recipiente  
-                  msg_to_broadcast = {  
-                      "type": "whatsapp_message_status",  
-                      "payload": {"id": internal_message_id, "chat_id": chat_id_for_ws, "status": new_status, "wami": wami, "timestamp": datetime.now(timezone.utc).isoformat()}  
-                  }  
-                  await ws_manager.broadcast(msg_to_broadcast)  
-             loop.run_until_complete(broadcast_status()); log.debug("Status update broadcasted.")  
+             chat_id_for_ws = recipient_wa_id # Chat ID é o recipiente  
+             msg_to_broadcast = {  
+                 "type": "whatsapp_message_status",  
+                 "payload": {"id": internal_message_id, "chat_id": chat_id_for_ws, "status": new_status, "wami": wami, "timestamp": datetime.now(timezone.utc).isoformat()}  
+             }  
+             await ws_manager.publish(whatsapp_chat_topics(chat_id_for_ws), msg_to_broadcast); log.debug("Status update published.")  
         else:  
              log.warning(f"Could not find message {internal_message_id} in DB to update status.")
 
@@ -100,7 +92,7 @@ def send_whatsapp_message(self, recipient_wa_id: str, message_text: str, interna
     except Exception as e:  
         log.exception("Error executing send WhatsApp message task.")  
         # Tentar atualizar status para failed no DB  
-        try: asyncio.run(db[WHATSAPP_MESSAGES_COLLECTION].update_one({"_id": internal_message_id, "status": {"$ne": "failed_send"}}, {"$set": {"status": "failed_send", "status_timestamp": datetime.now(timezone.utc)}}))  
+        try: await get_mongo_db_instance()[WHATSAPP_MESSAGES_COLLECTION].update_one({"_id": internal_message_id, "status": {"$ne": "failed_send"}}, {"$set": {"status": "failed_send", "status_timestamp": datetime.now(timezone.utc)}})  
         except Exception as db_upd_err: log.error(f"Failed to update message {internal_message_id} to 'failed_send': {db_upd_err}")  
         # Retry Celery  
         try:  
@@ -109,36 +101,38 @@ def send_whatsapp_message(self, recipient_wa_id: str, message_text: str, interna
             self.retry(exc=e, countdown=retry_countdown)  
         except self.MaxRetriesExceededError:  
             log.error(f"Max retries exceeded for send WA message task ID {internal_message_id}.")  
-            # asyncio.run(trigger_vox_fallback(recipient_wa_id, "send_message_failed_max_retries", internal_message_id, current_trace_id))  
+            # await trigger_vox_fallback(recipient_wa_id, "send_message_failed_max_retries", internal_message_id, current_trace_id)  
             return {"status": "failed", "reason": "max_retries_exceeded", "error": str(e)}  
         except Exception as retry_err:  
+             if isinstance(retry_err, Retry): raise  
              log.exception(f"Failed to initiate retry: {retry_err}"); raise e  
     finally:  
          trace_id_var.reset(token)
 
 # --- Task AutoResponder (Implementada) ---  
-@celery_app.task(bind=True, name="whatsapp.check_chat_timeout", max_retries=1, acks_late=True)  
-def check_chat_timeout(self, chat_id: str, last_customer_message_id: str, scheduled_time_iso: str, trace_id: str | None = None):  
+@celery_app.task(bind=True, base=AsyncTask, name="whatsapp.check_chat_timeout", max_retries=1, acks_late=True)  
+async def check_chat_timeout(self, chat_id: str, last_customer_message_id: str, scheduled_time_iso: str, trace_id: str | None = None):  
     """Verifica timeout, busca contexto, chama LLM e envia auto-resposta."""  
     current_trace_id = trace_id or f"task_{uuid.uuid4().hex[:12]}"; token = trace_id_var.set(current_trace_id)  
     log = logger.bind(trace_id=current_trace_id, task_name=self.name, job_id=self.request.id, chat_id=chat_id, check_msg_id=last_customer_message_id)  
     log.info(f"Running timeout check scheduled at {scheduled_time_iso}")  
-    db: AsyncIOMotorDatabase = get_database()
+    db: AsyncIOMotorDatabase = get_mongo_db_instance()
 
     try:  
         # Executar lógica async principal  
         async def run_check():  
-            # 1. Obter Configurações AutoResponder (com cache via service)  
+            # 1. Obter Configurações AutoResponder (cache em processo, invalidado via pub/sub: app/core/settings_cache.py)  
             try:  
-                # Obter instâncias de dependência dentro do run_until_complete se necessário  
-                setting_repo_local = await get_setting_repository()  
-                redis_client_local = get_redis_client() # Assume que connect já rodou no lifespan  
-                office_service = get_office_service() # Service sem estado
-
-                autoresponder_enabled = await office_service.get_setting("autoresponder_enabled", setting_repo_local, redis_client_local, default=False)  
-                timeout_minutes = await office_service.get_setting("autoresponder_timeout_minutes", setting_repo_local, redis_client_local, default=5)  
-                base_prompt_template = await office_service.get_setting("autoresponder_base_prompt", setting_repo_local, redis_client_local, default="")  
-                fallback_message = await office_service.get_setting("autoresponder_fallback_message", setting_repo_local, redis_client_local, default="Recebemos sua mensagem, um atendente responderá em breve.")
+                autoresponder_settings = await settings_cache.get_settings({  
+                    "autoresponder_enabled": False,  
+                    "autoresponder_timeout_minutes": 5,  
+                    "autoresponder_base_prompt": "",  
+                    "autoresponder_fallback_message": "Recebemos sua mensagem, um atendente responderá em breve.",  
+                }, db)  
+                autoresponder_enabled = autoresponder_settings["autoresponder_enabled"]  
+                timeout_minutes = autoresponder_settings["autoresponder_timeout_minutes"]  
+                base_prompt_template = autoresponder_settings["autoresponder_base_prompt"]  
+                fallback_message = autoresponder_settings["autoresponder_fallback_message"]
 
                 if not autoresponder_enabled or not isinstance(timeout_minutes, int) or timeout_minutes <= 0 or not base_prompt_template:  
                     log.info("AutoResponder disabled or misconfigured. Exiting check.")  
@@ -164,19 +158,16 @@ def check_chat_timeout(self, chat_id: str, last_customer_message_id: str, schedu
                 {"chat_id": chat_id, "timestamp": {"$lt": latest_message_doc["timestamp"]}},  
                 {"content": 1, "sender_id": 1}  
             ).sort("timestamp", DESCENDING).limit(5)  
-            history_docs = list(reversed(await history_cursor.to_list(length=5)))  
-            history_formatted = "n".join([f"- {msg.get('sender_id','?').split(':')[0]}: {msg.get('content', '')[:80]}" for msg in history_docs])
+            history_docs = await history_cursor.to_list(length=5) # Mais recentes primeiro  
+            history_formatted = _format_history_for_prompt(history_docs)
 
             # Buscar cliente  
             user_repo_local = await get_user_repository()  
             customer = await user_repo_local.get_by_id(chat_id) # Assumindo chat_id é user_id (ObjectId)  
             customer_name = customer.profile.first_name if customer and customer.profile else "Cliente"
 
-            # Buscar último pedido/entrega  
-            order_repo_local = await get_order_repository()  
-            delivery_repo_local = await get_delivery_repository()  
+            # Buscar último pedido/entrega (pendente: app.modules.sales/delivery ainda não importam)  
             order_context = "Nenhum pedido recente encontrado."  
-            # ... (Lógica para buscar order/delivery como antes) ...  
             # orders_list = await order_repo_local.list_by({"customer_id": customer.id, "status": {"$nin": ["cancelled", "failed"]}}, sort=[("created_at", DESCENDING)], limit=1) if customer else []  
             # if orders_list: ... (formatar order_context)
 
@@ -193,8 +184,8 @@ def check_chat_timeout(self, chat_id: str, last_customer_message_id: str, schedu
 
             response_text = fallback_message # Default  
             try:  
-                llm_client = get_llm_client() # Obter cliente primário  
-                llm_response = await llm_client.get_completion(messages=messages_for_llm, model=settings.OPENAI_CHAT_MODEL or "gpt-4-turbo-preview") # Usar modelo das settings?
+                # Fallback/cache/limiter do cliente LLM; o prompt é ajustado ao orçamento do modelo
+                llm_response = await get_completion_with_fallback(messages=messages_for_llm, model=settings.OPENAI_CHAT_MODEL, max_tokens=300)
 
                 is_error_or_empty = llm_response.error or not (llm_response.choices and llm_response.choices[0].message.content)  
                 if is_error_or_empty:  
@@ -209,11 +200,8 @@ def check_chat_timeout(self, chat_id: str, last_customer_message_id: str, schedu
             await _send_auto_response(log, chat_id, response_text)  
             await db[WHATSAPP_CHATS_COLLECTION].update_one({"_id": chat_id}, {"$unset": {"pending_timeout_task_id": ""}})
 
-        # Executar a lógica async dentro da task sync  
-        loop = asyncio.get_event_loop()  
-        loop.run_until_complete(  
-            _check_timeout_async_logic(db, log, chat_id, last_customer_message_id)  
-        )
+        # Executar a lógica async (a task já roda no loop persistente do worker)  
+        await run_check()
 
     except Exception as e:  
         log.exception("Unexpected error during check_chat_timeout task.")  
@@ -221,10 +209,28 @@ def check_chat_timeout(self, chat_id: str, last_customer_message_id: str, schedu
     finally:  
         trace_id_var.reset(token)
 
+def _format_history_for_prompt(history_docs: List[Dict[str, Any]]) -> str:
+    """
+    Formata o histórico (mais recentes primeiro) dentro de AUTORESPONDER_HISTORY_MAX_TOKENS: cada mensagem
+    é truncada em AUTORESPONDER_MESSAGE_MAX_TOKENS e as mais antigas saem primeiro. Retorna em ordem cronológica.
+    """
+    lines: List[str] = []
+    remaining = settings.AUTORESPONDER_HISTORY_MAX_TOKENS
+    for msg in history_docs:
+        sender = str(msg.get("sender_id", "?")).split(":")[0]
+        content = truncate_text(str(msg.get("content") or ""), settings.AUTORESPONDER_MESSAGE_MAX_TOKENS)
+        line = f"- {sender}: {content}"
+        tokens = count_tokens(line) + 1 # + quebra de linha
+        if tokens > remaining:
+            break
+        remaining -= tokens
+        lines.append(line)
+    return "\n".join(reversed(lines))
+
 async def _send_auto_response(log: logger, chat_id: str, message_text: str):  
     """Enfileira a task para enviar a mensagem e salva no DB."""  
     # ... (lógica de _send_auto_response como antes: salvar doc, enfileirar task, broadcast WS) ...  
-    db: AsyncIOMotorDatabase = get_database()  
+    db: AsyncIOMotorDatabase = get_mongo_db_instance()  
     response_id = f"auto_resp_{chat_id}_{uuid.uuid4().hex[:6]}"  
     recipient_wa_id_numeric = chat_id # Assume chat_id é o número
 
@@ -232,9 +238,11 @@ async def _send_auto_response(log: logger, chat_id: str, message_text: str):
     try:  
         await db[WHATSAPP_MESSAGES_COLLECTION].insert_one(agent_message_doc)  
         log.info(f"Auto-response {response_id} saved to DB.")  
-        celery_app.send_task("app.worker.tasks_whatsapp.send_whatsapp_message", args=[recipient_wa_id_numeric, message_text, response_id], kwargs={"trace_id": trace_id_var.get()})  
-        log.info(f"Task enqueued to send auto-response {response_id}.")  
-        api_message = WhatsAppMessageAPI.model_validate(agent_message_doc)  
-        await ws_manager.broadcast({"type": "new_whatsapp_message", "payload": api_message.model_dump(by_alias=True)})  
+        if settings.WHATSAPP_SEND_PIPELINE_ENABLED:  
+            log.info(f"Auto-response {response_id} queued for the batch send pipeline.") # pending_queue é drenado pelo beat  
+        else:  
+            celery_app.send_task("whatsapp.send_message", args=[recipient_wa_id_numeric, message_text, response_id], kwargs={"trace_id": trace_id_var.get()})  
+            log.info(f"Task enqueued to send auto-response {response_id}.")  
+        await ws_manager.publish(whatsapp_chat_topics(chat_id), {"type": "new_whatsapp_message", "payload": message_event_payload(agent_message_doc)})  
     except Exception as e:  
         log.exception(f"Error saving/enqueuing/broadcasting auto-response for chat {chat_id}")
@@ -0,0 +1,62 @@
+# agentos_core/app/worker/tasks_whatsapp_outbox.py
+
+from app.worker.celery_app import celery_app
+from app.worker.runtime import AsyncTask
+from loguru import logger
+from app.core.logging_config import trace_id_var
+import uuid
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.database import get_mongo_db_instance, redis_manager
+from app.services.whatsapp_send_pipeline import drain_send_queue, ensure_send_pipeline_indexes, send_bucket_for
+from app.websocket.topics import whatsapp_chat_topics
+
+try:
+    from app.websocket.connection_manager import manager as ws_manager
+except ImportError as e:
+    logger.warning(f"WebSocket manager unavailable, send status will not be broadcast: {e}")
+    ws_manager = None
+
+DRAIN_LOCK_KEY = "wa:send_drain_lock:{phone_id}"
+
+_indexes_ready = False
+
+async def _broadcast_status(payload: Dict[str, Any]) -> None:
+    if ws_manager is not None:
+        await ws_manager.publish(whatsapp_chat_topics(payload["chat_id"]), {"type": "whatsapp_message_status", "payload": payload})
+
+@celery_app.task(bind=True, base=AsyncTask, name="whatsapp.drain_send_queue", acks_late=False, ignore_result=True)
+async def drain_whatsapp_send_queue(self, trace_id: Optional[str] = None):
+    """Drena o lote de mensagens `pending_queue` (disparada pelo beat; um dreno por número por vez)."""
+    global _indexes_ready
+    current_trace_id = trace_id or f"task_{uuid.uuid4().hex[:12]}"; token = trace_id_var.set(current_trace_id)
+    log = logger.bind(trace_id=current_trace_id, task_name=self.name, job_id=self.request.id)
+    redis_client = redis_manager.client # None = bucket local e sem lock (só um worker deve drenar)
+    lock = None
+    try:
+        db = get_mongo_db_instance()
+        if not _indexes_ready:
+            await ensure_send_pipeline_indexes(db)
+            _indexes_ready = True
+        if redis_client is not None:
+            # Beat dispara a cada poucos segundos; execuções sobrepostas saem na hora em vez de ocupar slots
+            lock = redis_client.lock(DRAIN_LOCK_KEY.format(phone_id=settings.META_PHONE_NUMBER_ID or "default"),
+                                     timeout=settings.WHATSAPP_SEND_DRAIN_SECONDS + 30, blocking=False)
+            if not await lock.acquire():
+                log.debug("Another worker is draining the WhatsApp send queue.")
+                lock = None
+                return {"status": "skipped_locked"}
+        bucket = send_bucket_for(settings.META_PHONE_NUMBER_ID, redis_client)
+        stats = await drain_send_queue(db, bucket, on_status=_broadcast_status)
+        return {"status": "success", **stats}
+    except Exception as e:
+        log.exception(f"Error draining WhatsApp send queue: {e}")
+        return {"status": "error", "error": str(e)}
+    finally:
+        if lock is not None:
+            try:
+                await lock.release()
+            except Exception as release_err:
+                log.warning(f"Could not release drain lock: {release_err}")
+        trace_id_var.reset(token)
@@ -0,0 +1,56 @@
+# agentos_core/app/worker/tasks_whatsapp_timers.py
+
+from app.worker.celery_app import celery_app
+from app.worker.runtime import AsyncTask
+from loguru import logger
+from app.core.logging_config import trace_id_var
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core.database import redis_manager
+from app.core.metrics import metrics
+from app.services.autoresponder_timers import AutoResponderTimers
+
+TIMER_CLAIM_BATCH = 200
+
+@celery_app.task(bind=True, base=AsyncTask, name="whatsapp.poll_autoresponder_timers", acks_late=False, ignore_result=True)
+async def poll_autoresponder_timers(self, trace_id: Optional[str] = None):
+    """Reivindica os timers vencidos do AutoResponder e dispara um check_chat_timeout para cada um (beat)."""
+    current_trace_id = trace_id or f"task_{uuid.uuid4().hex[:12]}"; token = trace_id_var.set(current_trace_id)
+    log = logger.bind(trace_id=current_trace_id, task_name=self.name, job_id=self.request.id)
+    fired = 0
+    try:
+        if redis_manager.client is None:
+            log.warning("Redis not connected; AutoResponder timers cannot be polled.")
+            return {"status": "skipped_no_redis"}
+        timers = AutoResponderTimers(redis_manager.client)
+        while True:
+            due = await timers.claim_due(limit=TIMER_CLAIM_BATCH)
+            failed = False
+            for timer in due:
+                scheduled_iso = datetime.fromtimestamp(timer["deadline"], tz=timezone.utc).isoformat()
+                try:
+                    celery_app.send_task(
+                        "whatsapp.check_chat_timeout",
+                        args=[timer["chat_id"], timer["last_customer_message_id"]],
+                        kwargs={"scheduled_time_iso": scheduled_iso, "trace_id": timer.get("trace_id")},
+                    )
+                    fired += 1
+                except Exception as send_err:
+                    # Já saiu do ZSET: devolve para a próxima varredura em vez de perder o timer (sem sobrescrever
+                    # um agendamento mais novo do chat)
+                    log.error(f"Failed to dispatch timeout check for chat {timer['chat_id']}: {send_err}")
+                    await timers.requeue(timer)
+                    failed = True
+            if len(due) < TIMER_CLAIM_BATCH or failed: # Com o broker fora, os devolvidos ficam para a próxima varredura
+                break
+        if fired:
+            metrics.incr("autoresponder_timers_fired", fired)
+            log.info(f"Fired {fired} AutoResponder timeout check(s).")
+        return {"status": "success", "fired": fired}
+    except Exception as e:
+        log.exception(f"Error polling AutoResponder timers: {e}")
+        return {"status": "error", "error": str(e), "fired": fired}
+    finally:
+        trace_id_var.reset(token)
@@ -0,0 +1,46 @@
+# agentos_core/app/worker/tasks_whatsapp_webhook.py
+
+from app.worker.celery_app import celery_app
+from app.worker.runtime import AsyncTask
+from loguru import logger
+from app.core.logging_config import trace_id_var
+import os
+import socket
+import uuid
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import get_mongo_db_instance, redis_manager
+from app.services.autoresponder_timers import AutoResponderTimers
+from app.services.whatsapp_webhook_stream import WebhookStream, consume_webhook_stream
+
+try:
+    from app.websocket.connection_manager import manager as ws_manager
+except ImportError as e:
+    logger.warning(f"WebSocket manager unavailable, webhook events will not be broadcast: {e}")
+    ws_manager = None
+
+@celery_app.task(bind=True, base=AsyncTask, name="whatsapp.consume_webhook_stream", acks_late=False, ignore_result=True)
+async def consume_whatsapp_webhook_stream(self, trace_id: Optional[str] = None):
+    """Processa o stream de webhooks da Meta em lotes (disparada pelo beat; consumidores concorrentes dividem o stream)."""
+    current_trace_id = trace_id or f"task_{uuid.uuid4().hex[:12]}"; token = trace_id_var.set(current_trace_id)
+    log = logger.bind(trace_id=current_trace_id, task_name=self.name, job_id=self.request.id)
+    try:
+        redis_client = redis_manager.client
+        if redis_client is None:
+            log.warning("Redis not connected; webhook stream cannot be consumed.")
+            return {"status": "skipped_no_redis"}
+        stream = WebhookStream(redis_client)
+        # Modo desligado e nada pendente: não segurar um slot do worker bloqueado no XREADGROUP
+        if not settings.WHATSAPP_WEBHOOK_STREAM_ENABLED and not await stream.backlog():
+            return {"status": "skipped_disabled"}
+        stats = await consume_webhook_stream(
+            stream, get_mongo_db_instance(), consumer=f"{socket.gethostname()}:{os.getpid()}",
+            timers=AutoResponderTimers(redis_client), publish=ws_manager.publish if ws_manager is not None else None,
+        )
+        return {"status": "success", **stats}
+    except Exception as e:
+        log.exception(f"Error consuming WhatsApp webhook stream: {e}")
+        return {"status": "error", "error": str(e)}
+    finally:
+        trace_id_var.reset(token)
@@ -0,0 +1,98 @@
+# agentos_core/benchmarks/bench_celery_runtime.py
+"""
+Tasks/s de tasks Celery async: modelo antigo x runtime persistente (app/worker/runtime.py).
+
+- legacy:  task síncrona que faz asyncio.run(...) por execução e cria (e fecha) o cliente a cada task,
+           como send_whatsapp_message/check_chat_timeout faziam
+- runtime: task `async def` com base=AsyncTask, no loop persistente, usando os clientes do processo
+           (whatsapp_http_manager / redis_manager / mongo_manager)
+
+As tasks são executadas com task.apply() (mesmo tracer do worker, sem broker), então o número isola o
+custo por task do runtime + clientes. Workloads (--workload):
+- noop:  só o ciclo do event loop (asyncio.run x run_until_complete)
+- http:  GET em --url (ex.: GET /stats do benchmarks/openai_stub.py)
+- redis: PING em REDIS_URL
+- mongo: ping em MONGODB_URI
+
+    cd backend
+    python -m benchmarks.openai_stub --port 8900 &
+    python -m benchmarks.bench_celery_runtime --workload http --url http://127.0.0.1:8900/stats --tasks 500
+    python -m benchmarks.bench_celery_runtime --workload redis --tasks 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import motor.motor_asyncio
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.database import mongo_manager, redis_manager
+from app.services.whatsapp_service import whatsapp_http_manager
+from app.worker.celery_app import celery_app
+from app.worker.runtime import AsyncTask, worker_runtime
+
+async def _legacy_workload(workload: str, url: str) -> None:
+    if workload == "http":
+        async with httpx.AsyncClient() as client:
+            (await client.get(url)).raise_for_status()
+    elif workload == "redis":
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        try:
+            await client.ping()
+        finally:
+            await client.aclose()
+    elif workload == "mongo":
+        client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URI, serverSelectionTimeoutMS=5000)
+        try:
+            await client.admin.command("ping")
+        finally:
+            client.close()
+    else:
+        await asyncio.sleep(0)
+
+async def _shared_workload(workload: str, url: str) -> None:
+    if workload == "http":
+        (await whatsapp_http_manager.get_client().get(url)).raise_for_status() # URL absoluta ignora o base_url
+    elif workload == "redis":
+        await redis_manager.get_client().ping()
+    elif workload == "mongo":
+        await mongo_manager.client.admin.command("ping")
+    else:
+        await asyncio.sleep(0)
+
+@celery_app.task(bind=True, name="bench.legacy_task")
+def legacy_task(self, workload: str, url: str):
+    return asyncio.run(_legacy_workload(workload, url))
+
+@celery_app.task(bind=True, base=AsyncTask, name="bench.runtime_task")
+async def runtime_task(self, workload: str, url: str):
+    return await _shared_workload(workload, url)
+
+def measure(task, tasks: int, workload: str, url: str) -> float:
+    started = time.perf_counter()
+    for _ in range(tasks):
+        result = task.apply(args=[workload, url])
+        if result.failed():
+            raise result.result
+    return tasks / (time.perf_counter() - started)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", choices=("noop", "http", "redis", "mongo"), default="noop")
+    parser.add_argument("--url", default="http://127.0.0.1:8900/stats", help="Target for --workload http")
+    parser.add_argument("--tasks", type=int, default=500)
+    args = parser.parse_args()
+
+    legacy = measure(legacy_task, args.tasks, args.workload, args.url)
+    worker_runtime.start() # Como no worker_process_init: conexões fora da medição
+    runtime = measure(runtime_task, args.tasks, args.workload, args.url)
+    worker_runtime.shutdown()
+    print(f"workload={args.workload} tasks={args.tasks}")
+    print(f"legacy  (asyncio.run + client per task): {legacy:9.1f} tasks/s")
+    print(f"runtime (persistent loop + shared client): {runtime:9.1f} tasks/s  ({runtime / legacy:.1f}x)")
+
+if __name__ == "__main__":
+    main()
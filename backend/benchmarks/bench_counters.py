@@ -0,0 +1,110 @@
+# agentos_core/benchmarks/bench_counters.py
+"""
+Benchmark: referências/seg do CounterService sob criação concorrente de pedidos.
+
+Compara o contador antigo (block_size=1, um find_one_and_update por referência) com a
+alocação em blocos no Mongo e com o backend Redis (INCRBY). Cada "pedido" gera uma
+referência (prefixo BENCH) e faz um insert_one, como no fluxo real de criação de pedidos.
+
+Requer MongoDB (e Redis para o backend redis) acessíveis:
+
+    cd backend
+    python -m benchmarks.bench_counters --mongo-uri mongodb://localhost:27017 \\
+        --redis-url redis://localhost:6379/15 --orders 5000 --concurrency 100 --processes 4
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import motor.motor_asyncio
+import redis.asyncio as redis
+
+from app.core.counters import CounterService, REDIS_COUNTER_KEY_PREFIX, reset_sequence_blocks
+
+BENCH_DB_NAME = "agentos_counter_bench"
+BENCH_PREFIX = "BENCH"
+
+async def _run_worker(mongo_uri: str, redis_url: Optional[str], block_size: int, orders: int, concurrency: int) -> List[str]:
+    client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri)
+    redis_client = redis.from_url(redis_url, decode_responses=True) if redis_url else None
+    db = client[BENCH_DB_NAME]
+    reset_sequence_blocks()
+    service = CounterService(db, block_size=block_size, redis_client=redis_client)
+    semaphore = asyncio.Semaphore(concurrency)
+    refs: List[str] = []
+
+    async def create_order() -> None:
+        async with semaphore:
+            ref = await service.generate_reference(BENCH_PREFIX)
+            await db.orders.insert_one({"order_ref": ref, "created_at": time.time()})
+            refs.append(ref)
+
+    try:
+        await asyncio.gather(*(create_order() for _ in range(orders)))
+    finally:
+        client.close()
+        if redis_client is not None:
+            await redis_client.close()
+    return refs
+
+def _worker_entry(args: tuple) -> List[str]:
+    return asyncio.run(_run_worker(*args))
+
+async def _reset_state(mongo_uri: str, redis_url: Optional[str]) -> None:
+    client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri)
+    await client.drop_database(BENCH_DB_NAME)
+    client.close()
+    if redis_url:
+        redis_client = redis.from_url(redis_url, decode_responses=True)
+        keys = [k async for k in redis_client.scan_iter(f"{REDIS_COUNTER_KEY_PREFIX}{BENCH_PREFIX.lower()}_*")]
+        if keys:
+            await redis_client.delete(*keys)
+        await redis_client.close()
+
+def run_scenario(label: str, mongo_uri: str, redis_url: Optional[str], block_size: int, orders: int, concurrency: int, processes: int) -> None:
+    asyncio.run(_reset_state(mongo_uri, redis_url))
+    per_process = orders // processes
+    args = [(mongo_uri, redis_url, block_size, per_process, concurrency)] * processes
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_worker_entry(args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_worker_entry, args))
+    elapsed = time.perf_counter() - start
+
+    refs = [ref for chunk in results for ref in chunk]
+    duplicates = len(refs) - len(set(refs))
+    print(
+        f"{label:<22} block={block_size:<5} refs={len(refs):<7} "
+        f"time={elapsed:7.3f}s  refs/s={len(refs) / elapsed:10.1f}  duplicates={duplicates}"
+    )
+    if duplicates:
+        raise SystemExit(f"{label}: {duplicates} duplicated references!")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--redis-url", default=os.getenv("BENCH_REDIS_URL"), help="Enables the Redis INCRBY scenarios")
+    parser.add_argument("--orders", type=int, default=2000, help="Total orders across all processes")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent order creations per process")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--block-sizes", default="1,20,100", help="Comma-separated block sizes to compare")
+    args = parser.parse_args()
+
+    block_sizes = [int(b) for b in args.block_sizes.split(",") if b.strip()]
+    print(f"orders={args.orders} concurrency={args.concurrency} processes={args.processes}")
+    for block_size in block_sizes:
+        label = "mongo (legacy)" if block_size == 1 else "mongo blocks"
+        run_scenario(label, args.mongo_uri, None, block_size, args.orders, args.concurrency, args.processes)
+    if args.redis_url:
+        for block_size in block_sizes:
+            run_scenario("redis incrby", args.mongo_uri, args.redis_url, block_size, args.orders, args.concurrency, args.processes)
+
+if __name__ == "__main__":
+    main()
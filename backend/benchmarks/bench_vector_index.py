@@ -0,0 +1,102 @@
+# agentos_core/benchmarks/bench_vector_index.py
+"""
+Benchmark: latência (p50/p99) e recall dos índices vetoriais locais de memória.
+
+Gera embeddings sintéticos agrupados (clusters + ruído, parecido com embeddings reais) e mede
+busca exata (bruteforce) vs aproximada (ivf), sem e com filtro de tags, em dois cenários:
+- uma única partição com todos os vetores (pior caso: um usuário com N memórias);
+- N vetores distribuídos entre vários usuários (cada busca toca só a partição do usuário).
+
+    cd backend
+    python -m benchmarks.bench_vector_index --vectors 1000000 --dim 256 --queries 500
+    python -m benchmarks.bench_vector_index --vectors 1000000 --dim 1536   # ~6 GB de RAM por índice
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.modules.memory.vector_index import BruteForceVectorIndex, IVFVectorIndex, VectorIndexBackend
+
+TAG_POOL = [f"tag{i}" for i in range(50)]
+
+def make_dataset(n: int, dim: int, clusters: int, seed: int = 42) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        end = min(start + 100_000, n)
+        vectors[start:end] = centers[rng.integers(0, clusters, end - start)]
+        vectors[start:end] += 0.6 * rng.standard_normal((end - start, dim), dtype=np.float32)
+    return vectors
+
+def make_tags(n: int, seed: int = 7) -> List[Tuple[str, ...]]:
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(TAG_POOL), (n, 2))
+    return [(TAG_POOL[a], TAG_POOL[b]) for a, b in picks.tolist()]
+
+def measure(index: VectorIndexBackend, users: List[ObjectId], queries: np.ndarray, limit: int, tags_filter=None):
+    latencies, results = [], []
+    for i, query in enumerate(queries):
+        user_id = users[i % len(users)]
+        started = time.perf_counter()
+        hits = index.search(user_id, query, limit=limit, min_similarity=0.0, tags_filter=tags_filter)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({obj_id for obj_id, _ in hits})
+    latencies = np.asarray(latencies)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99)), results
+
+def recall(approx: List[set], exact: List[set]) -> float:
+    found = sum(len(a & e) for a, e in zip(approx, exact))
+    total = sum(len(e) for e in exact)
+    return found / total if total else 1.0
+
+def run(n: int, dim: int, num_users: int, num_queries: int, limit: int, nprobe: int) -> None:
+    print(f"\n== {n} vectors, dim={dim}, users={num_users} ({n // num_users} vectors/partition) ==")
+    vectors = make_dataset(n, dim, clusters=max(16, n // 1000))
+    tags = make_tags(n)
+    ids = [ObjectId() for _ in range(n)]
+    users = [ObjectId() for _ in range(num_users)]
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, n, num_queries)] + 0.3 * rng.standard_normal((num_queries, dim), dtype=np.float32)
+
+    exact_results = {}
+    factories = (
+        lambda: BruteForceVectorIndex(dimensions=dim, partition_ttl_seconds=0),
+        lambda: IVFVectorIndex(dimensions=dim, partition_ttl_seconds=0, nprobe=nprobe, min_train_size=20_000),
+    )
+    for factory in factories: # Um índice por vez (memória)
+        index = factory()
+        started = time.perf_counter()
+        per_user = n // num_users
+        for u, user_id in enumerate(users):
+            sl = slice(u * per_user, (u + 1) * per_user)
+            index.load_partition(user_id, ids[sl], vectors[sl], tags[sl])
+        build_s = time.perf_counter() - started
+        for label, tags_filter in (("no filter", None), ("tags=[tag3]", ["tag3"])):
+            p50, p99, results = measure(index, users, queries, limit, tags_filter)
+            line = f"{index.name:<10} {label:<12} build={build_s:7.1f}s  p50={p50:7.2f}ms  p99={p99:7.2f}ms"
+            if index.name == "bruteforce":
+                exact_results[label] = results
+            else:
+                line += f"  recall@{limit}={recall(results, exact_results[label]):.3f}"
+            print(line)
+        del index
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--users", default="1,100", help="Comma-separated user counts (partitions) to test")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+    for num_users in (int(u) for u in args.users.split(",")):
+        run(args.vectors, args.dim, num_users, args.queries, args.limit, args.nprobe)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# agentos_core/benchmarks/bench_webhook_ingest.py
+"""
+Latência de ack do webhook da Meta: processamento inline x ingestão via Redis Stream
+(app/services/whatsapp_webhook_stream.py), com uma fração de reentregas para medir a deduplicação.
+
+- inline: build_webhook_batch + process_webhook_batch dentro da "request" (o que a Meta espera)
+- stream: WebhookStream.enqueue na request; depois consume_webhook_stream drena o backlog (tempo separado)
+
+Cada webhook traz --messages-per-webhook mensagens + statuses; --redelivery-rate dos webhooks são reenviados
+(como a Meta faz após timeout). Mongo: --mongo-uri (padrão MONGODB_URI, banco bench_webhook_ingest, recriado).
+Redis: REDIS_URL (o stream e as chaves de dedup são apagados antes de cada rodada).
+
+    cd backend
+    python -m benchmarks.bench_webhook_ingest --webhooks 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def build_payloads(webhooks: int, per_webhook: int, redelivery_rate: float, seed: int = 7) -> List[Tuple[bytes, Dict]]:
+    rng = random.Random(seed)
+    payloads = []
+    for w in range(webhooks):
+        chat = f"5511{w % 300:08d}"
+        value = {
+            "messaging_product": "whatsapp", "metadata": {"phone_number_id": "1000000001"},
+            "contacts": [{"wa_id": chat, "profile": {"name": f"Cliente {w % 300}"}}],
+            "messages": [{"from": chat, "id": f"wamid.bench.{w}.{i}", "timestamp": str(1700000000 + w), "type": "text",
+                          "text": {"body": f"mensagem {i}"}} for i in range(per_webhook)],
+            "statuses": [{"id": f"wamid.out.{w}", "status": "delivered", "timestamp": str(1700000000 + w), "recipient_id": chat}],
+        }
+        payload = {"object": "whatsapp_business_account", "entry": [{"id": "waba", "changes": [{"field": "messages", "value": value}]}]}
+        payloads.append((json.dumps(payload).encode(), payload))
+    redeliveries = [payloads[i] for i in rng.sample(range(webhooks), int(webhooks * redelivery_rate))]
+    return payloads + redeliveries
+
+async def _drive(payloads: List[Tuple[bytes, Dict]], concurrency: int, handler) -> List[float]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in payloads:
+        queue.put_nowait(item)
+    latencies: List[float] = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            raw_body, payload = queue.get_nowait()
+            started = time.perf_counter()
+            await handler(raw_body, payload)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+def _print(label: str, latencies: List[float], elapsed: float, extra: str = "") -> None:
+    ms = [value * 1000 for value in latencies]
+    print(f"\n== {label} ==")
+    print(f"webhooks={len(ms)} elapsed={elapsed:.2f}s p50={statistics.median(ms):.2f}ms "
+          f"p99={_percentile(ms, 99):.2f}ms max={max(ms):.2f}ms")
+    if extra:
+        print(extra)
+
+async def _reset(db, redis_client, webhooks: int) -> None:
+    from app.services.whatsapp_webhook_stream import WEBHOOK_DEDUP_KEY_PREFIX, WEBHOOK_STREAM_KEY
+    for name in ("whatsapp_messages", "whatsapp_chats"):
+        await db[name].delete_many({})
+    await db["whatsapp_messages"].insert_many([{"_id": f"wamid.out.{w}", "status": "sent"} for w in range(webhooks)])
+    await redis_client.delete(WEBHOOK_STREAM_KEY)
+    keys = [key async for key in redis_client.scan_iter(match=WEBHOOK_DEDUP_KEY_PREFIX + "*", count=1000)]
+    if keys:
+        await redis_client.delete(*keys)
+
+async def main_async(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.core.config import settings
+    from app.core.database import redis_manager
+    from app.services.autoresponder_timers import AutoResponderTimers
+    from app.services.whatsapp_webhook import build_webhook_batch, process_webhook_batch
+    from app.services.whatsapp_webhook_stream import WebhookStream, consume_webhook_stream
+
+    db = AsyncIOMotorClient(args.mongo_uri or settings.MONGODB_URI, tz_aware=True)["bench_webhook_ingest"]
+    await redis_manager.connect()
+    redis_client = redis_manager.get_client()
+    timers = AutoResponderTimers(redis_client)
+    payloads = build_payloads(args.webhooks, args.messages_per_webhook, args.redelivery_rate)
+    print(f"{len(payloads)} webhook deliveries ({args.webhooks} unique + {len(payloads) - args.webhooks} redeliveries), "
+          f"{args.messages_per_webhook} msg + 1 status each, concurrency={args.concurrency}")
+
+    if args.mode in ("both", "inline"):
+        await _reset(db, redis_client, args.webhooks)
+
+        async def inline(raw_body, payload):
+            await process_webhook_batch(build_webhook_batch(payload), db, timers=timers)
+
+        started = time.perf_counter()
+        latencies = await _drive(payloads, args.concurrency, inline)
+        _print("inline", latencies, time.perf_counter() - started)
+
+    if args.mode in ("both", "stream"):
+        await _reset(db, redis_client, args.webhooks)
+        stream = WebhookStream(redis_client)
+        counts = {"events": 0, "duplicates": 0, "duplicate_webhooks": 0}
+
+        async def enqueue(raw_body, payload):
+            result = await stream.enqueue(raw_body, payload)
+            counts["events"] += result.fresh + result.duplicates
+            counts["duplicates"] += result.duplicates
+            counts["duplicate_webhooks"] += int(not result.queued)
+
+        started = time.perf_counter()
+        latencies = await _drive(payloads, args.concurrency, enqueue)
+        elapsed = time.perf_counter() - started
+        dedup_rate = counts["duplicates"] / counts["events"] if counts["events"] else 0.0
+        _print("stream (ack)", latencies, elapsed,
+               f"dedup: {counts['duplicates']}/{counts['events']} events ({dedup_rate:.1%}), "
+               f"{counts['duplicate_webhooks']} webhooks never entered the stream")
+
+        drain_started = time.perf_counter()
+        consumed = {"entries": 0, "messages": 0}
+        while await stream.backlog():
+            stats = await asyncio.gather(*(consume_webhook_stream(stream, db, consumer=f"bench-{i}", timers=timers, max_seconds=1.0, block_ms=100)
+                                           for i in range(args.consumers)))
+            for item in stats:
+                consumed["entries"] += item["entries"]; consumed["messages"] += item["messages"]
+        stored = await db["whatsapp_messages"].count_documents({"status": "received"})
+        print(f"consumers x{args.consumers}: {consumed['entries']} entries / {consumed['messages']} messages in "
+              f"{time.perf_counter() - drain_started:.2f}s; stored={stored} (expected {args.webhooks * args.messages_per_webhook})")
+
+    await redis_manager.disconnect()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("both", "inline", "stream"), default="both")
+    parser.add_argument("--mongo-uri", default=None, help="Default: MONGODB_URI (uses database bench_webhook_ingest)")
+    parser.add_argument("--webhooks", type=int, default=2000)
+    parser.add_argument("--messages-per-webhook", type=int, default=3)
+    parser.add_argument("--redelivery-rate", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--consumers", type=int, default=2)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# agentos_core/benchmarks/bench_whatsapp_send.py
+"""
+Vazão de envio WhatsApp: uma task por mensagem x pipeline em lote com token bucket
+(app/services/whatsapp_send_pipeline.py), contra o stand-in local da Graph API.
+
+- per-task: --workers consumidores (como processos Celery com prefetch 1), cada um envia uma mensagem e
+  grava o status; sem noção do limite da Meta, falhas ficam para o retry da task (default_retry_delay=45s)
+- pipeline: drain_send_queue até esvaziar a fila (retries com backoff+jitter dentro da medição)
+
+Mongo: --mongo-uri (padrão: MONGODB_URI; use um banco descartável — a coleção é recriada). Redis: o bucket
+usa REDIS_URL se estiver no ar, senão o bucket local do processo.
+
+    cd backend
+    python -m benchmarks.graph_api_stub --port 8902 --rate-per-second 80 &
+    python -m benchmarks.bench_whatsapp_send --graph-url http://127.0.0.1:8902 --messages 2000 --workers 32
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import httpx
+
+PHONE_ID = "1000000001"
+
+async def _stub_stats(graph_url: str, reset: bool = False) -> Dict:
+    async with httpx.AsyncClient(base_url=graph_url, timeout=10) as client:
+        response = await (client.post("/stats/reset") if reset else client.get("/stats"))
+        return response.json()
+
+async def _seed(collection, messages: int, recipients: int, prefix: str) -> None:
+    await collection.delete_many({})
+    now = datetime.now(timezone.utc)
+    await collection.insert_many([
+        {"_id": f"{prefix}_{i}", "chat_id": f"3519{i % recipients:08d}", "recipient_id": f"3519{i % recipients:08d}",
+         "content": f"Mensagem {i}", "type": "text", "timestamp": now, "status": "pending_queue"}
+        for i in range(messages)
+    ])
+
+async def run_per_task(db, args) -> Dict:
+    from app.services.whatsapp_service import send_whatsapp_text_message_result
+    collection = db["whatsapp_messages"]
+    await _seed(collection, args.messages, args.recipients, "task")
+    queue: asyncio.Queue = asyncio.Queue()
+    async for doc in collection.find({}, {"recipient_id": 1, "content": 1}):
+        queue.put_nowait(doc)
+    counts = {"sent": 0, "failed": 0}
+
+    async def worker() -> None:
+        while not queue.empty():
+            doc = queue.get_nowait()
+            result = await send_whatsapp_text_message_result(doc["recipient_id"], doc["content"])
+            status = "sent" if result.success else "failed_send"
+            await collection.update_one({"_id": doc["_id"]}, {"$set": {"status": status}})
+            counts["sent" if result.success else "failed"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.workers)))
+    return {**counts, "elapsed": time.perf_counter() - started}
+
+async def run_pipeline(db, bucket, args) -> Dict:
+    from app.services.whatsapp_send_pipeline import drain_send_queue
+    collection = db["whatsapp_messages"]
+    await _seed(collection, args.messages, args.recipients, "pipe")
+    totals = {"sent": 0, "retried": 0, "failed": 0, "rate_limited": 0}
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.timeout:
+        stats = await drain_send_queue(db, bucket, batch_size=args.batch_size)
+        for key in totals:
+            totals[key] += stats[key]
+        if not await collection.count_documents({"status": {"$in": ["pending_queue", "pending_send"]}}):
+            break
+        if not stats["claimed"]:
+            await asyncio.sleep(0.2) # Só restam retries agendados (next_attempt_at no futuro)
+    return {**totals, "elapsed": time.perf_counter() - started}
+
+def _print(label: str, result: Dict, stub: Dict) -> None:
+    print(f"\n== {label} ==")
+    print(f"sent={result['sent']} failed={result['failed']} elapsed={result['elapsed']:.1f}s "
+          f"throughput={result['sent'] / result['elapsed']:.1f} msg/s")
+    extra = {k: v for k, v in result.items() if k not in ("sent", "failed", "elapsed")}
+    if extra:
+        print(f"pipeline: {extra}")
+    print(f"graph stub: accepted={stub['accepted']} rate_limited={stub['rate_limited']} peak={stub['peak_per_second']}/s")
+
+async def main_async(args) -> None:
+    from app.core.config import settings
+    from app.core.database import redis_manager
+    from app.services.whatsapp_send_pipeline import send_bucket_for
+    from app.services.whatsapp_service import whatsapp_http_manager
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    db = AsyncIOMotorClient(args.mongo_uri or settings.MONGODB_URI, tz_aware=True)["bench_whatsapp_send"]
+    await redis_manager.connect() # Sem Redis: loga e o bucket fica local
+    await whatsapp_http_manager.connect()
+
+    if args.mode in ("both", "per-task"):
+        await _stub_stats(args.graph_url, reset=True)
+        _print(f"per-task x{args.messages} @ {args.workers} workers", await run_per_task(db, args), await _stub_stats(args.graph_url))
+    if args.mode in ("both", "pipeline"):
+        await _stub_stats(args.graph_url, reset=True)
+        bucket = send_bucket_for(f"bench:{time.time_ns()}", redis_manager.client)
+        label = f"pipeline x{args.messages} batch={args.batch_size} rate={settings.WHATSAPP_SEND_RATE_PER_SECOND}/s"
+        _print(label, await run_pipeline(db, bucket, args), await _stub_stats(args.graph_url))
+
+    await whatsapp_http_manager.disconnect()
+    await redis_manager.disconnect()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("both", "per-task", "pipeline"), default="both")
+    parser.add_argument("--graph-url", default="http://127.0.0.1:8902")
+    parser.add_argument("--mongo-uri", default=None, help="Default: MONGODB_URI (uses database bench_whatsapp_send)")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=32, help="per-task mode: concurrent consumers")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+    # Antes de importar app.*: a URL base e as credenciais são lidas das settings no import
+    os.environ["META_GRAPH_API_BASE_URL"] = args.graph_url.rstrip("/") + "/v19.0"
+    os.environ.setdefault("META_ACCESS_TOKEN", "bench-token")
+    os.environ.setdefault("META_PHONE_NUMBER_ID", PHONE_ID)
+    os.environ.setdefault("WHATSAPP_SEND_RETRY_BASE_SECONDS", "0.5")
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
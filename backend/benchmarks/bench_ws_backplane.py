@@ -0,0 +1,131 @@
+# agentos_core/benchmarks/bench_ws_backplane.py
+"""
+Latência ponta a ponta do backplane WebSocket (app/websocket/connection_manager.py): um "worker" publica
+eventos de chat e N nós da API, cada um com sua própria conexão Redis e listener, entregam aos seus sockets.
+
+- Cada nó tem --sockets-per-node sockets falsos; cada socket acompanha um chat aleatório (chat:<id>) e uma
+  fração --dashboard-share também o tópico dashboard:whatsapp
+- O publicador não tem sockets (como um worker Celery): tudo que chega aos clientes passou pelo Redis
+- Latência = publish() no worker -> send_text() no socket (mesmo processo, perf_counter); confere também
+  que cada socket recebeu exatamente os eventos dos seus tópicos
+
+Os nós rodam no mesmo processo/loop (conexões Redis separadas); o custo medido é o do caminho Redis +
+listener + fan-out local. Redis: REDIS_URL.
+
+    cd backend
+    python -m benchmarks.bench_ws_backplane --nodes 3 --sockets-per-node 500 --events 5000 --rate 2000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+class BenchSocket:
+    """Socket falso: registra a latência de cada evento recebido."""
+
+    def __init__(self, name: str, sent_at: Dict[int, float], latencies: List[float], received: Counter):
+        self.client = name
+        self._sent_at = sent_at
+        self._latencies = latencies
+        self._received = received
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        seq = json.loads(text)["payload"]["seq"]
+        self._latencies.append(time.perf_counter() - self._sent_at[seq])
+        self._received[self.client] += 1
+
+async def main_async(args: argparse.Namespace) -> None:
+    import redis.asyncio as redis
+
+    from app.core.config import settings
+    from app.websocket.connection_manager import WS_BACKPLANE_CHANNEL, ConnectionManager
+    from app.websocket.topics import WHATSAPP_DASHBOARD_TOPIC, chat_topic, whatsapp_chat_topics
+
+    rng = random.Random(11)
+    sent_at: Dict[int, float] = {}
+    latencies: List[float] = []
+    received: Counter = Counter()
+    expected: Counter = Counter()
+    chats = [f"5511{i:08d}" for i in range(args.chats)]
+
+    clients = [redis.from_url(settings.REDIS_URL) for _ in range(args.nodes + 1)]
+    nodes = [ConnectionManager() for _ in range(args.nodes)]
+    watchers: Dict[str, List[str]] = {} # tópico -> sockets (para o esperado)
+    for n, node in enumerate(nodes):
+        node.start_backplane(clients[n])
+        for s in range(args.sockets_per_node):
+            name = f"node{n}-ws{s}"
+            topics = [chat_topic(rng.choice(chats))]
+            if rng.random() < args.dashboard_share:
+                topics.append(WHATSAPP_DASHBOARD_TOPIC)
+            await node.connect(BenchSocket(name, sent_at, latencies, received), f"user-{n}-{s}", topics=topics)
+            for topic in topics:
+                watchers.setdefault(topic, []).append(name)
+    worker = ConnectionManager()
+    worker.attach_backplane(clients[-1])
+
+    # Espera os listeners se inscreverem no canal
+    for _ in range(100):
+        if (await clients[-1].pubsub_numsub(WS_BACKPLANE_CHANNEL))[0][1] >= args.nodes:
+            break
+        await asyncio.sleep(0.05)
+
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    started = time.perf_counter()
+    for seq in range(args.events):
+        chat_id = rng.choice(chats)
+        topics = whatsapp_chat_topics(chat_id)
+        for name in {name for topic in topics for name in watchers.get(topic, ())}:
+            expected[name] += 1
+        sent_at[seq] = time.perf_counter()
+        await worker.publish(topics, {"type": "new_whatsapp_message", "payload": {"seq": seq, "chat_id": chat_id}})
+        if interval:
+            await asyncio.sleep(max(started + (seq + 1) * interval - time.perf_counter(), 0))
+    publish_elapsed = time.perf_counter() - started
+
+    total_expected = sum(expected.values())
+    deadline = time.monotonic() + args.timeout
+    while sum(received.values()) < total_expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    mismatched = sum(1 for name in set(expected) | set(received) if expected[name] != received[name])
+    print(f"nodes={args.nodes} sockets={args.nodes * args.sockets_per_node} events={args.events} "
+          f"published in {publish_elapsed:.2f}s ({args.events / publish_elapsed:.0f} ev/s)")
+    if latencies:
+        print(f"deliveries: {len(latencies)}/{total_expected}  sockets with wrong count: {mismatched}")
+        print(f"latency ms  p50={_percentile(latencies, 50) * 1000:.2f}  p95={_percentile(latencies, 95) * 1000:.2f}  "
+              f"p99={_percentile(latencies, 99) * 1000:.2f}  max={max(latencies) * 1000:.2f}  "
+              f"mean={statistics.mean(latencies) * 1000:.2f}")
+    else:
+        print(f"deliveries: 0/{total_expected} (backplane not running?)")
+
+    for node in nodes:
+        await node.stop_backplane()
+    for client in clients:
+        await client.aclose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--sockets-per-node", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--dashboard-share", type=float, default=0.05)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=2000.0, help="Events per second (0 = as fast as possible)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# agentos_core/benchmarks/bench_ws_encoding.py
+"""
+Codificação dos eventos WebSocket (app/websocket/encoding.py) para um dashboard de chats WhatsApp:
+
+- encode: json.dumps(default=str) antigo x encoding.dumps (orjson se instalado, senão stdlib compacta)
+- backplane: envelope antigo (mensagem dentro do JSON; cada nó faz loads + dumps) x cabeçalho + frame pronto
+- banda: bytes por evento sem compressão e com deflate de contexto contínuo (o que a permessage-deflate
+  negociada pelo uvicorn faz por conexão)
+
+    cd backend
+    python -m benchmarks.bench_ws_encoding --events 5000
+"""
+
+import argparse
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+def build_events(count: int, seed: int = 3) -> List[Dict[str, Any]]:
+    from app.services.whatsapp_webhook import message_event_payload
+
+    rng = random.Random(seed)
+    base = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    events = []
+    for i in range(count):
+        chat = f"5511{rng.randrange(500):08d}"
+        at = base + timedelta(seconds=i)
+        messages = [{"type": "new_whatsapp_message", "payload": message_event_payload({
+            "_id": f"wamid.HBgNNTUxMTk5OTk5ODg4OBUCABIYFjNFQjA{i:06d}{k}", "chat_id": chat, "sender_id": chat,
+            "recipient_id": "1000000001", "content": rng.choice(["Oi, tudo bem?", "Qual o status do meu pedido?", "Obrigado!",
+                                                                "Pode entregar depois das 18h?"]),
+            "type": "text", "timestamp": at, "status": "received", "status_timestamp": None, "official_wami": None,
+            "metadata": {"contact_name": "Cliente"}, "createdAt": at})} for k in range(rng.choice((1, 1, 2, 3)))]
+        statuses = [{"type": "whatsapp_message_status", "payload": {"id": f"wamid.out.{i}", "chat_id": chat,
+                                                                    "status": "delivered", "timestamp": at.isoformat()}}]
+        frame = messages + statuses
+        events.append({"type": "whatsapp_batch", "payload": {"events": frame}})
+    return events
+
+def _time_per_call(fn: Callable[[Any], Any], items: List[Any], rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, (time.perf_counter() - started) / len(items))
+    return best
+
+def _deflated_size(frames: List[str]) -> int:
+    compressor = zlib.compressobj(wbits=-15) # permessage-deflate: raw deflate, contexto mantido entre mensagens
+    total = 0
+    for frame in frames:
+        total += len(compressor.compress(frame.encode())) + len(compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    args = parser.parse_args()
+
+    from loguru import logger
+    logger.disable("app")
+    from app.websocket import encoding
+
+    events = build_events(args.events)
+    legacy_dumps = lambda m: json.dumps(m, default=str)
+    codec = "orjson" if encoding.orjson is not None else "json (compact)"
+
+    legacy_us = _time_per_call(legacy_dumps, events) * 1e6
+    fast_us = _time_per_call(encoding.dumps, events) * 1e6
+    print(f"encode per event     legacy json.dumps={legacy_us:7.1f}us   {codec}={fast_us:7.1f}us   ({legacy_us / fast_us:.1f}x)")
+
+    header = {"origin": "node", "sent_at": time.time(), "topics": ["chat:5511", "dashboard:whatsapp"], "coalesce_key": None, "droppable": False}
+    legacy_envelopes = [json.dumps({**header, "message": m}, default=str) for m in events]
+    frames = [encoding.dumps(m) for m in events]
+    new_envelopes = [f"{encoding.dumps(header)}\n{frame}" for frame in frames]
+
+    def legacy_receive(data: str) -> str:
+        envelope = json.loads(data)
+        return json.dumps(envelope["message"], default=str)
+
+    def new_receive(data: str) -> str:
+        raw_header, frame = data.split("\n", 1)
+        encoding.loads(raw_header)
+        return frame
+    legacy_rx = _time_per_call(legacy_receive, legacy_envelopes) * 1e6
+    new_rx = _time_per_call(new_receive, new_envelopes) * 1e6
+    print(f"backplane receive    legacy loads+dumps={legacy_rx:7.1f}us   header+frame={new_rx:7.1f}us   ({legacy_rx / new_rx:.1f}x)")
+
+    legacy_frames = [legacy_dumps(m) for m in events]
+    legacy_bytes = sum(len(f.encode()) for f in legacy_frames) / len(events)
+    new_bytes = sum(len(f.encode()) for f in frames) / len(events)
+    deflated = _deflated_size(frames) / len(events)
+    print(f"bytes per event      legacy={legacy_bytes:7.0f}   {codec}={new_bytes:7.0f}   "
+          f"+permessage-deflate={deflated:7.0f}   ({1 - deflated / legacy_bytes:.0%} less than legacy)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# agentos_core/benchmarks/bench_ws_fanout.py
+"""
+Fan-out local do ConnectionManager com clientes lentos: filas por socket (app/websocket/send_queue.py) x o
+envio antigo (asyncio.gather de send_text sobre todos os sockets, esperando o mais lento).
+
+- --sockets clientes no tópico dashboard:whatsapp; --slow deles levam --slow-ms por send_text
+- publica --events eventos a --rate ev/s; mede a duração de publish() e a latência até os clientes rápidos
+- com filas, os lentos acumulam até WS_SEND_QUEUE_MAX_FRAMES e são desconectados
+
+    cd backend
+    python -m benchmarks.bench_ws_fanout --sockets 2000 --slow 20 --events 200 --rate 20
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+class BenchSocket:
+    def __init__(self, name: str, delay: float, sent_at: Dict[int, float], latencies: List[float]):
+        self.client = name
+        self._delay = delay
+        self._sent_at = sent_at
+        self._latencies = latencies
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        if self._delay:
+            await asyncio.sleep(self._delay)
+        else:
+            self._latencies.append(time.perf_counter() - self._sent_at[json.loads(text)["payload"]["seq"]])
+
+async def _run(args: argparse.Namespace, mode: str) -> None:
+    from app.websocket.connection_manager import ConnectionManager
+
+    sent_at: Dict[int, float] = {}
+    latencies: List[float] = []
+    manager = ConnectionManager()
+    sockets = [BenchSocket(f"ws{i}", args.slow_ms / 1000 if i < args.slow else 0.0, sent_at, latencies) for i in range(args.sockets)]
+    for i, ws in enumerate(sockets):
+        await manager.connect(ws, f"user-{i}", topics=["dashboard:whatsapp"])
+
+    async def gather_publish(message):
+        # Envio antigo: serializa uma vez e espera todos os send_text
+        text = json.dumps(message, default=str)
+        await asyncio.gather(*(ws.send_text(text) for ws in sockets), return_exceptions=True)
+
+    publish_times: List[float] = []
+    interval = 1.0 / args.rate
+    started = time.perf_counter()
+    for seq in range(args.events):
+        message = {"type": "new_whatsapp_message", "payload": {"seq": seq}}
+        sent_at[seq] = t0 = time.perf_counter()
+        if mode == "queue":
+            await manager.publish(["dashboard:whatsapp"], message)
+        else:
+            await gather_publish(message)
+        publish_times.append(time.perf_counter() - t0)
+        await asyncio.sleep(max(started + (seq + 1) * interval - time.perf_counter(), 0))
+    expected = args.events * (args.sockets - args.slow)
+    deadline = time.monotonic() + 30
+    while len(latencies) < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+    print(f"[{mode}] {args.events} events to {args.sockets} sockets ({args.slow} slow @ {args.slow_ms:.0f}ms) "
+          f"in {time.perf_counter() - started:.2f}s")
+    print(f"  publish() ms       p50={_percentile(publish_times, 50) * 1000:.2f}  p99={_percentile(publish_times, 99) * 1000:.2f}")
+    print(f"  fast clients ms    p50={_percentile(latencies, 50) * 1000:.2f}  p99={_percentile(latencies, 99) * 1000:.2f}  "
+          f"deliveries={len(latencies)}/{expected}")
+    if mode == "queue":
+        print(f"  still connected: {manager.subscriber_count('dashboard:whatsapp')}/{args.sockets}")
+    for ws in sockets:
+        await manager.disconnect(ws)
+
+async def main_async(args: argparse.Namespace) -> None:
+    for mode in ("gather", "queue") if args.mode == "both" else (args.mode,):
+        await _run(args, mode)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("both", "gather", "queue"), default="both")
+    parser.add_argument("--sockets", type=int, default=2000)
+    parser.add_argument("--slow", type=int, default=20)
+    parser.add_argument("--slow-ms", type=float, default=200.0)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20.0, help="Events per second")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
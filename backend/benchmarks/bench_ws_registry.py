@@ -0,0 +1,121 @@
+# agentos_core/benchmarks/bench_ws_registry.py
+"""
+Microbenchmark do registro do ConnectionManager com --connections sockets simulados (sem rede):
+
+- connect: cada socket entra em user:<id>, dashboard:whatsapp (--dashboard-share) e um chat:<id>
+- publish: eventos de chat (whatsapp_chat_topics) e broadcast; mede só o fan-out (as filas são drenadas fora do tempo)
+- churn: --churn desconexões/reconexões intercaladas com publishes
+- disconnect: todos os sockets, sem user_id (caminho do _drop_slow_consumer)
+
+    cd backend
+    python -m benchmarks.bench_ws_registry --connections 10000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import List
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+class NullSocket:
+    def __init__(self, name: str):
+        self.client = name
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        pass
+
+def _report(label: str, samples: List[float]) -> None:
+    print(f"{label:<28} n={len(samples):<6} mean={statistics.mean(samples) * 1e6:9.1f}us  "
+          f"p50={_percentile(samples, 50) * 1e6:9.1f}us  p99={_percentile(samples, 99) * 1e6:9.1f}us")
+
+async def _drain() -> None:
+    await asyncio.sleep(0.02)
+
+async def main_async(args: argparse.Namespace) -> None:
+    from loguru import logger
+    logger.disable("app") # Um log por connect/disconnect dominaria o tempo medido
+
+    from app.websocket.connection_manager import ConnectionManager
+    from app.websocket.topics import WHATSAPP_DASHBOARD_TOPIC, chat_topic, whatsapp_chat_topics
+
+    rng = random.Random(5)
+    manager = ConnectionManager()
+    chats = [f"5511{i:08d}" for i in range(args.chats)]
+    sockets = [NullSocket(f"ws{i}") for i in range(args.connections)]
+
+    def topics_for(i: int) -> List[str]:
+        topics = [chat_topic(chats[i % len(chats)])]
+        if rng.random() < args.dashboard_share:
+            topics.append(WHATSAPP_DASHBOARD_TOPIC)
+        return topics
+
+    connect_times = []
+    for i, ws in enumerate(sockets):
+        t0 = time.perf_counter()
+        await manager.connect(ws, f"user-{i % (args.connections // 2)}", topics=topics_for(i))
+        connect_times.append(time.perf_counter() - t0)
+    _report(f"connect ({args.connections})", connect_times)
+    await _drain()
+
+    publish_times = []
+    for _ in range(args.events):
+        topics = whatsapp_chat_topics(rng.choice(chats))
+        t0 = time.perf_counter()
+        await manager.publish(topics, {"type": "whatsapp_message_status", "payload": {"id": "x", "status": "read"}})
+        publish_times.append(time.perf_counter() - t0)
+        await _drain()
+    _report("publish chat+dashboard", publish_times)
+
+    broadcast_times = []
+    for _ in range(max(args.events // 10, 1)):
+        t0 = time.perf_counter()
+        await manager.broadcast({"type": "system_notice", "payload": {}})
+        broadcast_times.append(time.perf_counter() - t0)
+        await _drain()
+    _report("broadcast", broadcast_times)
+
+    churn_publish, churn_ops = [], []
+    for n in range(args.churn):
+        i = rng.randrange(args.connections)
+        t0 = time.perf_counter()
+        await manager.disconnect(sockets[i])
+        sockets[i] = NullSocket(f"ws{i}-{n}")
+        await manager.connect(sockets[i], f"user-{i % (args.connections // 2)}", topics=topics_for(i))
+        churn_ops.append(time.perf_counter() - t0)
+        if n % 10 == 0:
+            t0 = time.perf_counter()
+            await manager.publish(whatsapp_chat_topics(rng.choice(chats)), {"type": "whatsapp_message_status", "payload": {"id": "y"}})
+            churn_publish.append(time.perf_counter() - t0)
+            await _drain()
+    _report("churn disconnect+connect", churn_ops)
+    _report("publish during churn", churn_publish)
+
+    disconnect_times = []
+    for ws in sockets:
+        t0 = time.perf_counter()
+        await manager.disconnect(ws) # Sem user_id
+        disconnect_times.append(time.perf_counter() - t0)
+    _report(f"disconnect ({args.connections})", disconnect_times)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--dashboard-share", type=float, default=0.3)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--churn", type=int, default=2000)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# agentos_core/benchmarks/graph_api_stub.py
+"""
+Stand-in local da Graph API do WhatsApp (POST /{version}/{phone_id}/messages) para testes de carga.
+
+- Latência sorteada por request (lognormal com mediana/p99 configuráveis)
+- Limite de vazão por phone_id (janela deslizante de 1s): acima de --rate-per-second responde como a Meta,
+  HTTP 400 com error.code 130429 ("Rate limit hit")
+- GET /stats: aceitas, rejeitadas por limite e pico de mensagens aceitas em 1s
+
+    cd backend
+    python -m benchmarks.graph_api_stub --port 8902 --rate-per-second 80
+    META_GRAPH_API_BASE_URL=http://127.0.0.1:8902/v19.0 ...
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+@dataclass
+class GraphStubConfig:
+    latency_p50_ms: float = 120.0
+    latency_p99_ms: float = 600.0
+    rate_per_second: float = 80.0 # 0 = sem limite
+    seed: Optional[int] = None
+
+def create_app(config: GraphStubConfig) -> FastAPI:
+    app = FastAPI(title="Graph API stub")
+    rng = random.Random(config.seed)
+    mu = math.log(max(config.latency_p50_ms, 0.001))
+    sigma = max(math.log(max(config.latency_p99_ms, config.latency_p50_ms) / max(config.latency_p50_ms, 0.001)) / 2.326, 0.0)
+    windows: Dict[str, Deque[float]] = defaultdict(deque)
+    stats = {"accepted": 0, "rate_limited": 0, "peak_per_second": 0}
+
+    @app.post("/{version}/{phone_id}/messages")
+    async def send_message(version: str, phone_id: str, request: Request):
+        payload = await request.json()
+        now = time.monotonic()
+        window = windows[phone_id]
+        while window and now - window[0] >= 1.0:
+            window.popleft()
+        if config.rate_per_second and len(window) >= config.rate_per_second:
+            stats["rate_limited"] += 1
+            return JSONResponse(status_code=400, content={"error": {
+                "message": "(#130429) Rate limit hit", "type": "OAuthException", "code": 130429, "fbtrace_id": "stub"}})
+        window.append(now)
+        stats["accepted"] += 1
+        stats["peak_per_second"] = max(stats["peak_per_second"], len(window))
+        await asyncio.sleep((rng.lognormvariate(mu, sigma) if sigma else config.latency_p50_ms) / 1000)
+        return {"messaging_product": "whatsapp", "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+                "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        stats.update(accepted=0, rate_limited=0, peak_per_second=0)
+        windows.clear()
+        return {"status": "reset"}
+
+    return app
+
+def main() -> None:
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8902)
+    parser.add_argument("--latency-p50-ms", type=float, default=120.0)
+    parser.add_argument("--latency-p99-ms", type=float, default=600.0)
+    parser.add_argument("--rate-per-second", type=float, default=80.0, help="Per phone_id limit (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = GraphStubConfig(latency_p50_ms=args.latency_p50_ms, latency_p99_ms=args.latency_p99_ms,
+                             rate_per_second=args.rate_per_second, seed=args.seed)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
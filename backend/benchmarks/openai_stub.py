@@ -0,0 +1,183 @@
+# agentos_core/benchmarks/openai_stub.py
+"""
+Servidor local compatível com a API OpenAI (chat/completions e embeddings) para testes de carga offline.
+
+- Latência sorteada por request (lognormal com mediana/p99 configuráveis) + tempo por token no streaming
+- stream=True em SSE (mesmo formato de chunks da OpenAI, com usage no último evento)
+- 429 com a probabilidade configurada (corpo de erro igual ao da OpenAI + Retry-After)
+- Tool calls: se o request traz `tools` e a última mensagem do usuário contém "tool:", responde chamando a
+  primeira ferramenta (argumentos JSON fragmentados no streaming)
+- Embeddings determinísticos (hash do texto) com `dimensions` configurável
+- GET /stats: latências injetadas (p50/p95/p99) para separar o tempo do "provider" do nosso overhead
+
+    cd backend
+    python -m benchmarks.openai_stub --port 8900 --latency-p50-ms 400 --latency-p99-ms 2500 --error-rate 0.02
+    OPENAI_API_BASE_URL=http://127.0.0.1:8900/v1 uvicorn app.main:app ...
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+@dataclass
+class StubConfig:
+    latency_p50_ms: float = 400.0
+    latency_p99_ms: float = 2000.0
+    token_interval_ms: float = 15.0 # Intervalo entre chunks no streaming
+    completion_tokens: int = 40 # Tamanho da resposta de texto
+    error_rate: float = 0.0 # Fração de requests respondidos com 429
+    embedding_latency_ms: float = 50.0
+    embedding_dimensions: int = 1536
+    seed: Optional[int] = None
+
+@dataclass
+class StubStats:
+    injected_ms: List[float] = field(default_factory=list)
+    requests: int = 0
+    rate_limited: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        values = np.asarray(self.injected_ms) if self.injected_ms else np.zeros(1)
+        return {
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "injected_latency_ms": {q: float(np.percentile(values, int(q[1:]))) for q in ("p50", "p95", "p99")},
+        }
+
+WORDS = "o seu pedido foi confirmado e será entregue amanhã pela nossa equipe de logística".split()
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="OpenAI stub")
+    rng = random.Random(config.seed)
+    stats = StubStats()
+    # Lognormal: mediana = p50; sigma tal que o quantil 0.99 (z=2.326) caia em p99
+    mu = math.log(max(config.latency_p50_ms, 0.001))
+    sigma = max(math.log(max(config.latency_p99_ms, config.latency_p50_ms) / max(config.latency_p50_ms, 0.001)) / 2.326, 0.0)
+
+    def sample_latency_s() -> float:
+        latency_ms = rng.lognormvariate(mu, sigma) if sigma else config.latency_p50_ms
+        stats.injected_ms.append(latency_ms)
+        return latency_ms / 1000
+
+    def rate_limited() -> Optional[JSONResponse]:
+        stats.requests += 1
+        if config.error_rate and rng.random() < config.error_rate:
+            stats.rate_limited += 1
+            body = {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded", "param": None}}
+            return JSONResponse(status_code=429, content=body, headers={"Retry-After": "1"})
+        return None
+
+    def wants_tool_call(payload: Dict[str, Any]) -> bool:
+        last = next((m for m in reversed(payload.get("messages") or []) if m.get("role") == "user"), None)
+        return bool(payload.get("tools")) and bool(last) and "tool:" in str(last.get("content") or "")
+
+    def usage(payload: Dict[str, Any], completion_tokens: int) -> Dict[str, int]:
+        prompt_tokens = sum(len(str(m.get("content") or "")) // 4 + 3 for m in payload.get("messages") or [])
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        if (error := rate_limited()) is not None:
+            return error
+        await asyncio.sleep(sample_latency_s())
+        completion_id, created, model = f"chatcmpl-{uuid.uuid4().hex[:24]}", int(time.time()), payload.get("model", "stub")
+        tool = payload["tools"][0]["function"]["name"] if wants_tool_call(payload) else None
+        words = [WORDS[i % len(WORDS)] for i in range(config.completion_tokens)]
+
+        if not payload.get("stream"):
+            if tool:
+                message = {"role": "assistant", "content": None, "tool_calls": [{"id": "call_stub", "type": "function", "function": {"name": tool, "arguments": json.dumps({"ref": "ORD-2025-00001"})}}]}
+                finish_reason = "tool_calls"
+            else:
+                message, finish_reason = {"role": "assistant", "content": " ".join(words)}, "stop"
+            return {"id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}], "usage": usage(payload, len(words))}
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async def stream():
+            yield event({"role": "assistant", "content": ""})
+            if tool:
+                yield event({"tool_calls": [{"index": 0, "id": "call_stub", "type": "function", "function": {"name": tool, "arguments": ""}}]})
+                for fragment in ('{"ref": ', '"ORD-2025', '-00001"}'):
+                    await asyncio.sleep(config.token_interval_ms / 1000)
+                    yield event({"tool_calls": [{"index": 0, "function": {"arguments": fragment}}]})
+                yield event({}, "tool_calls")
+            else:
+                for i, word in enumerate(words):
+                    await asyncio.sleep(config.token_interval_ms / 1000)
+                    yield event({"content": word if i == 0 else " " + word})
+                yield event({}, "stop")
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage(payload, len(words))})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        payload = await request.json()
+        if (error := rate_limited()) is not None:
+            return error
+        await asyncio.sleep(config.embedding_latency_ms / 1000)
+        inputs = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+        dimensions = payload.get("dimensions") or config.embedding_dimensions
+        data = []
+        for index, text in enumerate(inputs):
+            seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            data.append({"object": "embedding", "index": index, "embedding": vector.tolist()})
+        tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+        return {"object": "list", "data": data, "model": payload.get("model", "stub"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats.summary()
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        stats.injected_ms.clear()
+        stats.requests = stats.rate_limited = 0
+        return {"status": "reset"}
+
+    return app
+
+def main() -> None:
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-p50-ms", type=float, default=400.0)
+    parser.add_argument("--latency-p99-ms", type=float, default=2000.0)
+    parser.add_argument("--token-interval-ms", type=float, default=15.0)
+    parser.add_argument("--completion-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embedding-dimensions", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = StubConfig(
+        latency_p50_ms=args.latency_p50_ms, latency_p99_ms=args.latency_p99_ms, token_interval_ms=args.token_interval_ms,
+        completion_tokens=args.completion_tokens, error_rate=args.error_rate, embedding_latency_ms=args.embedding_latency_ms,
+        embedding_dimensions=args.embedding_dimensions, seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
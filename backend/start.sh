@@ -18,6 +18,8 @@ WORKERS_PER_CORE=${WORKERS_PER_CORE:-1}
 CORES=$(grep -c ^processor /proc/cpuinfo 2>/dev/null || echo 1)
 DEFAULT_WORKERS=$((CORES * WORKERS_PER_CORE))
 WORKERS=${WORKERS:-$DEFAULT_WORKERS}
+# Compressão permessage-deflate dos WebSockets (negociada com o cliente); false economiza CPU em fan-out grande
+WS_PER_MESSAGE_DEFLATE=${WS_PER_MESSAGE_DEFLATE:-true}
 
 # Execute uvicorn using the full path within the virtual environment
 exec /app/.venv/bin/uvicorn \
@@ -26,5 +28,6 @@ exec /app/.venv/bin/uvicorn \
     --port ${PORT} \
     --workers ${WORKERS} \
     --log-level ${LOG_LEVEL} \
+    --ws-per-message-deflate ${WS_PER_MESSAGE_DEFLATE} \
     --forwarded-allow-ips='*' \
     --proxy-headers
\ No newline at end of file
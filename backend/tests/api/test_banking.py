@@ -0,0 +1,47 @@
+# tests/api/test_banking.py
+from datetime import datetime, timedelta
+from bson import ObjectId, Decimal128
+
+def _seed_transactions(db, user_id, count):
+    import asyncio
+    base = datetime(2026, 1, 1)
+    asyncio.run(db["transactions"].insert_many([
+        {
+            "transaction_ref": f"TRX-2026-{i:05d}", "type": "payment_received", "amount": Decimal128("12.50"),
+            "currency": "BRL", "description": f"pagamento {i}", "status": "completed",
+            "associated_user_id": user_id, "created_at": base + timedelta(minutes=i), "updated_at": base
+        }
+        for i in range(count)
+    ]))
+
+def test_list_transactions_follows_next_cursor(monkeypatch):
+    from fastapi.testclient import TestClient
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.database import mongo_manager
+    from app.core.security import get_current_active_user
+    from app.main import app
+    from app.modules.people.models import UserInDB
+
+    db = AsyncMongoMockClient()["test_banking_api"]
+    monkeypatch.setattr(mongo_manager, "get_db", lambda: db)
+    user = UserInDB(email="cliente@example.com", hashed_password="x")
+    _seed_transactions(db, user.id, 5)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    try:
+        client = TestClient(app) # Sem `with`: o lifespan (Mongo/Redis) não roda
+        first = client.get("/api/v1/banking/transactions", params={"limit": 2})
+        assert first.status_code == 200
+        refs, page = [], first.json()
+        while True:
+            refs += [item["transaction_ref"] for item in page["items"]]
+            if not page["next_cursor"]: break
+            page = client.get("/api/v1/banking/transactions", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+        assert refs == [f"TRX-2026-{i:05d}" for i in range(4, -1, -1)]
+        assert first.json()["items"][0]["amount"] == "12.50"
+
+        bad_cursor = client.get("/api/v1/banking/transactions", params={"cursor": first.json()["next_cursor"] + "x"})
+        assert bad_cursor.status_code == 400
+        other_user = client.get("/api/v1/banking/transactions", params={"user_id": str(ObjectId())})
+        assert other_user.status_code == 403
+    finally:
+        app.dependency_overrides.clear()
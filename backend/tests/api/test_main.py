@@ -0,0 +1,36 @@
+# tests/api/test_main.py
+
+def test_app_imports_and_mounts_the_api_routes():
+    from app.main import app
+    paths = app.openapi()["paths"]
+    assert {"/api/v1/whatsapp/webhook", "/api/v1/gateway/stream", "/api/v1/healthcheck"} <= set(paths)
+    assert {"get", "post"} <= set(paths["/api/v1/whatsapp/webhook"])
+
+def test_whatsapp_webhook_verification_handshake(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.core.config import settings
+    from app.main import app
+
+    monkeypatch.setattr(settings, "META_VERIFY_TOKEN", "verify-me")
+    client = TestClient(app) # Sem `with`: o lifespan (Mongo/Redis) não roda
+    params = {"hub.mode": "subscribe", "hub.verify_token": "verify-me", "hub.challenge": "1158201444"}
+    response = client.get("/api/v1/whatsapp/webhook", params=params)
+    assert response.status_code == 200 and response.text == "1158201444"
+    assert client.get("/api/v1/whatsapp/webhook", params={**params, "hub.verify_token": "wrong"}).status_code == 403
+
+def test_ws_updates_is_mounted_and_speaks_the_subscription_protocol(monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+    from app.core.config import settings
+    from app.main import app
+
+    monkeypatch.setattr(settings, "API_KEY", "ws-test-key")
+    client = TestClient(app)
+    with client.websocket_connect("/ws/updates?apiKey=ws-test-key&topics=dashboard:whatsapp") as ws:
+        status = json.loads(ws.receive_text())
+        assert status["type"] == "connection_status" and status["connection_id"]
+        ws.send_text(json.dumps({"action": "subscribe", "topics": ["chat:5511999998888"]}))
+        reply = json.loads(ws.receive_text())
+        assert reply["type"] == "subscription" and "chat:5511999998888" in reply["topics"]
+        ws.send_text(json.dumps({"action": "list_subscriptions"}))
+        assert set(json.loads(ws.receive_text())["topics"]) >= {"dashboard:whatsapp", "chat:5511999998888"}
@@ -0,0 +1,64 @@
+# tests/core/test_counters.py
+import asyncio
+
+class _CountingCollection:
+    """Conta as chamadas ao Mongo feitas pelo CounterService."""
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = []
+
+    async def find_one(self, *args, **kwargs):
+        self.calls.append("find_one")
+        return await self.collection.find_one(*args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        self.calls.append("update_one")
+        return await self.collection.update_one(*args, **kwargs)
+
+def test_redis_counter_seeds_once_and_persists_high_water_mark_per_step(monkeypatch):
+    import fakeredis
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.config import settings
+    from app.core.counters import COUNTERS_COLLECTION, CounterService, reset_sequence_blocks
+
+    monkeypatch.setattr(settings, "COUNTER_REDIS_HWM_STEP", 100)
+    db = AsyncMongoMockClient()["test_counters"]
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+    async def scenario():
+        await db[COUNTERS_COLLECTION].insert_one({"_id": "ord_counter", "sequence_value": 41}) # Valor legado do backend mongo
+        service = CounterService(db, block_size=10, redis_client=client)
+        service.collection = counting = _CountingCollection(service.collection)
+        reset_sequence_blocks()
+
+        first = await asyncio.gather(*(service._get_next_sequence("ord_counter") for _ in range(50)))
+        assert sorted(first) == list(range(42, 92))
+        # Semeadura (1 leitura) + uma marca d'água para os 5 blocos, em vez de 2 round trips por bloco
+        assert counting.calls == ["find_one", "update_one"]
+        assert (await db[COUNTERS_COLLECTION].find_one({"_id": "ord_counter"}))["sequence_value"] == 151
+
+        # Redis perde as chaves: a nova semente vem da marca d'água e nada é reemitido
+        await client.flushall()
+        reset_sequence_blocks()
+        after_restart = [await service._get_next_sequence("ord_counter") for _ in range(5)]
+        assert after_restart[0] > max(first) and after_restart == list(range(152, 157))
+
+    asyncio.run(scenario())
+    reset_sequence_blocks()
+
+def test_redis_counter_concurrent_seeding_does_not_reissue(monkeypatch):
+    import fakeredis
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.counters import CounterService, reset_sequence_blocks
+
+    db = AsyncMongoMockClient()["test_counters_seed"]
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        # Dois "processos" (blocos independentes) semeando a mesma chave ao mesmo tempo
+        services = [CounterService(db, block_size=5, redis_client=fakeredis.FakeAsyncRedis(server=server)) for _ in range(2)]
+        ends = await asyncio.gather(*(service._reserve_block("trx_counter", 5) for service in services))
+        return sorted(ends)
+
+    assert asyncio.run(scenario()) == [5, 10]
+    reset_sequence_blocks()
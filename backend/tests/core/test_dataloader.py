@@ -0,0 +1,36 @@
+# tests/core/test_dataloader.py
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+pytestmark = pytest.mark.asyncio
+
+def make_repo(found: dict):
+    from app.core.repository import BaseRepository
+    repo = MagicMock()
+    repo.collection_name = "users"
+    repo._to_objectid = BaseRepository._to_objectid
+    repo.get_many = AsyncMock(return_value=found)
+    return repo
+
+async def test_loads_in_same_tick_are_batched_and_cached():
+    """Loads issued concurrently hit get_many once; repeated ids come from cache."""
+    from app.core.dataloader import get_loader, request_loaders_scope
+    a, b = ObjectId(), ObjectId()
+    repo = make_repo({a: "user_a"})
+    with request_loaders_scope():
+        results = await asyncio.gather(
+            get_loader(repo).load(a), get_loader(repo).load(str(b)), get_loader(repo).load(a)
+        )
+        assert results == ["user_a", None, "user_a"]
+        assert await get_loader(repo).load(a) == "user_a"
+    repo.get_many.assert_awaited_once()
+    assert set(repo.get_many.await_args.args[0]) == {a, b}
+
+async def test_invalid_ids_resolve_to_none_without_query():
+    from app.core.dataloader import get_loader, request_loaders_scope
+    repo = make_repo({})
+    with request_loaders_scope():
+        assert await get_loader(repo).load_many(["system", None]) == [None, None]
+    repo.get_many.assert_not_awaited()
@@ -0,0 +1,28 @@
+# tests/core/test_repository_cursor.py
+import asyncio
+
+def test_list_by_cursor_keeps_sort_keys_with_exclusion_projections():
+    from mongomock_motor import AsyncMongoMockClient
+    from pymongo import ASCENDING
+    from app.core.repository import BaseRepository
+    from app.modules.banking.models import TransactionInDB
+
+    class _Repo(BaseRepository):
+        model = TransactionInDB
+        collection_name = "items"
+
+    repo = _Repo(AsyncMongoMockClient()["test_repository_cursor"])
+
+    async def scenario():
+        await repo.collection.insert_many([{"seq": i, "secret": "x", "name": f"n{i}"} for i in range(3)])
+        pages = []
+        for projection in ({"_id": 0}, {"secret": 0, "seq": 0}):
+            rows, cursor = await repo.list_by_cursor(sort=[("seq", ASCENDING)], limit=2, projection=projection, raw=True)
+            more, last = await repo.list_by_cursor(sort=[("seq", ASCENDING)], limit=2, cursor=cursor, projection=projection, raw=True)
+            pages.append((rows + more, last))
+        return pages
+
+    (all_fields, last), (without_secret, _) = asyncio.run(scenario())
+    # {"_id": 0} não vira {} (o pymongo devolveria só o _id): documento inteiro, _id mantido para o cursor
+    assert [row["name"] for row in all_fields] == ["n0", "n1", "n2"] and last is None
+    assert all("secret" not in row and "seq" in row for row in without_secret)
@@ -0,0 +1,58 @@
+# tests/core/test_settings_cache.py
+import asyncio
+
+def test_settings_cache_coalesces_loads_and_invalidates():
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.settings_cache import KIND_SETTING, SettingsCache
+
+    db = AsyncMongoMockClient()["test_settings_cache"]
+    cache = SettingsCache(ttl_seconds=60)
+    finds = []
+    original_load = cache._load
+
+    async def counting_load(kind, keys, db_, ttl):
+        finds.append(sorted(keys))
+        await asyncio.sleep(0.01) # Janela para as demais corrotinas chegarem durante a carga
+        return await original_load(kind, keys, db_, ttl)
+    cache._load = counting_load
+
+    async def scenario():
+        await db["settings"].insert_one({"_id": "autoresponder_enabled", "value": True})
+        defaults = {"autoresponder_enabled": False, "autoresponder_timeout_minutes": 5}
+        results = await asyncio.gather(*(cache.get_settings(defaults, db) for _ in range(20)))
+        assert all(r == {"autoresponder_enabled": True, "autoresponder_timeout_minutes": 5} for r in results)
+        assert finds == [["autoresponder_enabled", "autoresponder_timeout_minutes"]] # Uma carga para 20 leitores
+
+        await db["settings"].update_one({"_id": "autoresponder_timeout_minutes"}, {"$set": {"value": 10}}, upsert=True)
+        assert await cache.get_setting("autoresponder_timeout_minutes", db, default=5) == 5 # Ausência também fica em cache
+        cache.invalidate(KIND_SETTING, "autoresponder_timeout_minutes")
+        assert await cache.get_setting("autoresponder_timeout_minutes", db, default=5) == 10
+        assert len(finds) == 2
+
+    asyncio.run(scenario())
+
+def test_settings_cache_load_survives_cancelled_first_caller():
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.settings_cache import SettingsCache
+
+    db = AsyncMongoMockClient()["test_settings_cache_cancel"]
+    cache = SettingsCache(ttl_seconds=60)
+    original_load = cache._load
+
+    async def slow_load(kind, keys, db_, ttl):
+        await asyncio.sleep(0.02)
+        return await original_load(kind, keys, db_, ttl)
+    cache._load = slow_load
+
+    async def scenario():
+        await db["settings"].insert_one({"_id": "autoresponder_enabled", "value": True})
+        first = asyncio.create_task(cache.get_setting("autoresponder_enabled", db, default=False))
+        await asyncio.sleep(0) # first dispara a carga
+        second = asyncio.create_task(cache.get_setting("autoresponder_enabled", db, default=False))
+        await asyncio.sleep(0) # second aguarda a mesma carga
+        first.cancel()
+        assert await asyncio.wait_for(second, timeout=1) is True
+        assert first.cancelled()
+        assert not cache._inflight.get(asyncio.get_running_loop()) # Nada pendurado para as próximas leituras
+
+    asyncio.run(scenario())
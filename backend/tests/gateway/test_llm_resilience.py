@@ -0,0 +1,91 @@
+# tests/gateway/test_llm_resilience.py
+import asyncio
+import time
+
+def test_circuit_breaker_opens_and_recovers_through_half_open_probe():
+    from app.services.llm_resilience import CircuitBreaker
+    breaker = CircuitBreaker("openai", failure_threshold=2, reset_seconds=0.05)
+    breaker.record("overload")
+    assert breaker.allow()
+    breaker.record("failure")
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() # Probe half-open
+    assert not breaker.allow() # Apenas uma chamada de teste por vez
+    breaker.record("success")
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_aimd_limiter_cuts_on_overload_and_grows_on_success():
+    from app.services.llm_resilience import AdaptiveConcurrencyLimiter, LimiterTimeout
+
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter("openai", initial_limit=2, min_limit=1, max_limit=4, latency_target_seconds=1.0)
+        await limiter.acquire(timeout=0.1)
+        await limiter.acquire(timeout=0.1)
+        try:
+            await limiter.acquire(timeout=0.01)
+            raise AssertionError("limiter should be full")
+        except LimiterTimeout:
+            pass
+        limiter.release("overload", 0.1)
+        assert limiter.limit == 1.0 and limiter.in_flight == 1
+        limiter.release("success", 0.1)
+        assert limiter.limit == 2.0 and limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+def test_hedged_completion_ignores_a_cancelled_hedge():
+    from app.models.gateway import LLMResponse
+    from app.services.llm_client import _hedged_completion
+
+    response = LLMResponse.model_validate({
+        "id": "r1", "object": "chat.completion", "created": 0, "model": "m",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}]
+    })
+
+    async def primary():
+        await asyncio.sleep(0.05)
+        return response
+
+    async def hedge():
+        raise asyncio.CancelledError()
+
+    assert asyncio.run(_hedged_completion(primary, hedge, delay_seconds=0.01)) is response
+
+def test_hedged_completion_returns_hedge_result_when_primary_is_cancelled():
+    from app.models.gateway import LLMResponse
+    from app.services.llm_client import _hedged_completion
+
+    empty = LLMResponse.model_validate({
+        "id": "r2", "object": "chat.completion", "created": 0, "model": "m",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": ""}, "finish_reason": "stop"}]
+    })
+
+    async def primary():
+        await asyncio.sleep(0.05)
+        raise asyncio.CancelledError()
+
+    async def empty_hedge():
+        return empty
+
+    async def skipped_hedge():
+        return None
+
+    # Hedge terminou sem resposta utilizável e o primário foi cancelado: nada de CancelledError para o chamador
+    assert asyncio.run(_hedged_completion(primary, empty_hedge, delay_seconds=0.01)) is empty
+    try:
+        asyncio.run(_hedged_completion(primary, skipped_hedge, delay_seconds=0.01))
+        assert False, "expected RuntimeError"
+    except RuntimeError as e:
+        assert "no response" in str(e)
+
+def test_hedge_requires_a_distinct_secondary_unless_same_provider_is_allowed(monkeypatch):
+    from app.core.config import settings
+    from app.services.llm_client import _hedge_call_factory
+
+    args = ("openai", object(), "gpt", "gemini", True, [], None, "auto", 0.2, 100)
+    monkeypatch.setattr(settings, "LLM_HEDGE_SAME_PROVIDER", False)
+    assert _hedge_call_factory(*args) is None # "gemini" (padrão) não é alvo: sem hedge duplicado no primário
+    monkeypatch.setattr(settings, "LLM_HEDGE_SAME_PROVIDER", True)
+    assert callable(_hedge_call_factory(*args))
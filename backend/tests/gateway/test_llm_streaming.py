@@ -0,0 +1,24 @@
+# tests/gateway/test_llm_streaming.py
+
+def test_stream_assembler_joins_content_and_tool_call_fragments():
+    from app.services.llm_client import _StreamAssembler
+    assembler = _StreamAssembler(model="gpt-test")
+    events = [
+        {"id": "c1", "created": 1, "model": "gpt-test", "choices": [{"index": 0, "delta": {"role": "assistant", "content": "Verificando"}}]},
+        {"id": "c1", "choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "id": "call_1", "function": {"name": "get_order", "arguments": ""}}]}}]},
+        {"id": "c1", "choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": "{\"ref\": "}}]}}]},
+        {"id": "c1", "choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": "\"ORD-1\"}"}}]}}]},
+        {"id": "c1", "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]},
+        {"id": "c1", "choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 9, "total_tokens": 12}},
+    ]
+    chunks = [chunk for event in events for chunk in assembler.feed(event)]
+
+    assert [chunk.type for chunk in chunks] == ["content", "tool_call", "tool_call", "tool_call"]
+    assert chunks[-1].tool_call.function.arguments == '{"ref": "ORD-1"}' # Estado acumulado a cada delta
+
+    response = assembler.response()
+    message = response.choices[0].message
+    assert message.content == "Verificando"
+    assert message.tool_calls[0].id == "call_1" and message.tool_calls[0].function.name == "get_order"
+    assert response.choices[0].finish_reason == "tool_calls"
+    assert response.usage["total_tokens"] == 12
@@ -0,0 +1,27 @@
+# tests/gateway/test_token_budget.py
+
+def test_fit_messages_drops_oldest_history_and_keeps_tool_pairs():
+    from app.services.token_budget import count_messages_tokens, fit_messages
+    model = "gpt-4o-mini"
+    messages = [{"role": "system", "content": "Você é o assistente da loja."}]
+    for i in range(40):
+        messages.append({"role": "user", "content": f"pergunta {i} " * 30})
+        messages.append({"role": "assistant", "content": None, "tool_calls": [{"id": f"call_{i}", "type": "function", "function": {"name": "get_order", "arguments": "{}"}}]})
+        messages.append({"role": "tool", "tool_call_id": f"call_{i}", "content": "resultado " * 20})
+    messages.append({"role": "user", "content": "E o pedido mais recente?"})
+
+    short = messages[:4]
+    assert fit_messages(short, model, 500, budget=10_000) is short # Já cabe: sem cópia
+    fitted = fit_messages(messages, model, 500, budget=1500)
+
+    assert count_messages_tokens(fitted, model) <= 1500
+    assert fitted[0] == messages[0] and fitted[-1] == messages[-1]
+    assert fitted[1]["role"] != "tool" # Resposta de ferramenta nunca fica sem o assistant que a pediu
+    assert fitted[-2] == messages[-2] # Histórico mais recente preservado
+
+def test_truncate_text_respects_token_limit():
+    from app.services.token_budget import count_tokens, truncate_text
+    text = "palavra " * 5000
+    truncated = truncate_text(text, 50)
+    assert count_tokens(truncated) <= 50 and truncated.endswith("…")
+    assert truncate_text("curto", 50) == "curto"
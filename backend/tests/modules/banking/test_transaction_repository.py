@@ -0,0 +1,37 @@
+# tests/modules/banking/test_transaction_repository.py
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId, Decimal128
+
+def test_list_summaries_by_user_returns_projected_raw_pages(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.database import mongo_manager
+    from app.modules.banking.repository import TRANSACTION_LIST_PROJECTION, get_transaction_repository
+
+    db = AsyncMongoMockClient()["test_banking_repository"]
+    monkeypatch.setattr(mongo_manager, "get_db", lambda: db)
+    user_id, other_user = ObjectId(), ObjectId()
+    base = datetime(2026, 1, 1)
+
+    async def scenario():
+        repo = await get_transaction_repository()
+        await db["transactions"].insert_many([
+            {
+                "transaction_ref": f"TRX-2026-{i:05d}", "type": "payment_received", "amount": Decimal128("10.00"),
+                "currency": "BRL", "description": f"pagamento {i}", "status": "completed",
+                "associated_user_id": user_id if i != 2 else other_user, "metadata": {"big": "x" * 100},
+                "created_at": base + timedelta(minutes=i), "updated_at": base
+            }
+            for i in range(5)
+        ])
+        first, cursor = await repo.list_summaries_by_user(user_id, limit=3)
+        second, last_cursor = await repo.list_summaries_by_user(user_id, limit=3, cursor=cursor)
+        return first, cursor, second, last_cursor
+
+    first, cursor, second, last_cursor = asyncio.run(scenario())
+    assert [row["transaction_ref"] for row in first] == ["TRX-2026-00004", "TRX-2026-00003", "TRX-2026-00001"]
+    assert [row["transaction_ref"] for row in second] == ["TRX-2026-00000"]
+    assert cursor and last_cursor is None
+    # Linhas cruas (sem model_validate) só com os campos da listagem
+    assert all(isinstance(row, dict) for row in first + second)
+    assert set(first[0]) == {"_id", *TRANSACTION_LIST_PROJECTION}
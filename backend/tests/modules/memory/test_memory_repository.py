@@ -0,0 +1,38 @@
+# tests/modules/memory/test_memory_repository.py
+import asyncio
+from bson import ObjectId
+
+def test_repository_vector_search_uses_local_index(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.config import settings
+    from app.core.database import mongo_manager
+    import app.modules.memory.vector_index as vector_index
+    from app.modules.memory.repository import get_memory_repository
+
+    monkeypatch.setattr(settings, "MEMORY_VECTOR_BACKEND", "bruteforce")
+    monkeypatch.setattr(settings, "EMBEDDING_DIMENSIONS", 4)
+    monkeypatch.setattr(settings, "MEMORY_EMBEDDING_STORAGE", "float32")
+    monkeypatch.setattr(vector_index, "_vector_index", None)
+    db = AsyncMongoMockClient()["test_memory_repository"]
+    monkeypatch.setattr(mongo_manager, "get_db", lambda: db)
+
+    user_id, other_user = ObjectId(), ObjectId()
+    async def scenario():
+        repo = await get_memory_repository()
+        assert repo.db is db and repo.vector_index.name == "bruteforce"
+        near = await repo.create_memory({"user_id": user_id, "text": "gosta de café", "tags": ["pref"], "embedding": [1.0, 0.0, 0.0, 0.0]})
+        await repo.create_memory({"user_id": user_id, "text": "mora em Recife", "tags": ["info"], "embedding": [0.0, 1.0, 0.0, 0.0]})
+        await repo.create_memory({"user_id": other_user, "text": "outro usuário", "embedding": [1.0, 0.0, 0.0, 0.0]})
+
+        # Índice do processo descartado: a busca recarrega a partição do Mongo (embeddings em float32)
+        monkeypatch.setattr(vector_index, "_vector_index", None)
+        fresh = await get_memory_repository()
+        results = await fresh.vector_search([0.9, 0.1, 0.0, 0.0], user_id, limit=5, min_similarity=0.6)
+        tagged = await fresh.vector_search([0.9, 0.1, 0.0, 0.0], user_id, limit=5, min_similarity=0.0, tags_filter=["info"])
+        return near, results, tagged
+
+    near, results, tagged = asyncio.run(scenario())
+    assert [doc["_id"] for doc in results] == [near.id]
+    assert results[0]["text"] == "gosta de café" and "embedding" not in results[0]
+    assert results[0]["similarity_score"] > 0.9
+    assert [doc["text"] for doc in tagged] == ["mora em Recife"]
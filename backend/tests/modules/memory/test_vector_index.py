@@ -0,0 +1,60 @@
+# tests/modules/memory/test_vector_index.py
+import numpy as np
+from bson import ObjectId
+
+def make_partition_data(n: int = 3000, dim: int = 32, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((30, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, 30, n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    ids = [ObjectId() for _ in range(n)]
+    tags = [("even",) if i % 2 == 0 else ("odd",) for i in range(n)]
+    return ids, vectors, tags
+
+def test_bruteforce_is_partitioned_by_user_and_prefilters_tags():
+    from app.modules.memory.vector_index import BruteForceVectorIndex
+    ids, vectors, tags = make_partition_data(200)
+    user_a, user_b = ObjectId(), ObjectId()
+    index = BruteForceVectorIndex(dimensions=vectors.shape[1], partition_ttl_seconds=0)
+    index.load_partition(user_a, ids, vectors, tags)
+
+    hits = index.search(user_a, vectors[7], limit=3)
+    assert hits[0][0] == ids[7]
+    assert hits[0][1] >= hits[1][1] >= hits[2][1]
+    assert abs(hits[0][1] - 1.0) < 1e-5 # Escala Atlas: (1 + cos) / 2
+    assert index.search(user_b, vectors[7], limit=3) == []
+
+    odd_hits = index.search(user_a, vectors[7], limit=5, tags_filter=["odd"])
+    assert odd_hits and all(ids.index(obj_id) % 2 == 1 for obj_id, _ in odd_hits)
+
+    assert index.remove(ids[7])
+    assert index.search(user_a, vectors[7], limit=1)[0][0] != ids[7]
+
+def test_ivf_matches_bruteforce_top_hit_after_training():
+    from app.modules.memory.vector_index import BruteForceVectorIndex, IVFVectorIndex
+    ids, vectors, tags = make_partition_data()
+    user_id = ObjectId()
+    exact = BruteForceVectorIndex(dimensions=vectors.shape[1], partition_ttl_seconds=0)
+    approx = IVFVectorIndex(dimensions=vectors.shape[1], partition_ttl_seconds=0, nprobe=8, min_train_size=1000)
+    for index in (exact, approx):
+        index.load_partition(user_id, ids, vectors, tags)
+    new_id = ObjectId()
+    for index in (exact, approx):
+        index.add(user_id, new_id, vectors[0] * 2, ["odd"]) # Fica na "tail" da IVF até o repack
+
+    for row in (0, 10, 2500):
+        assert approx.search(user_id, vectors[row], limit=1)[0][0] == exact.search(user_id, vectors[row], limit=1)[0][0]
+    tagged = approx.search(user_id, vectors[0], limit=1, tags_filter=["odd"])
+    assert tagged[0][0] == new_id
+
+def test_ivf_keeps_indexing_after_removals_drop_below_min_train_size():
+    from app.modules.memory.vector_index import IVFVectorIndex
+    ids, vectors, tags = make_partition_data(1200)
+    user_id = ObjectId()
+    index = IVFVectorIndex(dimensions=vectors.shape[1], partition_ttl_seconds=0, nprobe=4, min_train_size=1000)
+    index.load_partition(user_id, ids, vectors, tags)
+    for obj_id in ids[:400]:
+        index.remove(obj_id, user_id)
+
+    new_id = ObjectId()
+    index.add(user_id, new_id, vectors[0] * 2, ["odd"])
+    assert index.search(user_id, vectors[0], limit=1)[0][0] == new_id
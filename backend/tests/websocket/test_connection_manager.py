@@ -0,0 +1,156 @@
+# tests/websocket/test_connection_manager.py
+import asyncio
+import json
+
+class FakeWebSocket:
+    def __init__(self, name):
+        self.client = name
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = code
+
+async def _drain():
+    await asyncio.sleep(0.01) # Deixa as tasks escritoras esvaziarem as filas
+
+def test_publish_targets_topics_once_per_socket():
+    from app.websocket.connection_manager import ConnectionManager
+    from app.websocket.topics import whatsapp_chat_topics
+
+    manager = ConnectionManager()
+    watcher, dashboard, other = FakeWebSocket("watcher"), FakeWebSocket("dashboard"), FakeWebSocket("other")
+
+    async def scenario():
+        await manager.connect(watcher, "u1", topics=["chat:5511", "dashboard:whatsapp"])
+        await manager.connect(dashboard, "u2") # Tópicos padrão (dashboard:whatsapp)
+        other_connection = await manager.connect(other, "u3", topics=["chat:5522"])
+
+        delivered = await manager.publish(whatsapp_chat_topics("5511"), {"type": "new_whatsapp_message"})
+        assert delivered == 2
+        await _drain()
+        assert len(watcher.sent) == 1 and len(dashboard.sent) == 1 and other.sent == [] # Uma cópia, mesmo com 2 tópicos
+
+        result = await manager.subscribe(other, "u3", ["chat:5511", "user:u1", "bogus"])
+        assert result["topics"] == ["chat:5511", "chat:5522", f"connection:{other_connection}", "user:u3"]
+        assert set(result["rejected"]) == {"user:u1", "bogus"}
+
+        await manager.disconnect(watcher) # Sem user_id: mapa reverso socket -> usuário
+        assert manager.connection_count == 2 and "u1" not in manager.active_connections
+        assert manager.subscriber_count("chat:5511") == 1
+        assert await manager.send_personal_message({"type": "ping"}, "u2") == 1
+
+    asyncio.run(scenario())
+
+def test_connection_topic_reaches_only_its_socket():
+    from app.websocket.connection_manager import ConnectionManager
+    from app.websocket.topics import connection_topic
+
+    manager = ConnectionManager()
+    first, second = FakeWebSocket("first"), FakeWebSocket("second")
+
+    async def scenario():
+        first_id = await manager.connect(first, "api_key_user", topics=[])
+        second_id = await manager.connect(second, "api_key_user", topics=[]) # Mesmo usuário, outra conexão
+        assert first_id != second_id
+
+        assert await manager.publish([connection_topic(first_id)], {"type": "llm_delta"}) == 1
+        await _drain()
+        assert len(first.sent) == 1 and second.sent == []
+
+        result = await manager.subscribe(second, "api_key_user", [connection_topic(first_id)])
+        assert connection_topic(first_id) in result["rejected"]
+        result = await manager.unsubscribe(first, "api_key_user", [connection_topic(first_id)])
+        assert connection_topic(first_id) in result["topics"]
+
+    asyncio.run(scenario())
+
+def test_backplane_delivers_remote_events_once():
+    from app.websocket.connection_manager import WS_BACKPLANE_CHANNEL, ConnectionManager
+
+    class CapturingRedis:
+        def __init__(self):
+            self.published = []
+
+        async def publish(self, channel, data):
+            self.published.append((channel, data))
+            return 1
+
+    redis_client = CapturingRedis()
+    worker, api_node = ConnectionManager(), ConnectionManager()
+    worker.attach_backplane(redis_client) # Worker: só publica
+    api_node.attach_backplane(redis_client)
+    client = FakeWebSocket("client")
+
+    async def scenario():
+        await api_node.connect(client, "u1", topics=["chat:5511"])
+        assert await worker.publish(["chat:5511"], {"type": "new_whatsapp_message"}) == 0 # Nenhum socket no worker
+        assert await api_node.publish(["chat:5511"], {"type": "local"}) == 1
+        assert [channel for channel, _ in redis_client.published] == [WS_BACKPLANE_CHANNEL] * 2
+
+        for _, data in redis_client.published: # O que o listener do nó da API receberia
+            await api_node._handle_backplane_message(data)
+        await _drain()
+        assert [m["type"] for m in client.sent] == ["local", "new_whatsapp_message"] # O próprio evento não volta duplicado
+
+    asyncio.run(scenario())
+
+def test_slow_consumer_is_isolated_coalesced_and_dropped(monkeypatch):
+    from app.core.config import settings
+    from app.websocket.connection_manager import ConnectionManager
+
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_MAX_FRAMES", 5)
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SOFT_LIMIT", 3)
+
+    class StuckWebSocket(FakeWebSocket):
+        async def send_text(self, text):
+            await asyncio.Event().wait() # Cliente que nunca lê
+
+    manager = ConnectionManager()
+    fast, slow = FakeWebSocket("fast"), StuckWebSocket("slow")
+
+    async def scenario():
+        await manager.connect(fast, "u1", topics=["chat:1"])
+        await manager.connect(slow, "u2", topics=["chat:1"])
+        for status in ("sent", "delivered", "read"): # Lento preso no primeiro; dos pendentes só o último fica na fila
+            await manager.publish(["chat:1"], {"type": "whatsapp_message_status", "payload": {"id": "wamid.1", "status": status}})
+            await _drain()
+        assert [m["payload"]["status"] for m in fast.sent] == ["sent", "delivered", "read"]
+        assert len(manager._send_queues[slow]) == 1
+
+        for i in range(3):
+            await manager.publish(["chat:1"], {"type": "new_whatsapp_message", "payload": {"id": f"wamid.m{i}"}})
+        await _drain()
+        # Acima do limite suave: status de outra mensagem é descartado para o lento, entregue ao rápido
+        assert await manager.publish(["chat:1"], {"type": "whatsapp_message_status", "payload": {"id": "wamid.2", "status": "sent"}}) == 1
+        await manager.publish(["chat:1"], {"type": "new_whatsapp_message", "payload": {"id": "wamid.m3"}})
+        await manager.publish(["chat:1"], {"type": "new_whatsapp_message", "payload": {"id": "wamid.m4"}}) # Fila cheia
+        await _drain()
+
+        assert manager.subscriber_count("chat:1") == 1 # Lento desconectado
+        assert slow.closed == 1013
+        assert len(fast.sent) == 9
+
+    asyncio.run(scenario())
+
+def test_encode_event_once_with_iso_dates_and_policy():
+    from datetime import datetime, timezone
+    from app.services.whatsapp_webhook import message_event_payload
+    from app.websocket.encoding import encode_event, loads
+
+    created = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    doc = {"_id": "wamid.1", "chat_id": "5511", "sender_id": "5511", "content": "oi", "type": "text", "timestamp": created,
+           "status": "received", "status_timestamp": None, "metadata": {"contact_name": "Ana"}, "createdAt": created}
+    event = encode_event({"type": "new_whatsapp_message", "payload": message_event_payload(doc)})
+    payload = loads(event.text)["payload"]
+    assert payload["created_at"] == "2024-05-01T12:00:00+00:00" and payload["_id"] == "wamid.1"
+    assert "metadata" not in payload and "status_timestamp" not in payload
+    assert ": " not in event.text # Compacto
+
+    status = encode_event({"type": "whatsapp_message_status", "payload": {"id": "wamid.1", "status": "read"}})
+    assert status.coalesce_key == "status:wamid.1" and status.droppable
@@ -0,0 +1,64 @@
+# tests/whatsapp/test_send_pipeline.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+def test_local_token_bucket_grants_burst_then_paces():
+    from app.core.rate_limit import TokenBucket
+    bucket = TokenBucket("test", rate_per_second=100, capacity=5)
+
+    async def scenario():
+        granted, wait = await bucket.take(8)
+        assert granted == 5 and 0 < wait <= 0.011
+        waited = await bucket.acquire(2) # ~2 tokens a 100/s
+        assert 0.01 <= waited < 0.1
+
+    asyncio.run(scenario())
+
+def test_send_batch_keeps_recipient_order_and_classifies_failures():
+    from app.core.rate_limit import TokenBucket
+    from app.services.whatsapp_send_pipeline import _result_update, send_batch
+    from app.services.whatsapp_service import WhatsAppSendResult
+    sent = []
+
+    async def sender(recipient, text):
+        await asyncio.sleep(0.001 if text.endswith("1") else 0.005)
+        sent.append((recipient, text))
+        if text == "b1":
+            return WhatsAppSendResult(False, status_code=400, error_code=130429, retryable=True, rate_limited=True)
+        if text == "c1":
+            return WhatsAppSendResult(False, status_code=400, error_code=131026)
+        return WhatsAppSendResult(True, wami=f"wamid.{text}")
+
+    batch = [{"_id": t, "recipient_id": t[0], "content": t} for t in ("a0", "b1", "a1", "c1", "a2")]
+    results = asyncio.run(send_batch(batch, TokenBucket("test", rate_per_second=1000, capacity=10), sender))
+    assert [text for recipient, text in sent if recipient == "a"] == ["a0", "a1", "a2"]
+
+    now = datetime.now(timezone.utc)
+    updates = {doc["_id"]: _result_update(doc, result, now) for doc, result in zip(batch, results)}
+    assert updates["a0"]["$set"]["status"] == "sent" and updates["a0"]["$set"]["official_wami"] == "wamid.a0"
+    assert updates["b1"]["$set"]["status"] == "pending_queue" and updates["b1"]["$set"]["next_attempt_at"] > now
+    assert updates["c1"]["$set"]["status"] == "failed_send" # 4xx permanente não volta para a fila
+
+def test_claim_batch_holds_messages_behind_a_retry_and_results_match_the_claim():
+    from mongomock_motor import AsyncMongoMockClient
+    from app.services.whatsapp_send_pipeline import WHATSAPP_MESSAGES_COLLECTION, claim_batch
+
+    db = AsyncMongoMockClient()["test"]
+    collection = db[WHATSAPP_MESSAGES_COLLECTION]
+    now = datetime.now(timezone.utc)
+    t0 = now - timedelta(minutes=5)
+
+    async def scenario():
+        await collection.insert_many([
+            {"_id": "r1", "recipient_id": "r", "status": "pending_queue", "timestamp": t0, "next_attempt_at": now + timedelta(seconds=30)},
+            {"_id": "r2", "recipient_id": "r", "status": "pending_queue", "timestamp": t0 + timedelta(seconds=1)},
+            {"_id": "s1", "recipient_id": "s", "status": "pending_queue", "timestamp": t0 + timedelta(seconds=2)},
+        ])
+        claimed = await claim_batch(db, 10, now=now)
+        assert [doc["_id"] for doc in claimed] == ["s1"] # r2 espera a nova tentativa de r1
+        assert claimed[0]["send_claim"]
+
+        later = await claim_batch(db, 10, now=now + timedelta(seconds=31))
+        assert [doc["_id"] for doc in later] == ["r1", "r2"]
+
+    asyncio.run(scenario())
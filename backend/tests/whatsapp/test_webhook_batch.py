@@ -0,0 +1,162 @@
+# tests/whatsapp/test_webhook_batch.py
+
+def test_build_webhook_batch_merges_chats_and_statuses():
+    from app.services.whatsapp_webhook import build_webhook_batch
+    value = {
+        "metadata": {"phone_number_id": "1000"},
+        "contacts": [{"wa_id": "5511", "profile": {"name": "Ana"}}, {"wa_id": "5522", "profile": {"name": "Bruno"}}],
+        "messages": [
+            {"from": "5511", "id": "wamid.a1", "timestamp": "1700000001", "type": "text", "text": {"body": "oi"}},
+            {"from": "5522", "id": "wamid.b1", "timestamp": "1700000002", "type": "reaction", "reaction": {"emoji": "👍"}},
+            {"from": "5511", "id": "wamid.a2", "timestamp": "1700000003", "type": "image", "image": {"id": "m1"}},
+            {"from": "5511", "id": "wamid.a2", "timestamp": "1700000003", "type": "image", "image": {"id": "m1"}}, # Reentrega
+            {"id": "wamid.sem_remetente", "type": "text"},
+        ],
+        "statuses": [
+            {"id": "out1", "status": "delivered", "timestamp": "1700000005", "recipient_id": "5511"},
+            {"id": "out1", "status": "sent", "timestamp": "1700000004", "recipient_id": "5511"}, # Fora de ordem
+        ],
+    }
+    payload = {"object": "whatsapp_business_account", "entry": [{"id": "e1", "changes": [{"field": "messages", "value": value}]}]}
+
+    batch = build_webhook_batch(payload)
+    assert [doc["_id"] for doc in batch.messages] == ["wamid.a1", "wamid.b1", "wamid.a2"]
+    assert batch.skipped == 2
+    assert batch.chats["5511"]["unread"] == 2 and batch.chats["5511"]["last_customer_message_id"] == "wamid.a2"
+    assert batch.chats["5522"]["unread"] == 0 and batch.chats["5522"]["contact_name"] == "Bruno"
+    assert batch.messages[0]["recipient_id"] == "1000" and batch.messages[2]["content"] == "[IMAGE Media]"
+    assert batch.statuses["out1"]["status"] == "delivered"
+
+def test_webhook_stream_filters_redelivered_events():
+    from app.services.whatsapp_webhook import build_webhook_batch
+    from app.services.whatsapp_webhook_stream import filter_webhook_payload, webhook_idempotency_ids
+    value = {
+        "messages": [{"from": "5511", "id": "wamid.a1", "type": "text"}, {"from": "5511", "id": "wamid.a2", "type": "text"}],
+        "statuses": [{"id": "out1", "status": "sent", "recipient_id": "5511"}, {"id": "out1", "status": "read", "recipient_id": "5511"}],
+    }
+    payload = {"object": "whatsapp_business_account", "entry": [{"id": "e1", "changes": [{"field": "messages", "value": value}]}]}
+
+    assert webhook_idempotency_ids(payload) == ["m:wamid.a1", "m:wamid.a2", "s:out1:sent", "s:out1:read"]
+    filtered = filter_webhook_payload(payload, ["m:wamid.a2", "s:out1:read"]) # a1 e o 'sent' já tinham chegado
+    batch = build_webhook_batch(filtered)
+    assert [doc["_id"] for doc in batch.messages] == ["wamid.a2"]
+    assert batch.statuses["out1"]["status"] == "read"
+    assert len(payload["entry"][0]["changes"][0]["value"]["messages"]) == 2 # Original intacto
+
+class _CountingCollection:
+    """Conta as chamadas ao Mongo (find/bulk_write/...) feitas numa coleção."""
+
+    def __init__(self, collection, calls):
+        self._collection = collection
+        self._calls = calls
+
+    async def bulk_write(self, operations, ordered=True):
+        # mongomock não aceita o UpdateOne do pymongo >= 4.9 (kwarg `sort`): conta uma chamada e aplica as operações
+        self._calls.append((self._collection.name, "bulk_write"))
+        for op in operations:
+            await self._collection.update_one(op._filter, op._doc, upsert=bool(op._upsert))
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self._calls.append((self._collection.name, name))
+            return attr(*args, **kwargs)
+        return counted
+
+class _CountingDatabase:
+    def __init__(self, db):
+        self._db = db
+        self.calls = []
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name], self.calls)
+
+def _webhook_payload(chats: int, messages_per_chat: int):
+    messages = [{"from": f"55{c:04d}", "id": f"wamid.{c}.{m}", "timestamp": str(1700000000 + m), "type": "text", "text": {"body": "oi"}}
+                for c in range(chats) for m in range(messages_per_chat)]
+    statuses = [{"id": f"out{c}", "status": "read", "timestamp": "1700000100", "recipient_id": f"55{c:04d}"} for c in range(chats)]
+    value = {"metadata": {"phone_number_id": "1000"}, "contacts": [{"wa_id": f"55{c:04d}", "profile": {"name": f"C{c}"}} for c in range(chats)],
+             "messages": messages, "statuses": statuses}
+    return {"object": "whatsapp_business_account", "entry": [{"id": "e1", "changes": [{"field": "messages", "value": value}]}]}
+
+def test_process_webhook_batch_uses_a_fixed_number_of_mongo_calls():
+    import asyncio
+    import fakeredis
+    from mongomock_motor import AsyncMongoMockClient
+    from app.core.settings_cache import SETTINGS_COLLECTION, settings_cache
+    from app.services.autoresponder_timers import AutoResponderTimers
+    from app.services.whatsapp_webhook import WHATSAPP_CHATS_COLLECTION, WHATSAPP_MESSAGES_COLLECTION, build_webhook_batch, process_webhook_batch
+
+    async def scenario(chats: int, messages_per_chat: int):
+        settings_cache.reset()
+        mongo = AsyncMongoMockClient()["test"]
+        await mongo[SETTINGS_COLLECTION].insert_many([{"_id": "autoresponder_enabled", "value": True},
+                                                      {"_id": "autoresponder_timeout_minutes", "value": 5}])
+        await mongo[WHATSAPP_MESSAGES_COLLECTION].insert_many([{"_id": f"out{c}", "status": "sent"} for c in range(chats)])
+        db = _CountingDatabase(mongo)
+        timers = AutoResponderTimers(fakeredis.FakeAsyncRedis())
+        frames = []
+
+        async def publish(topics, message):
+            frames.append((topics, message))
+
+        stats = await process_webhook_batch(build_webhook_batch(_webhook_payload(chats, messages_per_chat)), db, timers=timers, publish=publish)
+        assert stats["messages"] == chats * messages_per_chat and stats["timers_scheduled"] == chats
+        assert await mongo[WHATSAPP_MESSAGES_COLLECTION].count_documents({"status": "received"}) == chats * messages_per_chat
+        assert await mongo[WHATSAPP_MESSAGES_COLLECTION].count_documents({"status": "read"}) == chats
+        assert await mongo[WHATSAPP_CHATS_COLLECTION].count_documents({}) == chats
+        assert len(frames) == chats # Um frame por chat
+        return db.calls
+
+    single = asyncio.run(scenario(1, 1))
+    many = asyncio.run(scenario(40, 5))
+    # find dos statuses, bulk_write das mensagens, bulk_write dos chats, find dos modos, find das settings
+    assert len(single) == 5
+    assert sorted(many) == sorted(single)
+    settings_cache.reset()
+
+def test_webhook_stream_dead_letters_a_poison_entry_without_blocking_the_rest(monkeypatch):
+    import asyncio
+    import json
+    import fakeredis
+    from app.core.config import settings
+    from app.services import whatsapp_webhook_stream
+    from app.services.whatsapp_webhook_stream import WEBHOOK_DEAD_LETTER_KEY, WEBHOOK_STREAM_KEY, WebhookStream, consume_webhook_stream
+
+    monkeypatch.setattr(settings, "WHATSAPP_WEBHOOK_CLAIM_IDLE_SECONDS", 0)
+    monkeypatch.setattr(settings, "WHATSAPP_WEBHOOK_MAX_DELIVERIES", 3)
+    stored = []
+
+    async def process_webhook_batch(batch, db, **kwargs):
+        if any(doc["_id"] == "wamid.bad" for doc in batch.messages):
+            raise ValueError("poison")
+        stored.extend(doc["_id"] for doc in batch.messages)
+
+    monkeypatch.setattr(whatsapp_webhook_stream, "process_webhook_batch", process_webhook_batch)
+
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis()
+        stream = WebhookStream(redis_client)
+        for wami in ("wamid.ok1", "wamid.bad", "wamid.ok2"):
+            value = {"messages": [{"from": "5511", "id": wami, "timestamp": "1700000000", "type": "text", "text": {"body": "oi"}}]}
+            payload = {"object": "whatsapp_business_account", "entry": [{"id": "e1", "changes": [{"field": "messages", "value": value}]}]}
+            await stream.enqueue(json.dumps(payload).encode(), payload)
+
+        for _ in range(2): # Lote inteiro falha: fica pendente e volta via XAUTOCLAIM
+            try:
+                await consume_webhook_stream(stream, db=None, consumer="c1", max_seconds=0.1, block_ms=10)
+            except ValueError:
+                pass
+        assert stored == [] and await stream.backlog() == 3
+
+        stats = await consume_webhook_stream(stream, db=None, consumer="c1", max_seconds=0.1, block_ms=10)
+        assert stored == ["wamid.ok1", "wamid.ok2"]
+        assert stats["dead_lettered"] == 1 and await stream.backlog() == 0
+        dead = await redis_client.xrange(WEBHOOK_DEAD_LETTER_KEY)
+        assert len(dead) == 1 and b"wamid.bad" in dead[0][1][b"body"] and dead[0][1][b"deliveries"] == b"3"
+        assert (await redis_client.xpending(WEBHOOK_STREAM_KEY, "wa-webhook"))["pending"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+# tests/worker/test_async_runtime.py
+import asyncio
+
+def test_async_tasks_share_one_persistent_loop(monkeypatch):
+    from app.worker.celery_app import celery_app
+    from app.worker.runtime import AsyncTask, WorkerAsyncRuntime
+    import app.worker.runtime as runtime_module
+
+    runtime = WorkerAsyncRuntime()
+    async def no_clients():
+        return None
+    monkeypatch.setattr(runtime, "_connect_clients", no_clients)
+    monkeypatch.setattr(runtime, "_ensure_clients", no_clients)
+    monkeypatch.setattr(runtime, "_disconnect_clients", no_clients)
+    monkeypatch.setattr(runtime_module, "worker_runtime", runtime)
+
+    @celery_app.task(bind=True, base=AsyncTask, name="tests.loop_id")
+    async def loop_id(self, value):
+        await asyncio.sleep(0)
+        return id(asyncio.get_running_loop()), value, self.request.id
+
+    first = loop_id.apply(args=[1], task_id="t-1").get()
+    second = loop_id.apply(args=[2], task_id="t-2").get()
+    assert first[0] == second[0] # Mesmo loop entre tasks
+    assert (first[1], first[2]) == (1, "t-1") and second[2] == "t-2" # self.request visível dentro da coroutine
+    runtime.shutdown()
+    assert not runtime.started
+
+def test_send_whatsapp_message_task_runs_on_the_worker_loop(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+    from app.worker.runtime import WorkerAsyncRuntime
+    import app.worker.runtime as runtime_module
+    import app.worker.tasks_whatsapp as tasks_whatsapp
+
+    runtime = WorkerAsyncRuntime()
+    async def no_clients():
+        return None
+    monkeypatch.setattr(runtime, "_connect_clients", no_clients)
+    monkeypatch.setattr(runtime, "_ensure_clients", no_clients)
+    monkeypatch.setattr(runtime, "_disconnect_clients", no_clients)
+    monkeypatch.setattr(runtime_module, "worker_runtime", runtime)
+
+    db = AsyncMongoMockClient()["test_tasks_whatsapp"]
+    loops, published = [], []
+    async def send_text(recipient, text):
+        loops.append(id(asyncio.get_running_loop()))
+        return True, f"wamid.{text}"
+    async def publish(topics, message):
+        published.append(message["payload"]["status"])
+    monkeypatch.setattr(tasks_whatsapp, "get_mongo_db_instance", lambda: db)
+    monkeypatch.setattr(tasks_whatsapp.whatsapp_service, "send_whatsapp_text_message", send_text)
+    monkeypatch.setattr(tasks_whatsapp.ws_manager, "publish", publish)
+
+    async def seed():
+        await db["whatsapp_messages"].insert_many([{"_id": "out_1", "status": "pending_queue"}, {"_id": "out_2", "status": "pending_queue"}])
+    runtime.run(seed())
+
+    assert tasks_whatsapp.send_whatsapp_message.apply(args=["5511", "a", "out_1"]).get() == {"status": "success", "wami": "wamid.a"}
+    assert tasks_whatsapp.send_whatsapp_message.apply(args=["5511", "b", "out_2"]).get()["status"] == "success"
+    assert len(set(loops)) == 1 and published == ["sent", "sent"]
+    doc = runtime.run(db["whatsapp_messages"].find_one({"_id": "out_1"}))
+    assert doc["status"] == "sent" and doc["official_wami"] == "wamid.a"
+    runtime.shutdown()
@@ -0,0 +1,79 @@
+# tests/worker/test_autoresponder_timers.py
+import asyncio
+import json
+
+def _fake_redis():
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+def test_timers_schedule_cancel_and_claim_due_atomically():
+    from app.services.autoresponder_timers import AUTORESPONDER_PAYLOADS_KEY, AutoResponderTimers
+
+    async def scenario():
+        client = _fake_redis()
+        timers = AutoResponderTimers(client)
+        await timers.apply(schedule=[("c1", "wamid.1", 100.0), ("c2", "wamid.2", 200.0), ("c3", "wamid.3", 150.0)], trace_id="t")
+        await timers.apply(schedule=[("c1", "wamid.1b", 120.0)], cancel=["c3"]) # Nova mensagem adia; c3 respondido
+        assert await timers.pending_count() == 2
+        assert not await timers.cancel("c3")
+
+        assert await timers.claim_due(now=110.0) == []
+        due = await timers.claim_due(now=130.0)
+        assert due == [{"chat_id": "c1", "last_customer_message_id": "wamid.1b", "deadline": 120.0, "trace_id": None}]
+        assert await timers.claim_due(now=130.0) == [] # Cada timer é entregue uma vez
+        assert await client.hget(AUTORESPONDER_PAYLOADS_KEY, "c1") is None
+
+        assert await timers.cancel("c2") and await timers.pending_count() == 0
+
+    asyncio.run(scenario())
+
+def test_requeue_does_not_overwrite_a_newer_schedule():
+    from app.services.autoresponder_timers import AUTORESPONDER_PAYLOADS_KEY, AutoResponderTimers
+
+    async def scenario():
+        client = _fake_redis()
+        timers = AutoResponderTimers(client)
+        await timers.schedule("c1", "wamid.old", 100.0)
+        claimed = (await timers.claim_due(now=100.0))[0]
+
+        await timers.schedule("c1", "wamid.new", 500.0) # Cliente escreveu de novo entre o claim e a devolução
+        assert not await timers.requeue(claimed, deadline=101.0)
+        assert await client.zscore("wa:autoresponder:deadlines", "c1") == 500.0
+        assert json.loads(await client.hget(AUTORESPONDER_PAYLOADS_KEY, "c1"))["last_customer_message_id"] == "wamid.new"
+
+        await timers.cancel("c1")
+        assert await timers.requeue(claimed, deadline=101.0)
+        assert (await timers.claim_due(now=101.0))[0]["last_customer_message_id"] == "wamid.old"
+
+    asyncio.run(scenario())
+
+def test_poller_dispatches_due_timers_and_requeues_failed_dispatches(monkeypatch):
+    from app.core.database import redis_manager
+    from app.services.autoresponder_timers import AutoResponderTimers
+    from app.worker import tasks_whatsapp_timers
+    from app.worker.celery_app import celery_app
+
+    client = _fake_redis()
+    monkeypatch.setattr(redis_manager, "client", client)
+    sent = []
+
+    def send_task(name, args=None, kwargs=None):
+        if args[0] == "broken":
+            raise ConnectionError("broker down")
+        sent.append((name, args, kwargs))
+    monkeypatch.setattr(celery_app, "send_task", send_task)
+
+    async def scenario():
+        timers = AutoResponderTimers(client)
+        await timers.apply(schedule=[("c1", "wamid.1", 1.0), ("broken", "wamid.2", 2.0), ("later", "wamid.3", 4e9)])
+        result = await tasks_whatsapp_timers.poll_autoresponder_timers.run()
+        assert result == {"status": "success", "fired": 1}
+        assert sent[0][0] == "whatsapp.check_chat_timeout" and sent[0][1] == ["c1", "wamid.1"]
+        assert sorted(await client.zrange("wa:autoresponder:deadlines", 0, -1)) == ["broken", "later"]
+
+    asyncio.run(scenario())
+
+def test_worker_registers_the_task_the_timer_poller_dispatches():
+    from app.worker.celery_app import celery_app
+    celery_app.loader.import_default_modules() # O que o worker faz ao subir (celery_app.include)
+    assert {"whatsapp.poll_autoresponder_timers", "whatsapp.check_chat_timeout"} <= set(celery_app.tasks)